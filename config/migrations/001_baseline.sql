@@ -0,0 +1,300 @@
+-- Migration 001: baseline schema
+-- The schema config/setup_supabase.sql created before migrations were versioned. Applied
+-- only to an empty database; on one already set up from setup_supabase.sql,
+-- scripts/supabase_db.py records it as applied without running it.
+
+-- 1. Enable pgvector extension
+CREATE EXTENSION IF NOT EXISTS vector;
+
+-- 2. Create documents table
+CREATE TABLE IF NOT EXISTS documents (
+    id BIGSERIAL PRIMARY KEY,
+    document_id TEXT UNIQUE NOT NULL,
+    filename TEXT NOT NULL,
+    file_hash TEXT UNIQUE NOT NULL,
+    file_path TEXT NOT NULL,
+    chunk_count INTEGER NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- 3. Create document_chunks table with vector column
+CREATE TABLE IF NOT EXISTS document_chunks (
+    id BIGSERIAL PRIMARY KEY,
+    document_id TEXT NOT NULL REFERENCES documents(document_id) ON DELETE CASCADE,
+    chunk_index INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    embedding vector(1536),  -- OpenAI embeddings are 1536 dimensions
+    metadata JSONB,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    UNIQUE(document_id, chunk_index)
+);
+
+-- 4. Create index on embedding column for faster similarity search
+CREATE INDEX IF NOT EXISTS document_chunks_embedding_idx 
+ON document_chunks 
+USING ivfflat (embedding vector_cosine_ops)
+WITH (lists = 100);
+
+-- 5. Create index on document_id for faster joins
+CREATE INDEX IF NOT EXISTS document_chunks_document_id_idx 
+ON document_chunks(document_id);
+
+-- 6. Create index on file_hash for duplicate detection
+CREATE INDEX IF NOT EXISTS documents_file_hash_idx 
+ON documents(file_hash);
+
+-- 7. Create functions for similarity search
+-- Optional filters restrict the search to some documents. Unfiltered calls pass none of
+-- them, so the older two-argument signature is dropped to keep the RPC unambiguous.
+-- include_embeddings returns the chunk vectors too, for diversity (MMR) re-ranking in the
+-- app; the return type changed with it, so the previous version is dropped as well.
+DROP FUNCTION IF EXISTS match_documents(vector, INT);
+DROP FUNCTION IF EXISTS match_documents(vector, INT, TEXT[], TEXT[], TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE);
+
+-- Ids of the documents passing the filters, or NULL when no filter is set
+CREATE OR REPLACE FUNCTION selected_document_ids(
+    filter_document_ids TEXT[] DEFAULT NULL,
+    filter_filenames TEXT[] DEFAULT NULL,
+    uploaded_after TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    uploaded_before TIMESTAMP WITH TIME ZONE DEFAULT NULL
+)
+RETURNS TEXT[]
+LANGUAGE sql STABLE
+AS $$
+    SELECT CASE
+        WHEN filter_document_ids IS NULL AND filter_filenames IS NULL
+             AND uploaded_after IS NULL AND uploaded_before IS NULL THEN NULL
+        ELSE COALESCE((
+            SELECT array_agg(d.document_id)
+            FROM documents d
+            WHERE (filter_document_ids IS NULL OR d.document_id = ANY(filter_document_ids))
+              AND (filter_filenames IS NULL OR d.filename = ANY(filter_filenames))
+              AND (uploaded_after IS NULL OR d.created_at >= uploaded_after)
+              AND (uploaded_before IS NULL OR d.created_at < uploaded_before)
+        ), ARRAY[]::TEXT[])
+    END;
+$$;
+
+-- Nearest chunks by cosine distance, only from the selected documents unless selected is NULL
+CREATE OR REPLACE FUNCTION nearest_chunks(
+    query_embedding vector(1536),
+    match_count INT,
+    selected TEXT[] DEFAULT NULL
+)
+RETURNS TABLE (
+    id BIGINT,
+    distance FLOAT
+)
+LANGUAGE plpgsql STABLE
+AS $$
+BEGIN
+    IF selected IS NULL THEN
+        RETURN QUERY
+        SELECT dc.id, (dc.embedding <=> query_embedding)::FLOAT
+        FROM document_chunks dc
+        ORDER BY dc.embedding <=> query_embedding
+        LIMIT match_count;
+    ELSE
+        -- The selected documents' chunks come from document_chunks_document_id_idx and are
+        -- scored exactly. Ordering through the ivfflat index instead would filter the
+        -- index's candidates afterwards and could return fewer than match_count rows.
+        RETURN QUERY
+        WITH candidates AS MATERIALIZED (
+            SELECT dc.id, (dc.embedding <=> query_embedding)::FLOAT AS distance
+            FROM document_chunks dc
+            WHERE dc.document_id = ANY(selected)
+        )
+        SELECT c.id, c.distance
+        FROM candidates c
+        ORDER BY c.distance
+        LIMIT match_count;
+    END IF;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION match_documents(
+    query_embedding vector(1536),
+    match_count INT DEFAULT 5,
+    filter_document_ids TEXT[] DEFAULT NULL,
+    filter_filenames TEXT[] DEFAULT NULL,
+    uploaded_after TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    uploaded_before TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    include_embeddings BOOLEAN DEFAULT FALSE
+)
+RETURNS TABLE (
+    id BIGINT,
+    document_id TEXT,
+    chunk_index INTEGER,
+    content TEXT,
+    metadata JSONB,
+    similarity FLOAT,
+    embedding vector(1536)
+)
+LANGUAGE sql STABLE
+AS $$
+    SELECT
+        dc.id,
+        dc.document_id,
+        dc.chunk_index,
+        dc.content,
+        dc.metadata,
+        1 - n.distance AS similarity,
+        CASE WHEN include_embeddings THEN dc.embedding END AS embedding
+    FROM nearest_chunks(
+        query_embedding,
+        match_count,
+        selected_document_ids(filter_document_ids, filter_filenames, uploaded_after, uploaded_before)
+    ) n
+    JOIN document_chunks dc ON dc.id = n.id
+    ORDER BY n.distance;
+$$;
+
+-- 7b. Keyword search: a full-text column maintained by Postgres on every insert/update,
+-- indexed with GIN (chunks deleted with their document drop out of it automatically)
+ALTER TABLE document_chunks
+ADD COLUMN IF NOT EXISTS content_tsv tsvector
+GENERATED ALWAYS AS (to_tsvector('english', content)) STORED;
+
+CREATE INDEX IF NOT EXISTS document_chunks_content_tsv_idx
+ON document_chunks
+USING gin (content_tsv);
+
+-- 7c. Hybrid search: the best candidate_count chunks by vector distance and by keyword
+-- rank, fused with reciprocal rank fusion (each list adds 1 / (rrf_k + rank) per chunk).
+-- Query words are OR-ed, so one matching error code or name is enough to be a candidate.
+-- Takes the same document filters and include_embeddings flag as match_documents.
+DROP FUNCTION IF EXISTS hybrid_match_documents(TEXT, vector, INT, INT, INT);
+DROP FUNCTION IF EXISTS hybrid_match_documents(TEXT, vector, INT, INT, INT, TEXT[], TEXT[], TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE);
+
+CREATE OR REPLACE FUNCTION hybrid_match_documents(
+    query_text TEXT,
+    query_embedding vector(1536),
+    match_count INT DEFAULT 5,
+    candidate_count INT DEFAULT 20,
+    rrf_k INT DEFAULT 60,
+    filter_document_ids TEXT[] DEFAULT NULL,
+    filter_filenames TEXT[] DEFAULT NULL,
+    uploaded_after TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    uploaded_before TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    include_embeddings BOOLEAN DEFAULT FALSE
+)
+RETURNS TABLE (
+    id BIGINT,
+    document_id TEXT,
+    chunk_index INTEGER,
+    content TEXT,
+    metadata JSONB,
+    similarity FLOAT,
+    score FLOAT,
+    embedding vector(1536)
+)
+LANGUAGE sql STABLE
+AS $$
+    WITH selection AS MATERIALIZED (
+        SELECT selected_document_ids(filter_document_ids, filter_filenames, uploaded_after, uploaded_before) AS ids
+    ),
+    semantic AS (
+        SELECT n.id, ROW_NUMBER() OVER (ORDER BY n.distance) AS rank
+        FROM selection sel, nearest_chunks(query_embedding, candidate_count, sel.ids) n
+    ),
+    keyword_query AS (
+        SELECT replace(plainto_tsquery('english', query_text)::text, '&', '|')::tsquery AS query
+    ),
+    keyword AS (
+        SELECT dc.id, ROW_NUMBER() OVER (ORDER BY ts_rank_cd(dc.content_tsv, kq.query) DESC) AS rank
+        FROM document_chunks dc, keyword_query kq, selection sel
+        WHERE dc.content_tsv @@ kq.query
+          AND (sel.ids IS NULL OR dc.document_id = ANY(sel.ids))
+        ORDER BY ts_rank_cd(dc.content_tsv, kq.query) DESC
+        LIMIT candidate_count
+    ),
+    fused AS (
+        SELECT
+            COALESCE(s.id, k.id) AS id,
+            COALESCE(1.0 / (rrf_k + s.rank), 0.0) + COALESCE(1.0 / (rrf_k + k.rank), 0.0) AS score
+        FROM semantic s
+        FULL OUTER JOIN keyword k ON s.id = k.id
+    )
+    SELECT
+        dc.id,
+        dc.document_id,
+        dc.chunk_index,
+        dc.content,
+        dc.metadata,
+        1 - (dc.embedding <=> query_embedding) AS similarity,
+        f.score::FLOAT AS score,
+        CASE WHEN include_embeddings THEN dc.embedding END AS embedding
+    FROM fused f
+    JOIN document_chunks dc ON dc.id = f.id
+    ORDER BY f.score DESC
+    LIMIT match_count;
+$$;
+
+-- 8. Create function to update updated_at timestamp
+CREATE OR REPLACE FUNCTION update_updated_at_column()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+-- 9. Create trigger for auto-updating updated_at
+CREATE TRIGGER update_documents_updated_at 
+    BEFORE UPDATE ON documents
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
+
+-- Supabase provides these roles; create them on a plain Postgres (local testing)
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'authenticated') THEN
+        CREATE ROLE authenticated NOLOGIN;
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'service_role') THEN
+        CREATE ROLE service_role NOLOGIN;
+    END IF;
+END;
+$$;
+
+-- 10. Enable Row Level Security (RLS) - Optional but recommended
+ALTER TABLE documents ENABLE ROW LEVEL SECURITY;
+ALTER TABLE document_chunks ENABLE ROW LEVEL SECURITY;
+
+-- 11. Create policies for authenticated access
+-- Allow all operations for authenticated users (adjust based on your needs)
+CREATE POLICY "Enable all operations for authenticated users on documents"
+ON documents FOR ALL
+TO authenticated
+USING (true)
+WITH CHECK (true);
+
+CREATE POLICY "Enable all operations for authenticated users on document_chunks"
+ON document_chunks FOR ALL
+TO authenticated
+USING (true)
+WITH CHECK (true);
+
+-- 12. Create policies for service role (your backend)
+CREATE POLICY "Enable all operations for service role on documents"
+ON documents FOR ALL
+TO service_role
+USING (true)
+WITH CHECK (true);
+
+CREATE POLICY "Enable all operations for service role on document_chunks"
+ON document_chunks FOR ALL
+TO service_role
+USING (true)
+WITH CHECK (true);
+
+-- 13. Grant permissions
+GRANT ALL ON documents TO authenticated, service_role;
+GRANT ALL ON document_chunks TO authenticated, service_role;
+GRANT ALL ON ALL SEQUENCES IN SCHEMA public TO authenticated, service_role;
+
+-- Verification queries (optional - run these to check setup)
+-- SELECT COUNT(*) FROM documents;
+-- SELECT COUNT(*) FROM document_chunks;
+-- SELECT * FROM pg_extension WHERE extname = 'vector';
@@ -0,0 +1,248 @@
+-- Migration 002: vector index sized from the data, with per-query probes / ef_search
+-- The baseline built an ivfflat index with a fixed lists = 100 on a still empty table, so
+-- its centroids were picked from no data, and match_documents left ivfflat.probes at its
+-- default of 1. The index is now (re)built by rebuild_embedding_index() from the row
+-- count, either HNSW or IVF, and the search functions set probes / ef_search per call.
+-- Rebuild after bulk loads: python scripts/supabase_db.py reindex
+
+-- Parameters of the current embedding index, written by rebuild_embedding_index()
+CREATE TABLE IF NOT EXISTS vector_index_settings (
+    singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+    method TEXT NOT NULL DEFAULT 'none',  -- 'hnsw', 'ivfflat' or 'none' (exact scan)
+    lists INTEGER,
+    probes INTEGER NOT NULL DEFAULT 1,
+    m INTEGER,
+    ef_construction INTEGER,
+    ef_search INTEGER NOT NULL DEFAULT 40,
+    rows_indexed BIGINT NOT NULL DEFAULT 0,
+    rebuilt_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+INSERT INTO vector_index_settings (singleton) VALUES (TRUE) ON CONFLICT DO NOTHING;
+
+GRANT ALL ON vector_index_settings TO authenticated, service_role;
+
+-- Drop and recreate document_chunks_embedding_idx for the current rows
+-- ivfflat gets rows / 1000 lists up to 1M rows and sqrt(rows) beyond, and searches
+-- sqrt(lists) of them (pgvector's recommendations); hnsw gets m / ef_construction.
+-- Below min_rows no index is built: an exact scan is fast there and has perfect recall.
+-- Writes to document_chunks wait while the index builds.
+CREATE OR REPLACE PROCEDURE rebuild_embedding_index(
+    index_method TEXT DEFAULT 'hnsw',
+    min_rows BIGINT DEFAULT 1000,
+    hnsw_m INTEGER DEFAULT 16,
+    hnsw_ef_construction INTEGER DEFAULT 64,
+    hnsw_ef_search INTEGER DEFAULT 40
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    chosen_method TEXT := index_method;
+    vector_count BIGINT;
+    list_count INTEGER;
+BEGIN
+    IF chosen_method NOT IN ('hnsw', 'ivfflat', 'none') THEN
+        RAISE EXCEPTION 'index_method must be hnsw, ivfflat or none, not %', chosen_method;
+    END IF;
+    SELECT COUNT(*) INTO vector_count FROM document_chunks WHERE embedding IS NOT NULL;
+    IF vector_count < min_rows THEN
+        chosen_method := 'none';
+    END IF;
+
+    DROP INDEX IF EXISTS document_chunks_embedding_idx;
+    IF chosen_method = 'ivfflat' THEN
+        list_count := GREATEST(1, CASE
+            WHEN vector_count <= 1000000 THEN vector_count / 1000
+            ELSE floor(sqrt(vector_count))::BIGINT
+        END);
+        EXECUTE format(
+            'CREATE INDEX document_chunks_embedding_idx ON document_chunks '
+            'USING ivfflat (embedding vector_cosine_ops) WITH (lists = %s)',
+            list_count
+        );
+    ELSIF chosen_method = 'hnsw' THEN
+        EXECUTE format(
+            'CREATE INDEX document_chunks_embedding_idx ON document_chunks '
+            'USING hnsw (embedding vector_cosine_ops) WITH (m = %s, ef_construction = %s)',
+            hnsw_m, hnsw_ef_construction
+        );
+    END IF;
+
+    UPDATE vector_index_settings SET
+        method = chosen_method,
+        lists = list_count,
+        probes = CASE WHEN list_count IS NULL THEN 1 ELSE ceil(sqrt(list_count))::INTEGER END,
+        m = CASE WHEN chosen_method = 'hnsw' THEN hnsw_m END,
+        ef_construction = CASE WHEN chosen_method = 'hnsw' THEN hnsw_ef_construction END,
+        ef_search = hnsw_ef_search,
+        rows_indexed = vector_count,
+        rebuilt_at = NOW();
+    ANALYZE document_chunks;
+END;
+$$;
+
+-- Replaces the fixed lists = 100 index built by the baseline
+CALL rebuild_embedding_index();
+
+-- The search functions gain ivf_probes / hnsw_ef_search arguments (NULL: the values in
+-- vector_index_settings), so their previous signatures are dropped first
+DROP FUNCTION IF EXISTS nearest_chunks(vector, INT, TEXT[]);
+DROP FUNCTION IF EXISTS match_documents(vector, INT, TEXT[], TEXT[], TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE, BOOLEAN);
+DROP FUNCTION IF EXISTS hybrid_match_documents(TEXT, vector, INT, INT, INT, TEXT[], TEXT[], TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE, BOOLEAN);
+
+-- Nearest chunks by cosine distance, only from the selected documents unless selected is NULL
+-- VOLATILE because it sets the index search parameters for the rest of the call's transaction
+CREATE OR REPLACE FUNCTION nearest_chunks(
+    query_embedding vector(1536),
+    match_count INT,
+    selected TEXT[] DEFAULT NULL,
+    ivf_probes INT DEFAULT NULL,
+    hnsw_ef_search INT DEFAULT NULL
+)
+RETURNS TABLE (
+    id BIGINT,
+    distance FLOAT
+)
+LANGUAGE plpgsql VOLATILE
+AS $$
+DECLARE
+    settings vector_index_settings%ROWTYPE;
+BEGIN
+    IF selected IS NULL THEN
+        SELECT * INTO settings FROM vector_index_settings;
+        PERFORM set_config('ivfflat.probes', COALESCE(ivf_probes, settings.probes, 1)::TEXT, true);
+        -- HNSW returns at most ef_search rows, so it never goes below match_count
+        PERFORM set_config(
+            'hnsw.ef_search',
+            LEAST(GREATEST(COALESCE(hnsw_ef_search, settings.ef_search, 40), match_count), 1000)::TEXT,
+            true
+        );
+        RETURN QUERY
+        SELECT dc.id, (dc.embedding <=> query_embedding)::FLOAT
+        FROM document_chunks dc
+        ORDER BY dc.embedding <=> query_embedding
+        LIMIT match_count;
+    ELSE
+        -- The selected documents' chunks come from document_chunks_document_id_idx and are
+        -- scored exactly. Ordering through the ANN index instead would filter the
+        -- index's candidates afterwards and could return fewer than match_count rows.
+        RETURN QUERY
+        WITH candidates AS MATERIALIZED (
+            SELECT dc.id, (dc.embedding <=> query_embedding)::FLOAT AS distance
+            FROM document_chunks dc
+            WHERE dc.document_id = ANY(selected)
+        )
+        SELECT c.id, c.distance
+        FROM candidates c
+        ORDER BY c.distance
+        LIMIT match_count;
+    END IF;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION match_documents(
+    query_embedding vector(1536),
+    match_count INT DEFAULT 5,
+    filter_document_ids TEXT[] DEFAULT NULL,
+    filter_filenames TEXT[] DEFAULT NULL,
+    uploaded_after TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    uploaded_before TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    include_embeddings BOOLEAN DEFAULT FALSE,
+    ivf_probes INT DEFAULT NULL,
+    hnsw_ef_search INT DEFAULT NULL
+)
+RETURNS TABLE (
+    id BIGINT,
+    document_id TEXT,
+    chunk_index INTEGER,
+    content TEXT,
+    metadata JSONB,
+    similarity FLOAT,
+    embedding vector(1536)
+)
+LANGUAGE sql VOLATILE
+AS $$
+    SELECT
+        dc.id,
+        dc.document_id,
+        dc.chunk_index,
+        dc.content,
+        dc.metadata,
+        1 - n.distance AS similarity,
+        CASE WHEN include_embeddings THEN dc.embedding END AS embedding
+    FROM nearest_chunks(
+        query_embedding,
+        match_count,
+        selected_document_ids(filter_document_ids, filter_filenames, uploaded_after, uploaded_before),
+        ivf_probes,
+        hnsw_ef_search
+    ) n
+    JOIN document_chunks dc ON dc.id = n.id
+    ORDER BY n.distance;
+$$;
+
+CREATE OR REPLACE FUNCTION hybrid_match_documents(
+    query_text TEXT,
+    query_embedding vector(1536),
+    match_count INT DEFAULT 5,
+    candidate_count INT DEFAULT 20,
+    rrf_k INT DEFAULT 60,
+    filter_document_ids TEXT[] DEFAULT NULL,
+    filter_filenames TEXT[] DEFAULT NULL,
+    uploaded_after TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    uploaded_before TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    include_embeddings BOOLEAN DEFAULT FALSE,
+    ivf_probes INT DEFAULT NULL,
+    hnsw_ef_search INT DEFAULT NULL
+)
+RETURNS TABLE (
+    id BIGINT,
+    document_id TEXT,
+    chunk_index INTEGER,
+    content TEXT,
+    metadata JSONB,
+    similarity FLOAT,
+    score FLOAT,
+    embedding vector(1536)
+)
+LANGUAGE sql VOLATILE
+AS $$
+    WITH selection AS MATERIALIZED (
+        SELECT selected_document_ids(filter_document_ids, filter_filenames, uploaded_after, uploaded_before) AS ids
+    ),
+    semantic AS (
+        SELECT n.id, ROW_NUMBER() OVER (ORDER BY n.distance) AS rank
+        FROM selection sel, nearest_chunks(query_embedding, candidate_count, sel.ids, ivf_probes, hnsw_ef_search) n
+    ),
+    keyword_query AS (
+        SELECT replace(plainto_tsquery('english', query_text)::text, '&', '|')::tsquery AS query
+    ),
+    keyword AS (
+        SELECT dc.id, ROW_NUMBER() OVER (ORDER BY ts_rank_cd(dc.content_tsv, kq.query) DESC) AS rank
+        FROM document_chunks dc, keyword_query kq, selection sel
+        WHERE dc.content_tsv @@ kq.query
+          AND (sel.ids IS NULL OR dc.document_id = ANY(sel.ids))
+        ORDER BY ts_rank_cd(dc.content_tsv, kq.query) DESC
+        LIMIT candidate_count
+    ),
+    fused AS (
+        SELECT
+            COALESCE(s.id, k.id) AS id,
+            COALESCE(1.0 / (rrf_k + s.rank), 0.0) + COALESCE(1.0 / (rrf_k + k.rank), 0.0) AS score
+        FROM semantic s
+        FULL OUTER JOIN keyword k ON s.id = k.id
+    )
+    SELECT
+        dc.id,
+        dc.document_id,
+        dc.chunk_index,
+        dc.content,
+        dc.metadata,
+        1 - (dc.embedding <=> query_embedding) AS similarity,
+        f.score::FLOAT AS score,
+        CASE WHEN include_embeddings THEN dc.embedding END AS embedding
+    FROM fused f
+    JOIN document_chunks dc ON dc.id = f.id
+    ORDER BY f.score DESC
+    LIMIT match_count;
+$$;
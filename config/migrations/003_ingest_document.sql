@@ -0,0 +1,48 @@
+-- Migration 003: a document and its chunks inserted in one round trip
+-- Uploads used to check for a duplicate, insert the documents row and insert the chunks
+-- in separate PostgREST requests. ingest_document() does the inserts in one call and one
+-- transaction, and its ON CONFLICT on file_hash replaces the separate duplicate check:
+-- when the file is already stored (also when two uploads of it race) nothing is written
+-- and the stored document is returned with inserted = FALSE.
+
+CREATE OR REPLACE FUNCTION ingest_document(
+    document JSONB,
+    chunks JSONB DEFAULT '[]'::JSONB
+)
+RETURNS TABLE (
+    document_id TEXT,
+    file_path TEXT,
+    inserted BOOLEAN
+)
+LANGUAGE plpgsql VOLATILE
+AS $$
+DECLARE
+    new_document_id TEXT;
+BEGIN
+    INSERT INTO documents (document_id, filename, file_hash, file_path, chunk_count)
+    VALUES (
+        document->>'document_id',
+        document->>'filename',
+        document->>'file_hash',
+        document->>'file_path',
+        (document->>'chunk_count')::INTEGER
+    )
+    ON CONFLICT (file_hash) DO NOTHING
+    RETURNING documents.document_id INTO new_document_id;
+
+    IF new_document_id IS NULL THEN
+        RETURN QUERY
+        SELECT d.document_id, d.file_path, FALSE
+        FROM documents d
+        WHERE d.file_hash = document->>'file_hash';
+        RETURN;
+    END IF;
+
+    -- Embeddings arrive as JSON arrays, which share pgvector's text form
+    INSERT INTO document_chunks (document_id, chunk_index, content, embedding, metadata)
+    SELECT new_document_id, c.chunk_index, c.content, c.embedding::TEXT::vector, c.metadata
+    FROM jsonb_to_recordset(chunks) AS c(chunk_index INTEGER, content TEXT, embedding JSONB, metadata JSONB);
+
+    RETURN QUERY SELECT new_document_id, document->>'file_path', TRUE;
+END;
+$$;
@@ -1,5 +1,7 @@
 -- Supabase Database Setup for RAG System with pgvector
 -- Run this in your Supabase SQL Editor
+-- This file creates the latest schema in a new project. To upgrade an existing database,
+-- apply the newer files in config/migrations instead: python scripts/supabase_db.py migrate
 
 -- 1. Enable pgvector extension
 CREATE EXTENSION IF NOT EXISTS vector;
@@ -28,11 +30,84 @@ CREATE TABLE IF NOT EXISTS document_chunks (
     UNIQUE(document_id, chunk_index)
 );
 
--- 4. Create index on embedding column for faster similarity search
-CREATE INDEX IF NOT EXISTS document_chunks_embedding_idx 
-ON document_chunks 
-USING ivfflat (embedding vector_cosine_ops)
-WITH (lists = 100);
+-- 4. Embedding index, sized from the data by rebuild_embedding_index()
+-- Parameters of the current embedding index, written by rebuild_embedding_index()
+CREATE TABLE IF NOT EXISTS vector_index_settings (
+    singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+    method TEXT NOT NULL DEFAULT 'none',  -- 'hnsw', 'ivfflat' or 'none' (exact scan)
+    lists INTEGER,
+    probes INTEGER NOT NULL DEFAULT 1,
+    m INTEGER,
+    ef_construction INTEGER,
+    ef_search INTEGER NOT NULL DEFAULT 40,
+    rows_indexed BIGINT NOT NULL DEFAULT 0,
+    rebuilt_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+INSERT INTO vector_index_settings (singleton) VALUES (TRUE) ON CONFLICT DO NOTHING;
+
+-- Drop and recreate document_chunks_embedding_idx for the current rows
+-- ivfflat gets rows / 1000 lists up to 1M rows and sqrt(rows) beyond, and searches
+-- sqrt(lists) of them (pgvector's recommendations); hnsw gets m / ef_construction.
+-- Below min_rows no index is built: an exact scan is fast there and has perfect recall.
+-- Writes to document_chunks wait while the index builds.
+CREATE OR REPLACE PROCEDURE rebuild_embedding_index(
+    index_method TEXT DEFAULT 'hnsw',
+    min_rows BIGINT DEFAULT 1000,
+    hnsw_m INTEGER DEFAULT 16,
+    hnsw_ef_construction INTEGER DEFAULT 64,
+    hnsw_ef_search INTEGER DEFAULT 40
+)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    chosen_method TEXT := index_method;
+    vector_count BIGINT;
+    list_count INTEGER;
+BEGIN
+    IF chosen_method NOT IN ('hnsw', 'ivfflat', 'none') THEN
+        RAISE EXCEPTION 'index_method must be hnsw, ivfflat or none, not %', chosen_method;
+    END IF;
+    SELECT COUNT(*) INTO vector_count FROM document_chunks WHERE embedding IS NOT NULL;
+    IF vector_count < min_rows THEN
+        chosen_method := 'none';
+    END IF;
+
+    DROP INDEX IF EXISTS document_chunks_embedding_idx;
+    IF chosen_method = 'ivfflat' THEN
+        list_count := GREATEST(1, CASE
+            WHEN vector_count <= 1000000 THEN vector_count / 1000
+            ELSE floor(sqrt(vector_count))::BIGINT
+        END);
+        EXECUTE format(
+            'CREATE INDEX document_chunks_embedding_idx ON document_chunks '
+            'USING ivfflat (embedding vector_cosine_ops) WITH (lists = %s)',
+            list_count
+        );
+    ELSIF chosen_method = 'hnsw' THEN
+        EXECUTE format(
+            'CREATE INDEX document_chunks_embedding_idx ON document_chunks '
+            'USING hnsw (embedding vector_cosine_ops) WITH (m = %s, ef_construction = %s)',
+            hnsw_m, hnsw_ef_construction
+        );
+    END IF;
+
+    UPDATE vector_index_settings SET
+        method = chosen_method,
+        lists = list_count,
+        probes = CASE WHEN list_count IS NULL THEN 1 ELSE ceil(sqrt(list_count))::INTEGER END,
+        m = CASE WHEN chosen_method = 'hnsw' THEN hnsw_m END,
+        ef_construction = CASE WHEN chosen_method = 'hnsw' THEN hnsw_ef_construction END,
+        ef_search = hnsw_ef_search,
+        rows_indexed = vector_count,
+        rebuilt_at = NOW();
+    ANALYZE document_chunks;
+END;
+$$;
+
+-- No index until there are rows to build it from: an empty table gets an exact scan, and
+-- python scripts/supabase_db.py reindex builds HNSW (or ivfflat) after loading documents
+CALL rebuild_embedding_index();
 
 -- 5. Create index on document_id for faster joins
 CREATE INDEX IF NOT EXISTS document_chunks_document_id_idx 
@@ -42,10 +117,102 @@ ON document_chunks(document_id);
 CREATE INDEX IF NOT EXISTS documents_file_hash_idx 
 ON documents(file_hash);
 
--- 7. Create function for similarity search
+-- 7. Create functions for similarity search
+-- Optional filters restrict the search to some documents. Unfiltered calls pass none of
+-- them, so the older two-argument signature is dropped to keep the RPC unambiguous.
+-- include_embeddings returns the chunk vectors too, for diversity (MMR) re-ranking in the
+-- app; the return type changed with it, so the previous version is dropped as well.
+DROP FUNCTION IF EXISTS match_documents(vector, INT);
+DROP FUNCTION IF EXISTS match_documents(vector, INT, TEXT[], TEXT[], TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE);
+-- ivf_probes / hnsw_ef_search set the index search parameters per call (NULL: the values
+-- in vector_index_settings); the versions without them are dropped too
+DROP FUNCTION IF EXISTS nearest_chunks(vector, INT, TEXT[]);
+DROP FUNCTION IF EXISTS match_documents(vector, INT, TEXT[], TEXT[], TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE, BOOLEAN);
+
+-- Ids of the documents passing the filters, or NULL when no filter is set
+CREATE OR REPLACE FUNCTION selected_document_ids(
+    filter_document_ids TEXT[] DEFAULT NULL,
+    filter_filenames TEXT[] DEFAULT NULL,
+    uploaded_after TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    uploaded_before TIMESTAMP WITH TIME ZONE DEFAULT NULL
+)
+RETURNS TEXT[]
+LANGUAGE sql STABLE
+AS $$
+    SELECT CASE
+        WHEN filter_document_ids IS NULL AND filter_filenames IS NULL
+             AND uploaded_after IS NULL AND uploaded_before IS NULL THEN NULL
+        ELSE COALESCE((
+            SELECT array_agg(d.document_id)
+            FROM documents d
+            WHERE (filter_document_ids IS NULL OR d.document_id = ANY(filter_document_ids))
+              AND (filter_filenames IS NULL OR d.filename = ANY(filter_filenames))
+              AND (uploaded_after IS NULL OR d.created_at >= uploaded_after)
+              AND (uploaded_before IS NULL OR d.created_at < uploaded_before)
+        ), ARRAY[]::TEXT[])
+    END;
+$$;
+
+-- Nearest chunks by cosine distance, only from the selected documents unless selected is NULL
+-- VOLATILE because it sets the index search parameters for the rest of the call's transaction
+CREATE OR REPLACE FUNCTION nearest_chunks(
+    query_embedding vector(1536),
+    match_count INT,
+    selected TEXT[] DEFAULT NULL,
+    ivf_probes INT DEFAULT NULL,
+    hnsw_ef_search INT DEFAULT NULL
+)
+RETURNS TABLE (
+    id BIGINT,
+    distance FLOAT
+)
+LANGUAGE plpgsql VOLATILE
+AS $$
+DECLARE
+    settings vector_index_settings%ROWTYPE;
+BEGIN
+    IF selected IS NULL THEN
+        SELECT * INTO settings FROM vector_index_settings;
+        PERFORM set_config('ivfflat.probes', COALESCE(ivf_probes, settings.probes, 1)::TEXT, true);
+        -- HNSW returns at most ef_search rows, so it never goes below match_count
+        PERFORM set_config(
+            'hnsw.ef_search',
+            LEAST(GREATEST(COALESCE(hnsw_ef_search, settings.ef_search, 40), match_count), 1000)::TEXT,
+            true
+        );
+        RETURN QUERY
+        SELECT dc.id, (dc.embedding <=> query_embedding)::FLOAT
+        FROM document_chunks dc
+        ORDER BY dc.embedding <=> query_embedding
+        LIMIT match_count;
+    ELSE
+        -- The selected documents' chunks come from document_chunks_document_id_idx and are
+        -- scored exactly. Ordering through the ANN index instead would filter the
+        -- index's candidates afterwards and could return fewer than match_count rows.
+        RETURN QUERY
+        WITH candidates AS MATERIALIZED (
+            SELECT dc.id, (dc.embedding <=> query_embedding)::FLOAT AS distance
+            FROM document_chunks dc
+            WHERE dc.document_id = ANY(selected)
+        )
+        SELECT c.id, c.distance
+        FROM candidates c
+        ORDER BY c.distance
+        LIMIT match_count;
+    END IF;
+END;
+$$;
+
 CREATE OR REPLACE FUNCTION match_documents(
     query_embedding vector(1536),
-    match_count INT DEFAULT 5
+    match_count INT DEFAULT 5,
+    filter_document_ids TEXT[] DEFAULT NULL,
+    filter_filenames TEXT[] DEFAULT NULL,
+    uploaded_after TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    uploaded_before TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    include_embeddings BOOLEAN DEFAULT FALSE,
+    ivf_probes INT DEFAULT NULL,
+    hnsw_ef_search INT DEFAULT NULL
 )
 RETURNS TABLE (
     id BIGINT,
@@ -53,22 +220,155 @@ RETURNS TABLE (
     chunk_index INTEGER,
     content TEXT,
     metadata JSONB,
-    similarity FLOAT
+    similarity FLOAT,
+    embedding vector(1536)
 )
-LANGUAGE plpgsql
+LANGUAGE sql VOLATILE
 AS $$
-BEGIN
-    RETURN QUERY
     SELECT
-        document_chunks.id,
-        document_chunks.document_id,
-        document_chunks.chunk_index,
-        document_chunks.content,
-        document_chunks.metadata,
-        1 - (document_chunks.embedding <=> query_embedding) AS similarity
-    FROM document_chunks
-    ORDER BY document_chunks.embedding <=> query_embedding
+        dc.id,
+        dc.document_id,
+        dc.chunk_index,
+        dc.content,
+        dc.metadata,
+        1 - n.distance AS similarity,
+        CASE WHEN include_embeddings THEN dc.embedding END AS embedding
+    FROM nearest_chunks(
+        query_embedding,
+        match_count,
+        selected_document_ids(filter_document_ids, filter_filenames, uploaded_after, uploaded_before),
+        ivf_probes,
+        hnsw_ef_search
+    ) n
+    JOIN document_chunks dc ON dc.id = n.id
+    ORDER BY n.distance;
+$$;
+
+-- 7b. Keyword search: a full-text column maintained by Postgres on every insert/update,
+-- indexed with GIN (chunks deleted with their document drop out of it automatically)
+ALTER TABLE document_chunks
+ADD COLUMN IF NOT EXISTS content_tsv tsvector
+GENERATED ALWAYS AS (to_tsvector('english', content)) STORED;
+
+CREATE INDEX IF NOT EXISTS document_chunks_content_tsv_idx
+ON document_chunks
+USING gin (content_tsv);
+
+-- 7c. Hybrid search: the best candidate_count chunks by vector distance and by keyword
+-- rank, fused with reciprocal rank fusion (each list adds 1 / (rrf_k + rank) per chunk).
+-- Query words are OR-ed, so one matching error code or name is enough to be a candidate.
+-- Takes the same document filters and include_embeddings flag as match_documents.
+DROP FUNCTION IF EXISTS hybrid_match_documents(TEXT, vector, INT, INT, INT);
+DROP FUNCTION IF EXISTS hybrid_match_documents(TEXT, vector, INT, INT, INT, TEXT[], TEXT[], TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE);
+DROP FUNCTION IF EXISTS hybrid_match_documents(TEXT, vector, INT, INT, INT, TEXT[], TEXT[], TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE, BOOLEAN);
+
+CREATE OR REPLACE FUNCTION hybrid_match_documents(
+    query_text TEXT,
+    query_embedding vector(1536),
+    match_count INT DEFAULT 5,
+    candidate_count INT DEFAULT 20,
+    rrf_k INT DEFAULT 60,
+    filter_document_ids TEXT[] DEFAULT NULL,
+    filter_filenames TEXT[] DEFAULT NULL,
+    uploaded_after TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    uploaded_before TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    include_embeddings BOOLEAN DEFAULT FALSE,
+    ivf_probes INT DEFAULT NULL,
+    hnsw_ef_search INT DEFAULT NULL
+)
+RETURNS TABLE (
+    id BIGINT,
+    document_id TEXT,
+    chunk_index INTEGER,
+    content TEXT,
+    metadata JSONB,
+    similarity FLOAT,
+    score FLOAT,
+    embedding vector(1536)
+)
+LANGUAGE sql VOLATILE
+AS $$
+    WITH selection AS MATERIALIZED (
+        SELECT selected_document_ids(filter_document_ids, filter_filenames, uploaded_after, uploaded_before) AS ids
+    ),
+    semantic AS (
+        SELECT n.id, ROW_NUMBER() OVER (ORDER BY n.distance) AS rank
+        FROM selection sel, nearest_chunks(query_embedding, candidate_count, sel.ids, ivf_probes, hnsw_ef_search) n
+    ),
+    keyword_query AS (
+        SELECT replace(plainto_tsquery('english', query_text)::text, '&', '|')::tsquery AS query
+    ),
+    keyword AS (
+        SELECT dc.id, ROW_NUMBER() OVER (ORDER BY ts_rank_cd(dc.content_tsv, kq.query) DESC) AS rank
+        FROM document_chunks dc, keyword_query kq, selection sel
+        WHERE dc.content_tsv @@ kq.query
+          AND (sel.ids IS NULL OR dc.document_id = ANY(sel.ids))
+        ORDER BY ts_rank_cd(dc.content_tsv, kq.query) DESC
+        LIMIT candidate_count
+    ),
+    fused AS (
+        SELECT
+            COALESCE(s.id, k.id) AS id,
+            COALESCE(1.0 / (rrf_k + s.rank), 0.0) + COALESCE(1.0 / (rrf_k + k.rank), 0.0) AS score
+        FROM semantic s
+        FULL OUTER JOIN keyword k ON s.id = k.id
+    )
+    SELECT
+        dc.id,
+        dc.document_id,
+        dc.chunk_index,
+        dc.content,
+        dc.metadata,
+        1 - (dc.embedding <=> query_embedding) AS similarity,
+        f.score::FLOAT AS score,
+        CASE WHEN include_embeddings THEN dc.embedding END AS embedding
+    FROM fused f
+    JOIN document_chunks dc ON dc.id = f.id
+    ORDER BY f.score DESC
     LIMIT match_count;
+$$;
+
+-- 7d. Document and chunks inserted in one round trip and one transaction; ON CONFLICT on
+-- file_hash doubles as the duplicate check (inserted = FALSE returns the stored document)
+CREATE OR REPLACE FUNCTION ingest_document(
+    document JSONB,
+    chunks JSONB DEFAULT '[]'::JSONB
+)
+RETURNS TABLE (
+    document_id TEXT,
+    file_path TEXT,
+    inserted BOOLEAN
+)
+LANGUAGE plpgsql VOLATILE
+AS $$
+DECLARE
+    new_document_id TEXT;
+BEGIN
+    INSERT INTO documents (document_id, filename, file_hash, file_path, chunk_count)
+    VALUES (
+        document->>'document_id',
+        document->>'filename',
+        document->>'file_hash',
+        document->>'file_path',
+        (document->>'chunk_count')::INTEGER
+    )
+    ON CONFLICT (file_hash) DO NOTHING
+    RETURNING documents.document_id INTO new_document_id;
+
+    IF new_document_id IS NULL THEN
+        RETURN QUERY
+        SELECT d.document_id, d.file_path, FALSE
+        FROM documents d
+        WHERE d.file_hash = document->>'file_hash';
+        RETURN;
+    END IF;
+
+    -- Embeddings arrive as JSON arrays, which share pgvector's text form
+    INSERT INTO document_chunks (document_id, chunk_index, content, embedding, metadata)
+    SELECT new_document_id, c.chunk_index, c.content, c.embedding::TEXT::vector, c.metadata
+    FROM jsonb_to_recordset(chunks) AS c(chunk_index INTEGER, content TEXT, embedding JSONB, metadata JSONB);
+
+    RETURN QUERY SELECT new_document_id, document->>'file_path', TRUE;
 END;
 $$;
 
@@ -121,9 +421,24 @@ WITH CHECK (true);
 -- 13. Grant permissions
 GRANT ALL ON documents TO authenticated, service_role;
 GRANT ALL ON document_chunks TO authenticated, service_role;
+GRANT ALL ON vector_index_settings TO authenticated, service_role;
 GRANT ALL ON ALL SEQUENCES IN SCHEMA public TO authenticated, service_role;
 
+-- 14. Record the schema version, so scripts/supabase_db.py migrate only applies
+-- config/migrations files newer than this file
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version TEXT PRIMARY KEY,
+    applied_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+INSERT INTO schema_migrations (version) VALUES
+    ('001_baseline'),
+    ('002_vector_index_tuning'),
+    ('003_ingest_document')
+ON CONFLICT DO NOTHING;
+
 -- Verification queries (optional - run these to check setup)
 -- SELECT COUNT(*) FROM documents;
 -- SELECT COUNT(*) FROM document_chunks;
 -- SELECT * FROM pg_extension WHERE extname = 'vector';
+-- SELECT * FROM vector_index_settings;
@@ -0,0 +1,85 @@
+"""
+Recall@k versus query latency for the FAISS segment index types (flat, IVF, HNSW, IVF-PQ)
+on synthetic clustered vectors, sweeping nprobe / efSearch. Indexes are built with the
+same code the vector store uses (src/backends/ann_index.py); recall is measured against
+exact flat search. Use the results to pick FAISS_INDEX_TYPE, FAISS_IVF_NPROBE and
+FAISS_HNSW_EF_SEARCH for a corpus size. No API server needed.
+
+Run from the project root:
+    python scripts/benchmarks/bench_ann_index.py --vectors 50000 --dimension 1536
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+import harness
+from src.backends import ann_index
+
+
+def measure(index, queries: np.ndarray, truth: np.ndarray, k: int, params) -> tuple:
+    """(recall@k, p50 ms, p95 ms) searching one query at a time, as the API does"""
+    timings, found = [], 0
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        _, ids = index.search(query[None, :], k, params=params)
+        timings.append(time.perf_counter() - started)
+        found += len(set(ids[0].tolist()) & set(expected.tolist()))
+    timings.sort()
+    return found / truth.size, statistics.median(timings) * 1000, timings[int(len(timings) * 0.95)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark recall@k vs latency of FAISS index types")
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--clusters", type=int, default=200, help="topic clusters in the synthetic data")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--types", nargs="+", default=["flat", "ivf", "hnsw", "ivfpq"], choices=ann_index.INDEX_TYPES)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32, 64])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128, 256])
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(1)
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((args.clusters, args.dimension)).astype("float32")
+    vectors, _ = harness.clustered_vectors(rng, centers, args.vectors)
+    queries, _ = harness.clustered_vectors(rng, centers, args.queries)
+    ids = np.arange(args.vectors, dtype="int64")
+
+    exact = faiss.IndexFlatL2(args.dimension)
+    exact.add(vectors)
+    _, truth = exact.search(queries, args.k)
+    print(f"{args.vectors} vectors x {args.dimension} dims, {args.queries} queries, recall@{args.k} vs exact search")
+    print(f"auto policy would choose: {ann_index.choose_index_type(args.vectors)}")
+    print(f"{'type':>6} {'setting':>12} {'recall':>8} {'p50 ms':>8} {'p95 ms':>8} {'build s':>8} {'size MB':>8}")
+
+    for kind in args.types:
+        started = time.perf_counter()
+        index = faiss.IndexIDMap2(ann_index.build_index(kind, args.dimension, vectors))
+        index.add_with_ids(vectors, ids)
+        build_seconds = time.perf_counter() - started
+        size_mb = faiss.serialize_index(index).nbytes / 2 ** 20
+
+        if kind == "hnsw":
+            settings = [(f"efSearch={ef}", ann_index.search_parameters("hnsw", ef_search=ef)) for ef in args.ef_search]
+        elif kind in ("ivf", "ivfpq"):
+            nlist = ann_index.ivf_nlist(args.vectors)
+            settings = [(f"nprobe={n}", ann_index.search_parameters("ivf", nprobe=n)) for n in args.nprobe if n <= nlist]
+        else:
+            settings = [("exact", None)]
+
+        for label, params in settings:
+            recall, p50, p95 = measure(index, queries, truth, args.k, params)
+            print(f"{kind:>6} {label:>12} {recall:>8.3f} {p50:>8.2f} {p95:>8.2f} {build_seconds:>8.1f} {size_mb:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
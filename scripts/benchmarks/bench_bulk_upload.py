@@ -0,0 +1,86 @@
+"""
+Bulk ingestion: one /upload/ per document versus a single /upload/batch of a zip
+archive, which embeds every chunk in large parallel batches and writes the index once.
+
+Run from the project root:
+    python scripts/benchmarks/bench_bulk_upload.py --documents 50 --paragraphs 40
+"""
+import argparse
+import io
+import sys
+import time
+import zipfile
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import harness
+
+
+def documents(count: int, paragraphs: int):
+    return [(f"doc{i}.txt", harness.sample_text(paragraphs, seed=i + 1).encode()) for i in range(count)]
+
+
+def serial_upload(base_url: str, docs) -> float:
+    started = time.perf_counter()
+    for filename, content in docs:
+        harness.upload_and_wait(base_url, filename, content)
+    return time.perf_counter() - started
+
+
+def batch_upload(base_url: str, docs) -> dict:
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        for filename, content in docs:
+            zf.writestr(f"corpus/{filename}", content)
+
+    started = time.perf_counter()
+    response = httpx.post(
+        f"{base_url}/upload/batch",
+        files=[("files", ("corpus.zip", archive.getvalue()))],
+        timeout=120
+    )
+    response.raise_for_status()
+    job = harness.wait_for_job(base_url, response.json())
+    job["wall_seconds"] = time.perf_counter() - started
+    return job
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark serial vs bulk document upload")
+    parser.add_argument("--documents", type=int, default=50)
+    parser.add_argument("--paragraphs", type=int, default=40, help="paragraphs per document")
+    parser.add_argument("--max-parallel", type=int, default=4, help="EMBEDDING_MAX_PARALLEL for the app")
+    parser.add_argument("--embed-latency-ms", type=float, default=100)
+    args = parser.parse_args()
+
+    docs = documents(args.documents, args.paragraphs)
+    stub, openai_url = harness.start_stub(args.embed_latency_ms, 50)
+    env = harness.stub_env(openai_url, EMBEDDING_MAX_PARALLEL=args.max_parallel)
+
+    try:
+        app, base_url = harness.start_app(harness.make_workdir(), env)
+        try:
+            serial_seconds = serial_upload(base_url, docs)
+        finally:
+            harness.stop(app)
+
+        app, base_url = harness.start_app(harness.make_workdir(), env)
+        try:
+            job = batch_upload(base_url, docs)
+        finally:
+            harness.stop(app)
+
+        print(f"serial /upload/:     {serial_seconds:.2f}s, "
+              f"{args.documents / serial_seconds:.1f} docs/s")
+        print(f"bulk /upload/batch:  {job['wall_seconds']:.2f}s, "
+              f"{args.documents / job['wall_seconds']:.1f} docs/s "
+              f"({job['chunk_count']} chunks, {job['chunks_per_second']} chunks/s in the worker)")
+        print(f"speedup: {serial_seconds / job['wall_seconds']:.1f}x")
+    finally:
+        harness.stop(stub)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Chunk embedding cache: embedding inputs sent to the API when a document is uploaded,
+then re-uploaded with a few paragraphs edited, then indexed again from scratch
+(a rebuild with a new vector store sharing the same cache file).
+
+Run from the project root:
+    python scripts/benchmarks/bench_chunk_cache.py --paragraphs 400 --edited 10
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import harness
+
+
+def edit(text: str, count: int) -> str:
+    paragraphs = text.split("\n\n")
+    step = max(1, len(paragraphs) // max(count, 1))
+    for index in range(0, len(paragraphs), step)[:count]:
+        paragraphs[index] = "edited " + paragraphs[index]
+    return "\n\n".join(paragraphs)
+
+
+def measure(stub_url: str, base_url: str, filename: str, content: bytes):
+    before = httpx.get(f"{stub_url}/stats").json()["embedding_inputs"]
+    started = time.perf_counter()
+    job = harness.upload_and_wait(base_url, filename, content)
+    elapsed = time.perf_counter() - started
+    sent = httpx.get(f"{stub_url}/stats").json()["embedding_inputs"] - before
+    return job["chunk_count"], sent, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the chunk embedding cache")
+    parser.add_argument("--paragraphs", type=int, default=400)
+    parser.add_argument("--edited", type=int, default=10, help="paragraphs changed in the re-upload")
+    parser.add_argument("--embed-latency-ms", type=float, default=100)
+    args = parser.parse_args()
+
+    stub, openai_url = harness.start_stub(args.embed_latency_ms, 50)
+    stub_url = openai_url.rsplit("/v1", 1)[0]
+    cache_dir = harness.make_workdir()
+    env = harness.stub_env(openai_url, CHUNK_CACHE_PATH=str(cache_dir / "chunk_embeddings.db"))
+
+    original = harness.sample_text(args.paragraphs, seed=1)
+    edited = edit(original, args.edited)
+
+    try:
+        app, base_url = harness.start_app(harness.make_workdir(), env)
+        try:
+            runs = [
+                ("first upload", measure(stub_url, base_url, "doc.txt", original.encode())),
+                (f"re-upload, {args.edited} paragraphs edited", measure(stub_url, base_url, "doc_v2.txt", edited.encode())),
+            ]
+        finally:
+            harness.stop(app)
+
+        # Fresh vector store, same cache file
+        app, base_url = harness.start_app(harness.make_workdir(), env)
+        try:
+            runs.append(("rebuild into an empty store", measure(stub_url, base_url, "doc.txt", original.encode())))
+            cache = httpx.get(f"{base_url}/stats").json()["chunk_embedding_cache"]
+        finally:
+            harness.stop(app)
+
+        for label, (chunks, sent, elapsed) in runs:
+            print(f"{label:<36} {chunks:>5} chunks, {sent:>5} embedded, {elapsed:.2f}s")
+        print(f"cache after rebuild: {cache['entries']} entries, {cache['size_bytes'] / 1e6:.1f} MB, "
+              f"hit rate {cache['hit_rate']}")
+    finally:
+        harness.stop(stub)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Chunking throughput and the resulting index size per strategy (src/backends/chunking.py),
+against the langchain splitter uploads went through before:
+  - langchain: RecursiveCharacterTextSplitter.split_text (character sizes), and with
+    tiktoken lengths (from_tiktoken_encoder) as the baseline of the token strategy
+  - character / token / markdown: chunking.split_text with each strategy
+The input is a multi-megabyte markdown document (a heading every few paragraphs), the same
+for every strategy. Reports chunks, MB/s, chunks/s, the mean chunk length and an estimate
+of the index it produces (a float32 vector of --dimensions per chunk plus the chunk text),
+and whether the new splitter cut exactly the baseline's chunks. The token strategy needs
+the tiktoken encoding (CHUNK_TOKEN_ENCODING) and is skipped when it can't be loaded.
+With --files, a bulk upload of that many copies is also chunked one file after another and
+in the CHUNKING_PROCESSES pool. No API server needed.
+
+Run from the project root:
+    python scripts/benchmarks/bench_chunking.py --mb 8 --files 8 --processes 2 4
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+import harness
+from src.backends import chunking
+
+
+def markdown_text(size_mb: float) -> str:
+    """Filler markdown of about size_mb: sections of 2 to 6 paragraphs under ## headings"""
+    target = int(size_mb * 1024 * 1024)
+    parts, length, section = [], 0, 0
+    while length < target:
+        part = f"## Section {section}\n\n" + harness.sample_text(2 + section % 5, seed=section) + "\n\n"
+        parts.append(part)
+        length += len(part)
+        section += 1
+    return "".join(parts)
+
+
+def measure(name: str, split, text: str, dimensions: int, baseline=None) -> list:
+    """Time one split of text and print its row; returns the chunks"""
+    started = time.perf_counter()
+    chunks = split(text)
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    text_bytes = sum(len(chunk.encode("utf-8")) for chunk in chunks)
+    index_mb = (len(chunks) * dimensions * 4 + text_bytes) / 1024 / 1024
+    same = "-" if baseline is None else ("yes" if chunks == baseline else "no")
+    print(f"{name:>22} {len(chunks):>9} {elapsed:>8.2f} {len(text) / 1024 / 1024 / elapsed:>7.1f} "
+          f"{len(chunks) / elapsed:>10.0f} {text_bytes / max(len(chunks), 1):>10.0f} {index_mb:>9.1f} {same:>6}")
+    return chunks
+
+
+def bulk(text: str, files: int, processes: list, settings: dict):
+    """Chunk files copies of text as one bulk upload, in a thread and in process pools of each size"""
+    directory = tempfile.mkdtemp(prefix="bench_chunking_")
+    try:
+        paths = []
+        for number in range(files):
+            path = os.path.join(directory, f"doc{number}.md")
+            Path(path).write_text(text, encoding="utf-8")
+            paths.append(path)
+        print(f"\nbulk upload of {files} files ({settings['strategy']} {settings['chunk_size']}/{settings['chunk_overlap']}), "
+              f"{os.cpu_count()} CPUs")
+        print(f"{'CHUNKING_PROCESSES':>18} {'seconds':>8} {'MB/s':>7}")
+        for count in [0] + processes:
+            # What the setting selects in a worker: achunk_many reads it when it starts the pool
+            chunking.CHUNKING_PROCESSES = count
+            if count:
+                # Start the processes before timing: a worker keeps its pool for every bulk upload
+                chunking.get_chunking_pool().submit(int).result()
+            started = time.perf_counter()
+            asyncio.run(chunking.achunk_many(chunking.split_file, paths, settings))
+            elapsed = time.perf_counter() - started
+            print(f"{count:>18} {elapsed:>8.2f} {files * len(text) / 1024 / 1024 / elapsed:>7.1f}")
+            chunking.shutdown_chunking_pool()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chunking strategies against the langchain splitter")
+    parser.add_argument("--mb", type=float, default=8, help="size of the input document")
+    parser.add_argument("--chunk-size", type=int, default=200, help="characters, for the character and markdown strategies")
+    parser.add_argument("--chunk-overlap", type=int, default=20)
+    parser.add_argument("--token-chunk-size", type=int, default=50, help="tokens, for the token strategy (about 4 characters each)")
+    parser.add_argument("--token-chunk-overlap", type=int, default=5)
+    parser.add_argument("--dimensions", type=int, default=1536, help="embedding size for the index estimate")
+    parser.add_argument("--files", type=int, default=0, help="also chunk a bulk upload of this many copies")
+    parser.add_argument("--processes", type=int, nargs="+", default=[2], help="CHUNKING_PROCESSES values for --files")
+    args = parser.parse_args()
+
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    text = markdown_text(args.mb)
+    character = chunking.chunking_settings("character", args.chunk_size, args.chunk_overlap)
+    markdown = chunking.chunking_settings("markdown", args.chunk_size, args.chunk_overlap)
+    token = chunking.chunking_settings("token", args.token_chunk_size, args.token_chunk_overlap)
+
+    def split_with(settings):
+        return lambda text: [chunk for chunk, _ in chunking.split_text(text, settings)]
+
+    print(f"{len(text) / 1024 / 1024:.1f} MB of markdown, {args.dimensions}-dimensional vectors in the index estimate")
+    print(f"{'strategy':>22} {'chunks':>9} {'seconds':>8} {'MB/s':>7} {'chunks/s':>10} {'bytes/chunk':>10} {'index MB':>9} {'same':>6}")
+    baseline = measure(
+        f"langchain {args.chunk_size}/{args.chunk_overlap}",
+        RecursiveCharacterTextSplitter(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap).split_text,
+        text, args.dimensions
+    )
+    measure(f"character {args.chunk_size}/{args.chunk_overlap}", split_with(character), text, args.dimensions, baseline)
+    measure(f"markdown {args.chunk_size}/{args.chunk_overlap}", split_with(markdown), text, args.dimensions)
+
+    try:
+        chunking.token_lengths()
+    except Exception as e:
+        print(f"{'token':>22} skipped: encoding {chunking.CHUNK_TOKEN_ENCODING} unavailable ({type(e).__name__})")
+    else:
+        token_baseline = measure(
+            f"langchain tok {args.token_chunk_size}/{args.token_chunk_overlap}",
+            RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+                encoding_name=chunking.CHUNK_TOKEN_ENCODING,
+                chunk_size=args.token_chunk_size,
+                chunk_overlap=args.token_chunk_overlap
+            ).split_text,
+            text, args.dimensions
+        )
+        measure(f"token {args.token_chunk_size}/{args.token_chunk_overlap}", split_with(token), text, args.dimensions, token_baseline)
+
+    if args.files:
+        bulk(text, args.files, args.processes, character)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Bytes per chunk, search latency and recall@k of compressed FAISS segments (float16, int8
+scalar quantization, PQ) against the current float32 flat index, with and without exact
+re-ranking from the full vectors. Segments are built, saved and memory-mapped back with
+the vector store's own code (Segment in src/backends/faiss_index.py), so the numbers
+include the re-ranking reads from the mapped .npy file. No API server needed.
+
+Run from the project root:
+    python scripts/benchmarks/bench_compression.py --vectors 50000 --dimension 1536
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+import harness
+from src.backends import ann_index
+from src.backends.faiss_index import Segment
+
+
+def measure(segment: Segment, queries: np.ndarray, truth: np.ndarray, k: int, rerank_factor: int) -> tuple:
+    """(recall@k, p50 ms, p95 ms) searching one query at a time, as the API does"""
+    params = ann_index.search_parameters(segment.family)
+    timings, found = [], 0
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        results = segment.search(query[None, :], k, params, rerank_factor)
+        timings.append(time.perf_counter() - started)
+        found += len({chunk_id for _, chunk_id in results} & set(expected.tolist()))
+    timings.sort()
+    return found / truth.size, statistics.median(timings) * 1000, timings[int(len(timings) * 0.95)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark compressed FAISS segments against float32 flat")
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--clusters", type=int, default=200, help="topic clusters in the synthetic data")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--kind", default="flat", choices=("flat", "hnsw"), help="index structure the codes are stored in")
+    parser.add_argument("--compressions", nargs="+", default=list(ann_index.COMPRESSIONS), choices=ann_index.COMPRESSIONS)
+    parser.add_argument("--rerank-factors", type=int, nargs="+", default=[0, 2, 4, 8])
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(1)
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((args.clusters, args.dimension)).astype("float32")
+    vectors, _ = harness.clustered_vectors(rng, centers, args.vectors)
+    queries, _ = harness.clustered_vectors(rng, centers, args.queries)
+    ids = np.arange(args.vectors, dtype="int64")
+
+    exact = faiss.IndexFlatL2(args.dimension)
+    exact.add(vectors)
+    _, truth = exact.search(queries, args.k)
+    print(f"{args.vectors} vectors x {args.dimension} dims, {args.queries} queries, recall@{args.k} vs exact search")
+    print(f"{'storage':>12} {'rerank':>7} {'index B/chunk':>14} {'full B/chunk':>13} {'recall':>8} {'p50 ms':>8} {'p95 ms':>8} {'build s':>8}")
+
+    directory = tempfile.mkdtemp(prefix="bench_compression_")
+    try:
+        for compression in args.compressions:
+            started = time.perf_counter()
+            built = Segment.build(compression, args.dimension, ids, vectors, {}, args.kind, compression)
+            built.save(directory)
+            build_seconds = time.perf_counter() - started
+            segment = Segment.load(directory, compression)
+            index_bytes = os.path.getsize(os.path.join(directory, Segment.files(compression)[0])) / args.vectors
+            raw_path = os.path.join(directory, Segment.raw_vectors_file(compression))
+            raw_bytes = os.path.getsize(raw_path) / args.vectors if os.path.exists(raw_path) else 0
+
+            # The float32 index is exact already, so re-ranking only applies to compressed codes
+            factors = args.rerank_factors if segment.raw_vectors is not None else [0]
+            for factor in factors:
+                recall, p50, p95 = measure(segment, queries, truth, args.k, factor)
+                label = f"{segment.kind}/{segment.compression}"
+                print(f"{label:>12} {factor or 'off':>7} {index_bytes:>14.0f} {raw_bytes:>13.0f} {recall:>8.3f} "
+                      f"{p50:>8.2f} {p95:>8.2f} {build_seconds:>8.1f}")
+            segment.delete_files(directory)
+            del built, segment
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
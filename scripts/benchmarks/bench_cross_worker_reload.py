@@ -0,0 +1,76 @@
+"""
+Cross-worker index consistency: after an upload is committed by one API worker, how
+long until every worker serves the new generation, and how long each reload takes.
+Runs several uvicorn workers sharing one vector store directory.
+
+Run from the project root:
+    python scripts/benchmarks/bench_cross_worker_reload.py --workers 4 --rounds 10
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import harness
+
+
+def worker_stats(base_url: str) -> dict:
+    # A fresh connection each time, so the kernel spreads requests over the workers
+    return httpx.get(f"{base_url}/stats", timeout=10, headers={"Connection": "close"}).json()
+
+
+def wait_for_all_workers(base_url: str, workers: int, documents: int, timeout: float = 30.0) -> float:
+    """Poll /stats until every worker reports at least `documents` documents"""
+    started = time.perf_counter()
+    seen = {}
+    while time.perf_counter() - started < timeout:
+        stats = worker_stats(base_url)
+        seen[stats["worker_pid"]] = stats["vector_store"]
+        current = [s for s in seen.values() if s["documents"] >= documents]
+        if len(seen) >= workers and len(current) == len(seen):
+            return time.perf_counter() - started
+    raise TimeoutError(f"Not every worker saw {documents} documents within {timeout}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cross-worker index reloads")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--paragraphs", type=int, default=100, help="paragraphs per uploaded document")
+    args = parser.parse_args()
+
+    stub, openai_url = harness.start_stub(5, 50)
+    env = harness.stub_env(openai_url)
+    app, base_url = harness.start_app(harness.make_workdir(), env, workers=args.workers)
+
+    try:
+        harness.upload_and_wait(base_url, "seed.txt", harness.sample_text(args.paragraphs).encode())
+        wait_for_all_workers(base_url, args.workers, 1)
+
+        convergence = []
+        for round_number in range(1, args.rounds + 1):
+            content = harness.sample_text(args.paragraphs, seed=round_number).encode()
+            harness.upload_and_wait(base_url, f"doc{round_number}.txt", content)
+            convergence.append(wait_for_all_workers(base_url, args.workers, round_number + 1))
+
+        workers = {}
+        while len(workers) < args.workers:
+            stats = worker_stats(base_url)
+            workers[stats["worker_pid"]] = stats["vector_store"]
+
+        print(f"{args.workers} workers, {args.rounds} uploads")
+        print(f"all workers on the new generation after: p50 {statistics.median(convergence) * 1000:.0f}ms, "
+              f"max {max(convergence) * 1000:.0f}ms (includes /stats polling)")
+        for pid, stats in sorted(workers.items()):
+            print(f"  worker {pid}: generation {stats['generation']}, {stats['reloads']} reloads, "
+                  f"reload {stats['reload_ms']}, staleness {stats['reload_staleness_ms']}")
+    finally:
+        harness.stop(app, stub)
+
+
+if __name__ == "__main__":
+    main()
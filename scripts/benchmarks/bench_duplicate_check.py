@@ -0,0 +1,107 @@
+"""
+Per-upload bookkeeping as the number of stored documents grows: the duplicate check and
+metadata write with the SQLite document catalog versus the old JSON metadata (linear hash
+scan plus a full rewrite of vector_store_metadata.json), and single-pass hashing of the
+upload stream versus copying the file and then hashing it twice.
+
+Run from the project root:
+    python scripts/benchmarks/bench_duplicate_check.py --sizes 10 1000 10000 100000
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+# Importing the endpoints creates data/ in the working directory; keep it out of the way
+os.chdir(tempfile.mkdtemp())
+from src.api.endpoints import _save_upload
+from src.backends.document_catalog import DocumentCatalog
+
+
+def entry(number: int) -> dict:
+    file_hash = hashlib.sha256(str(number).encode()).hexdigest()
+    return {
+        "document_id": f"doc_{file_hash[:16]}",
+        "original_filename": f"doc{number}.txt",
+        "file_hash": file_hash,
+        "file_path": f"data/doc{number}.txt",
+        "chunk_count": 40,
+        "added_at": str(time.time())
+    }
+
+
+def json_upload(metadata: dict, path: str, new: dict) -> float:
+    started = time.perf_counter()
+    exists = any(info["file_hash"] == new["file_hash"] for info in metadata.values())
+    assert not exists
+    metadata[new["document_id"]] = new
+    with open(path, "w") as f:
+        json.dump(metadata, f, indent=2)
+    return time.perf_counter() - started
+
+
+def catalog_upload(catalog: DocumentCatalog, new: dict) -> float:
+    started = time.perf_counter()
+    assert catalog.find_by_hash(new["file_hash"]) is None
+    catalog.add_many([new])
+    return time.perf_counter() - started
+
+
+def hashing(size_mb: int, workdir: str):
+    payload = os.urandom(size_mb * 1024 * 1024)
+    path = os.path.join(workdir, "upload.txt")
+
+    started = time.perf_counter()
+    with open(path, "wb") as f:
+        shutil.copyfileobj(io.BytesIO(payload), f)
+    for _ in range(2):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(4096), b""):
+                digest.update(block)
+    before = time.perf_counter() - started
+
+    started = time.perf_counter()
+    _save_upload(io.BytesIO(payload), path)
+    after = time.perf_counter() - started
+    return before, after
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark duplicate detection and upload hashing")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000, 100000])
+    parser.add_argument("--uploads", type=int, default=20, help="timed uploads per size")
+    parser.add_argument("--upload-mb", type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    print(f"{'documents':>10} {'JSON metadata':>14} {'catalog':>9}")
+    for size in args.sizes:
+        metadata = {}
+        catalog = DocumentCatalog(os.path.join(workdir, f"catalog_{size}.db"))
+        existing = [entry(number) for number in range(size)]
+        metadata.update({e["document_id"]: e for e in existing})
+        catalog.add_many(existing)
+
+        json_path = os.path.join(workdir, f"metadata_{size}.json")
+        new = [entry(size + number) for number in range(args.uploads)]
+        json_times = [json_upload(metadata, json_path, e) for e in new]
+        catalog_times = [catalog_upload(catalog, e) for e in new]
+        print(f"{size:>10} {sum(json_times) / len(json_times) * 1000:>12.2f}ms "
+              f"{sum(catalog_times) / len(catalog_times) * 1000:>7.2f}ms")
+
+    before, after = hashing(args.upload_mb, workdir)
+    print(f"{args.upload_mb} MB upload: copy then hash twice {before * 1000:.0f}ms, "
+          f"hash while writing {after * 1000:.0f}ms")
+    shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Query embedding micro-batching: outbound embedding calls and latency at high concurrency,
+with the batcher disabled (EMBEDDING_BATCH_WAIT_MS=0) and enabled.
+
+Run from the project root:
+    python scripts/benchmarks/bench_embedding_batching.py --clients 32 --wait-ms 0 2 5
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import harness
+
+
+async def run_clients(base_url: str, clients: int, requests_per_client: int):
+    latencies = []
+
+    async def client(client_id: int, http: httpx.AsyncClient):
+        for i in range(requests_per_client):
+            started = time.perf_counter()
+            response = await http.get(f"{base_url}/query/", params={"query": f"question {client_id}-{i}"})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(timeout=300, limits=limits) as http:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(c, http) for c in range(clients)))
+        return time.perf_counter() - started, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark query embedding micro-batching")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=4, help="requests per client")
+    parser.add_argument("--wait-ms", type=float, nargs="+", default=[0, 2, 5])
+    parser.add_argument("--embed-latency-ms", type=float, default=100)
+    parser.add_argument("--llm-latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    stub, openai_url = harness.start_stub(args.embed_latency_ms, args.llm_latency_ms)
+    stub_stats_url = openai_url.replace("/v1", "/stats")
+
+    print(f"{args.clients} clients x {args.requests} unique queries, embed={args.embed_latency_ms}ms")
+    print(f"{'wait ms':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'embed calls':>12} {'avg batch':>10}")
+    try:
+        for wait_ms in args.wait_ms:
+            workdir = harness.make_workdir()
+            env = harness.stub_env(
+                openai_url,
+                EMBEDDING_BATCH_WAIT_MS=wait_ms,
+                QUERY_CACHE_SIZE=0,
+                RAG_MAX_CONCURRENT_QUERIES=args.clients
+            )
+            app, base_url = harness.start_app(workdir, env)
+            try:
+                harness.upload_and_wait(base_url, "seed.txt", harness.sample_text().encode())
+
+                calls_before = httpx.get(stub_stats_url).json()["embedding_requests"]
+                elapsed, latencies = asyncio.run(run_clients(base_url, args.clients, args.requests))
+                calls = httpx.get(stub_stats_url).json()["embedding_requests"] - calls_before
+                batcher = httpx.get(f"{base_url}/stats").json()["query_embedding_batcher"]
+
+                print(f"{wait_ms:>8.1f} {len(latencies) / elapsed:>8.1f} "
+                      f"{harness.percentile(latencies, 50) * 1000:>8.0f} "
+                      f"{harness.percentile(latencies, 95) * 1000:>8.0f} "
+                      f"{calls:>12} {batcher['avg_batch_size'] if batcher else 1.0:>10}")
+            finally:
+                harness.stop(app)
+    finally:
+        harness.stop(stub)
+
+
+if __name__ == "__main__":
+    main()
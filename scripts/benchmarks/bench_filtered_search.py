@@ -0,0 +1,107 @@
+"""
+Latency and recall@k of document-filtered searches on the local store. The filter is pushed
+into FAISS as an id selector over the selected documents' id ranges (ChunkIndex.search
+with document_ids), compared with the over-fetch alternative: an unfiltered search for
+more results with the non-matching ones thrown away. Recall is measured against the exact
+top-k within the selected documents. Run once per base index type.
+
+Run from the project root:
+    python scripts/benchmarks/bench_filtered_search.py --chunks 20000 --index-type flat
+    python scripts/benchmarks/bench_filtered_search.py --chunks 20000 --index-type hnsw
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+import harness
+
+
+def build_store(directory: str, chunks: int, dimension: int, clusters: int, per_document: int):
+    """Documents of per_document chunks, each drawn from a few topic clusters"""
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((clusters, dimension)).astype("float32")
+    vectors, _ = harness.clustered_vectors(rng, centers, chunks)
+    index = harness.build_index(directory, vectors, per_document=per_document, documents_per_commit=10)
+    return index, vectors, centers
+
+
+def measure(search, questions, k: int) -> tuple:
+    """(recall@k against the exact filtered top-k, p50 ms, p95 ms)"""
+    timings, found = [], 0
+    for embedding, selection, expected in questions:
+        started = time.perf_counter()
+        results = search(embedding, selection)
+        timings.append(time.perf_counter() - started)
+        found += len({document.metadata["chunk"] for document, _ in results} & expected)
+    return found / (k * len(questions)), statistics.median(timings) * 1000, harness.percentile(timings, 95) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark filtered FAISS search: id selector vs over-fetching")
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--per-document", type=int, default=100, help="chunks per document")
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=2)
+    parser.add_argument("--documents", type=int, nargs="+", default=[1, 10, 100], help="documents selected by the filter")
+    parser.add_argument("--overfetch", type=int, default=50, help="results fetched per wanted one by the over-fetch search")
+    parser.add_argument("--index-type", default="flat", choices=("flat", "ivf", "hnsw"))
+    args = parser.parse_args()
+
+    # Read by src.backends.ann_index at import: make the merged base segment this type
+    os.environ["FAISS_INDEX_TYPE"] = args.index_type
+    os.environ["FAISS_ANN_MIN_VECTORS"] = "1"
+    import faiss
+    faiss.omp_set_num_threads(1)
+
+    directory = tempfile.mkdtemp(prefix="bench_filtered_")
+    try:
+        started = time.perf_counter()
+        index, vectors, centers = build_store(directory, args.chunks, args.dimension, args.clusters, args.per_document)
+        documents = args.chunks // args.per_document
+        print(f"{args.chunks} chunks in {documents} documents, base segment {index.segments[0].kind}, "
+              f"built in {time.perf_counter() - started:.1f}s; recall@{args.k} vs exact filtered search")
+        print(f"{'documents':>10} {'selected':>9} {'mode':>14} {'recall':>8} {'p50 ms':>8} {'p95 ms':>8}")
+
+        rng = np.random.default_rng(1)
+        for count in args.documents:
+            questions = []
+            for _ in range(args.queries):
+                chosen = sorted(rng.choice(documents, count, replace=False).tolist())
+                rows = np.concatenate([np.arange(n * args.per_document, (n + 1) * args.per_document) for n in chosen])
+                embedding = centers[rng.integers(0, args.clusters)] + rng.standard_normal(args.dimension).astype("float32") * 0.6
+                distances = ((vectors[rows] - embedding) ** 2).sum(axis=1)
+                expected = set(rows[np.argsort(distances)[:args.k]].tolist())
+                questions.append((embedding.tolist(), [f"doc_{n}" for n in chosen], expected))
+
+            def selector_search(embedding, selection):
+                return index.search(embedding, args.k, selection)
+
+            def overfetch_search(embedding, selection):
+                wanted = set(selection)
+                results = index.search(embedding, args.k * args.overfetch)
+                return [result for result in results if result[0].metadata["document_id"] in wanted][:args.k]
+
+            for label, search in (("id selector", selector_search), (f"overfetch x{args.overfetch}", overfetch_search)):
+                recall, p50, p95 = measure(search, questions, args.k)
+                print(f"{count:>10} {count / documents:>9.1%} {label:>14} {recall:>8.3f} {p50:>8.2f} {p95:>8.2f}")
+
+        unfiltered = [(question[0], None, set()) for question in questions]
+        _, p50, p95 = measure(lambda embedding, _: index.search(embedding, args.k), unfiltered, args.k)
+        print(f"{'all':>10} {1:>9.1%} {'unfiltered':>14} {'':>8} {p50:>8.2f} {p95:>8.2f}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Hybrid (BM25 + vector, reciprocal rank fusion) vs vector-only retrieval on the local store:
+search latency and hit@k for two kinds of questions over a synthetic corpus.
+  - keyword: "what does error ERR-123456 mean?" whose embedding only lands in the right
+    topic, so vector search rarely ranks the one chunk with that code first
+  - semantic: an embedding close to the target chunk, worded with common filler words
+    only, checking that fusion does not lose what vector search already finds
+Uses ChunkIndex directly (src/backends/faiss_index.py). No API server needed.
+
+Run from the project root:
+    python scripts/benchmarks/bench_hybrid_search.py --chunks 20000 --k 2
+"""
+import argparse
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+import harness
+
+CODE_EVERY = 20
+
+
+def build_store(directory: str, chunks: int, dimension: int, clusters: int, per_document: int = 100):
+    """Filler chunks around topic centres; every CODE_EVERY-th one mentions a unique error code"""
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((clusters, dimension)).astype("float32")
+    vectors, assignment = harness.clustered_vectors(rng, centers, chunks)
+
+    texts = []
+    for number in range(chunks):
+        text = harness.sample_text(1, seed=number)[:200]
+        if number % CODE_EVERY == 0:
+            text = f"{text[:120]} error ERR-{100000 + number} raised by the worker {text[120:]}"
+        texts.append(text)
+
+    index = harness.build_index(directory, vectors, texts, per_document=per_document)
+    return index, vectors, centers, assignment
+
+
+def run(search, questions, k: int) -> tuple:
+    """(hit@k, p50 ms, p95 ms)"""
+    timings, hits = [], 0
+    for text, embedding, target in questions:
+        started = time.perf_counter()
+        documents = search(text, embedding, k)
+        timings.append(time.perf_counter() - started)
+        hits += any(document.metadata["chunk"] == target for document, _ in documents)
+    return hits / len(questions), statistics.median(timings) * 1000, harness.percentile(timings, 95) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hybrid BM25 + vector search against vector search")
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=2)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[10, 20, 50], help="per-ranking candidates to fuse")
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(1)
+    directory = tempfile.mkdtemp(prefix="bench_hybrid_")
+    try:
+        started = time.perf_counter()
+        index, vectors, centers, assignment = build_store(directory, args.chunks, args.dimension, args.clusters)
+        print(f"{args.chunks} chunks x {args.dimension} dims indexed in {time.perf_counter() - started:.1f}s, "
+              f"{args.queries} questions of each kind, hit@{args.k}")
+
+        rng = np.random.default_rng(1)
+        coded = np.arange(0, args.chunks, CODE_EVERY)
+        keyword_questions = []
+        for target in rng.choice(coded, args.queries, replace=False):
+            # Right topic, but nothing in the embedding singles out this chunk
+            embedding = centers[assignment[target]] + rng.standard_normal(args.dimension).astype("float32") * 0.6
+            keyword_questions.append((f"what does error ERR-{100000 + target} mean?", embedding.tolist(), int(target)))
+        semantic_questions = []
+        for target in rng.choice(args.chunks, args.queries, replace=False):
+            embedding = vectors[target] + rng.standard_normal(args.dimension).astype("float32") * 0.01
+            semantic_questions.append((harness.sample_text(1, seed=10 ** 6 + int(target))[:80], embedding.tolist(), int(target)))
+
+        def vector_search(text, embedding, k):
+            return index.search(embedding, k)
+
+        modes = [("vector", vector_search)]
+        for candidates in args.candidates:
+            def hybrid_search(text, embedding, k, candidates=candidates):
+                return index.hybrid_search(text, embedding, k, candidates=candidates)
+            modes.append((f"hybrid/{candidates}", hybrid_search))
+
+        print(f"{'mode':>10} {'keyword hit':>12} {'semantic hit':>13} {'p50 ms':>8} {'p95 ms':>8}")
+        for label, search in modes:
+            keyword_hit, keyword_p50, keyword_p95 = run(search, keyword_questions, args.k)
+            semantic_hit, semantic_p50, semantic_p95 = run(search, semantic_questions, args.k)
+            print(f"{label:>10} {keyword_hit:>12.3f} {semantic_hit:>13.3f} "
+                  f"{(keyword_p50 + semantic_p50) / 2:>8.2f} {max(keyword_p95, semantic_p95):>8.2f}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Peak memory of ingesting one large text file, whole-file vs streaming, as the file grows.
+Each run ingests a fresh file in its own process against the OpenAI stand-in and reports
+how far the process's private memory peaked above its size before the upload (sampled
+every 10 ms), the file-backed pages it added (memory-mapped FAISS segments, shared and
+reclaimable), time and chunks:
+  - whole file: the file is read and split as one string and every chunk is embedded
+    before anything is written (INGEST_STREAM_MIN_MB above the file size)
+  - streaming: blocks of INGEST_STREAM_BLOCK_KB are chunked incrementally and embedded
+    and written INGEST_STREAM_BATCH_CHUNKS at a time (INGEST_STREAM_MIN_MB=0)
+With --backend supabase the store talks to the Supabase stand-in (stub_supabase.py),
+whose memory is not counted.
+
+Run from the project root:
+    python scripts/benchmarks/bench_ingest_memory.py --sizes-mb 4 16 32 --dimensions 256
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+import harness
+
+
+def write_file(path: Path, size_mb: float):
+    """Filler text of about size_mb, a different paragraph mix per megabyte"""
+    target = int(size_mb * 1024 * 1024)
+    with open(path, "w") as f:
+        seed = 0
+        while f.tell() < target:
+            f.write(harness.sample_text(200, seed=seed) + "\n\n")
+            seed += 1
+
+
+def memory_mb() -> dict:
+    """Resident memory of this process in MB: private (anonymous) and file-backed pages"""
+    values = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("RssAnon", "RssFile"):
+                values[key] = int(rest.split()[0]) / 1024
+    return values
+
+
+class PeakSampler:
+    """Highest private resident memory seen while running, sampled every 10 ms"""
+
+    def __init__(self):
+        self.peak = memory_mb()["RssAnon"]
+        self._running = True
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def _sample(self):
+        while self._running:
+            self.peak = max(self.peak, memory_mb()["RssAnon"])
+            time.sleep(0.01)
+
+    def stop(self) -> float:
+        self._running = False
+        self._thread.join()
+        return max(self.peak, memory_mb()["RssAnon"])
+
+
+def child(backend: str, path: str):
+    """One ingestion in this process; prints its measurements as JSON"""
+    if backend == "supabase":
+        import asyncio
+        from src.backends.supabase_manager import SupabaseVectorStore
+
+        async def ingest():
+            store = SupabaseVectorStore()
+            await store._ensure_bucket_exists()
+            before = memory_mb()
+            sampler = PeakSampler()
+            started = time.perf_counter()
+            result = await store.add_file(path, Path(path).name)
+            elapsed = time.perf_counter() - started
+            peak = sampler.stop()
+            await store.aclose()
+            return before, peak, elapsed, result
+
+        before, peak, elapsed, result = asyncio.run(ingest())
+    else:
+        from src.backends.faiss_manager import VectorStoreManager
+
+        directory = tempfile.mkdtemp(prefix="ingest-memory-")
+        manager = VectorStoreManager(os.path.join(directory, "vector_store"), os.path.join(directory, "metadata.json"))
+        before = memory_mb()
+        sampler = PeakSampler()
+        started = time.perf_counter()
+        result = manager.add_document(path, Path(path).name)
+        elapsed = time.perf_counter() - started
+        peak = sampler.stop()
+    assert result["status"] == "success", result["message"]
+    print(json.dumps({
+        "before": before["RssAnon"],
+        "peak": peak,
+        # Memory-mapped segments and other file pages: shared and reclaimable
+        "mapped": memory_mb()["RssFile"] - before["RssFile"],
+        "seconds": elapsed,
+        "chunks": result["chunk_count"]
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark peak memory of whole-file vs streaming ingestion")
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[4, 16, 32])
+    parser.add_argument("--backend", choices=["faiss", "supabase"], default="faiss")
+    parser.add_argument("--dimensions", type=int, default=256, help="embedding size returned by the stand-in")
+    parser.add_argument("--block-kb", type=int, default=1024, help="INGEST_STREAM_BLOCK_KB")
+    parser.add_argument("--batch-chunks", type=int, default=512, help="INGEST_STREAM_BATCH_CHUNKS")
+    parser.add_argument("--child", nargs=2, metavar=("BACKEND", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    openai_stub, openai_url = harness.start_stub(0, 0, dimensions=args.dimensions)
+    stubs = [openai_stub]
+    extra = {
+        # Every chunk pays for its embedding, and the cache file stays out of the project
+        "CHUNK_CACHE_MAX_MB": "0",
+        "INGEST_STREAM_BLOCK_KB": args.block_kb,
+        "INGEST_STREAM_BATCH_CHUNKS": args.batch_chunks,
+        # A streamed document spans several segments; the background merge that later folds
+        # them (or any deltas) into one holds all their vectors, and is not ingestion memory
+        "FAISS_MAX_DELTA_SEGMENTS": 1000000,
+    }
+    if args.backend == "supabase":
+        supabase_stub, supabase_url = harness.start_supabase_stub(0, documents=0)
+        stubs.append(supabase_stub)
+        extra.update({"USE_SUPABASE": "true", "SUPABASE_URL": supabase_url, "SUPABASE_KEY": "stub"})
+
+    print(f"{args.backend} backend, {args.dimensions}-dimensional embeddings, "
+          f"{args.block_kb} kB blocks, {args.batch_chunks} chunks per batch")
+    print(f"{'file MB':>8} {'mode':>11} {'chunks':>8} {'seconds':>8} {'base MB':>8} {'peak MB':>8} {'growth MB':>10} {'mapped MB':>10}")
+    workdir = Path(tempfile.mkdtemp(prefix="ingest-memory-"))
+    try:
+        for size_mb in args.sizes_mb:
+            for mode, threshold in (("whole file", size_mb * 4 + 1), ("streaming", 0)):
+                # A new file per run, so neither run sees the other's document as a duplicate
+                path = workdir / f"upload_{size_mb:g}mb_{mode.replace(' ', '_')}.txt"
+                write_file(path, size_mb)
+                with open(path, "a") as f:
+                    f.write(mode)
+                env = harness.stub_env(openai_url, **extra, INGEST_STREAM_MIN_MB=threshold)
+                output = subprocess.run(
+                    [sys.executable, __file__, "--child", args.backend, str(path)],
+                    env=env, capture_output=True, text=True, check=True
+                ).stdout
+                run = json.loads(output.strip().splitlines()[-1])
+                print(f"{size_mb:>8g} {mode:>11} {run['chunks']:>8} {run['seconds']:>8.1f} "
+                      f"{run['before']:>8.0f} {run['peak']:>8.0f} {run['peak'] - run['before']:>10.0f} {run['mapped']:>10.0f}")
+                path.unlink()
+    finally:
+        harness.stop(*stubs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Background ingestion: /upload/ response time, query latency while documents are
+being embedded, backpressure when the queue is full, and ingestion throughput.
+
+Run from the project root:
+    python scripts/benchmarks/bench_ingestion_queue.py --documents 10 --paragraphs 400
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import harness
+
+
+def query_latencies(base_url: str, count: int, prefix: str):
+    latencies = []
+    for i in range(count):
+        started = time.perf_counter()
+        httpx.get(f"{base_url}/query/", params={"query": f"{prefix} {i}"}, timeout=120).raise_for_status()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark background ingestion")
+    parser.add_argument("--documents", type=int, default=10)
+    parser.add_argument("--paragraphs", type=int, default=400, help="paragraphs per document")
+    parser.add_argument("--queue-size", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--embed-latency-ms", type=float, default=40)
+    parser.add_argument("--llm-latency-ms", type=float, default=100)
+    args = parser.parse_args()
+
+    stub, openai_url = harness.start_stub(args.embed_latency_ms, args.llm_latency_ms)
+    workdir = harness.make_workdir()
+    env = harness.stub_env(openai_url, INGESTION_QUEUE_SIZE=args.queue_size, INGESTION_WORKERS=args.workers)
+    app, base_url = harness.start_app(workdir, env)
+
+    try:
+        harness.upload_and_wait(base_url, "seed.txt", harness.sample_text().encode())
+        idle = query_latencies(base_url, 10, "idle")
+
+        # Submit everything at once; the queue accepts queue_size + workers jobs, the rest get 503
+        upload_times, job_ids, rejected = [], [], 0
+        for i in range(args.documents):
+            content = harness.sample_text(args.paragraphs, seed=i + 1).encode()
+            started = time.perf_counter()
+            response = httpx.post(f"{base_url}/upload/", files={"file": (f"doc{i}.txt", content)}, timeout=120)
+            upload_times.append(time.perf_counter() - started)
+            if response.status_code == 503:
+                rejected += 1
+            else:
+                response.raise_for_status()
+                job_ids.append(response.json()["job_id"])
+
+        busy = query_latencies(base_url, 10, "busy")
+
+        jobs = []
+        for job_id in job_ids:
+            while True:
+                job = httpx.get(f"{base_url}/jobs/{job_id}", timeout=10).json()
+                if job["status"] not in ("queued", "running"):
+                    jobs.append(job)
+                    break
+                time.sleep(0.2)
+
+        stats = httpx.get(f"{base_url}/stats").json()["ingestion"]
+
+        print(f"/upload/ response time: p50 {harness.percentile(upload_times, 50) * 1000:.0f}ms, "
+              f"max {max(upload_times) * 1000:.0f}ms for {args.documents} uploads ({rejected} rejected with 503)")
+        print(f"/query/ p50 while idle: {harness.percentile(idle, 50) * 1000:.0f}ms, "
+              f"while ingesting: {harness.percentile(busy, 50) * 1000:.0f}ms")
+        for job in jobs:
+            print(f"  {job['filename']}: {job['status']}, {job.get('chunk_count')} chunks, "
+                  f"{job.get('chunks_per_second')} chunks/s")
+        for backend, totals in stats["throughput"].items():
+            print(f"{backend}: {totals['documents']} documents, {totals['chunks']} chunks, "
+                  f"{totals['documents_per_second']} docs/s, {totals['chunks_per_second']} chunks/s")
+    finally:
+        harness.stop(app, stub)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Latency of maximal-marginal-relevance re-ranking (src/backends/diversity.py) for candidate
+sets of 20 to 500 chunks, against a per-pair Python loop doing the same picks, plus the
+end-to-end cost on the local store: ChunkIndex.search with and without MMR, and how many
+near-duplicate chunks end up in the top k. The corpus repeats each passage a few times with
+a little noise, like overlapping chunks and documents that restate themselves.
+
+Run from the project root:
+    python scripts/benchmarks/bench_mmr.py --chunks 20000 --k 2
+"""
+import argparse
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+import harness
+from src.backends.diversity import maximal_marginal_relevance
+
+COPIES = 4
+
+
+def loop_mmr(query, candidates, k: int, lambda_mult: float):
+    """Reference MMR: cosine similarities computed pair by pair in Python"""
+    def cosine(a, b):
+        return sum(x * y for x, y in zip(a, b)) / ((sum(x * x for x in a) ** 0.5) * (sum(y * y for y in b) ** 0.5))
+
+    candidates = candidates.tolist()
+    query = list(query)
+    relevance = [cosine(vector, query) for vector in candidates]
+    picked = []
+    while len(picked) < min(k, len(candidates)):
+        best, best_score = None, None
+        for position, vector in enumerate(candidates):
+            if position in picked:
+                continue
+            redundancy = max((cosine(vector, candidates[other]) for other in picked), default=0.0)
+            score = relevance[position] if not picked else lambda_mult * relevance[position] - (1 - lambda_mult) * redundancy
+            if best_score is None or score > best_score:
+                best, best_score = position, score
+        picked.append(best)
+    return picked
+
+
+def timed(function, repeats: int) -> tuple:
+    """(p50 ms, p95 ms) of repeated calls"""
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000, harness.percentile(timings, 95) * 1000
+
+
+def build_store(directory: str, chunks: int, dimension: int, per_document: int = 100):
+    """Passages that each appear COPIES times with small noise, grouped in documents"""
+    rng = np.random.default_rng(0)
+    passages = rng.standard_normal((chunks // COPIES, dimension)).astype("float32")
+    vectors = np.repeat(passages, COPIES, axis=0) + rng.standard_normal((chunks, dimension)).astype("float32") * 0.05
+    vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype("float32")
+    return harness.build_index(directory, vectors, per_document=per_document), passages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vectorized MMR re-ranking")
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--k", type=int, default=2)
+    parser.add_argument("--lambda-mult", type=float, default=0.5)
+    parser.add_argument("--candidates", type=int, nargs="+", default=[20, 50, 100, 200, 500])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--loop-max", type=int, default=100, help="largest candidate set timed with the Python loop")
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(1)
+    rng = np.random.default_rng(1)
+    query = rng.standard_normal(args.dimension).astype("float32")
+
+    print(f"MMR re-ranking alone, k={args.k}, {args.dimension} dims")
+    print(f"{'candidates':>10} {'numpy p50 ms':>13} {'numpy p95 ms':>13} {'loop p50 ms':>12}")
+    for count in args.candidates:
+        candidates = rng.standard_normal((count, args.dimension)).astype("float32")
+        p50, p95 = timed(lambda: maximal_marginal_relevance(query, candidates, args.k, args.lambda_mult), 200)
+        loop = "-"
+        if count <= args.loop_max:
+            assert loop_mmr(query, candidates, args.k, args.lambda_mult) == maximal_marginal_relevance(query, candidates, args.k, args.lambda_mult)
+            loop = f"{timed(lambda: loop_mmr(query, candidates, args.k, args.lambda_mult), 3)[0]:.2f}"
+        print(f"{count:>10} {p50:>13.3f} {p95:>13.3f} {loop:>12}")
+
+    directory = tempfile.mkdtemp(prefix="bench_mmr_")
+    try:
+        index, passages = build_store(directory, args.chunks, args.dimension)
+        questions = []
+        for passage in rng.choice(len(passages), args.queries, replace=False):
+            embedding = passages[passage] + rng.standard_normal(args.dimension).astype("float32") * 0.5
+            questions.append(embedding.tolist())
+
+        print(f"\nChunkIndex.search on {args.chunks} chunks ({COPIES} near-copies of each passage), top {args.k}")
+        print(f"{'mode':>10} {'duplicate rate':>15} {'p50 ms':>8} {'p95 ms':>8}")
+        for count in [0] + args.candidates:
+            timings, duplicates = [], 0
+            for embedding in questions:
+                started = time.perf_counter()
+                results = index.search(embedding, args.k, mmr_candidates=count)
+                timings.append(time.perf_counter() - started)
+                passages_found = [document.metadata["chunk"] // COPIES for document, _ in results]
+                duplicates += len(passages_found) - len(set(passages_found))
+            label = f"mmr/{count}" if count else "plain"
+            rate = duplicates / (len(questions) * max(args.k - 1, 1))
+            print(f"{label:>10} {rate:>15.3f} {statistics.median(timings) * 1000:>8.2f} {harness.percentile(timings, 95) * 1000:>8.2f}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
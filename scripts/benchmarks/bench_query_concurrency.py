@@ -0,0 +1,74 @@
+"""
+Query throughput vs. number of concurrent clients for a single API worker.
+Embeddings and the LLM are served by the local stand-in (stub_openai.py), so the
+numbers reflect how well the worker overlaps I/O, not OpenAI's speed.
+
+Run from the project root:
+    python scripts/benchmarks/bench_query_concurrency.py --clients 1 4 16 64
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import harness
+
+
+async def run_clients(base_url: str, clients: int, requests_per_client: int):
+    latencies = []
+
+    async def client(client_id: int, http: httpx.AsyncClient):
+        for i in range(requests_per_client):
+            started = time.perf_counter()
+            response = await http.get(f"{base_url}/query/", params={"query": f"question {client_id}-{i}"})
+            response.raise_for_status()
+            if response.json()["response"].startswith(("Error", "An error")):
+                raise RuntimeError(response.json()["response"])
+            latencies.append(time.perf_counter() - started)
+
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(timeout=300, limits=limits) as http:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(c, http) for c in range(clients)))
+        elapsed = time.perf_counter() - started
+
+    return elapsed, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /query/ throughput against stand-in servers")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=4, help="requests per client")
+    parser.add_argument("--embed-latency-ms", type=float, default=40)
+    parser.add_argument("--llm-latency-ms", type=float, default=400)
+    parser.add_argument("--max-concurrent", type=int, default=None, help="RAG_MAX_CONCURRENT_QUERIES for the worker")
+    args = parser.parse_args()
+
+    stub, openai_url = harness.start_stub(args.embed_latency_ms, args.llm_latency_ms)
+    workdir = harness.make_workdir()
+    extra = {}
+    if args.max_concurrent:
+        extra["RAG_MAX_CONCURRENT_QUERIES"] = args.max_concurrent
+    env = harness.stub_env(openai_url, **extra)
+    app, base_url = harness.start_app(workdir, env)
+
+    try:
+        harness.upload_and_wait(base_url, "seed.txt", harness.sample_text().encode())
+
+        print(f"stand-in latency: embed={args.embed_latency_ms}ms llm={args.llm_latency_ms}ms")
+        print(f"{'clients':>8} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        for clients in args.clients:
+            elapsed, latencies = asyncio.run(run_clients(base_url, clients, args.requests))
+            print(f"{clients:>8} {len(latencies):>9} {len(latencies) / elapsed:>8.1f} "
+                  f"{harness.percentile(latencies, 50) * 1000:>8.0f} "
+                  f"{harness.percentile(latencies, 95) * 1000:>8.0f}")
+    finally:
+        harness.stop(app, stub)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+FAISS commit cost as the corpus grows: segmented persistence (one small delta segment
+plus the manifest per upload) versus rewriting the whole index and docstore on every
+upload, as the store did before. Uses synthetic vectors, no API server needed.
+
+Run from the project root:
+    python scripts/benchmarks/bench_segment_commit.py --uploads 200 --chunks 50
+"""
+import argparse
+import os
+import pickle
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from src.backends.faiss_index import ChunkIndex
+
+
+def upload(rng, number: int, chunks: int, dimension: int):
+    vectors = rng.standard_normal((chunks, dimension)).astype("float32")
+    texts = [f"document {number} chunk {i} " + "x" * 180 for i in range(chunks)]
+    metadatas = [{"document_id": f"doc_{number}", "source_file": f"doc{number}.txt"} for _ in range(chunks)]
+    return f"doc_{number}", texts, vectors, metadatas
+
+
+def full_rewrite(directory: str, index, docstore):
+    faiss.write_index(index, os.path.join(directory, "index.faiss"))
+    with open(os.path.join(directory, "index.pkl"), "wb") as f:
+        pickle.dump(docstore, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark segmented vs full-rewrite FAISS commits")
+    parser.add_argument("--uploads", type=int, default=200)
+    parser.add_argument("--chunks", type=int, default=50, help="chunks per upload")
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--report-every", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as segmented_dir, tempfile.TemporaryDirectory() as rewrite_dir:
+        index = ChunkIndex(segmented_dir)
+        flat = faiss.IndexFlatL2(args.dimension)
+        docstore = {}
+
+        print(f"{'corpus chunks':>14} {'segmented commit':>17} {'full rewrite':>13}")
+        segmented_times, rewrite_times = [], []
+        for number in range(1, args.uploads + 1):
+            document = upload(rng, number, args.chunks, args.dimension)
+
+            started = time.perf_counter()
+            index.add_documents([document])
+            segmented_times.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            flat.add(document[2])
+            docstore.update({len(docstore) + i: text for i, text in enumerate(document[1])})
+            full_rewrite(rewrite_dir, flat, docstore)
+            rewrite_times.append(time.perf_counter() - started)
+
+            if number % args.report_every == 0:
+                window = slice(-args.report_every, None)
+                print(f"{number * args.chunks:>14} "
+                      f"{np.mean(segmented_times[window]) * 1000:>15.1f}ms "
+                      f"{np.mean(rewrite_times[window]) * 1000:>11.1f}ms")
+
+        # Fan-out search must return the same neighbours as one flat index
+        queries = rng.standard_normal((20, args.dimension)).astype("float32")
+        started = time.perf_counter()
+        fanned = [[document.page_content for document, _ in index.search(query, 5)] for query in queries]
+        fanout_ms = (time.perf_counter() - started) / len(queries) * 1000
+        _, expected = flat.search(queries, 5)
+        matches = sum(
+            [docstore[int(i)] for i in row] == result for row, result in zip(expected, fanned)
+        )
+
+        started = time.perf_counter()
+        result = index.merge(include_base=True)
+        merge_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for query in queries:
+            index.search(query, 5)
+        merged_ms = (time.perf_counter() - started) / len(queries) * 1000
+
+        print(f"search over {args.uploads} segments: {fanout_ms:.2f}ms/query, "
+              f"{matches}/{len(queries)} identical to a single flat index")
+        print(f"merge of {result['segments_merged']} segments: {merge_seconds:.2f}s, "
+              f"then {merged_ms:.2f}ms/query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+API startup cost with a populated local vector store: time to import the app, time until
+the port answers /health, time until /ready, and the latency of the first and second
+queries. Run with the warm-up on (the default) and off, where the first request builds
+the LLM client, embeddings and vector store itself.
+
+Run from the project root:
+    python scripts/benchmarks/bench_startup.py --chunks 20000 --runs 3
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+import harness
+
+IMPORT_SNIPPET = "import time; started = time.perf_counter(); import main; print(time.perf_counter() - started)"
+
+
+def build_store(directory: Path, chunks: int, dimension: int):
+    rng = np.random.default_rng(0)
+    harness.build_index(directory, rng.standard_normal((chunks, dimension)).astype("float32"))
+
+
+def import_seconds(workdir: Path, env: dict) -> float:
+    """Time to import main:app in a fresh interpreter"""
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        cwd=workdir, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def query_seconds(base_url: str, number: int) -> float:
+    started = time.perf_counter()
+    httpx.get(f"{base_url}/query/", params={"query": f"startup question {number}"}, timeout=120).raise_for_status()
+    return time.perf_counter() - started
+
+
+def startup_run(workdir: Path, env: dict) -> dict:
+    started = time.perf_counter()
+    app, base_url = harness.start_app(workdir, env)
+    try:
+        health = time.perf_counter() - started
+        ready = None
+        while True:
+            response = httpx.get(f"{base_url}/ready", timeout=10)
+            if response.status_code == 404:
+                # Older versions have no readiness endpoint
+                break
+            if response.status_code == 200:
+                ready = time.perf_counter() - started
+                break
+            if response.json().get("state") == "failed":
+                raise RuntimeError(f"Warm-up failed: {response.json()['error']}")
+            # Polling much faster than this steals the GIL from the warm-up thread
+            time.sleep(0.25)
+        return {
+            "health": health,
+            "ready": ready,
+            "first_query": query_seconds(base_url, 1),
+            "second_query": query_seconds(base_url, 2)
+        }
+    finally:
+        harness.stop(app)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API import, readiness and first-query latency")
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = harness.make_workdir()
+    build_store(workdir / "vector_store", args.chunks, args.dimension)
+    stub, openai_url = harness.start_stub(5, 50, dimensions=args.dimension)
+
+    def median(results, key):
+        values = [result[key] for result in results if result[key] is not None]
+        return f"{statistics.median(values) * 1000:>8.0f}ms" if values else f"{'n/a':>10}"
+
+    try:
+        imports = [import_seconds(workdir, harness.stub_env(openai_url)) for _ in range(args.runs)]
+        print(f"{args.chunks} chunks; import main:app: median {statistics.median(imports) * 1000:.0f}ms over {args.runs} runs")
+        print(f"{'warm-up':>8} {'/health':>10} {'/ready':>10} {'1st query':>10} {'2nd query':>10}")
+        for warmup in ("true", "false"):
+            env = harness.stub_env(openai_url, WARMUP_ON_STARTUP=warmup)
+            results = [startup_run(workdir, env) for _ in range(args.runs)]
+            print(f"{warmup:>8} {median(results, 'health')} {median(results, 'ready')} "
+                  f"{median(results, 'first_query')} {median(results, 'second_query')}")
+    finally:
+        harness.stop(stub)
+
+
+if __name__ == "__main__":
+    main()
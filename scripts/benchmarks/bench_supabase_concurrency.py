@@ -0,0 +1,140 @@
+"""
+Concurrent requests to the Supabase backend from one worker's event loop, against the local
+stand-in (stub_supabase.py) with a fixed latency per round trip. Each request does what a
+query or upload does first: a documents lookup (document_exists) and a match_documents RPC.
+  - sync client: the synchronous supabase client called inside async methods, as
+    document_exists / get_all_documents / delete_document used to
+  - sync + to_thread: the synchronous client in the default thread pool, as the searches did
+  - async client: SupabaseVectorStore (AsyncClient over one pooled keep-alive connection pool)
+Reports requests per second, latency percentiles, the longest stall of a 10 ms timer running
+on the same loop (how long other requests would wait) and TCP connections opened.
+
+Run from the project root:
+    python scripts/benchmarks/bench_supabase_concurrency.py --clients 1 8 32 --latency-ms 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+import harness
+
+QUERY_EMBEDDING = [0.001 * (i % 100) for i in range(1536)]
+
+
+class SyncClient:
+    """Blocking calls made straight from a coroutine"""
+
+    def __init__(self, url: str):
+        from supabase import create_client
+        self.client = create_client(url, "stub")
+
+    async def request(self, number: int):
+        self.client.table("documents").select("id, document_id").eq("file_hash", f"hash_{number}").execute()
+        self.client.rpc("match_documents", {"query_embedding": QUERY_EMBEDDING, "match_count": 5}).execute()
+
+
+class ThreadedClient(SyncClient):
+    """Blocking calls handed to asyncio's default thread pool"""
+
+    async def request(self, number: int):
+        await asyncio.to_thread(
+            self.client.table("documents").select("id, document_id").eq("file_hash", f"hash_{number}").execute
+        )
+        await asyncio.to_thread(
+            self.client.rpc("match_documents", {"query_embedding": QUERY_EMBEDDING, "match_count": 5}).execute
+        )
+
+
+class StoreClient:
+    """The app's SupabaseVectorStore"""
+
+    def __init__(self, url: str):
+        from src.backends.supabase_manager import SupabaseVectorStore
+        self.store = SupabaseVectorStore()
+
+    async def request(self, number: int):
+        await self.store.document_exists(f"hash_{number}")
+        documents = await self.store.similarity_search_by_vector(QUERY_EMBEDDING, 5)
+        assert len(documents) == 5
+
+    async def close(self):
+        await self.store.aclose()
+
+
+async def run(client, clients: int, requests_per_client: int):
+    latencies, stalls = [], []
+    running = True
+
+    async def timer():
+        # Any delay beyond the 10 ms sleep is time the loop could not run other tasks
+        while running:
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            stalls.append(time.perf_counter() - started - 0.01)
+
+    async def worker(worker_id: int):
+        for i in range(requests_per_client):
+            started = time.perf_counter()
+            await client.request(worker_id * requests_per_client + i)
+            latencies.append(time.perf_counter() - started)
+
+    ticker = asyncio.create_task(timer())
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(clients)))
+    elapsed = time.perf_counter() - started
+    running = False
+    await ticker
+    return elapsed, latencies, max(stalls, default=0.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent Supabase calls from one event loop")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=8, help="requests per client")
+    parser.add_argument("--latency-ms", type=float, default=50, help="stand-in latency per round trip")
+    parser.add_argument("--max-connections", type=int, default=20, help="SUPABASE_MAX_CONNECTIONS")
+    args = parser.parse_args()
+
+    stub, url = harness.start_supabase_stub(args.latency_ms)
+    os.environ.update({
+        "SUPABASE_URL": url,
+        "SUPABASE_KEY": "stub",
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "stub"),
+        "SUPABASE_MAX_CONNECTIONS": str(args.max_connections),
+    })
+
+    def connections() -> int:
+        return httpx.get(f"{url}/stats").json()["connections"]
+
+    print(f"{args.requests} requests per client, 2 round trips each, {args.latency_ms:.0f} ms per round trip")
+    print(f"{'client':>18} {'clients':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'max stall ms':>13} {'connections':>12}")
+    try:
+        for label, factory in (("sync client", SyncClient), ("sync + to_thread", ThreadedClient), ("async client", StoreClient)):
+            for clients in args.clients:
+                async def measure():
+                    # Created inside the loop that uses it, as in a worker
+                    client = factory(url)
+                    opened = connections()
+                    result = await run(client, clients, args.requests)
+                    if hasattr(client, "close"):
+                        await client.close()
+                    return result, connections() - opened
+
+                (elapsed, latencies, stall), opened = asyncio.run(measure())
+                print(f"{label:>18} {clients:>8} {len(latencies) / elapsed:>8.1f} "
+                      f"{statistics.median(latencies) * 1000:>8.1f} {harness.percentile(latencies, 95) * 1000:>8.1f} "
+                      f"{stall * 1000:>13.1f} {opened:>12}")
+    finally:
+        harness.stop(stub)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Latency of one document upload on the Supabase backend, stage by stage, against the local
+Supabase and OpenAI stand-ins (stub_supabase.py, stub_openai.py):
+  - sequential: the previous add_document, one step after another: duplicate select,
+    Storage upload, split, embed batch by batch, documents insert, document_chunks insert
+  - pipelined: SupabaseVectorStore.add_document: lookup during the split, upload during
+    the embedding (parallel sub-batches), one ingest_document RPC
+Reports the median total, the median of each stage (pipelined stages overlap, so they add
+up to more than the total) and Supabase round trips per document.
+
+Run from the project root:
+    python scripts/benchmarks/bench_supabase_ingest.py --documents 10 --paragraphs 50 --latency-ms 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+import harness
+
+STAGES = ("duplicate_check", "upload", "split", "embed", "insert")
+
+
+async def sequential_add(store, file_content: bytes, filename: str) -> dict:
+    """The add_document flow before pipelining, timed per stage"""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    from src.backends.embeddings import aembed_documents_in_batches
+
+    timings = {}
+
+    async def stage(name, awaitable):
+        started = time.perf_counter()
+        result = await awaitable
+        timings[name] = time.perf_counter() - started
+        return result
+
+    file_hash = store._calculate_file_hash(file_content)
+    await stage("duplicate_check", store.document_exists(file_hash))
+    doc_id = f"doc_{file_hash[:16]}"
+    file_path = f"{doc_id}/{filename}"
+    await stage("upload", store._upload(file_path, file_content))
+    started = time.perf_counter()
+    chunks = RecursiveCharacterTextSplitter(chunk_size=200, chunk_overlap=20).split_text(file_content.decode("utf-8"))
+    timings["split"] = time.perf_counter() - started
+    vectors = await stage("embed", aembed_documents_in_batches(store.embeddings, chunks))
+    row = {"document_id": doc_id, "filename": filename, "file_hash": file_hash, "file_path": file_path, "chunk_count": len(chunks)}
+    records = store._chunk_records(doc_id, filename, chunks, vectors)
+
+    async def insert():
+        # PostgREST's default return=representation, as the inserts used
+        await store.client.table("documents").insert(row).execute()
+        for start in range(0, len(records), 500):
+            await store.client.table("document_chunks").insert(records[start:start + 500]).execute()
+
+    await stage("insert", insert())
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Supabase document ingestion stage by stage")
+    parser.add_argument("--documents", type=int, default=10)
+    parser.add_argument("--paragraphs", type=int, default=50, help="paragraphs per document (about 2.5 chunks each)")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Supabase stand-in latency per round trip")
+    parser.add_argument("--embed-latency-ms", type=float, default=40)
+    args = parser.parse_args()
+
+    supabase_stub, supabase_url = harness.start_supabase_stub(args.latency_ms, documents=0)
+    openai_stub, openai_url = harness.start_stub(args.embed_latency_ms, 0)
+    os.environ.update({
+        **harness.stub_env(openai_url),
+        "SUPABASE_URL": supabase_url,
+        "SUPABASE_KEY": "stub",
+        # Every document pays for its embeddings
+        "CHUNK_CACHE_MAX_MB": "0",
+    })
+
+    def requests_made() -> int:
+        return httpx.get(f"{supabase_url}/stats").json()["requests"]
+
+    async def run(label: str, seed: int):
+        from src.backends.supabase_manager import SupabaseVectorStore
+
+        store = SupabaseVectorStore()
+        # Bucket check once, outside the measurements
+        await store._ensure_bucket_exists()
+        totals, stages, chunks = [], {name: [] for name in STAGES}, 0
+        before = requests_made()
+        for number in range(args.documents):
+            content = harness.sample_text(args.paragraphs, seed=seed + number).encode()
+            started = time.perf_counter()
+            if label == "sequential":
+                timings = await sequential_add(store, content, f"doc{number}.txt")
+            else:
+                result = await store.add_document(content, f"doc{number}.txt")
+                assert result["status"] == "success", result["message"]
+                timings = result["timings"]
+                chunks += result["chunk_count"]
+            totals.append(time.perf_counter() - started)
+            for name in STAGES:
+                stages[name].append(timings[name])
+        round_trips = (requests_made() - before) / args.documents
+        await store.aclose()
+        print(f"{label:>11} {statistics.median(totals) * 1000:>9.0f} "
+              + " ".join(f"{statistics.median(stages[name]) * 1000:>9.0f}" for name in STAGES)
+              + f" {round_trips:>12.1f}")
+        return chunks
+
+    print(f"{args.documents} documents of {args.paragraphs} paragraphs, Supabase {args.latency_ms:.0f} ms "
+          f"and embeddings {args.embed_latency_ms:.0f} ms per round trip; median ms")
+    print(f"{'flow':>11} {'total':>9} " + " ".join(f"{name[:9]:>9}" for name in STAGES) + f" {'round trips':>12}")
+    try:
+        asyncio.run(run("sequential", 0))
+        chunks = asyncio.run(run("pipelined", 10000))
+        print(f"({chunks / args.documents:.0f} chunks per document)")
+    finally:
+        harness.stop(supabase_stub, openai_stub)
+
+
+if __name__ == "__main__":
+    main()
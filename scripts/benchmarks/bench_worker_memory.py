@@ -0,0 +1,104 @@
+"""
+Per-worker memory and startup time with a large local vector store. Builds a synthetic
+store, then starts several uvicorn workers on it and reports each worker's resident
+memory split into private (anonymous) and shared file-backed pages, plus PSS, which
+charges shared pages fractionally and so adds up to the real total across workers.
+Compares segments copied into the heap (FAISS_MMAP=false) with memory-mapped ones.
+
+Run from the project root:
+    python scripts/benchmarks/bench_worker_memory.py --chunks 20000 --workers 4
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+import harness
+
+
+def build_store(directory: Path, chunks: int, dimension: int, per_document: int = 100):
+    """Synthetic corpus merged into one base segment, like a long-running deployment"""
+    rng = np.random.default_rng(0)
+    harness.build_index(
+        directory,
+        rng.standard_normal((chunks, dimension)).astype("float32"),
+        [f"doc_{n // per_document} chunk {n} " + harness.sample_text(1, seed=n)[:180] for n in range(chunks)],
+        [{"document_id": f"doc_{n // per_document}", "source_file": f"doc_{n // per_document}.txt"} for n in range(chunks)],
+        per_document=per_document
+    )
+
+
+def memory_kb(pid: int) -> dict:
+    """Resident memory of a process in kB: total, private anonymous, shared file-backed and PSS"""
+    values = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("VmRSS", "RssAnon", "RssFile"):
+                values[key] = int(rest.split()[0])
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                values["Pss"] = int(line.split()[1])
+    return values
+
+
+def run(workdir: Path, openai_url: str, workers: int, queries: int, mmap: bool) -> dict:
+    env = harness.stub_env(openai_url, FAISS_MMAP=str(mmap).lower())
+    started = time.perf_counter()
+    app, base_url = harness.start_app(workdir, env, workers=workers)
+    try:
+        # /stats loads the store if the warm-up has not yet, so wait until every worker has replied
+        pids = set()
+        while len(pids) < workers:
+            response = httpx.get(f"{base_url}/stats", timeout=30, headers={"Connection": "close"})
+            pids.add(response.json()["worker_pid"])
+        startup = time.perf_counter() - started
+
+        # Flat search scans every vector, so these queries fault in the whole index in each worker
+        for number in range(queries):
+            httpx.get(f"{base_url}/query/", params={"query": f"question {number}"}, timeout=60,
+                      headers={"Connection": "close"}).raise_for_status()
+        return {"startup": startup, "workers": {pid: memory_kb(pid) for pid in sorted(pids)}}
+    finally:
+        harness.stop(app)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-worker memory with heap vs memory-mapped segments")
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = harness.make_workdir()
+    started = time.perf_counter()
+    build_store(workdir / "vector_store", args.chunks, args.dimension)
+    print(f"built {args.chunks} chunks x {args.dimension} dims ({args.chunks * args.dimension * 4 / 2**20:.0f} MB of vectors) "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    stub, openai_url = harness.start_stub(1, 1, dimensions=args.dimension)
+    try:
+        for mmap in (False, True):
+            result = run(workdir, openai_url, args.workers, args.queries, mmap)
+            workers = result["workers"].values()
+            print(f"\nFAISS_MMAP={str(mmap).lower()}: all {args.workers} workers up in {result['startup']:.2f}s")
+            print(f"{'worker':>8} {'RSS MB':>8} {'private':>8} {'shared':>8} {'PSS MB':>8}")
+            for pid, memory in result["workers"].items():
+                print(f"{pid:>8} {memory['VmRSS'] / 1024:>8.0f} {memory['RssAnon'] / 1024:>8.0f} "
+                      f"{memory['RssFile'] / 1024:>8.0f} {memory['Pss'] / 1024:>8.0f}")
+            print(f"{'total':>8} {sum(m['VmRSS'] for m in workers) / 1024:>8.0f} "
+                  f"{sum(m['RssAnon'] for m in workers) / 1024:>8.0f} "
+                  f"{sum(m['RssFile'] for m in workers) / 1024:>8.0f} {sum(m['Pss'] for m in workers) / 1024:>8.0f}")
+    finally:
+        harness.stop(stub)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Shared helpers for the benchmark scripts: free ports, the OpenAI and Supabase stand-in servers,
+an isolated API process running against a throw-away working directory, and synthetic
+corpora (filler text, clustered vectors, a populated FAISS segment index).
+"""
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+STUB_SERVER = Path(__file__).resolve().parent / "stub_openai.py"
+SUPABASE_STUB_SERVER = Path(__file__).resolve().parent / "stub_supabase.py"
+
+
+def free_port() -> int:
+    """Ask the OS for an unused TCP port"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url: str, timeout: float = 30.0):
+    """Poll a URL until it answers or the timeout expires"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise TimeoutError(f"{url} did not come up within {timeout}s")
+
+
+def start_stub(embed_latency_ms: float = 40, llm_latency_ms: float = 400, dimensions: int = 1536):
+    """Start the OpenAI stand-in and return (process, base_url)"""
+    port = free_port()
+    process = subprocess.Popen([
+        sys.executable, str(STUB_SERVER),
+        "--port", str(port),
+        "--embed-latency-ms", str(embed_latency_ms),
+        "--llm-latency-ms", str(llm_latency_ms),
+        "--dimensions", str(dimensions),
+    ])
+    base_url = f"http://127.0.0.1:{port}"
+    wait_for(f"{base_url}/stats")
+    return process, f"{base_url}/v1"
+
+
+def start_supabase_stub(latency_ms: float = 50, documents: int = 200):
+    """Start the Supabase stand-in and return (process, base_url)"""
+    port = free_port()
+    process = subprocess.Popen([
+        sys.executable, str(SUPABASE_STUB_SERVER),
+        "--port", str(port),
+        "--latency-ms", str(latency_ms),
+        "--documents", str(documents),
+    ])
+    base_url = f"http://127.0.0.1:{port}"
+    wait_for(f"{base_url}/stats")
+    return process, base_url
+
+
+def stub_env(openai_base_url: str, **extra) -> dict:
+    """Environment for processes that should talk to the stand-in instead of OpenAI"""
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_BASE_URL": openai_base_url,
+        "OPENAI_API_KEY": "stub",
+        "USE_SUPABASE": "false",
+        "PYTHONPATH": str(PROJECT_ROOT),
+        "EMBEDDINGS_CHECK_CTX_LENGTH": "false",
+    })
+    env.update({key: str(value) for key, value in extra.items()})
+    return env
+
+
+def make_workdir() -> Path:
+    """Throw-away working directory with the layout the app expects"""
+    workdir = Path(tempfile.mkdtemp(prefix="langbot-bench-"))
+    (workdir / "static").mkdir()
+    (workdir / "data").mkdir()
+    return workdir
+
+
+def start_app(workdir: Path, env: dict, workers: int = 1):
+    """Run main:app under uvicorn inside workdir and return (process, base_url)"""
+    port = free_port()
+    process = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--app-dir", str(PROJECT_ROOT),
+        "--host", "127.0.0.1",
+        "--port", str(port),
+        "--workers", str(workers),
+        "--log-level", "warning",
+    ], cwd=workdir, env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    wait_for(f"{base_url}/health", timeout=60)
+    return process, base_url
+
+
+def stop(*processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def sample_text(paragraphs: int = 50, seed: int = 0) -> str:
+    """Deterministic filler text for seeding the vector store"""
+    import random
+
+    rng = random.Random(seed)
+    words = ("vector index query answer document chunk embedding latency worker "
+             "server cache search result context model token stream upload").split()
+    return "\n\n".join(
+        " ".join(rng.choice(words) for _ in range(rng.randint(30, 80)))
+        for _ in range(paragraphs)
+    )
+
+
+def clustered_vectors(rng, centers, count: int, noise: float = 0.6):
+    """
+    count points scattered around topic centres, normalized like OpenAI embeddings
+    Returns (vectors, the centre each one was drawn around)
+    """
+    import numpy as np
+
+    assignment = rng.integers(0, len(centers), count)
+    vectors = centers[assignment] + rng.standard_normal((count, centers.shape[1])).astype("float32") * noise
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype("float32"), assignment
+
+
+def build_index(directory, vectors, texts=None, metadatas=None, per_document: int = 100, documents_per_commit: int = 1):
+    """
+    A ChunkIndex holding vectors as documents of per_document chunks (doc_0, doc_1, ...),
+    committed documents_per_commit at a time and merged into one base segment, like a
+    long-running deployment. Texts and metadatas default to the chunk's number and document.
+    """
+    from src.backends.faiss_index import ChunkIndex
+
+    chunks = len(vectors)
+    texts = texts or [f"doc_{number // per_document} chunk {number}" for number in range(chunks)]
+    metadatas = metadatas or [{"document_id": f"doc_{number // per_document}", "chunk": number} for number in range(chunks)]
+    index = ChunkIndex(str(directory))
+    step = per_document * documents_per_commit
+    for commit in range(0, chunks, step):
+        index.add_documents([
+            (f"doc_{start // per_document}", texts[start:start + per_document], vectors[start:start + per_document],
+             metadatas[start:start + per_document])
+            for start in range(commit, min(commit + step, chunks), per_document)
+        ])
+    index.compact()
+    return index
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def upload_and_wait(base_url: str, filename: str, content: bytes, timeout: float = 300.0) -> dict:
+    """Upload a document and poll its ingestion job until it finishes"""
+    response = httpx.post(f"{base_url}/upload/", files={"file": (filename, content)}, timeout=120)
+    response.raise_for_status()
+    return wait_for_job(base_url, response.json(), timeout)
+
+
+def wait_for_job(base_url: str, job: dict, timeout: float = 300.0) -> dict:
+    """Poll an ingestion job until it finishes"""
+    deadline = time.time() + timeout
+    while job["status"] in ("queued", "running"):
+        if time.time() > deadline:
+            raise TimeoutError(f"Ingestion job {job['job_id']} did not finish within {timeout}s")
+        time.sleep(0.1)
+        job = httpx.get(f"{base_url}/jobs/{job['job_id']}", timeout=10).json()
+
+    if job["status"] not in ("success", "duplicate"):
+        raise RuntimeError(f"Ingestion job {job['job_id']} failed: {job['message']}")
+    return job
@@ -0,0 +1,122 @@
+"""
+Local stand-in for the OpenAI embeddings and completions API.
+Used by the benchmarks so they can run without network access or API costs.
+
+Run from the project root:
+    python scripts/benchmarks/stub_openai.py --port 8900 --embed-latency-ms 40 --llm-latency-ms 400
+
+Then point the app at it:
+    OPENAI_BASE_URL=http://127.0.0.1:8900/v1 OPENAI_API_KEY=stub uvicorn main:app
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+EMBED_LATENCY_MS = float(os.getenv("STUB_EMBED_LATENCY_MS", "40"))
+LLM_LATENCY_MS = float(os.getenv("STUB_LLM_LATENCY_MS", "400"))
+EMBED_DIMENSIONS = int(os.getenv("STUB_EMBED_DIMENSIONS", "1536"))
+STREAM_TOKENS = int(os.getenv("STUB_STREAM_TOKENS", "20"))
+
+app = FastAPI(title="OpenAI stand-in")
+
+# Simple counters so benchmarks can see how many outbound calls were made
+stats = {"embedding_requests": 0, "embedding_inputs": 0, "completion_requests": 0}
+
+
+def fake_embedding(text: str) -> np.ndarray:
+    """Deterministic unit vector derived from the text"""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(EMBED_DIMENSIONS).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    inputs = body["input"]
+    # OpenAIEmbeddings may send a single string, a list of strings or token id lists
+    if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+        inputs = [inputs]
+
+    stats["embedding_requests"] += 1
+    stats["embedding_inputs"] += len(inputs)
+    await asyncio.sleep(EMBED_LATENCY_MS / 1000)
+
+    data = []
+    for idx, item in enumerate(inputs):
+        vector = fake_embedding(item if isinstance(item, str) else json.dumps(item))
+        if body.get("encoding_format") == "base64":
+            embedding = base64.b64encode(vector.tobytes()).decode("ascii")
+        else:
+            embedding = vector.tolist()
+        data.append({"object": "embedding", "index": idx, "embedding": embedding})
+
+    return {
+        "object": "list",
+        "data": data,
+        "model": body.get("model", "stub"),
+        "usage": {"prompt_tokens": 0, "total_tokens": 0},
+    }
+
+
+@app.post("/v1/completions")
+async def completions(request: Request):
+    body = await request.json()
+    stats["completion_requests"] += 1
+    model = body.get("model", "stub")
+    words = [f"token{i} " for i in range(STREAM_TOKENS)]
+
+    if body.get("stream"):
+        async def event_stream():
+            for word in words:
+                await asyncio.sleep(LLM_LATENCY_MS / 1000 / len(words))
+                chunk = {
+                    "id": "cmpl-stub",
+                    "object": "text_completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"text": word, "index": 0, "logprobs": None, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+    await asyncio.sleep(LLM_LATENCY_MS / 1000)
+    return {
+        "id": "cmpl-stub",
+        "object": "text_completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"text": "".join(words), "index": 0, "logprobs": None, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 1, "completion_tokens": len(words), "total_tokens": len(words) + 1},
+    }
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--embed-latency-ms", type=float, default=EMBED_LATENCY_MS)
+    parser.add_argument("--llm-latency-ms", type=float, default=LLM_LATENCY_MS)
+    parser.add_argument("--dimensions", type=int, default=EMBED_DIMENSIONS)
+    args = parser.parse_args()
+
+    EMBED_LATENCY_MS = args.embed_latency_ms
+    LLM_LATENCY_MS = args.llm_latency_ms
+    EMBED_DIMENSIONS = args.dimensions
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
@@ -0,0 +1,154 @@
+"""
+Local stand-in for the parts of Supabase's REST (PostgREST) and Storage APIs the app uses.
+Every request waits --latency-ms before answering, like a round trip to a hosted project,
+so benchmarks can measure how the app overlaps Supabase calls without a real project.
+Rows live in memory; match_documents returns the first match_count chunks and
+ingest_document inserts a document and its chunks unless its file_hash is stored.
+
+Run from the project root:
+    python scripts/benchmarks/stub_supabase.py --port 8901 --latency-ms 50 --documents 200
+
+Then point the app at it:
+    USE_SUPABASE=true SUPABASE_URL=http://127.0.0.1:8901 SUPABASE_KEY=stub uvicorn main:app
+"""
+import argparse
+import asyncio
+import os
+
+from fastapi import FastAPI, Request, Response
+
+LATENCY_MS = float(os.getenv("STUB_SUPABASE_LATENCY_MS", "50"))
+
+app = FastAPI(title="Supabase stand-in")
+
+tables = {"documents": [], "document_chunks": []}
+objects = {}
+stats = {"requests": 0, "connections": set()}
+
+
+def seed(documents: int, chunks_per_document: int = 5):
+    for number in range(documents):
+        document_id = f"doc_{number:016d}"
+        tables["documents"].append({
+            "id": number + 1, "document_id": document_id, "filename": f"{document_id}.txt",
+            "file_hash": f"hash_{number}", "file_path": f"{document_id}/{document_id}.txt",
+            "chunk_count": chunks_per_document, "created_at": "2024-01-01T00:00:00+00:00"
+        })
+        objects[f"{document_id}/{document_id}.txt"] = f"Contents of {document_id}".encode()
+        for index in range(chunks_per_document):
+            tables["document_chunks"].append({
+                "id": len(tables["document_chunks"]) + 1, "document_id": document_id, "chunk_index": index,
+                "content": f"Chunk {index} of {document_id}", "metadata": {"filename": f"{document_id}.txt", "chunk": index}
+            })
+
+
+def matches(row: dict, params) -> bool:
+    """PostgREST eq. / in. filters from the query string"""
+    for column, condition in params.items():
+        if column in ("select", "order", "limit"):
+            continue
+        operator, _, value = condition.partition(".")
+        if operator == "eq" and str(row.get(column)) != value:
+            return False
+        if operator == "in" and str(row.get(column)) not in [item.strip('"') for item in value.strip("()").split(",")]:
+            return False
+    return True
+
+
+@app.middleware("http")
+async def latency(request: Request, call_next):
+    if request.url.path != "/stats":
+        stats["requests"] += 1
+        # A new TCP connection comes from a new client port
+        stats["connections"].add(request.client.port if request.client else None)
+        await asyncio.sleep(LATENCY_MS / 1000)
+    return await call_next(request)
+
+
+@app.get("/rest/v1/{table}")
+async def select(table: str, request: Request):
+    return [row for row in tables[table] if matches(row, request.query_params)]
+
+
+@app.post("/rest/v1/{table}", status_code=201)
+async def insert(table: str, request: Request):
+    body = await request.json()
+    rows = body if isinstance(body, list) else [body]
+    # upsert(on_conflict=..., ignore_duplicates=True) skips rows whose key is already stored
+    conflict = request.query_params.get("on_conflict")
+    if conflict and "resolution=ignore-duplicates" in request.headers.get("prefer", ""):
+        stored = {row.get(conflict) for row in tables[table]}
+        rows = [row for row in rows if row.get(conflict) not in stored]
+    tables[table].extend(rows)
+    if "return=minimal" in request.headers.get("prefer", ""):
+        return Response(status_code=201)
+    return rows
+
+
+@app.patch("/rest/v1/{table}")
+async def update(table: str, request: Request):
+    changes = await request.json()
+    updated = [row for row in tables[table] if matches(row, request.query_params)]
+    for row in updated:
+        row.update(changes)
+    return updated
+
+
+@app.delete("/rest/v1/{table}")
+async def delete(table: str, request: Request):
+    removed = [row for row in tables[table] if matches(row, request.query_params)]
+    tables[table] = [row for row in tables[table] if not matches(row, request.query_params)]
+    return removed
+
+
+@app.post("/rest/v1/rpc/{function}")
+async def rpc(function: str, request: Request):
+    body = await request.json()
+    if function == "ingest_document":
+        # Insert the document and its chunks unless the file_hash is stored (ON CONFLICT)
+        document = body["document"]
+        stored = [row for row in tables["documents"] if row["file_hash"] == document["file_hash"]]
+        if stored:
+            return [{"document_id": stored[0]["document_id"], "file_path": stored[0]["file_path"], "inserted": False}]
+        tables["documents"].append(document)
+        tables["document_chunks"].extend({**chunk, "document_id": document["document_id"]} for chunk in body.get("chunks", []))
+        return [{"document_id": document["document_id"], "file_path": document["file_path"], "inserted": True}]
+    rows = tables["document_chunks"][:body.get("match_count", 5)]
+    return [{**row, "similarity": 0.9, **({"score": 0.03} if function.startswith("hybrid") else {})} for row in rows]
+
+
+@app.get("/storage/v1/bucket")
+async def list_buckets():
+    return [{"id": "documents", "name": "documents", "owner": "", "public": False,
+             "file_size_limit": None, "allowed_mime_types": None,
+             "created_at": "2024-01-01T00:00:00+00:00", "updated_at": "2024-01-01T00:00:00+00:00"}]
+
+
+@app.post("/storage/v1/object/{bucket}/{path:path}")
+async def upload(bucket: str, path: str, request: Request):
+    objects[path] = await request.body()
+    return {"Key": f"{bucket}/{path}"}
+
+
+@app.get("/storage/v1/object/{bucket}/{path:path}")
+async def download(bucket: str, path: str):
+    return Response(objects.get(path, b""), media_type="text/plain")
+
+
+@app.get("/stats")
+async def get_stats():
+    return {"requests": stats["requests"], "connections": len(stats["connections"])}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--latency-ms", type=float, default=LATENCY_MS)
+    parser.add_argument("--documents", type=int, default=200)
+    args = parser.parse_args()
+
+    LATENCY_MS = args.latency_ms
+    seed(args.documents)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
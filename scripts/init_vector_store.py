@@ -1,9 +1,11 @@
 """
 Initialize the vector store with existing documents in the data directory.
 Run this script from the project root: python scripts/init_vector_store.py
+Pass --batch to embed every document in one bulk, parallel pass.
 """
 import os
 import sys
+import asyncio
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -14,7 +16,7 @@ sys.path.insert(0, str(project_root))
 # Load environment variables first
 load_dotenv()
 
-def initialize_vector_store():
+def initialize_vector_store(batch: bool = False):
     """Initialize vector store with all documents in data directory"""
     # Check for OpenAI API key
     if not os.getenv("OPENAI_API_KEY"):
@@ -24,7 +26,8 @@ def initialize_vector_store():
         sys.exit(1)
     
     # Import here after checking environment
-    from src.backends.faiss_manager import vector_store_manager
+    from src.backends.faiss_manager import get_vector_store_manager
+    vector_store_manager = get_vector_store_manager()
     
     data_dir = "data"
     
@@ -43,23 +46,35 @@ def initialize_vector_store():
     
     print(f"Found {len(text_files)} document(s) to process...")
     
-    for file_path in text_files:
-        print(f"\nProcessing: {file_path.name}")
-        result = vector_store_manager.add_document(
-            str(file_path), 
-            file_path.name
-        )
+    if batch:
+        files = [(str(file_path), file_path.name) for file_path in text_files]
+        result = asyncio.run(vector_store_manager.aadd_documents(files))
         
-        print(f"  Status: {result['status']}")
+        print(f"\n  Status: {result['status']}")
         print(f"  Message: {result['message']}")
         
         if result['status'] == 'success':
-            print(f"  Document ID: {result['document_id']}")
+            print(f"  Documents added: {result['document_count']}")
             print(f"  Chunks created: {result['chunk_count']}")
+            print(f"  Throughput: {result['documents_per_second']} docs/s, {result['chunks_per_second']} chunks/s")
+    else:
+        for file_path in text_files:
+            print(f"\nProcessing: {file_path.name}")
+            result = vector_store_manager.add_document(
+                str(file_path), 
+                file_path.name
+            )
+            
+            print(f"  Status: {result['status']}")
+            print(f"  Message: {result['message']}")
+            
+            if result['status'] == 'success':
+                print(f"  Document ID: {result['document_id']}")
+                print(f"  Chunks created: {result['chunk_count']}")
     
     print("\n" + "="*50)
     print("Vector store initialization complete!")
     print(f"Total documents in vector store: {len(vector_store_manager.get_all_documents())}")
 
 if __name__ == "__main__":
-    initialize_vector_store()
+    initialize_vector_store(batch="--batch" in sys.argv[1:])
@@ -0,0 +1,172 @@
+"""
+Versioned schema migrations and vector index maintenance for the Supabase (Postgres + pgvector) database
+Run this script from the project root:
+    python scripts/supabase_db.py status
+    python scripts/supabase_db.py migrate
+    python scripts/supabase_db.py reindex --method hnsw
+
+Connects with SUPABASE_DB_URL (Supabase dashboard > Project Settings > Database > Connection
+string), or --database-url; any Postgres with the pgvector extension works, e.g. a local one
+for testing. Migrations are the config/migrations/NNN_name.sql files, applied in order, each
+in its own transaction, and recorded in the schema_migrations table.
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+os.chdir(project_root)
+
+MIGRATIONS_DIR = Path("config") / "migrations"
+
+# Recorded without being run on a database set up from setup_supabase.sql before migrations existed
+BASELINE_VERSION = "001_baseline"
+
+INDEX_METHODS = ("hnsw", "ivfflat", "none")
+
+
+def connect(database_url: str):
+    """Autocommit connection; migrations manage their own transactions"""
+    import psycopg2
+    connection = psycopg2.connect(database_url)
+    connection.autocommit = True
+    return connection
+
+
+def migration_files() -> list:
+    """(version, path) of every migration, in order"""
+    return sorted((path.stem, path) for path in MIGRATIONS_DIR.glob("[0-9]*.sql"))
+
+
+def applied_versions(cursor) -> set:
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version TEXT PRIMARY KEY,
+            applied_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+        )
+    """)
+    cursor.execute("SELECT version FROM schema_migrations")
+    versions = {row[0] for row in cursor.fetchall()}
+    if not versions:
+        cursor.execute("SELECT to_regclass('public.document_chunks') IS NOT NULL")
+        if cursor.fetchone()[0]:
+            # Tables created by pasting setup_supabase.sql before it recorded its version
+            cursor.execute("INSERT INTO schema_migrations (version) VALUES (%s)", (BASELINE_VERSION,))
+            print(f"📌 Existing schema found: recorded {BASELINE_VERSION} as applied")
+            versions.add(BASELINE_VERSION)
+    return versions
+
+
+def migrate(connection) -> int:
+    """Apply pending migrations in order; returns how many were applied"""
+    with connection.cursor() as cursor:
+        applied = applied_versions(cursor)
+        pending = [(version, path) for version, path in migration_files() if version not in applied]
+        if not pending:
+            print("✅ Schema is up to date")
+            return 0
+        
+        for version, path in pending:
+            started = time.perf_counter()
+            print(f"⏳ Applying {version}...")
+            try:
+                cursor.execute("BEGIN")
+                cursor.execute(path.read_text())
+                cursor.execute("INSERT INTO schema_migrations (version) VALUES (%s)", (version,))
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                print(f"❌ {version} failed and was rolled back; later migrations were not applied")
+                raise
+            print(f"✅ {version} applied in {time.perf_counter() - started:.1f}s")
+        return len(pending)
+
+
+def reindex(connection, method: str, min_rows: int, m: int, ef_construction: int, ef_search: int, maintenance_work_mem: str):
+    """Rebuild the embedding index for the rows now in document_chunks (after bulk loads)"""
+    with connection.cursor() as cursor:
+        # Index builds are much faster when the graph / lists fit in memory
+        cursor.execute("SET maintenance_work_mem = %s", (maintenance_work_mem,))
+        cursor.execute("SET statement_timeout = 0")
+        started = time.perf_counter()
+        print(f"⏳ Rebuilding the embedding index ({method})...")
+        cursor.execute("CALL rebuild_embedding_index(%s, %s, %s, %s, %s)", (method, min_rows, m, ef_construction, ef_search))
+        print(f"✅ Rebuilt in {time.perf_counter() - started:.1f}s")
+    show_index(connection)
+
+
+def show_index(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT method, lists, probes, m, ef_construction, ef_search, rows_indexed, rebuilt_at,
+                   pg_size_pretty(COALESCE(pg_relation_size(to_regclass('public.document_chunks_embedding_idx')), 0))
+            FROM vector_index_settings
+        """)
+        row = cursor.fetchone()
+        if row is None:
+            print("⚠️  No vector_index_settings row: run migrate first")
+            return
+        method, lists, probes, m, ef_construction, ef_search, rows, rebuilt_at, size = row
+        print(f"   Index: {method} over {rows} rows, {size}, rebuilt {rebuilt_at:%Y-%m-%d %H:%M}")
+        if method == "ivfflat":
+            print(f"   lists = {lists}, probes per query = {probes}")
+        elif method == "hnsw":
+            print(f"   m = {m}, ef_construction = {ef_construction}, ef_search per query = {ef_search}")
+        
+        cursor.execute("SELECT COUNT(*) FROM document_chunks")
+        current = cursor.fetchone()[0]
+        if (rows and current > 2 * rows) or (not rows and current):
+            print(f"   ⚠️  {current} rows now; run reindex to size the index for them")
+
+
+def status(connection):
+    with connection.cursor() as cursor:
+        applied = applied_versions(cursor)
+    print("\n📊 Schema migrations")
+    print("=" * 50)
+    for version, _ in migration_files():
+        print(f"   {'✅' if version in applied else '⏳ pending'} {version}")
+    print("=" * 50)
+    if "002_vector_index_tuning" in applied:
+        show_index(connection)
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Supabase schema migrations and vector index maintenance")
+    parser.add_argument("--database-url", default=os.getenv("SUPABASE_DB_URL"), help="Postgres connection string (default: SUPABASE_DB_URL)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="show applied and pending migrations and the embedding index")
+    commands.add_parser("migrate", help="apply pending migrations")
+    rebuild = commands.add_parser("reindex", help="rebuild the embedding index for the current row count")
+    rebuild.add_argument("--method", choices=INDEX_METHODS, default=os.getenv("SUPABASE_VECTOR_INDEX", "hnsw"))
+    rebuild.add_argument("--min-rows", type=int, default=1000, help="below this many rows, search exactly without an index")
+    rebuild.add_argument("--m", type=int, default=16, help="HNSW links per node")
+    rebuild.add_argument("--ef-construction", type=int, default=64, help="HNSW build-time candidate list")
+    rebuild.add_argument("--ef-search", type=int, default=40, help="HNSW query-time candidate list")
+    rebuild.add_argument("--maintenance-work-mem", default="1GB")
+    args = parser.parse_args()
+    
+    if not args.database_url:
+        print("❌ SUPABASE_DB_URL is not set (or pass --database-url)")
+        sys.exit(1)
+    
+    connection = connect(args.database_url)
+    try:
+        if args.command == "status":
+            status(connection)
+        elif args.command == "migrate":
+            migrate(connection)
+        else:
+            reindex(connection, args.method, args.min_rows, args.m, args.ef_construction, args.ef_search, args.maintenance_work_mem)
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,28 @@
 """
 Unified endpoints supporting both FAISS (local) and Supabase (cloud) backends
 """
-from fastapi import APIRouter, HTTPException, UploadFile, File
-from src.core import get_rag_response
+from fastapi import APIRouter, HTTPException, UploadFile, File, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from src.backends.chunking import chunking_settings
+from src.core import answer_query, search_filters, stream_rag_response
+from src.core.ingestion import QueueFullError, get_ingestion_queue
+from src.core.warmup import is_ready, lifespan, warmup_status
 import os
+import json
+import uuid
+import hashlib
+import asyncio
+import tarfile
+import zipfile
 from pathlib import Path
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 
 load_dotenv()
 
-router = APIRouter()
+# The lifespan starts warming up the LLM, embeddings and vector store once the app is up
+router = APIRouter(lifespan=lifespan)
 
 # Determine which backend to use
 USE_SUPABASE = os.getenv("USE_SUPABASE", "false").lower() == "true"
@@ -18,69 +31,346 @@ USE_SUPABASE = os.getenv("USE_SUPABASE", "false").lower() == "true"
 DATA_DIR = "data"
 Path(DATA_DIR).mkdir(parents=True, exist_ok=True)
 
+# Uploads waiting to be ingested, each under a name of its own
+UPLOAD_STAGING_DIR = os.path.join(DATA_DIR, ".uploads")
+
+TEXT_EXTENSIONS = ('.txt', '.md', '.text')
+
+# Read size when streaming uploads to disk
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+
+# How often a streaming query checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = 0.25
+
+# Limits on what one bulk upload may unpack: archive members, and bytes written to disk
+UPLOAD_MAX_ARCHIVE_MEMBERS = int(os.getenv("UPLOAD_MAX_ARCHIVE_MEMBERS", "10000"))
+UPLOAD_MAX_EXTRACTED_MB = float(os.getenv("UPLOAD_MAX_EXTRACTED_MB", "1024"))
+
 
 @router.get("/query/")
-async def query_rag_system(query: str):
-    """Query the RAG system"""
+async def query_rag_system(
+    query: str,
+    document_id: Optional[List[str]] = Query(None),
+    filename: Optional[List[str]] = Query(None),
+    uploaded_after: Optional[datetime] = None,
+    uploaded_before: Optional[datetime] = None
+):
+    """
+    Query the RAG system
+    Repeat document_id / filename to allow several; uploaded_after / uploaded_before take ISO dates.
+    """
+    filters = search_filters(document_id, filename, uploaded_after, uploaded_before)
     try:
-        response = await get_rag_response(query)
-        return {"query": query, "response": response}
+        result = await answer_query(query, filters)
+        return {"query": query, **result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/upload/")
-async def upload_document(file: UploadFile = File(...)):
-    """Upload a new document and automatically vectorize it"""
+@router.get("/query/stream")
+async def stream_query(
+    query: str,
+    request: Request,
+    document_id: Optional[List[str]] = Query(None),
+    filename: Optional[List[str]] = Query(None),
+    uploaded_after: Optional[datetime] = None,
+    uploaded_before: Optional[datetime] = None
+):
+    """
+    Query the RAG system and stream the answer as Server-Sent Events.
+    Sends a "sources" event first, then one "token" event per generated fragment.
+    Takes the same filters as /query/.
+    """
+    filters = search_filters(document_id, filename, uploaded_after, uploaded_before)
+    
+    async def event_stream():
+        events = stream_rag_response(query, filters)
+        # Watched while retrieval or the LLM is still working on the next event, not only between
+        # events: a client that goes away gives back its query slot and stops the LLM call at once
+        disconnected = asyncio.ensure_future(_wait_for_disconnect(request))
+        step = None
+        try:
+            while True:
+                step = asyncio.ensure_future(events.__anext__())
+                await asyncio.wait({step, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if not step.done():
+                    break
+                try:
+                    event = step.result()
+                except StopAsyncIteration:
+                    break
+                yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+        finally:
+            disconnected.cancel()
+            if step is not None and not step.done():
+                # Raises CancelledError inside the generator where it waits, which ends it
+                step.cancel()
+            else:
+                await events.aclose()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def _wait_for_disconnect(request: Request):
+    """Return once the client of a streaming response has gone away"""
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+
+@router.post("/upload/", status_code=202)
+async def upload_document(
+    file: UploadFile = File(...),
+    chunk_strategy: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+    chunk_overlap: Optional[int] = None
+):
+    """
+    Upload a new document and queue it for vectorization
+    chunk_strategy (character, token or markdown), chunk_size and chunk_overlap override
+    the CHUNK_* defaults for this document.
+    Returns a job id right away; poll /jobs/{job_id} for progress
+    """
     try:
-        # Validate filename exists
-        if not file.filename:
+        chunking = _chunking(chunk_strategy, chunk_size, chunk_overlap)
+        
+        # Validate filename exists (a client-sent path like ../x.txt keeps only its last part)
+        filename = _safe_filename(file.filename or "")
+        if not filename:
             raise HTTPException(status_code=400, detail="Filename is required")
         
         # Validate file type
-        if not file.filename.endswith(('.txt', '.md', '.text')):
+        if not filename.endswith(TEXT_EXTENSIONS):
             raise HTTPException(
                 status_code=400, 
                 detail="Only text files (.txt, .md, .text) are supported"
             )
         
-        # Read file content
-        file_content = await file.read()
+        queue = get_ingestion_queue()
+        if queue.is_full():
+            raise HTTPException(
+                status_code=503,
+                detail="Ingestion queue is full, please retry shortly",
+                headers={"Retry-After": "5"}
+            )
         
-        if USE_SUPABASE:
-            # Use Supabase for storage and vectorization
-            from src.backends import get_supabase_store
-            
-            store = get_supabase_store()
-            result = await store.add_document(file_content, file.filename)
-        else:
-            # Use local FAISS storage
-            from src.backends import vector_store_manager
-            import shutil
-            
-            # Save file locally
-            file_path = os.path.join(DATA_DIR, file.filename)
-            with open(file_path, "wb") as buffer:
-                buffer.write(file_content)
-            
-            # Add to vector store
-            result = vector_store_manager.add_document(file_path, file.filename)
+        file_path = _staging_path(filename)
+        
+        # Stream the upload to disk without holding the whole file in memory, hashing it on the way
+        file_hash = await asyncio.to_thread(_save_upload, file.file, file_path)
+        
+        try:
+            job = queue.submit(
+                file_path, filename, remove_staged=True, file_hash=file_hash, chunking=chunking,
+                stored_path=_stored_path(filename, file_hash)
+            )
+        except QueueFullError as e:
+            Path(file_path).unlink(missing_ok=True)
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
         
         return {
-            "filename": file.filename,
-            "status": result["status"],
-            "message": result["message"],
-            "document_id": result.get("document_id"),
-            "chunk_count": result.get("chunk_count"),
-            "backend": "Supabase" if USE_SUPABASE else "Local FAISS"
+            "filename": filename,
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "message": "Document queued for vectorization",
+            "status_url": f"/jobs/{job['job_id']}",
+            "backend": job["backend"]
         }
-        
+    
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error uploading document: {str(e)}")
 
 
+def _chunking(strategy: Optional[str], chunk_size: Optional[int], chunk_overlap: Optional[int]) -> Dict[str, Any]:
+    """An upload's chunking settings; invalid ones are rejected before anything is staged"""
+    try:
+        return chunking_settings(strategy, chunk_size, chunk_overlap)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _save_upload(source: BinaryIO, file_path: str, max_bytes: Optional[int] = None) -> str:
+    """
+    Copy an upload to disk in blocks and return its SHA256, computed in the same pass
+    Stops with a 413 once more than max_bytes have been read; a partial file is removed
+    """
+    sha256_hash = hashlib.sha256()
+    written = 0
+    try:
+        with open(file_path, "wb") as buffer:
+            for block in iter(lambda: source.read(UPLOAD_BLOCK_SIZE), b""):
+                written += len(block)
+                if max_bytes is not None and written > max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Upload unpacks to more than UPLOAD_MAX_EXTRACTED_MB ({UPLOAD_MAX_EXTRACTED_MB:g} MB)"
+                    )
+                sha256_hash.update(block)
+                buffer.write(block)
+    except Exception:
+        Path(file_path).unlink(missing_ok=True)
+        raise
+    return sha256_hash.hexdigest()
+
+
+@router.post("/upload/batch", status_code=202)
+async def upload_documents(
+    files: List[UploadFile] = File(...),
+    chunk_strategy: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+    chunk_overlap: Optional[int] = None
+):
+    """
+    Upload many documents (or .zip / .tar.gz archives of them) as one bulk job
+    All chunks are embedded in large parallel batches and written to the index once;
+    the chunking parameters apply to every document, as for /upload/
+    """
+    try:
+        chunking = _chunking(chunk_strategy, chunk_size, chunk_overlap)
+        
+        queue = get_ingestion_queue()
+        if queue.is_full():
+            raise HTTPException(
+                status_code=503,
+                detail="Ingestion queue is full, please retry shortly",
+                headers={"Retry-After": "5"}
+            )
+        
+        staged, file_hashes, skipped = await asyncio.to_thread(_stage_batch, files)
+        if not staged:
+            raise HTTPException(
+                status_code=400,
+                detail="No text files (.txt, .md, .text) found in the upload"
+            )
+        
+        try:
+            job = queue.submit_batch(
+                staged, remove_staged=True, file_hashes=file_hashes, chunking=chunking,
+                stored_paths=[_stored_path(filename, file_hash) for (_, filename), file_hash in zip(staged, file_hashes)]
+            )
+        except QueueFullError as e:
+            for file_path, _ in staged:
+                Path(file_path).unlink(missing_ok=True)
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+        
+        return {
+            "filenames": [filename for _, filename in staged],
+            "skipped": skipped,
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "message": f"{len(staged)} documents queued for vectorization",
+            "status_url": f"/jobs/{job['job_id']}",
+            "backend": job["backend"]
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error uploading documents: {str(e)}")
+
+
+def _safe_filename(name: str) -> str:
+    """
+    The last part of a client-sent file or archive member name, so it can't lead out of
+    the directory it is saved in; empty for names with nothing left ("", "dir/", "..")
+    """
+    filename = os.path.basename(name.replace("\\", "/"))
+    return "" if filename in (".", "..") else filename
+
+
+def _staging_path(filename: str) -> str:
+    """A path of its own for an upload until a worker has ingested it, so queued uploads sharing a name never overwrite each other"""
+    Path(UPLOAD_STAGING_DIR).mkdir(parents=True, exist_ok=True)
+    return os.path.join(UPLOAD_STAGING_DIR, f"{uuid.uuid4().hex}_{_safe_filename(filename)}")
+
+
+def _stored_path(filename: str, file_hash: str) -> Optional[str]:
+    """
+    Where FAISS keeps an upload once it is committed, named by its content so documents
+    sharing a filename keep their own file; Supabase keeps nothing locally (None)
+    """
+    if USE_SUPABASE:
+        return None
+    return os.path.join(DATA_DIR, f"{file_hash[:16]}_{_safe_filename(filename)}")
+
+
+def _stage_batch(files: List[UploadFile]) -> Tuple[List[Tuple[str, str]], List[str], List[str]]:
+    """
+    Save every text file of a bulk upload to disk, unpacking archives on the way
+    Each file is staged under a path of its own, so archive members sharing a base name
+    (a/notes.txt, b/notes.txt) are all kept and nothing is written outside the staging
+    directory. At most UPLOAD_MAX_ARCHIVE_MEMBERS archive members and UPLOAD_MAX_EXTRACTED_MB
+    in all are unpacked; past either limit nothing is kept and the upload fails with a 413.
+    Returns (staged (path, filename) pairs, their SHA256 hashes, names that were skipped)
+    """
+    staged, file_hashes, skipped = [], [], []
+    max_bytes = int(UPLOAD_MAX_EXTRACTED_MB * 1024 * 1024)
+    extracted = 0
+    members = 0
+    
+    def count_member():
+        nonlocal members
+        members += 1
+        if members > UPLOAD_MAX_ARCHIVE_MEMBERS:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Upload has more than UPLOAD_MAX_ARCHIVE_MEMBERS ({UPLOAD_MAX_ARCHIVE_MEMBERS}) archive members"
+            )
+    
+    def stage(name: str, source):
+        nonlocal extracted
+        filename = _safe_filename(name)
+        if not filename.endswith(TEXT_EXTENSIONS):
+            skipped.append(name)
+            return
+        file_path = _staging_path(filename)
+        file_hashes.append(_save_upload(source, file_path, max_bytes - extracted))
+        staged.append((file_path, filename))
+        extracted += os.path.getsize(file_path)
+    
+    try:
+        for upload in files:
+            name = upload.filename or ""
+            if name.endswith(".zip"):
+                with zipfile.ZipFile(upload.file) as archive:
+                    for member in archive.infolist():
+                        if member.is_dir():
+                            continue
+                        count_member()
+                        with archive.open(member) as source:
+                            stage(member.filename, source)
+            elif name.endswith((".tar", ".tar.gz", ".tgz")):
+                with tarfile.open(fileobj=upload.file, mode="r:*") as archive:
+                    for member in archive:
+                        # Regular files only: no links or devices
+                        if not member.isfile():
+                            continue
+                        count_member()
+                        stage(member.name, archive.extractfile(member))
+            else:
+                stage(name, upload.file)
+    except Exception:
+        for file_path, _ in staged:
+            Path(file_path).unlink(missing_ok=True)
+        raise
+    
+    return staged, file_hashes, skipped
+
+
+@router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """Progress of a background ingestion job (chunks embedded / total)"""
+    job = get_ingestion_queue().get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+
 @router.get("/documents/")
 async def list_documents():
     """Get list of all documents in the vector store"""
@@ -90,8 +380,8 @@ async def list_documents():
             store = get_supabase_store()
             documents = await store.get_all_documents()
         else:
-            from src.backends import vector_store_manager
-            documents = vector_store_manager.get_all_documents()
+            from src.backends import get_vector_store_manager
+            documents = get_vector_store_manager().get_all_documents()
         
         return {
             "count": len(documents),
@@ -111,8 +401,8 @@ async def delete_document(doc_id: str):
             store = get_supabase_store()
             result = await store.delete_document(doc_id)
         else:
-            from src.backends import vector_store_manager
-            result = vector_store_manager.remove_document(doc_id)
+            from src.backends import get_vector_store_manager
+            result = await asyncio.to_thread(get_vector_store_manager().remove_document, doc_id)
         
         if result["status"] == "error":
             raise HTTPException(status_code=404, detail=result["message"])
@@ -123,6 +413,24 @@ async def delete_document(doc_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/documents/compact")
+async def compact_documents():
+    """Rewrite the local index without the vectors of deleted documents"""
+    if USE_SUPABASE:
+        return {
+            "status": "success",
+            "message": "Supabase deletes rows directly; nothing to compact",
+            "vectors_removed": 0,
+            "bytes_reclaimed": 0
+        }
+    
+    try:
+        from src.backends import get_vector_store_manager
+        return await asyncio.to_thread(get_vector_store_manager().compact)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/health")
 async def health_check():
     """Health check endpoint for Railway"""
@@ -133,6 +441,45 @@ async def health_check():
     }
 
 
+@router.get("/ready")
+async def readiness_check():
+    """Readiness check: 503 until the warm-up has built the LLM, embeddings and vector store"""
+    return JSONResponse(
+        status_code=200 if is_ready() else 503,
+        content={"ready": is_ready(), "worker_pid": os.getpid(), **warmup_status}
+    )
+
+
+@router.get("/stats")
+async def get_stats():
+    """Cache and performance counters for this worker"""
+    from src.backends import embedding_batcher
+    from src.backends.chunk_cache import get_chunk_cache
+    from src.backends.query_cache import get_query_cache
+    from src.core.answer_cache import get_answer_cache
+    
+    query_cache = get_query_cache()
+    batcher = embedding_batcher.query_embedding_batcher
+    answer_cache = get_answer_cache()
+    chunk_cache = get_chunk_cache()
+    return {
+        "backend": "Supabase" if USE_SUPABASE else "Local FAISS",
+        "worker_pid": os.getpid(),
+        "vector_store": None if USE_SUPABASE else await asyncio.to_thread(_faiss_stats),
+        "query_embedding_cache": query_cache.stats() if query_cache else None,
+        "query_embedding_batcher": batcher.stats() if batcher else None,
+        "answer_cache": answer_cache.stats() if answer_cache else None,
+        "chunk_embedding_cache": await asyncio.to_thread(chunk_cache.stats) if chunk_cache else None,
+        "ingestion": get_ingestion_queue().stats(),
+        "warmup": warmup_status
+    }
+
+
+def _faiss_stats():
+    from src.backends import get_vector_store_manager
+    return get_vector_store_manager().stats()
+
+
 @router.get("/config")
 async def get_config():
     """Get current configuration"""
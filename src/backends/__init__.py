@@ -1,7 +1,13 @@
 """
 Backend managers for vector storage
+Nothing is built at import time: the stores, their embeddings and the index are created
+on first use (or by the startup warm-up), so the API can bind its port quickly.
 """
-from .faiss_manager import vector_store_manager
+
+def get_vector_store_manager():
+    """Lazy load the local FAISS store only when needed"""
+    from .faiss_manager import get_vector_store_manager as _get_manager
+    return _get_manager()
 
 # Lazy import for Supabase to avoid requiring supabase package when not used
 def get_supabase_store():
@@ -9,4 +15,10 @@ def get_supabase_store():
     from .supabase_manager import get_supabase_store as _get_store
     return _get_store()
 
-__all__ = ["vector_store_manager", "get_supabase_store"]
+def __getattr__(name: str):
+    # Keeps `from src.backends import vector_store_manager` working without building it at import
+    if name == "vector_store_manager":
+        return get_vector_store_manager()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+__all__ = ["vector_store_manager", "get_vector_store_manager", "get_supabase_store"]
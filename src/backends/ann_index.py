@@ -0,0 +1,213 @@
+"""
+Index types for FAISS segments.
+Small segments stay exact (IndexFlatL2): they are cheap to scan and need no training. A segment
+built from enough vectors, in practice the base segment a merge rebuilds, can use an IVF, HNSW
+or IVF-PQ index instead. FAISS_INDEX_TYPE picks one, or with "auto" the type follows the
+segment's size, so the base switches type as the corpus grows past each threshold.
+Independently, FAISS_COMPRESSION stores vectors as float16, int8 (scalar quantization) or
+PQ codes. The full vectors of a compressed segment are kept in a memory-mapped file, and
+the top candidates are re-ranked against them so answers keep exact distances.
+"""
+import os
+import math
+from typing import Optional, Tuple
+
+import faiss
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq")
+COMPRESSIONS = ("none", "fp16", "int8", "pq")
+
+# Which SearchParameters class an index takes
+FAMILIES = ("flat", "ivf", "hnsw")
+
+# auto, flat, ivf, hnsw or ivfpq
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "auto").lower()
+
+# Segments smaller than this stay flat whatever FAISS_INDEX_TYPE says; with auto they get HNSW above it...
+FAISS_ANN_MIN_VECTORS = int(os.getenv("FAISS_ANN_MIN_VECTORS", "50000"))
+# ...and IVF-PQ above this, where full vectors no longer fit comfortably in memory
+FAISS_IVFPQ_MIN_VECTORS = int(os.getenv("FAISS_IVFPQ_MIN_VECTORS", "1000000"))
+
+# IVF: number of clusters (0 = 4 * sqrt(vectors)) and clusters scanned per query
+FAISS_IVF_NLIST = int(os.getenv("FAISS_IVF_NLIST", "0"))
+FAISS_IVF_NPROBE = int(os.getenv("FAISS_IVF_NPROBE", "16"))
+
+# HNSW: links per node, and candidate list sizes while building and searching
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+FAISS_HNSW_EF_CONSTRUCTION = int(os.getenv("FAISS_HNSW_EF_CONSTRUCTION", "80"))
+FAISS_HNSW_EF_SEARCH = int(os.getenv("FAISS_HNSW_EF_SEARCH", "64"))
+
+# IVF-PQ: bytes per vector (0 = one per 16 dimensions); each byte encodes one sub-vector
+FAISS_PQ_M = int(os.getenv("FAISS_PQ_M", "0"))
+PQ_NBITS = 8
+
+# none, fp16 (2 bytes per dimension), int8 (1 byte per dimension) or pq (FAISS_PQ_M bytes per vector)
+FAISS_COMPRESSION = os.getenv("FAISS_COMPRESSION", "none").lower()
+
+# Candidates per requested result re-scored with the full vectors of compressed segments (0 = off)
+FAISS_RERANK_FACTOR = int(os.getenv("FAISS_RERANK_FACTOR", "4"))
+
+# Filtered searches raise nprobe / efSearch by 1 / (fraction of chunks selected), at most this many times
+FAISS_FILTER_MAX_BOOST = int(os.getenv("FAISS_FILTER_MAX_BOOST", "16"))
+# Filters selecting at most this many chunks of an HNSW (or compressed) segment are scored exactly instead
+FAISS_FILTER_EXACT_MAX = int(os.getenv("FAISS_FILTER_EXACT_MAX", "5000"))
+
+# faiss.index_factory suffix storing vectors with each compression
+STORAGE_FACTORY = {"none": "Flat", "fp16": "SQfp16", "int8": "SQ8"}
+
+# k-means needs this many training points per centroid and gains little beyond MAX_POINTS_PER_CENTROID
+MIN_POINTS_PER_CENTROID = 39
+MAX_POINTS_PER_CENTROID = 256
+
+
+def choose_index_type(ntotal: int) -> str:
+    """Index type for a segment of ntotal vectors"""
+    if FAISS_INDEX_TYPE not in INDEX_TYPES + ("auto",):
+        raise ValueError(f"Unknown FAISS_INDEX_TYPE '{FAISS_INDEX_TYPE}'. Use auto, flat, ivf, hnsw or ivfpq.")
+    if ntotal < FAISS_ANN_MIN_VECTORS:
+        return "flat"
+    if FAISS_INDEX_TYPE == "auto":
+        kind = "ivfpq" if ntotal >= FAISS_IVFPQ_MIN_VECTORS else "hnsw"
+    else:
+        kind = FAISS_INDEX_TYPE
+    # PQ codebooks need enough points to train every one of their 256 centroids
+    if kind == "ivfpq" and not can_train_pq(ntotal):
+        return "ivf"
+    return kind
+
+
+def can_train_pq(ntotal: int) -> bool:
+    return ntotal >= MIN_POINTS_PER_CENTROID * 2 ** PQ_NBITS
+
+
+def choose_layout(ntotal: int, kind: Optional[str] = None) -> Tuple[str, str]:
+    """(index type, compression) for a segment of ntotal vectors; kind overrides the type policy"""
+    if FAISS_COMPRESSION not in COMPRESSIONS:
+        raise ValueError(f"Unknown FAISS_COMPRESSION '{FAISS_COMPRESSION}'. Use none, fp16, int8 or pq.")
+    kind = kind or choose_index_type(ntotal)
+    if kind == "ivfpq":
+        return kind, "pq"
+    compression = FAISS_COMPRESSION
+    if compression == "pq":
+        # Too few vectors to train PQ (small upload segments): scalar quantization needs no real training
+        if not can_train_pq(ntotal):
+            return kind, "int8"
+        if kind == "ivf":
+            return "ivfpq", "pq"
+    return kind, compression
+
+
+def _unwrap(index: faiss.Index) -> faiss.Index:
+    return faiss.downcast_index(index.index if isinstance(index, faiss.IndexIDMap2) else index)
+
+
+def _storage_compression(storage: faiss.Index) -> str:
+    storage = faiss.downcast_index(storage)
+    if isinstance(storage, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return "pq"
+    if isinstance(storage, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return "fp16" if storage.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "int8"
+    return "none"
+
+
+def describe_index(index: faiss.Index) -> Tuple[str, str]:
+    """(index type, compression) of an index, looking through the IndexIDMap2 wrapper"""
+    inner = _unwrap(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw", _storage_compression(inner.storage)
+    if isinstance(inner, faiss.IndexIVFPQ):
+        # A single-list IVF-PQ is how flat PQ is stored (IndexPQ cannot filter by id)
+        return ("flat" if inner.nlist == 1 else "ivfpq"), "pq"
+    if isinstance(inner, faiss.IndexIVF):
+        return "ivf", _storage_compression(inner)
+    return "flat", _storage_compression(inner)
+
+
+def index_family(index: faiss.Index) -> str:
+    """Which SearchParameters class the index takes"""
+    inner = _unwrap(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexIVF):
+        return "ivf"
+    return "flat"
+
+
+def ivf_nlist(ntotal: int) -> int:
+    nlist = FAISS_IVF_NLIST or int(4 * math.sqrt(ntotal))
+    return max(1, min(nlist, ntotal // MIN_POINTS_PER_CENTROID))
+
+
+def pq_m(dimension: int) -> int:
+    """Largest sub-quantizer count not above the configured one that divides the dimension"""
+    m = min(FAISS_PQ_M or max(1, dimension // 16), dimension)
+    while dimension % m:
+        m -= 1
+    return m
+
+
+def build_index(kind: str, dimension: int, vectors, compression: str = "none") -> faiss.Index:
+    """
+    Empty index of the given type and compression, trained on vectors when it needs it
+    vectors is an array, or any sequence read by sorted row positions (len() and
+    vectors[rows]), so that only the training sample is loaded.
+    """
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{kind}'. Use flat, ivf, hnsw or ivfpq.")
+    if kind == "ivfpq":
+        compression = "pq"
+    pq = f"PQ{pq_m(dimension)}x{PQ_NBITS}"
+    nlist = 1
+    if kind == "hnsw":
+        factory = f"HNSW{FAISS_HNSW_M},{STORAGE_FACTORY.get(compression, pq)}"
+    elif kind == "flat" and compression != "pq":
+        factory = STORAGE_FACTORY[compression]
+    else:
+        # Flat PQ is a single-list IVF-PQ: every code is scanned, and id filters work
+        nlist = 1 if kind == "flat" else ivf_nlist(len(vectors))
+        factory = f"IVF{nlist},{STORAGE_FACTORY.get(compression, pq)}"
+    index = faiss.index_factory(dimension, factory, faiss.METRIC_L2)
+    if kind == "hnsw":
+        index.hnsw.efConstruction = FAISS_HNSW_EF_CONSTRUCTION
+    if index.is_trained:
+        return index
+    
+    # A random sample trains as well as the full set at a fraction of the cost
+    sample_size = max(nlist, 2 ** PQ_NBITS if compression == "pq" else 0) * MAX_POINTS_PER_CENTROID
+    if len(vectors) > sample_size:
+        rows = np.sort(np.random.default_rng(0).choice(len(vectors), sample_size, replace=False))
+        vectors = vectors[rows]
+    elif not isinstance(vectors, np.ndarray):
+        vectors = vectors[np.arange(len(vectors))]
+    index.train(np.ascontiguousarray(vectors, dtype="float32"))
+    return index
+
+
+def search_parameters(
+    family: str,
+    selector: Optional[faiss.IDSelector] = None,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None
+) -> Optional[faiss.SearchParameters]:
+    """Per-query settings for an index family, with an optional id filter (overrides are for benchmarking)"""
+    options = {"sel": selector} if selector is not None else {}
+    if family == "hnsw":
+        return faiss.SearchParametersHNSW(efSearch=ef_search or FAISS_HNSW_EF_SEARCH, **options)
+    if family == "ivf":
+        return faiss.SearchParametersIVF(nprobe=nprobe or FAISS_IVF_NPROBE, **options)
+    return faiss.SearchParameters(**options) if options else None
+
+
+def filtered_search_parameters(family: str, selector: faiss.IDSelector, selectivity: float) -> Optional[faiss.SearchParameters]:
+    """
+    Search parameters restricted to selector, which keeps `selectivity` of the chunks
+    IVF lists and HNSW neighbourhoods hold proportionally fewer selected vectors, so the
+    search widens to still find k of them.
+    """
+    boost = min(FAISS_FILTER_MAX_BOOST, max(1, math.ceil(1 / max(selectivity, 1e-9))))
+    return search_parameters(family, selector, nprobe=FAISS_IVF_NPROBE * boost, ef_search=FAISS_HNSW_EF_SEARCH * boost)
@@ -0,0 +1,167 @@
+"""
+Persistent, content-addressed cache of chunk embeddings.
+Chunks are keyed by hash(embedding model + dimensions + chunk text), so rebuilding the
+FAISS store, switching backends or re-uploading an edited file only embeds chunks whose
+text actually changed. Entries live in SQLite and the least recently used ones are
+evicted once the cache grows past its size limit.
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from typing import Optional, List, Dict, Any, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+CHUNK_CACHE_PATH = os.getenv("CHUNK_CACHE_PATH", "chunk_embeddings.db")
+CHUNK_CACHE_MAX_MB = float(os.getenv("CHUNK_CACHE_MAX_MB", "1024"))
+
+# Eviction frees space down to this fraction of the limit so it does not run on every insert
+EVICTION_TARGET = 0.9
+
+
+class ChunkEmbeddingCache:
+    """SQLite store of chunk embeddings with size-based LRU eviction"""
+    
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+        # Shared by every gunicorn worker on the machine, hence WAL and a busy timeout
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_embeddings ("
+            "key TEXT PRIMARY KEY, embedding BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS chunk_embeddings_last_used ON chunk_embeddings (last_used)")
+        self._db.commit()
+        self._size_estimate = self._total_bytes()
+    
+    @staticmethod
+    def make_key(text: str, model: str) -> str:
+        """Cache key from the exact chunk text and the embedding model (with dimensions)"""
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+    
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Return the cached embeddings for whichever keys are present"""
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            try:
+                # Stay well below SQLite's bound-parameter limit
+                for start in range(0, len(unique), 500):
+                    batch = unique[start:start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self._db.execute(
+                        f"SELECT key, embedding FROM chunk_embeddings WHERE key IN ({placeholders})", batch
+                    ).fetchall()
+                    for key, blob in rows:
+                        found[key] = array("f", blob).tolist()
+                
+                if found:
+                    now = time.time()
+                    self._db.executemany(
+                        "UPDATE chunk_embeddings SET last_used = ? WHERE key = ?",
+                        [(now, key) for key in found]
+                    )
+                    self._db.commit()
+            except sqlite3.Error as e:
+                # The cache is best effort; a busy database just means embedding again
+                print(f"Chunk cache read failed: {e}")
+            
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+    
+    def put_many(self, items: List[Tuple[str, List[float]]]):
+        """Store embeddings and evict the least recently used ones if over the limit"""
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, embedding in items:
+            blob = array("f", embedding).tobytes()
+            rows.append((key, blob, len(blob), now))
+        
+        with self._lock:
+            try:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO chunk_embeddings (key, embedding, size, last_used) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+                self._db.commit()
+                self._size_estimate += sum(row[2] for row in rows)
+                if self._size_estimate > self.max_bytes:
+                    self._evict()
+            except sqlite3.Error as e:
+                print(f"Chunk cache write failed: {e}")
+    
+    def _total_bytes(self) -> int:
+        return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM chunk_embeddings").fetchone()[0]
+    
+    def _evict(self):
+        """Delete least recently used rows until the cache is back under EVICTION_TARGET"""
+        # Other workers write to the same file, so recount before deleting anything
+        total = self._total_bytes()
+        target = self.max_bytes * EVICTION_TARGET
+        if total > self.max_bytes:
+            cursor = self._db.execute("SELECT key, size FROM chunk_embeddings ORDER BY last_used")
+            doomed = []
+            for key, size in cursor:
+                if total <= target:
+                    break
+                doomed.append((key,))
+                total -= size
+            cursor.close()
+            self._db.executemany("DELETE FROM chunk_embeddings WHERE key = ?", doomed)
+            self._db.commit()
+            self.evictions += len(doomed)
+        self._size_estimate = total
+    
+    def clear(self):
+        """Drop every cached embedding"""
+        with self._lock:
+            self._db.execute("DELETE FROM chunk_embeddings")
+            self._db.commit()
+            self._size_estimate = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and disk usage for monitoring"""
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM chunk_embeddings").fetchone()[0]
+            size = self._total_bytes()
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "entries": entries,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+# Global instance shared by both backends (created on first use)
+chunk_embedding_cache: Optional[ChunkEmbeddingCache] = None
+
+def get_chunk_cache() -> Optional[ChunkEmbeddingCache]:
+    """Get or create the process-wide chunk embedding cache (None when disabled)"""
+    global chunk_embedding_cache
+    if chunk_embedding_cache is None and CHUNK_CACHE_PATH and CHUNK_CACHE_MAX_MB > 0:
+        chunk_embedding_cache = ChunkEmbeddingCache(
+            path=CHUNK_CACHE_PATH,
+            max_bytes=int(CHUNK_CACHE_MAX_MB * 1024 * 1024)
+        )
+    return chunk_embedding_cache
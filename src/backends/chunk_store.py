@@ -0,0 +1,188 @@
+"""
+Chunk text store for the local FAISS backend.
+Chunk texts and metadata live in SQLite keyed by the chunk's FAISS id instead of a pickled
+dict per segment, so a worker only reads the k rows a search returns rather than holding
+every chunk of the corpus in its own heap. SQLite reads go through mmap, so the pages that
+are read are shared by every gunicorn worker through the OS page cache.
+An FTS5 index over the same texts answers BM25 keyword searches; triggers keep it in step
+with the chunks table, so it is updated by every insert and by the deletes of a merge.
+"""
+import os
+import re
+import json
+import sqlite3
+import threading
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Bytes of the database file SQLite may read through mmap (shared page cache)
+CHUNK_STORE_MMAP_BYTES = int(float(os.getenv("CHUNK_STORE_MMAP_MB", "1024")) * 1024 * 1024)
+
+# Stay well below SQLite's bound-parameter limit
+QUERY_BATCH_SIZE = 500
+
+# Longer questions only add OR branches that barely change the ranking
+MAX_KEYWORD_TERMS = 32
+
+# Words in more than this fraction of chunks have a BM25 weight of about zero but make the
+# search score nearly every chunk ("what", "the"), so they are left out of the query
+MAX_TERM_DOC_FRACTION = 0.5
+
+# Below this many chunks every query is cheap and a word in half of them can still be the one
+# that matters (a corpus of two chunks), so the cutoff only applies to larger stores
+MIN_CHUNKS_FOR_TERM_CUTOFF = 1000
+
+# External-content FTS5 table: postings only, the texts stay in chunks
+KEYWORD_INDEX_SCHEMA = (
+    "CREATE VIRTUAL TABLE chunks_fts USING fts5(text, content='chunks', content_rowid='chunk_id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER chunks_fts_insert AFTER INSERT ON chunks BEGIN "
+    "INSERT INTO chunks_fts (rowid, text) VALUES (new.chunk_id, new.text); END",
+    "CREATE TRIGGER chunks_fts_delete AFTER DELETE ON chunks BEGIN "
+    "INSERT INTO chunks_fts (chunks_fts, rowid, text) VALUES ('delete', old.chunk_id, old.text); END",
+    "CREATE TRIGGER chunks_fts_update AFTER UPDATE ON chunks BEGIN "
+    "INSERT INTO chunks_fts (chunks_fts, rowid, text) VALUES ('delete', old.chunk_id, old.text); "
+    "INSERT INTO chunks_fts (rowid, text) VALUES (new.chunk_id, new.text); END",
+    # Document frequency per term
+    "CREATE VIRTUAL TABLE chunks_fts_terms USING fts5vocab(chunks_fts, 'row')"
+)
+
+
+def keyword_terms(text: str) -> List[str]:
+    return list(dict.fromkeys(re.findall(r"\w+", text.lower())))[:MAX_KEYWORD_TERMS]
+
+
+def keyword_query(terms: List[str]) -> str:
+    """FTS5 query matching any of the terms (quoted, so user input is never parsed as syntax)"""
+    return " OR ".join(f'"{term}"' for term in terms)
+
+
+class ChunkStore:
+    """SQLite table of chunk id -> (text, metadata)"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        # Every gunicorn worker opens the same file, hence WAL and a busy timeout
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(f"PRAGMA mmap_size={CHUNK_STORE_MMAP_BYTES}")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "chunk_id INTEGER PRIMARY KEY, text TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        self._db.commit()
+        self._create_keyword_index()
+    
+    def _create_keyword_index(self):
+        """Create the FTS5 index on first open, indexing texts stored by older versions"""
+        with self._db:
+            # IMMEDIATE: only one worker creates it when several start on the same file
+            self._db.execute("BEGIN IMMEDIATE")
+            exists = self._db.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chunks_fts'"
+            ).fetchone()
+            if exists:
+                return
+            for statement in KEYWORD_INDEX_SCHEMA:
+                self._db.execute(statement)
+            self._db.execute("INSERT INTO chunks_fts (chunks_fts) VALUES ('rebuild')")
+    
+    def add_many(self, chunks: Iterable[Tuple[int, str, Dict[str, Any]]]):
+        """
+        Insert (chunk id, text, metadata) rows in one transaction
+        Ids left behind by a commit that never reached the manifest are reused, hence the
+        upsert (REPLACE would skip the delete trigger and leave stale keyword postings).
+        """
+        rows = [(int(chunk_id), text, json.dumps(metadata, default=str)) for chunk_id, text, metadata in chunks]
+        with self._lock:
+            with self._db:
+                self._db.executemany(
+                    "INSERT INTO chunks (chunk_id, text, metadata) VALUES (?, ?, ?) "
+                    "ON CONFLICT (chunk_id) DO UPDATE SET text = excluded.text, metadata = excluded.metadata",
+                    rows
+                )
+    
+    def get_many(self, chunk_ids: List[int]) -> Dict[int, Tuple[str, Dict[str, Any]]]:
+        """(text, metadata) for whichever ids are present"""
+        found: Dict[int, Tuple[str, Dict[str, Any]]] = {}
+        unique = list(dict.fromkeys(int(chunk_id) for chunk_id in chunk_ids))
+        with self._lock:
+            for start in range(0, len(unique), QUERY_BATCH_SIZE):
+                batch = unique[start:start + QUERY_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._db.execute(
+                    f"SELECT chunk_id, text, metadata FROM chunks WHERE chunk_id IN ({placeholders})", batch
+                ).fetchall()
+                for chunk_id, text, metadata in rows:
+                    found[chunk_id] = (text, json.loads(metadata))
+        return found
+    
+    def search_keywords(
+        self,
+        text: str,
+        limit: int,
+        below_id: Optional[int] = None,
+        id_ranges: Optional[List[Tuple[int, int]]] = None,
+        total: int = 0
+    ) -> List[int]:
+        """
+        Chunk ids ranked by BM25 for any word of text, best first
+        below_id leaves out chunks of commits the caller's manifest does not list yet;
+        id_ranges, (first id, count) pairs, restricts the search to those chunks.
+        total is the number of chunks the caller's manifest lists (counting the table on
+        every query would scan it): words in most of them are dropped once it reaches
+        MIN_CHUNKS_FOR_TERM_CUTOFF.
+        """
+        terms = keyword_terms(text)
+        if not terms or limit <= 0:
+            return []
+        with self._lock:
+            if total >= MIN_CHUNKS_FOR_TERM_CUTOFF:
+                placeholders = ",".join("?" * len(terms))
+                frequent = {
+                    term
+                    for term, documents in self._db.execute(
+                        f"SELECT term, doc FROM chunks_fts_terms WHERE term IN ({placeholders})", terms
+                    )
+                    if documents > total * MAX_TERM_DOC_FRACTION
+                }
+                terms = [term for term in terms if term not in frequent]
+                if not terms:
+                    return []
+            
+            sql = "SELECT rowid FROM chunks_fts WHERE chunks_fts MATCH ?"
+            params: List[Any] = [keyword_query(terms)]
+            if below_id is not None:
+                sql += " AND rowid < ?"
+                params.append(int(below_id))
+            if id_ranges is not None:
+                sql += (
+                    " AND EXISTS (SELECT 1 FROM json_each(?) AS r WHERE chunks_fts.rowid >= json_extract(r.value, '$[0]')"
+                    " AND chunks_fts.rowid < json_extract(r.value, '$[0]') + json_extract(r.value, '$[1]'))"
+                )
+                params.append(json.dumps([[int(start), int(count)] for start, count in id_ranges]))
+            rows = self._db.execute(f"{sql} ORDER BY rank LIMIT ?", params + [int(limit)]).fetchall()
+        return [row[0] for row in rows]
+    
+    def delete_many(self, chunk_ids: Iterable[int]) -> int:
+        """Drop the rows of merged-away chunks; returns the number deleted"""
+        rows = [(int(chunk_id),) for chunk_id in chunk_ids]
+        with self._lock:
+            with self._db:
+                cursor = self._db.executemany("DELETE FROM chunks WHERE chunk_id = ?", rows)
+        return cursor.rowcount
+    
+    def size_bytes(self) -> int:
+        return sum(
+            os.path.getsize(f"{self.path}{suffix}")
+            for suffix in ("", "-wal")
+            if os.path.exists(f"{self.path}{suffix}")
+        )
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
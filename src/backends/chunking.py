@@ -0,0 +1,324 @@
+"""
+Document chunking
+Three strategies, chosen per upload (or by the CHUNK_* defaults):
+  - character: chunks of up to chunk_size characters, cut at paragraph, line, word and
+    finally character boundaries, neighbours sharing chunk_overlap characters
+  - token: the same boundaries, with sizes counted in tokens of CHUNK_TOKEN_ENCODING
+    (the embedding model's tokenizer), so chunks fill the model's input predictably
+  - markdown: the text is first cut into sections at headings (# to ######, outside code
+    fences) and each section is chunked by characters; chunks carry their heading path in
+    metadata["headings"] and never span two sections
+RecursiveSplitter follows RecursiveCharacterTextSplitter's algorithm and returns the same
+chunks, but measures every piece once per level (token counts in one batch), merges by
+index instead of copying lists and tracks where each chunk starts.
+Everything here is plain functions of picklable arguments, so bulk uploads can chunk in a
+process pool (CHUNKING_PROCESSES).
+"""
+import os
+import re
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import accumulate
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+STRATEGIES = ("character", "token", "markdown")
+
+# Defaults for uploads that don't choose their own settings
+CHUNK_STRATEGY = os.getenv("CHUNK_STRATEGY", "character")
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "200"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "20"))
+
+# Tokenizer counting chunk sizes for the token strategy (tiktoken encoding name)
+CHUNK_TOKEN_ENCODING = os.getenv("CHUNK_TOKEN_ENCODING", "cl100k_base")
+
+# Processes chunking the files of a bulk upload in parallel (0 chunks in a thread of the worker)
+CHUNKING_PROCESSES = int(os.getenv("CHUNKING_PROCESSES", "0"))
+
+# Separators tried in order, coarsest first (RecursiveCharacterTextSplitter's defaults)
+SEPARATORS = ["\n\n", "\n", " ", ""]
+
+# A heading line, or a line opening or closing a code fence (headings inside fences don't count)
+MARKDOWN_LINE = re.compile(
+    r"^ {0,3}(?:(?P<fence>```|~~~)|(?P<hashes>#{1,6})[ \t]+(?P<title>[^\n]*?)(?:[ \t]+#+)?[ \t]*$)",
+    re.MULTILINE
+)
+
+# A chunk: (text, metadata)
+Chunk = Tuple[str, Dict[str, Any]]
+
+
+def chunking_settings(
+    strategy: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+    chunk_overlap: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Complete, validated chunking settings; anything not given comes from the CHUNK_* defaults
+    Raises ValueError for an unknown strategy or sizes the splitter cannot honour
+    """
+    settings = {
+        "strategy": strategy or CHUNK_STRATEGY,
+        "chunk_size": chunk_size if chunk_size is not None else CHUNK_SIZE,
+        "chunk_overlap": chunk_overlap if chunk_overlap is not None else CHUNK_OVERLAP
+    }
+    if settings["strategy"] not in STRATEGIES:
+        raise ValueError(f"Unknown chunking strategy '{settings['strategy']}'. Use {', '.join(STRATEGIES)}.")
+    if settings["chunk_size"] <= 0:
+        raise ValueError(f"chunk_size must be positive, got {settings['chunk_size']}")
+    if not 0 <= settings["chunk_overlap"] < settings["chunk_size"]:
+        raise ValueError(
+            f"chunk_overlap must be at least 0 and below chunk_size ({settings['chunk_size']}), got {settings['chunk_overlap']}"
+        )
+    return settings
+
+
+def _character_lengths(pieces: List[str]) -> List[int]:
+    return [len(piece) for piece in pieces]
+
+
+_token_lengths_by_encoding: Dict[str, Callable[[List[str]], List[int]]] = {}
+
+
+def token_lengths(encoding_name: str = CHUNK_TOKEN_ENCODING) -> Callable[[List[str]], List[int]]:
+    """Token counts of a list of pieces, encoded in one batch (special tokens count as text)"""
+    if encoding_name not in _token_lengths_by_encoding:
+        import tiktoken
+        encoding = tiktoken.get_encoding(encoding_name)
+        
+        def lengths(pieces: List[str]) -> List[int]:
+            # One thread: the pieces are short and a worker may share its CPU with others
+            return [len(tokens) for tokens in encoding.encode_ordinary_batch(pieces, num_threads=1)]
+        _token_lengths_by_encoding[encoding_name] = lengths
+    return _token_lengths_by_encoding[encoding_name]
+
+
+def _pieces(text: str, separator: str) -> List[str]:
+    """text cut before every separator, which stays at the start of the piece it opens"""
+    if not separator:
+        return list(text)
+    parts = text.split(separator)
+    pieces = [separator + part for part in parts[1:]]
+    if parts[0]:
+        pieces.insert(0, parts[0])
+    return pieces
+
+
+class RecursiveSplitter:
+    """
+    RecursiveCharacterTextSplitter (separators kept at the start of pieces, chunks stripped)
+    Text is cut at the coarsest separator it contains; pieces shorter than chunk_size are
+    merged into chunks sharing up to chunk_overlap, longer ones are cut again at the next
+    separator. lengths measures a list of pieces at once.
+    """
+    
+    def __init__(
+        self,
+        chunk_size: int,
+        chunk_overlap: int,
+        lengths: Callable[[List[str]], List[int]] = _character_lengths,
+        separators: Optional[List[str]] = None
+    ):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.lengths = lengths
+        self.separators = separators or SEPARATORS
+    
+    def split(self, text: str) -> List[str]:
+        return [chunk for chunk, _ in self.split_with_offsets(text)]
+    
+    def split_with_offsets(self, text: str) -> List[Tuple[str, int]]:
+        """(chunk, offset in text of its first piece, before whitespace is stripped)"""
+        return self._split(text, self.separators, 0)
+    
+    def _split(self, text: str, separators: List[str], offset: int) -> List[Tuple[str, int]]:
+        separator = separators[-1]
+        finer: List[str] = []
+        for i, candidate in enumerate(separators):
+            if not candidate:
+                separator = candidate
+                break
+            if candidate in text:
+                separator = candidate
+                finer = separators[i + 1:]
+                break
+        
+        pieces = _pieces(text, separator)
+        lengths = self.lengths(pieces)
+        offsets = list(accumulate((len(piece) for piece in pieces), initial=offset))
+        chunks: List[Tuple[str, int]] = []
+        run_start = None
+        for i, length in enumerate(lengths):
+            if length < self.chunk_size:
+                if run_start is None:
+                    run_start = i
+                continue
+            if run_start is not None:
+                chunks.extend(self._merge(pieces, lengths, offsets, run_start, i))
+                run_start = None
+            if finer:
+                chunks.extend(self._split(pieces[i], finer, offsets[i]))
+            else:
+                chunks.append((pieces[i], offsets[i]))
+        if run_start is not None:
+            chunks.extend(self._merge(pieces, lengths, offsets, run_start, len(pieces)))
+        return chunks
+    
+    def _merge(self, pieces: List[str], lengths: List[int], offsets: List[int], begin: int, end: int) -> List[Tuple[str, int]]:
+        """Pack pieces[begin:end] into chunks; a chunk starts over with its predecessor's last pieces"""
+        chunks: List[Tuple[str, int]] = []
+        start = begin
+        total = 0
+        for i in range(begin, end):
+            length = lengths[i]
+            if total + length > self.chunk_size and i > start:
+                chunk = "".join(pieces[start:i]).strip()
+                if chunk:
+                    chunks.append((chunk, offsets[start]))
+                while total > self.chunk_overlap or (total + length > self.chunk_size and total > 0):
+                    total -= lengths[start]
+                    start += 1
+            total += length
+        chunk = "".join(pieces[start:end]).strip()
+        if chunk:
+            chunks.append((chunk, offsets[start]))
+        return chunks
+
+
+def make_splitter(settings: Dict[str, Any]) -> RecursiveSplitter:
+    """The splitter for chunking settings (markdown sections are chunked by characters)"""
+    lengths = token_lengths() if settings["strategy"] == "token" else _character_lengths
+    return RecursiveSplitter(settings["chunk_size"], settings["chunk_overlap"], lengths)
+
+
+class MarkdownScanner:
+    """
+    Finds the sections of markdown text fed to it in any number of pieces
+    feed() returns ("text", text) and ("section", heading path) events in order; a section
+    event comes before the heading line that opens it. Only complete lines are scanned, so
+    a heading cut in two by a block boundary is still found; close() flushes the last line.
+    """
+    
+    def __init__(self):
+        self._carry = ""
+        self._fence: Optional[str] = None
+        self._headings: List[Tuple[int, str]] = []
+    
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        text = self._carry + text
+        complete = text.rfind("\n") + 1
+        self._carry = text[complete:]
+        return self._scan(text[:complete])
+    
+    def close(self) -> List[Tuple[str, Any]]:
+        text, self._carry = self._carry, ""
+        return self._scan(text)
+    
+    def _scan(self, text: str) -> List[Tuple[str, Any]]:
+        events: List[Tuple[str, Any]] = []
+        start = 0
+        for match in MARKDOWN_LINE.finditer(text):
+            fence = match.group("fence")
+            if fence:
+                if self._fence is None:
+                    self._fence = fence
+                elif fence == self._fence:
+                    self._fence = None
+                continue
+            if self._fence is not None:
+                continue
+            if match.start() > start:
+                events.append(("text", text[start:match.start()]))
+            level = len(match.group("hashes"))
+            self._headings = [heading for heading in self._headings if heading[0] < level] + [(level, match.group("title"))]
+            events.append(("section", [title for _, title in self._headings]))
+            start = match.start()
+        if start < len(text):
+            events.append(("text", text[start:]))
+        return events
+
+
+def section_metadata(headings: Optional[List[str]]) -> Dict[str, Any]:
+    return {"headings": headings} if headings else {}
+
+
+def split_text(text: str, settings: Optional[Dict[str, Any]] = None) -> List[Chunk]:
+    """Chunks of a whole text as (text, metadata)"""
+    settings = settings or chunking_settings()
+    splitter = make_splitter(settings)
+    if settings["strategy"] != "markdown":
+        return [(chunk, {}) for chunk in splitter.split(text)]
+    
+    scanner = MarkdownScanner()
+    chunks: List[Chunk] = []
+    metadata: Dict[str, Any] = {}
+    section: List[str] = []
+    for kind, value in scanner.feed(text) + scanner.close() + [("section", None)]:
+        if kind == "text":
+            section.append(value)
+            continue
+        chunks.extend((chunk, metadata) for chunk in splitter.split("".join(section)))
+        section = []
+        metadata = section_metadata(value)
+    return chunks
+
+
+def split_file(file_path: str, settings: Optional[Dict[str, Any]] = None) -> List[Chunk]:
+    """Chunks of a UTF-8 text file"""
+    with open(file_path, "r", encoding="utf-8") as f:
+        return split_text(f.read(), settings)
+
+
+def split_content(content: bytes, settings: Optional[Dict[str, Any]] = None) -> List[Chunk]:
+    """Chunks of UTF-8 encoded text"""
+    return split_text(content.decode("utf-8"), settings)
+
+
+# Global instance (created on first use)
+chunking_pool: Optional[ProcessPoolExecutor] = None
+_chunking_pool_lock = threading.Lock()
+
+def get_chunking_pool() -> Optional[ProcessPoolExecutor]:
+    """The process pool for bulk chunking, or None when CHUNKING_PROCESSES is 0"""
+    global chunking_pool
+    if CHUNKING_PROCESSES <= 0:
+        return None
+    if chunking_pool is None:
+        with _chunking_pool_lock:
+            if chunking_pool is None:
+                import multiprocessing
+                # Spawned, not forked: a worker has threads (FAISS, the event loop) a fork would copy mid-flight
+                chunking_pool = ProcessPoolExecutor(CHUNKING_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+    return chunking_pool
+
+
+def shutdown_chunking_pool():
+    """Stop the chunking processes, if this worker started them"""
+    global chunking_pool
+    if chunking_pool is not None:
+        chunking_pool.shutdown(cancel_futures=True)
+        chunking_pool = None
+
+
+async def achunk_many(function: Callable[[Any, Dict[str, Any]], List[Chunk]], items: Iterable[Any], settings: Dict[str, Any]) -> List[List[Chunk]]:
+    """
+    function (split_file or split_content) applied to every item, off the event loop
+    With CHUNKING_PROCESSES the items are chunked in parallel processes, otherwise one
+    after another in a thread.
+    """
+    items = list(items)
+    pool = get_chunking_pool()
+    if pool is None or len(items) < 2:
+        return await asyncio.to_thread(lambda: [function(item, settings) for item in items])
+    loop = asyncio.get_running_loop()
+    try:
+        return list(await asyncio.gather(*(loop.run_in_executor(pool, function, item, settings) for item in items)))
+    except BrokenProcessPool:
+        # A chunking process died (out of memory?); the next bulk upload gets a new pool
+        shutdown_chunking_pool()
+        raise
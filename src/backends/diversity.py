@@ -0,0 +1,62 @@
+"""
+Maximal marginal relevance (MMR): diversity re-ranking of retrieved candidates.
+Chunks overlap and documents repeat themselves, so the nearest chunks are often near
+copies of each other and fill the small context window with the same sentence twice.
+MMR fetches more candidates than needed and picks them one at a time, each time taking the
+candidate with the best lambda * relevance - (1 - lambda) * (highest similarity to a chunk
+already picked). Both backends re-rank here, with the candidates' stored vectors
+(ChunkIndex reads them from the segments; Supabase returns them from the search RPC).
+"""
+import os
+from typing import List, Optional, Sequence
+from dotenv import load_dotenv
+
+import numpy as np
+
+# Load environment variables
+load_dotenv()
+
+# Re-rank retrieved chunks for diversity before they reach the prompt
+MMR_SEARCH = os.getenv("MMR_SEARCH", "false").lower() == "true"
+
+# Candidates fetched and re-ranked per search
+MMR_CANDIDATES = int(os.getenv("MMR_CANDIDATES", "20"))
+
+# Trade-off between relevance (1.0: plain similarity order) and diversity (0.0)
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.5"))
+
+
+def maximal_marginal_relevance(
+    query_embedding: Sequence[float],
+    candidates: np.ndarray,
+    k: int,
+    lambda_mult: float = MMR_LAMBDA,
+    relevance: Optional[np.ndarray] = None
+) -> List[int]:
+    """
+    Positions of the k candidates (rows of an n x d matrix) picked by MMR, in pick order
+    relevance defaults to cosine similarity to the query; pass other scores (e.g. fused
+    ranks scaled to [0, 1]) to keep that ordering as the relevance term. Similarities
+    between candidates are cosine. Each pick costs one matrix-vector product over the
+    candidates, so nothing loops over pairs in Python.
+    """
+    vectors = np.asarray(candidates, dtype="float32")
+    count = min(k, len(vectors))
+    if count <= 0:
+        return []
+    normalized = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    if relevance is None:
+        query = np.asarray(query_embedding, dtype="float32")
+        relevance = normalized @ (query / max(float(np.linalg.norm(query)), 1e-12))
+    relevance = np.asarray(relevance, dtype="float32")
+    
+    picked = [int(np.argmax(relevance))]
+    # Highest similarity of every candidate to the ones picked so far
+    redundancy = normalized @ normalized[picked[0]]
+    for _ in range(count - 1):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[picked] = -np.inf
+        best = int(np.argmax(scores))
+        picked.append(best)
+        np.maximum(redundancy, normalized @ normalized[best], out=redundancy)
+    return picked
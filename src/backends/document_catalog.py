@@ -0,0 +1,114 @@
+"""
+Document catalog for the local FAISS backend.
+Keeps one row per document in SQLite with a unique index on the content hash, so the
+duplicate check on upload is a single indexed lookup and adding or removing a document
+writes one row instead of rewriting a JSON file that grows with the corpus.
+"""
+import os
+import json
+import sqlite3
+import threading
+from typing import Optional, List, Dict, Any, Iterable
+
+COLUMNS = ("document_id", "original_filename", "file_hash", "file_path", "chunk_count", "added_at")
+
+
+class DocumentCatalog:
+    """SQLite table of indexed documents, looked up by id or by file hash"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "document_id TEXT PRIMARY KEY, original_filename TEXT, file_hash TEXT NOT NULL, "
+            "file_path TEXT, chunk_count INTEGER, added_at TEXT)"
+        )
+        self._db.execute("CREATE UNIQUE INDEX IF NOT EXISTS documents_file_hash ON documents (file_hash)")
+        self._db.commit()
+    
+    def import_json(self, json_path: str) -> int:
+        """
+        Load a vector_store_metadata.json written by older versions, once
+        The file is kept with a .migrated suffix. Returns the number of documents imported.
+        """
+        if not os.path.exists(json_path):
+            return 0
+        with open(json_path, "r") as f:
+            metadata = json.load(f)
+        self.add_many(metadata.values())
+        os.replace(json_path, f"{json_path}.migrated")
+        return len(metadata)
+    
+    def _row_to_entry(self, row) -> Dict[str, Any]:
+        return dict(zip(COLUMNS, row))
+    
+    def find_by_hash(self, file_hash: str) -> Optional[str]:
+        """Document id stored for a content hash, or None"""
+        with self._lock:
+            row = self._db.execute("SELECT document_id FROM documents WHERE file_hash = ?", (file_hash,)).fetchone()
+        return row[0] if row else None
+    
+    def get(self, document_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM documents WHERE document_id = ?", (document_id,)
+            ).fetchone()
+        return self._row_to_entry(row) if row else None
+    
+    def __contains__(self, document_id: str) -> bool:
+        return self.get(document_id) is not None
+    
+    def add_many(self, entries: Iterable[Dict[str, Any]]):
+        """Insert documents in one transaction"""
+        with self._lock:
+            with self._db:
+                self._db.executemany(
+                    f"INSERT OR REPLACE INTO documents ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                    [tuple(entry.get(column) for column in COLUMNS) for entry in entries]
+                )
+    
+    def remove(self, document_id: str) -> bool:
+        with self._lock:
+            with self._db:
+                cursor = self._db.execute("DELETE FROM documents WHERE document_id = ?", (document_id,))
+        return cursor.rowcount > 0
+    
+    def all(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute(f"SELECT {', '.join(COLUMNS)} FROM documents ORDER BY rowid").fetchall()
+        return [self._row_to_entry(row) for row in rows]
+    
+    def find_ids(
+        self,
+        document_ids: Optional[List[str]] = None,
+        filenames: Optional[List[str]] = None,
+        added_after: Optional[float] = None,
+        added_before: Optional[float] = None
+    ) -> List[str]:
+        """Ids of the documents matching every given filter (a list matches any of its values)"""
+        clauses, params = [], []
+        for column, values in (("document_id", document_ids), ("original_filename", filenames)):
+            if values is not None:
+                clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+        # added_at holds the upload's file mtime in epoch seconds
+        if added_after is not None:
+            clauses.append("CAST(added_at AS REAL) >= ?")
+            params.append(added_after)
+        if added_before is not None:
+            clauses.append("CAST(added_at AS REAL) < ?")
+            params.append(added_before)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            return [row[0] for row in self._db.execute(f"SELECT document_id FROM documents{where}", params)]
+    
+    def ids(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT document_id FROM documents")]
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
@@ -0,0 +1,155 @@
+"""
+Micro-batching of concurrent query embeddings.
+Queries that arrive within a few milliseconds of each other are sent to the
+embeddings API in a single embed_documents call and the vectors are fanned back
+out to the waiting requests. Off by default: every query waits up to
+EMBEDDING_BATCH_WAIT_MS for company, which only pays off under many concurrent queries.
+"""
+import os
+import time
+import asyncio
+from functools import partial
+from typing import Optional, List, Dict, Any, Set, Tuple
+from dotenv import load_dotenv
+
+from langchain_core.embeddings import Embeddings
+
+# Load environment variables
+load_dotenv()
+
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "64"))
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "0"))
+
+
+class QueryEmbeddingBatcher:
+    """Coalesces concurrent aembed_query calls into batched aembed_documents calls"""
+    
+    def __init__(self, embeddings: Embeddings, max_batch_size: int = 64, max_wait_ms: float = 5):
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: List[Tuple[str, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # The event loop only keeps weak references to tasks
+        self._batches: Set[asyncio.Future] = set()
+        
+        # Metrics
+        self.batches = 0
+        self.queries = 0
+        self.max_observed_batch = 0
+        self.total_wait = 0.0
+        self.total_call_time = 0.0
+    
+    async def embed(self, text: str) -> List[float]:
+        """Queue a query and wait for its vector"""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # A new event loop (e.g. a fresh worker); anything pending belongs to the old one
+            self._loop = loop
+            self._pending = []
+            self._timer = None
+        
+        future = loop.create_future()
+        self._pending.append((text, future, time.perf_counter()))
+        
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        
+        return await future
+    
+    def _flush(self):
+        """Send everything queued so far as one batch"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(partial(self._batch_done, batch))
+    
+    def _batch_done(self, batch: List[Tuple[str, asyncio.Future, float]], task: asyncio.Future):
+        self._batches.discard(task)
+        # A batch task cancelled (e.g. at shutdown), even before it started, must not leave
+        # its requests waiting forever
+        for _, future, _ in batch:
+            if not future.done():
+                future.cancel()
+    
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future, float]]):
+        flushed_at = time.perf_counter()
+        # Identical questions in the same batch are embedded once
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+        
+        try:
+            vectors = await self.embeddings.aembed_documents(texts)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        by_text = dict(zip(texts, vectors))
+        for text, future, _ in batch:
+            if not future.done():
+                future.set_result(by_text[text])
+        
+        self.batches += 1
+        self.queries += len(batch)
+        self.max_observed_batch = max(self.max_observed_batch, len(batch))
+        self.total_wait += sum(flushed_at - queued_at for _, _, queued_at in batch)
+        self.total_call_time += time.perf_counter() - flushed_at
+    
+    def stats(self) -> Dict[str, Any]:
+        """Batch size and wait time metrics"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "queries": self.queries,
+            "avg_batch_size": round(self.queries / self.batches, 2) if self.batches else 0.0,
+            "max_observed_batch": self.max_observed_batch,
+            "avg_wait_ms": round(self.total_wait / self.queries * 1000, 2) if self.queries else 0.0,
+            "avg_call_ms": round(self.total_call_time / self.batches * 1000, 2) if self.batches else 0.0
+        }
+
+
+class BatchedQueryEmbeddings(Embeddings):
+    """Wraps an embeddings client so async query embeddings go through a QueryEmbeddingBatcher"""
+    
+    def __init__(self, embeddings: Embeddings, batcher: QueryEmbeddingBatcher):
+        self.embeddings = embeddings
+        self.batcher = batcher
+        self.model = getattr(embeddings, "model", None)
+        self.dimensions = getattr(embeddings, "dimensions", None)
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+    
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+    
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.batcher.embed(text)
+
+
+# Global instance shared by both backends (created on first use)
+query_embedding_batcher: Optional[QueryEmbeddingBatcher] = None
+
+def get_query_batcher(embeddings: Embeddings) -> Optional[QueryEmbeddingBatcher]:
+    """Get or create the process-wide batcher (None when EMBEDDING_BATCH_WAIT_MS is 0)"""
+    global query_embedding_batcher
+    if query_embedding_batcher is None and EMBEDDING_BATCH_WAIT_MS > 0:
+        query_embedding_batcher = QueryEmbeddingBatcher(
+            embeddings,
+            max_batch_size=EMBEDDING_BATCH_MAX_SIZE,
+            max_wait_ms=EMBEDDING_BATCH_WAIT_MS
+        )
+    return query_embedding_batcher
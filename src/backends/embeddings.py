@@ -0,0 +1,188 @@
+"""
+Embeddings client shared by the FAISS and Supabase backends
+"""
+import os
+import asyncio
+from typing import Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+from langchain_openai.embeddings import OpenAIEmbeddings
+
+from .chunk_cache import ChunkEmbeddingCache, get_chunk_cache
+from .embedding_batcher import BatchedQueryEmbeddings, get_query_batcher
+from .query_cache import QueryEmbeddingCache, get_query_cache
+
+# Load environment variables
+load_dotenv()
+
+# OpenAI-compatible servers (local stand-ins, vLLM, ...) expect raw strings rather than
+# tiktoken token ids, so the client-side context-length check can be switched off
+CHECK_CTX_LENGTH = os.getenv("EMBEDDINGS_CHECK_CTX_LENGTH", "true").lower() == "true"
+
+# Number of chunks sent per embeddings call during ingestion (progress is reported per batch)
+EMBEDDING_DOCUMENT_BATCH_SIZE = int(os.getenv("EMBEDDING_DOCUMENT_BATCH_SIZE", "100"))
+
+# Maximum embeddings calls in flight at once during bulk ingestion
+EMBEDDING_MAX_PARALLEL = int(os.getenv("EMBEDDING_MAX_PARALLEL", "4"))
+
+# Called with (chunks_embedded, chunks_total) after every batch
+ProgressCallback = Callable[[int, int], None]
+
+
+def embedding_model_name(embeddings: Embeddings) -> str:
+    """Identify the model (and dimensions, if overridden) behind an embeddings client"""
+    model = getattr(embeddings, "model", None) or type(embeddings).__name__
+    dimensions = getattr(embeddings, "dimensions", None)
+    return f"{model}:{dimensions}" if dimensions else model
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """Wraps an embeddings client and serves repeat queries from a QueryEmbeddingCache"""
+    
+    def __init__(self, embeddings: Embeddings, cache: QueryEmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = embedding_model_name(embeddings)
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+    
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+    
+    def embed_query(self, text: str) -> List[float]:
+        key = self.cache.make_key(text, self.model)
+        embedding = self.cache.get(key)
+        if embedding is None:
+            embedding = self.embeddings.embed_query(text)
+            self.cache.put(key, embedding)
+        return embedding
+    
+    async def _cache_call(self, function, *args):
+        # The SQLite tier (QUERY_CACHE_PATH) is blocking, keep it off the event loop;
+        # in-memory lookups are cheaper than the thread hop
+        if self.cache.disk_path:
+            return await asyncio.to_thread(function, *args)
+        return function(*args)
+    
+    async def aembed_query(self, text: str) -> List[float]:
+        key = self.cache.make_key(text, self.model)
+        embedding = await self._cache_call(self.cache.get, key)
+        if embedding is None:
+            embedding = await self.embeddings.aembed_query(text)
+            await self._cache_call(self.cache.put, key, embedding)
+        return embedding
+
+
+class CachedChunkEmbeddings(Embeddings):
+    """Wraps an embeddings client and only sends chunks missing from a ChunkEmbeddingCache"""
+    
+    def __init__(self, embeddings: Embeddings, cache: ChunkEmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = embedding_model_name(embeddings)
+    
+    def _lookup(self, texts: List[str]) -> Tuple[List[str], Dict[str, List[float]], List[str]]:
+        """Return (keys, cached embeddings by key, distinct texts that still need embedding)"""
+        keys = [self.cache.make_key(text, self.model) for text in texts]
+        cached = self.cache.get_many(keys)
+        missing = list(dict.fromkeys(text for key, text in zip(keys, texts) if key not in cached))
+        return keys, cached, missing
+    
+    def _merge(self, keys: List[str], cached: Dict[str, List[float]], missing: List[str], vectors: List[List[float]]) -> List[List[float]]:
+        new = [(self.cache.make_key(text, self.model), vector) for text, vector in zip(missing, vectors)]
+        self.cache.put_many(new)
+        cached.update(new)
+        return [cached[key] for key in keys]
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, cached, missing = self._lookup(texts)
+        vectors = self.embeddings.embed_documents(missing) if missing else []
+        return self._merge(keys, cached, missing, vectors)
+    
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        # SQLite calls are blocking, keep them off the event loop
+        keys, cached, missing = await asyncio.to_thread(self._lookup, texts)
+        vectors = await self.embeddings.aembed_documents(missing) if missing else []
+        return await asyncio.to_thread(self._merge, keys, cached, missing, vectors)
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+    
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.embeddings.aembed_query(text)
+
+
+def create_embeddings() -> Embeddings:
+    """Create the embeddings client used by the vector store backends"""
+    embeddings: Embeddings = OpenAIEmbeddings(check_embedding_ctx_length=CHECK_CTX_LENGTH)
+    
+    # Concurrent cache misses are coalesced into one embeddings call
+    batcher = get_query_batcher(embeddings)
+    if batcher is not None:
+        embeddings = BatchedQueryEmbeddings(embeddings, batcher)
+    
+    cache = get_query_cache()
+    if cache is not None:
+        embeddings = CachedQueryEmbeddings(embeddings, cache)
+    
+    # Unchanged chunks are never embedded twice, across rebuilds and backends
+    chunk_cache = get_chunk_cache()
+    if chunk_cache is not None:
+        embeddings = CachedChunkEmbeddings(embeddings, chunk_cache)
+    
+    return embeddings
+
+
+def embed_documents_in_batches(
+    embeddings: Embeddings,
+    texts: List[str],
+    progress_callback: Optional[ProgressCallback] = None
+) -> List[List[float]]:
+    """Embed chunks batch by batch, reporting progress after each batch"""
+    vectors: List[List[float]] = []
+    for start in range(0, len(texts), EMBEDDING_DOCUMENT_BATCH_SIZE):
+        vectors.extend(embeddings.embed_documents(texts[start:start + EMBEDDING_DOCUMENT_BATCH_SIZE]))
+        if progress_callback:
+            progress_callback(len(vectors), len(texts))
+    return vectors
+
+
+async def aembed_documents_in_batches(
+    embeddings: Embeddings,
+    texts: List[str],
+    progress_callback: Optional[ProgressCallback] = None
+) -> List[List[float]]:
+    """Async version of embed_documents_in_batches"""
+    vectors: List[List[float]] = []
+    for start in range(0, len(texts), EMBEDDING_DOCUMENT_BATCH_SIZE):
+        vectors.extend(await embeddings.aembed_documents(texts[start:start + EMBEDDING_DOCUMENT_BATCH_SIZE]))
+        if progress_callback:
+            progress_callback(len(vectors), len(texts))
+    return vectors
+
+
+async def aembed_documents_parallel(
+    embeddings: Embeddings,
+    texts: List[str],
+    batch_size: int = 500,
+    max_parallel: int = EMBEDDING_MAX_PARALLEL,
+    progress_callback: Optional[ProgressCallback] = None
+) -> List[List[float]]:
+    """Embed many chunks in large batches with at most max_parallel calls in flight"""
+    slots = asyncio.Semaphore(max_parallel)
+    embedded = 0
+    
+    async def embed_batch(batch: List[str]) -> List[List[float]]:
+        nonlocal embedded
+        async with slots:
+            vectors = await embeddings.aembed_documents(batch)
+        embedded += len(batch)
+        if progress_callback:
+            progress_callback(embedded, len(texts))
+        return vectors
+    
+    batches = [texts[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+    results = await asyncio.gather(*(embed_batch(batch) for batch in batches))
+    return [vector for batch_vectors in results for vector in batch_vectors]
@@ -0,0 +1,1041 @@
+"""
+Segmented, id-mapped FAISS index with real deletes for the local backend.
+Every chunk gets a stable int64 id; a document's chunks occupy one contiguous id range.
+Each commit writes a small immutable delta segment plus a manifest listing the live
+segments, so saving costs the size of the new documents rather than the whole corpus.
+Searches fan out across segments and merge the top-k. Deleting a document tombstones its
+ids, which are filtered out inside the FAISS search right away; a background merge folds
+the deltas into the base segment and drops tombstoned vectors.
+All gunicorn workers share the directory: the manifest carries a generation number,
+writers hold an flock, and readers load only the segments that are new to them.
+Segment files are memory-mapped read-only and chunk texts live in a SQLite chunk store,
+so the workers share one copy of the corpus through the OS page cache instead of each
+holding its own in the heap. Large segments can use approximate index types and any segment
+can store compressed vectors (see ann_index). A BM25 index in the chunk store backs hybrid
+keyword + vector search.
+"""
+import os
+import json
+import heapq
+import pickle
+import time
+import fcntl
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Callable, Iterable, Iterator, Set, Tuple
+
+import faiss
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+
+from .ann_index import (
+    COMPRESSIONS, FAMILIES, FAISS_FILTER_EXACT_MAX, FAISS_RERANK_FACTOR, INDEX_TYPES,
+    build_index, choose_layout, describe_index, filtered_search_parameters, index_family, search_parameters
+)
+from .chunk_store import ChunkStore
+from .diversity import MMR_LAMBDA, maximal_marginal_relevance
+from .hybrid import HYBRID_CANDIDATES, reciprocal_rank_fusion
+from .streaming import ChunkSpool
+
+# Load environment variables
+load_dotenv()
+
+# Map segment files read-only instead of copying the vectors into every worker's heap
+FAISS_MMAP = os.getenv("FAISS_MMAP", "true").lower() == "true"
+FAISS_READ_FLAGS = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY if FAISS_MMAP else 0
+
+# Vectors read from a source segment at a time while a merge fills the new index
+MERGE_BLOCK_VECTORS = 16384
+
+MANIFEST_FILE = "manifest.json"
+TOMBSTONES_FILE = "tombstones.json"
+LOCK_FILE = ".lock"
+MERGE_LOCK_FILE = ".merge.lock"
+CHUNK_STORE_FILE = "chunks.db"
+
+# Single-file layout written before segments existed (adopted as the base segment)
+SINGLE_INDEX_FILE = "chunks.faiss"
+SINGLE_DOCSTORE_FILE = "chunks.pkl"
+
+# Files written by LangChain's FAISS.save_local before this layout existed
+LEGACY_INDEX_FILE = "index.faiss"
+LEGACY_DOCSTORE_FILE = "index.pkl"
+
+# (document id, chunk texts, vectors, metadatas)
+DocumentChunks = Tuple[str, List[str], Any, List[Dict[str, Any]]]
+
+
+def _replace_atomically(path: str, write):
+    """Write to a temporary file and rename it over path, so readers never see half a file"""
+    tmp_path = f"{path}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _document_ranges(segment_ranges: Iterable[Dict[str, Tuple[int, int]]]) -> Dict[str, Tuple[int, int]]:
+    """
+    Document id -> (first chunk id, chunk count) across segments
+    A streamed document spans several segments, each holding a contiguous slice of its range.
+    """
+    bounds: Dict[str, Tuple[int, int]] = {}
+    for ranges in segment_ranges:
+        for document_id, (start, count) in ranges.items():
+            first, end = bounds.get(document_id, (start, start + count))
+            bounds[document_id] = (min(first, start), max(end, start + count))
+    return {document_id: (first, end - first) for document_id, (first, end) in bounds.items()}
+
+
+def _squared_l2(vectors: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Squared L2 distances from query to each row, expanded so the work is one matrix-vector product"""
+    return np.maximum(np.einsum("ij,ij->i", vectors, vectors) - 2 * (vectors @ query) + query @ query, 0)
+
+
+class Segment:
+    """
+    One immutable FAISS IndexIDMap2 with the id ranges of its documents (texts are in the chunk store)
+    Segments with compressed vectors (float16, int8 or PQ codes) also keep the full vectors
+    in a memory-mapped .npy file: searches re-rank their top candidates with it, and merges
+    rebuild from it instead of from lossy codes.
+    """
+    
+    def __init__(self, name: str, index: faiss.IndexIDMap2, ranges: Dict[str, Tuple[int, int]], raw_vectors: Optional[np.ndarray] = None):
+        self.name = name
+        self.index = index
+        self.kind, self.compression = describe_index(index)
+        self.family = index_family(index)
+        # document id -> (first chunk id, chunk count)
+        self.ranges = ranges
+        # Full vectors in id_map order, for compressed segments
+        self.raw_vectors = raw_vectors
+        self._ids: Optional[np.ndarray] = None
+        self._id_order: Optional[np.ndarray] = None
+        self._sorted_ids: Optional[np.ndarray] = None
+        # IVF lists can only be read back by row after a direct map is built, once, on first use
+        self._direct_map_lock = threading.Lock()
+        self._has_direct_map = False
+    
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+    
+    @staticmethod
+    def files(name: str) -> Tuple[str, str]:
+        return f"{name}.faiss", f"{name}.pkl"
+    
+    @staticmethod
+    def raw_vectors_file(name: str) -> str:
+        return f"{name}.vectors.npy"
+    
+    @classmethod
+    def build(cls, name: str, dimension: int, ids: np.ndarray, vectors: np.ndarray, ranges, kind: str = "flat", compression: str = "none") -> "Segment":
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        index = faiss.IndexIDMap2(build_index(kind, dimension, vectors, compression))
+        if len(ids):
+            index.add_with_ids(vectors, ids)
+        return cls(name, index, ranges, None if compression == "none" and kind != "ivfpq" else vectors)
+    
+    @classmethod
+    def load(cls, directory: str, name: str) -> "Segment":
+        index_file, ranges_file = cls.files(name)
+        # Segment files are never modified once written, so mapping them read-only is safe
+        index = faiss.read_index(os.path.join(directory, index_file), FAISS_READ_FLAGS)
+        with open(os.path.join(directory, ranges_file), "rb") as f:
+            state = pickle.load(f)
+        raw_path = os.path.join(directory, cls.raw_vectors_file(name))
+        raw_vectors = np.load(raw_path, mmap_mode="r") if os.path.exists(raw_path) else None
+        return cls(name, index, state["ranges"], raw_vectors)
+    
+    def save(self, directory: str):
+        index_file = self.files(self.name)[0]
+        if self.raw_vectors is not None:
+            raw_path = os.path.join(directory, self.raw_vectors_file(self.name))
+            
+            def write_raw(path: str):
+                with open(path, "wb") as f:
+                    np.save(f, self.raw_vectors)
+            _replace_atomically(raw_path, write_raw)
+            # Keep the page-cache copy rather than a second one in the heap
+            self.raw_vectors = np.load(raw_path, mmap_mode="r")
+        _replace_atomically(os.path.join(directory, index_file), lambda path: faiss.write_index(self.index, path))
+        self.save_ranges(directory)
+    
+    def save_ranges(self, directory: str):
+        def write(path: str):
+            with open(path, "wb") as f:
+                pickle.dump({"ranges": self.ranges}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        _replace_atomically(os.path.join(directory, self.files(self.name)[1]), write)
+    
+    def delete_files(self, directory: str):
+        for filename in self.files(self.name) + (self.raw_vectors_file(self.name),):
+            try:
+                os.remove(os.path.join(directory, filename))
+            except FileNotFoundError:
+                pass
+    
+    def size_bytes(self, directory: str) -> int:
+        return sum(
+            os.path.getsize(os.path.join(directory, filename))
+            for filename in self.files(self.name) + (self.raw_vectors_file(self.name),)
+            if os.path.exists(os.path.join(directory, filename))
+        )
+    
+    def ids(self) -> np.ndarray:
+        """Chunk ids held by this segment"""
+        if self._ids is None:
+            self._ids = faiss.vector_to_array(self.index.id_map).astype("int64")
+        return self._ids
+    
+    @property
+    def can_score_exactly(self) -> bool:
+        """Whether vectors can be read back by id (IVF lists cannot without a direct map)"""
+        return self.raw_vectors is not None or self.family == "hnsw"
+    
+    def search_exact(self, query: np.ndarray, k: int, chunk_ids: np.ndarray) -> List[Tuple[float, int]]:
+        """Top-k (L2 distance, chunk id) among chunk_ids, all held by this segment, scored exactly"""
+        rows = np.sort(self.rows(chunk_ids))
+        vectors = self.read_vectors(rows)
+        distances = _squared_l2(vectors, query[0])
+        order = np.argsort(distances, kind="stable")[:k]
+        ids = self.ids()[rows]
+        return [(float(distances[i]), int(ids[i])) for i in order]
+    
+    def read_vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Full-precision vectors at rows (id_map order); best read in ascending row order"""
+        if self.raw_vectors is not None:
+            return np.asarray(self.raw_vectors[rows], dtype="float32")
+        if self.family == "ivf" and not self._has_direct_map:
+            with self._direct_map_lock:
+                if not self._has_direct_map:
+                    faiss.extract_index_ivf(self.index.index).make_direct_map()
+                    self._has_direct_map = True
+        return self.index.index.reconstruct_batch(np.asarray(rows, dtype="int64"))
+    
+    def _sorted(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(argsort of the ids, ids in ascending order), computed once per segment"""
+        if self._id_order is None:
+            order = np.argsort(self.ids(), kind="stable")
+            self._sorted_ids = self.ids()[order]
+            self._id_order = order
+        return self._id_order, self._sorted_ids
+    
+    def rows(self, chunk_ids: np.ndarray) -> np.ndarray:
+        """Positions of chunk ids (all held by this segment) in id_map order"""
+        order, sorted_ids = self._sorted()
+        return order[np.searchsorted(sorted_ids, chunk_ids)]
+    
+    def locate(self, chunk_ids: np.ndarray) -> np.ndarray:
+        """Positions of chunk ids in id_map order, -1 for those this segment does not hold"""
+        if not self.ntotal:
+            return np.full(len(chunk_ids), -1, dtype="int64")
+        order, sorted_ids = self._sorted()
+        positions = np.minimum(np.searchsorted(sorted_ids, chunk_ids), len(sorted_ids) - 1)
+        return np.where(sorted_ids[positions] == chunk_ids, order[positions], -1)
+    
+    def search(self, query: np.ndarray, k: int, params: Optional[faiss.SearchParameters], rerank_factor: int = 0) -> List[Tuple[float, int]]:
+        """
+        Top-k (L2 distance, chunk id); with full vectors and a rerank factor, k * rerank_factor
+        candidates come from the compressed index and are re-scored exactly
+        """
+        rerank = self.raw_vectors is not None and rerank_factor > 0
+        fetch = k * rerank_factor if rerank else k
+        distances, ids = self.index.search(query, min(fetch, self.ntotal), params=params)
+        found = ids[0] >= 0
+        distances, ids = distances[0][found], ids[0][found]
+        if rerank and len(ids):
+            # Only the candidates' pages of the mapped file are read, in file order
+            rows = np.sort(self.rows(ids))
+            vectors = np.asarray(self.raw_vectors[rows], dtype="float32")
+            ids = self.ids()[rows]
+            distances = _squared_l2(vectors, query[0])
+            order = np.argsort(distances, kind="stable")[:k]
+            distances, ids = distances[order], ids[order]
+        return [(float(distance), int(chunk_id)) for distance, chunk_id in zip(distances, ids)]
+
+
+class _MergeSource:
+    """
+    The vectors a merge keeps from its source segments, addressed as if they were one array
+    Rows are read from the (mapped) segment files on demand, so neither training an index
+    on a sample nor filling it block by block loads the rest into the heap.
+    """
+    
+    def __init__(self, segments: List[Segment], kept_rows: List[np.ndarray]):
+        self.segments = segments
+        self.kept_rows = kept_rows
+        self.offsets = np.cumsum([0] + [len(rows) for rows in kept_rows])
+    
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+    
+    def __getitem__(self, positions: np.ndarray) -> np.ndarray:
+        """Vectors at ascending positions"""
+        positions = np.asarray(positions, dtype="int64")
+        owners = np.searchsorted(self.offsets, positions, side="right") - 1
+        return np.concatenate([
+            self.segments[owner].read_vectors(self.kept_rows[owner][positions[owners == owner] - self.offsets[owner]])
+            for owner in np.unique(owners)
+        ])
+    
+    def blocks(self) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """(ids, vectors) of up to MERGE_BLOCK_VECTORS kept vectors at a time, in order"""
+        for segment, rows in zip(self.segments, self.kept_rows):
+            ids = segment.ids()
+            for start in range(0, len(rows), MERGE_BLOCK_VECTORS):
+                block = rows[start:start + MERGE_BLOCK_VECTORS]
+                yield ids[block], np.ascontiguousarray(segment.read_vectors(block), dtype="float32")
+
+
+class ChunkIndex:
+    """
+    Base segment plus delta segments, a manifest, per-document id ranges and tombstones
+    Several processes (gunicorn workers) can share one directory: writers serialize on an
+    flock and bump the manifest generation; readers notice a newer generation on their
+    next search and load only the segments they don't have yet.
+    """
+    
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.segments: List[Segment] = []
+        self.ranges: Dict[str, Tuple[int, int]] = {}
+        self.tombstones: Set[int] = set()
+        self.next_id = 0
+        self.next_segment = 0
+        self.dimension: Optional[int] = None
+        self.generation = 0
+        # Guards swapping the segment list and tombstones; searches only hold it to take a snapshot
+        self._lock = threading.RLock()
+        # Serializes writers within this process (the flock serializes processes)
+        self._write_lock = threading.RLock()
+        self._writer_depth = 0
+        # Only one thread reloads; the others keep searching the current snapshot
+        self._reload_lock = threading.Lock()
+        self._manifest_stat: Optional[Tuple[int, int, int]] = None
+        # Index family -> search parameters (tombstone filter plus nprobe / efSearch)
+        self._search_params: Dict[str, Optional[faiss.SearchParameters]] = {}
+        # FAISS selectors do not own the selectors they wrap, so keep them referenced here
+        self._selectors: Tuple = ()
+        self.reloads = 0
+        self.reload_seconds: List[float] = []
+        self.reload_staleness_seconds: List[float] = []
+        # Called after this process loads a generation another process wrote
+        self._reload_callbacks: List[Callable[[], None]] = []
+        
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        self._lock_file = open(self._path(LOCK_FILE), "a+")
+        self.chunks = ChunkStore(self._path(CHUNK_STORE_FILE))
+        self._refresh_search_params()
+    
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+    
+    @property
+    def live_count(self) -> int:
+        return sum(segment.ntotal for segment in self.segments) - len(self.tombstones)
+    
+    @property
+    def delta_count(self) -> int:
+        return max(len(self.segments) - 1, 0)
+    
+    @contextmanager
+    def writer(self):
+        """
+        Exclusive access for changing the index, across threads and processes
+        The latest manifest is loaded first, so ids and segment names never collide with
+        another worker's. Re-entrant within a thread.
+        """
+        with self._write_lock:
+            if self._writer_depth == 0:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._writer_depth += 1
+            try:
+                if self._writer_depth == 1:
+                    with self._reload_lock:
+                        self._reload(force=False)
+                yield
+            finally:
+                self._writer_depth -= 1
+                if self._writer_depth == 0:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+    
+    def load(self) -> bool:
+        """Load the manifest and its segments; returns False when there is nothing to load"""
+        with self.writer():
+            if not os.path.exists(self._path(MANIFEST_FILE)):
+                if not self._adopt_single_file_layout():
+                    return False
+                self._reload(force=True)
+            self._move_texts_to_chunk_store()
+            return True
+    
+    def _stat_manifest(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self._path(MANIFEST_FILE))
+        except FileNotFoundError:
+            return None
+        # The manifest is replaced atomically, so a new inode means a new generation
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+    
+    def on_reload(self, callback: Callable[[], None]):
+        """
+        Call callback() whenever this process loads a generation another worker wrote
+        (state private to this process, such as a memory cache, is stale then). Registering
+        the same callback again is a no-op.
+        """
+        if callback not in self._reload_callbacks:
+            self._reload_callbacks.append(callback)
+    
+    def refresh(self) -> bool:
+        """
+        Pick up changes written by other workers (cheap when nothing changed: one stat call)
+        Never blocks: if another thread is already reloading, the current snapshot is used.
+        Returns True when a newer generation was loaded.
+        """
+        # A writer in this process already holds the latest state
+        if self._writer_depth or self._stat_manifest() == self._manifest_stat:
+            return False
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            return self._reload(force=False)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            # A merge elsewhere removed a segment between reading the manifest and loading it
+            print(f"Vector store reload deferred: {e}")
+            return False
+        finally:
+            self._reload_lock.release()
+    
+    def _reload(self, force: bool) -> bool:
+        """Load a newer manifest, reusing segments already in memory"""
+        manifest_stat = self._stat_manifest()
+        if manifest_stat is None or (manifest_stat == self._manifest_stat and not force):
+            return False
+        
+        started = time.perf_counter()
+        with open(self._path(MANIFEST_FILE), "r") as f:
+            manifest = json.load(f)
+        if manifest.get("generation", 0) == self.generation and self.segments and not force:
+            self._manifest_stat = manifest_stat
+            return False
+        
+        tombstones: Set[int] = set()
+        if os.path.exists(self._path(TOMBSTONES_FILE)):
+            with open(self._path(TOMBSTONES_FILE), "r") as f:
+                tombstones = set(json.load(f))
+        
+        # Only segments this process hasn't seen are read from disk
+        loaded = {segment.name: segment for segment in self.segments}
+        segments = [loaded.get(name) or Segment.load(self.directory, name) for name in manifest["segments"]]
+        
+        # Deleted documents keep their range in the segment files until the next merge
+        ranges = {
+            document_id: (start, count)
+            for document_id, (start, count) in _document_ranges(segment.ranges for segment in segments).items()
+            if start not in tombstones
+        }
+        
+        with self._lock:
+            self.segments = segments
+            self.tombstones = tombstones
+            self.ranges = ranges
+            self.next_id = manifest["next_id"]
+            self.next_segment = manifest["next_segment"]
+            self.dimension = manifest.get("dimension")
+            self.generation = manifest.get("generation", 0)
+            self._manifest_stat = manifest_stat
+            self._refresh_search_params()
+        
+        if loaded:
+            for callback in self._reload_callbacks:
+                try:
+                    callback()
+                except Exception as e:
+                    print(f"Error in vector store reload callback: {e}")
+            self.reloads += 1
+            self.reload_seconds = (self.reload_seconds + [time.perf_counter() - started])[-100:]
+            if manifest.get("updated_at"):
+                self.reload_staleness_seconds = (self.reload_staleness_seconds + [time.time() - manifest["updated_at"]])[-100:]
+        return True
+    
+    def _adopt_single_file_layout(self) -> bool:
+        """Turn a chunks.faiss / chunks.pkl pair into the base segment of a new manifest (caller holds the writer)"""
+        if not os.path.exists(self._path(SINGLE_INDEX_FILE)):
+            return False
+        
+        name = self._segment_name(0)
+        index_file, docstore_file = Segment.files(name)
+        with open(self._path(SINGLE_DOCSTORE_FILE), "rb") as f:
+            state = pickle.load(f)
+        os.replace(self._path(SINGLE_INDEX_FILE), self._path(index_file))
+        os.replace(self._path(SINGLE_DOCSTORE_FILE), self._path(docstore_file))
+        
+        index = faiss.read_index(self._path(index_file))
+        self.next_id = state["next_id"]
+        self.next_segment = 1
+        self.dimension = index.d
+        self._save_manifest([name])
+        return True
+    
+    def _move_texts_to_chunk_store(self):
+        """
+        Copy chunk texts out of segment pickles written by older versions (caller holds the writer)
+        Each pickle is rewritten with only its id ranges once its texts are in the chunk store.
+        """
+        moved = 0
+        for segment in self.segments:
+            ranges_path = self._path(Segment.files(segment.name)[1])
+            with open(ranges_path, "rb") as f:
+                state = pickle.load(f)
+            if "docstore" not in state:
+                continue
+            self.chunks.add_many((chunk_id, text, metadata) for chunk_id, (text, metadata) in state["docstore"].items())
+            segment.save_ranges(self.directory)
+            moved += len(state["docstore"])
+        if moved:
+            print(f"Moved {moved} chunk texts into {self.chunks.path}")
+    
+    def _segment_name(self, number: int) -> str:
+        return f"seg_{number:06d}"
+    
+    def _save_manifest(self, names: Optional[List[str]] = None):
+        """Publish a new generation (caller holds the writer)"""
+        self.generation += 1
+        manifest = {
+            "generation": self.generation,
+            "updated_at": time.time(),
+            "segments": names if names is not None else [segment.name for segment in self.segments],
+            "next_id": self.next_id,
+            "next_segment": self.next_segment,
+            "dimension": self.dimension
+        }
+        
+        def write(path: str):
+            with open(path, "w") as f:
+                json.dump(manifest, f, indent=2)
+        _replace_atomically(self._path(MANIFEST_FILE), write)
+        self._manifest_stat = self._stat_manifest()
+    
+    def _save_tombstones(self):
+        def write(path: str):
+            with open(path, "w") as f:
+                json.dump(sorted(self.tombstones), f)
+        _replace_atomically(self._path(TOMBSTONES_FILE), write)
+    
+    def add_documents(self, documents: List[DocumentChunks]) -> Optional[Segment]:
+        """
+        Append documents as one new delta segment and persist it with the manifest
+        Each document gets a fresh contiguous id range
+        """
+        documents = [document for document in documents if len(document[1])]
+        if not documents:
+            return None
+        
+        with self.writer():
+            matrix = np.concatenate([np.asarray(vectors, dtype="float32") for _, _, vectors, _ in documents])
+            if self.dimension is None:
+                self.dimension = matrix.shape[1]
+            
+            ids = np.arange(self.next_id, self.next_id + len(matrix), dtype="int64")
+            rows: List[Tuple[int, str, Dict[str, Any]]] = []
+            ranges: Dict[str, Tuple[int, int]] = {}
+            chunk_id = self.next_id
+            for document_id, texts, _, metadatas in documents:
+                ranges[document_id] = (chunk_id, len(texts))
+                for text, metadata in zip(texts, metadatas):
+                    rows.append((chunk_id, text, metadata))
+                    chunk_id += 1
+            
+            # Texts go in first: a search can only return these ids once the manifest lists the segment
+            self.chunks.add_many(rows)
+            segment = self._persist(
+                Segment.build(
+                    self._segment_name(self.next_segment), self.dimension, ids, matrix, ranges,
+                    *choose_layout(len(matrix), "flat")
+                )
+            )
+            
+            with self._lock:
+                self.segments = self.segments + [segment]
+                self.ranges.update(ranges)
+            self.next_id = chunk_id
+            self.next_segment += 1
+            self._save_manifest()
+            return segment
+    
+    def add_spooled_document(self, document_id: str, spool: ChunkSpool, segment_chunks: int) -> int:
+        """
+        Append one large document from a ChunkSpool as delta segments of up to segment_chunks
+        vectors, published with a single manifest; returns the chunk count
+        The document still gets one contiguous id range, so deletes, filters and merges treat
+        it like any other; each of its segments records the slice of it that segment holds.
+        Only one block of the spool is in memory at a time.
+        """
+        if not spool.count:
+            return 0
+        
+        with self.writer():
+            if self.dimension is None:
+                self.dimension = spool.dimension
+            ranges = {document_id: (self.next_id, spool.count)}
+            segments: List[Segment] = []
+            chunk_id = self.next_id
+            for texts, metadatas, vectors in spool.blocks(segment_chunks):
+                ids = np.arange(chunk_id, chunk_id + len(texts), dtype="int64")
+                # Texts go in first: a search can only return these ids once the manifest lists the segments
+                self.chunks.add_many(zip(ids, texts, metadatas))
+                segments.append(self._persist(
+                    Segment.build(
+                        self._segment_name(self.next_segment), self.dimension, ids, vectors,
+                        {document_id: (chunk_id, len(texts))}, *choose_layout(len(vectors), "flat")
+                    )
+                ))
+                self.next_segment += 1
+                chunk_id += len(texts)
+            
+            with self._lock:
+                self.segments = self.segments + segments
+                self.ranges.update(ranges)
+            self.next_id = chunk_id
+            self._save_manifest()
+            return spool.count
+    
+    def delete_document(self, document_id: str) -> int:
+        """Tombstone a document's chunks; they stop matching immediately. Returns the chunk count."""
+        with self.writer():
+            if document_id not in self.ranges:
+                return 0
+            with self._lock:
+                start, count = self.ranges.pop(document_id)
+                self.tombstones = self.tombstones | set(range(start, start + count))
+                self._refresh_search_params()
+            self._save_tombstones()
+            self._save_manifest()
+            return count
+    
+    def _persist(self, segment: Segment) -> Segment:
+        """Write a freshly built segment and, with FAISS_MMAP, swap it for the mapped copy"""
+        segment.save(self.directory)
+        if FAISS_MMAP:
+            # Drops the heap copy so this worker shares the page cache like the others
+            return Segment.load(self.directory, segment.name)
+        return segment
+    
+    def _refresh_search_params(self):
+        """Search parameters per index family that exclude every tombstoned id inside FAISS"""
+        selector = None
+        self._selectors = ()
+        if self.tombstones:
+            dead = np.fromiter(self.tombstones, dtype="int64", count=len(self.tombstones))
+            batch = faiss.IDSelectorBatch(dead)
+            selector = faiss.IDSelectorNot(batch)
+            self._selectors = (batch, selector)
+        self._search_params = {family: search_parameters(family, selector) for family in FAMILIES}
+    
+    def search(
+        self,
+        query_embedding: List[float],
+        k: int,
+        document_ids: Optional[Iterable[str]] = None,
+        mmr_candidates: int = 0
+    ) -> List[Tuple[Document, float]]:
+        """
+        Top-k live chunks across all segments, or only those of document_ids, as (Document, L2 distance)
+        With mmr_candidates, that many nearest chunks are fetched and k of them picked by
+        maximal marginal relevance (see diversity), in pick order.
+        """
+        self.refresh()
+        with self._lock:
+            # Segments are immutable, so searching a snapshot needs no lock
+            segments = self.segments
+            params, selectors = self._search_params, self._selectors
+            ranges = self.ranges
+            live_count = self.live_count
+        if not segments or live_count <= 0:
+            return []
+        if document_ids is not None:
+            restricted = self._restrict(segments, ranges, live_count, document_ids)
+            if restricted is None:
+                return []
+            segments, params, selectors, document_ids = restricted
+        
+        nearest = self._nearest(segments, params, query_embedding, max(k, mmr_candidates), document_ids)
+        scored = [(chunk_id, distance) for distance, chunk_id in nearest]
+        if mmr_candidates:
+            scored = self._diversify(segments, query_embedding, scored, k)
+        return self._documents(scored)
+    
+    def hybrid_search(
+        self,
+        query_text: str,
+        query_embedding: List[float],
+        k: int,
+        candidates: int = HYBRID_CANDIDATES,
+        document_ids: Optional[Iterable[str]] = None,
+        mmr_candidates: int = 0
+    ) -> List[Tuple[Document, float]]:
+        """
+        Top-k live chunks by reciprocal rank fusion of the vector and BM25 rankings, as
+        (Document, fused score). Each ranking contributes its best `candidates` chunks.
+        With mmr_candidates, k of the best fused chunks are picked by maximal marginal
+        relevance, with the fused score as relevance.
+        """
+        self.refresh()
+        with self._lock:
+            segments = self.segments
+            params, selectors = self._search_params, self._selectors
+            tombstones, next_id = self.tombstones, self.next_id
+            ranges = self.ranges
+            live_count = self.live_count
+        if not segments or live_count <= 0:
+            return []
+        id_ranges = None
+        if document_ids is not None:
+            restricted = self._restrict(segments, ranges, live_count, document_ids)
+            if restricted is None:
+                return []
+            segments, params, selectors, document_ids = restricted
+            id_ranges = [ranges[document_id] for document_id in document_ids]
+        
+        candidates = max(candidates, k)
+        nearest = [chunk_id for _, chunk_id in self._nearest(segments, params, query_embedding, candidates, document_ids)]
+        total = sum(segment.ntotal for segment in segments)
+        keywords = self._keyword_ranking(query_text, candidates, tombstones, next_id, total, id_ranges)
+        if not mmr_candidates:
+            return self._documents(reciprocal_rank_fusion([nearest, keywords], k))
+        fused = reciprocal_rank_fusion([nearest, keywords], max(k, mmr_candidates))
+        if not fused:
+            return []
+        # Scaled so the best fused chunk has relevance 1, like a cosine similarity
+        scores = np.array([score for _, score in fused], dtype="float32")
+        return self._documents(self._diversify(segments, query_embedding, fused, k, scores / scores[0]))
+    
+    @staticmethod
+    def _restrict(
+        segments: List[Segment],
+        ranges: Dict[str, Tuple[int, int]],
+        live_count: int,
+        document_ids: Iterable[str]
+    ) -> Optional[Tuple[List[Segment], Dict[str, Optional[faiss.SearchParameters]], Tuple, List[str]]]:
+        """
+        Segments to search, search parameters and selectors covering only the chunks of
+        document_ids, plus the ids of those documents that are indexed; None when none is.
+        The selector stands in for the tombstone filter, since ranges only lists live documents.
+        """
+        wanted = [document_id for document_id in dict.fromkeys(document_ids) if document_id in ranges]
+        if not wanted:
+            return None
+        selected = [ranges[document_id] for document_id in wanted]
+        if len(selected) == 1:
+            start, count = selected[0]
+            selector = faiss.IDSelectorRange(start, start + count)
+        else:
+            selector = faiss.IDSelectorBatch(
+                np.concatenate([np.arange(start, start + count, dtype="int64") for start, count in selected])
+            )
+        selectivity = sum(count for _, count in selected) / max(live_count, 1)
+        params = {family: filtered_search_parameters(family, selector, selectivity) for family in FAMILIES}
+        # Segments holding none of the documents are skipped rather than searched
+        segments = [segment for segment in segments if any(document_id in segment.ranges for document_id in wanted)]
+        return segments, params, (selector,), wanted
+    
+    def _nearest(
+        self,
+        segments: List[Segment],
+        params: Dict[str, Optional[faiss.SearchParameters]],
+        query_embedding: List[float],
+        k: int,
+        document_ids: Optional[List[str]] = None
+    ) -> List[Tuple[float, int]]:
+        """
+        (L2 distance, chunk id) of the k nearest live vectors of a segment snapshot
+        With document_ids (see _restrict), approximate segments score a small selection
+        exactly: an HNSW graph or IVF lists searched through a selector that keeps few
+        vectors find fewer than k of them.
+        """
+        query = np.asarray([query_embedding], dtype="float32")
+        candidates = []
+        for segment in segments:
+            if document_ids is not None and segment.family != "flat" and segment.can_score_exactly:
+                selected = [segment.ranges[document_id] for document_id in document_ids if document_id in segment.ranges]
+                if sum(count for _, count in selected) <= FAISS_FILTER_EXACT_MAX:
+                    chunk_ids = np.concatenate([np.arange(start, start + count, dtype="int64") for start, count in selected])
+                    candidates.extend(segment.search_exact(query, k, chunk_ids))
+                    continue
+            candidates.extend(segment.search(query, k, params.get(segment.family), FAISS_RERANK_FACTOR))
+        return heapq.nsmallest(k, candidates, key=lambda candidate: candidate[0])
+    
+    def _diversify(
+        self,
+        segments: List[Segment],
+        query_embedding: List[float],
+        scored: List[Tuple[int, float]],
+        k: int,
+        relevance: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, float]]:
+        """The k (chunk id, score) pairs of scored picked by maximal marginal relevance, in pick order"""
+        if len(scored) <= 1:
+            return scored[:k]
+        chunk_ids = np.array([chunk_id for chunk_id, _ in scored], dtype="int64")
+        vectors = np.empty((len(chunk_ids), segments[0].index.d), dtype="float32")
+        found = np.zeros(len(chunk_ids), dtype=bool)
+        for segment in segments:
+            rows = segment.locate(chunk_ids)
+            held = np.flatnonzero(rows >= 0)
+            if len(held):
+                # Read in row order so a mapped file is walked forwards
+                order = np.argsort(rows[held])
+                vectors[held[order]] = segment.read_vectors(rows[held][order])
+                found[held] = True
+        if not found.all():
+            scored = [pair for pair, present in zip(scored, found) if present]
+            vectors = vectors[found]
+            relevance = relevance[found] if relevance is not None else None
+        picked = maximal_marginal_relevance(query_embedding, vectors, k, MMR_LAMBDA, relevance)
+        return [scored[position] for position in picked]
+    
+    def _keyword_ranking(
+        self,
+        query_text: str,
+        count: int,
+        tombstones: Set[int],
+        next_id: int,
+        total: int,
+        id_ranges: Optional[List[Tuple[int, int]]] = None
+    ) -> List[int]:
+        """
+        Best BM25 matches among live chunks the snapshot's manifest lists (within id_ranges if given)
+        total is the number of chunks in the snapshot's segments, tombstoned ones included
+        """
+        limit = count
+        while True:
+            found = self.chunks.search_keywords(query_text, limit, below_id=next_id, id_ranges=id_ranges, total=total)
+            # Tombstoned chunks keep their postings until a merge deletes their rows
+            live = [chunk_id for chunk_id in found if chunk_id not in tombstones]
+            if len(live) >= count or len(found) < limit:
+                return live[:count]
+            limit *= 4
+    
+    def _documents(self, scored: List[Tuple[int, float]]) -> List[Tuple[Document, float]]:
+        """(Document, score) for ranked (chunk id, score) pairs"""
+        chunks = self.chunks.get_many([chunk_id for chunk_id, _ in scored])
+        results = []
+        for chunk_id, score in scored:
+            # Missing only if a merge elsewhere dropped a chunk this snapshot has not seen deleted yet
+            if chunk_id in chunks:
+                text, metadata = chunks[chunk_id]
+                results.append((Document(page_content=text, metadata=metadata), score))
+        return results
+    
+    def size_bytes(self) -> int:
+        """Bytes used on disk by the segments, manifest and tombstones"""
+        total = sum(segment.size_bytes(self.directory) for segment in self.segments)
+        for name in (MANIFEST_FILE, TOMBSTONES_FILE):
+            if os.path.exists(self._path(name)):
+                total += os.path.getsize(self._path(name))
+        return total
+    
+    def _index_bytes(self) -> int:
+        """Bytes of the searched index files alone, without full vectors kept for re-ranking"""
+        return sum(
+            os.path.getsize(self._path(Segment.files(segment.name)[0]))
+            for segment in self.segments
+            if os.path.exists(self._path(Segment.files(segment.name)[0]))
+        )
+    
+    def merge(self, include_base: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Fold segments into one, dropping tombstoned vectors and texts
+        The merged segment gets the index type and compression its size calls for (see
+        choose_layout), so a single segment is also rebuilt when its layout no longer matches
+        the configuration.
+        With include_base=False only the delta segments are merged with each other.
+        The new segment is built without holding the writer, so searches and commits
+        continue meanwhile. Returns None when a merge is already running in any worker.
+        """
+        with open(self._path(MERGE_LOCK_FILE), "a+") as merge_lock:
+            try:
+                fcntl.flock(merge_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+            
+            with self.writer():
+                size_before = self.size_bytes()
+                segments = list(self.segments if include_base else self.segments[1:])
+                dead = set(self.tombstones)
+                if len(segments) < 2 and not any(
+                    self._has_dead(segment, dead) or (segment.kind, segment.compression) != choose_layout(segment.ntotal)
+                    for segment in segments
+                ):
+                    return {"segments_merged": 0, "vectors_removed": 0, "bytes_reclaimed": 0, "size_bytes": size_before}
+                # Reserve the new segment's name
+                name = self._segment_name(self.next_segment)
+                self.next_segment += 1
+                self._save_manifest()
+            
+            merged = self._build_merged(name, segments, dead)
+            if not merged.ntotal:
+                # Everything in these segments was deleted
+                merged.delete_files(self.directory)
+            
+            with self.writer():
+                # Only the merge lock holder removes segments, so all of them are still listed
+                merged_names = {segment.name for segment in segments}
+                position = next(i for i, segment in enumerate(self.segments) if segment.name in merged_names)
+                remaining = [segment for segment in self.segments if segment.name not in merged_names]
+                replacement = [merged] if merged.ntotal else []
+                dead_ids = np.fromiter(dead, dtype="int64", count=len(dead))
+                removed = {int(chunk_id) for segment in segments for chunk_id in segment.ids()[np.isin(segment.ids(), dead_ids)]}
+                with self._lock:
+                    self.segments = remaining[:position] + replacement + remaining[position:]
+                    self.tombstones = self.tombstones - removed
+                    self._refresh_search_params()
+                self._save_tombstones()
+                self._save_manifest()
+                self.chunks.delete_many(removed)
+            
+            for segment in segments:
+                segment.delete_files(self.directory)
+            
+            size_after = self.size_bytes()
+            return {
+                "segments_merged": len(segments),
+                "vectors_removed": len(removed),
+                "bytes_reclaimed": size_before - size_after,
+                "size_bytes": size_after,
+                "index_type": merged.kind if merged.ntotal else None,
+                "compression": merged.compression if merged.ntotal else None
+            }
+    
+    @staticmethod
+    def _has_dead(segment: Segment, dead: Set[int]) -> bool:
+        if not dead:
+            return False
+        return bool(np.isin(segment.ids(), np.fromiter(dead, dtype="int64", count=len(dead))).any())
+    
+    def _build_merged(self, name: str, segments: List[Segment], dead: Set[int]) -> Segment:
+        """
+        One segment holding the live vectors of segments
+        The new index is filled MERGE_BLOCK_VECTORS at a time from the source segment files,
+        so besides the index itself only a block (and a training sample) of the vectors is in
+        the heap, however many segments a streamed document was written as. The full vectors
+        a compressed layout keeps go to a mapped file the same way.
+        """
+        dead_ids = np.fromiter(dead, dtype="int64", count=len(dead))
+        source = _MergeSource(segments, [np.flatnonzero(~np.isin(segment.ids(), dead_ids)) for segment in segments])
+        # Slices of a streamed document in the merged segments become one range
+        ranges = _document_ranges(
+            {document_id: document_range for document_id, document_range in segment.ranges.items() if document_range[0] not in dead}
+            for segment in segments
+        )
+        
+        kind, compression = choose_layout(len(source))
+        # Training an IVF, PQ or scalar quantizer happens here, outside the writer
+        index = faiss.IndexIDMap2(build_index(kind, self.dimension, source, compression))
+        raw_vectors, raw_path = None, None
+        if len(source) and (compression != "none" or kind == "ivfpq"):
+            raw_path = self._path(f"{Segment.raw_vectors_file(name)}.merging")
+            raw_vectors = np.lib.format.open_memmap(raw_path, mode="w+", dtype="float32", shape=(len(source), self.dimension))
+        position = 0
+        for ids, vectors in source.blocks():
+            index.add_with_ids(vectors, ids)
+            if raw_vectors is not None:
+                raw_vectors[position:position + len(ids)] = vectors
+            position += len(ids)
+        try:
+            return self._persist(Segment(name, index, ranges, raw_vectors))
+        finally:
+            if raw_path is not None:
+                os.remove(raw_path)
+    
+    def compact(self) -> Dict[str, Any]:
+        """Merge every segment into a new base without the vectors of deleted documents"""
+        result = self.merge(include_base=True)
+        if result is None:
+            return {"segments_merged": 0, "vectors_removed": 0, "bytes_reclaimed": 0, "size_bytes": self.size_bytes(), "skipped": "merge already running"}
+        return result
+    
+    def stats(self) -> Dict[str, Any]:
+        self.refresh()
+        with self._lock:
+            total = sum(segment.ntotal for segment in self.segments)
+            return {
+                "generation": self.generation,
+                "vectors": total,
+                "live_vectors": total - len(self.tombstones),
+                "tombstoned_vectors": len(self.tombstones),
+                "dead_ratio": round(len(self.tombstones) / total, 4) if total else 0.0,
+                "documents": len(self.ranges),
+                "dimension": self.dimension,
+                "segments": len(self.segments),
+                "delta_segments": self.delta_count,
+                "index_types": {
+                    kind: sum(1 for segment in self.segments if segment.kind == kind)
+                    for kind in INDEX_TYPES
+                    if any(segment.kind == kind for segment in self.segments)
+                },
+                "compression": {
+                    compression: sum(1 for segment in self.segments if segment.compression == compression)
+                    for compression in COMPRESSIONS
+                    if any(segment.compression == compression for segment in self.segments)
+                },
+                "rerank_factor": FAISS_RERANK_FACTOR,
+                "index_bytes_per_vector": round(self._index_bytes() / total, 1) if total else None,
+                "size_bytes": self.size_bytes(),
+                "chunk_store_bytes": self.chunks.size_bytes(),
+                "mmap": FAISS_MMAP,
+                "reloads": self.reloads,
+                "reload_ms": self._summary(self.reload_seconds),
+                "reload_staleness_ms": self._summary(self.reload_staleness_seconds)
+            }
+    
+    @staticmethod
+    def _summary(seconds: List[float]) -> Optional[Dict[str, float]]:
+        """Last / mean / max of recent timings in milliseconds"""
+        if not seconds:
+            return None
+        return {
+            "last": round(seconds[-1] * 1000, 2),
+            "mean": round(sum(seconds) / len(seconds) * 1000, 2),
+            "max": round(max(seconds) * 1000, 2)
+        }
+    
+    def migrate_legacy(self, live_document_ids: Set[str]) -> bool:
+        """
+        Convert a LangChain index.faiss / index.pkl pair into this layout
+        Chunks of documents no longer in the metadata (removed before deletes were real)
+        are tombstoned straight away. The old files are kept with a .legacy suffix.
+        """
+        legacy_index_path = self._path(LEGACY_INDEX_FILE)
+        legacy_docstore_path = self._path(LEGACY_DOCSTORE_FILE)
+        if not (os.path.exists(legacy_index_path) and os.path.exists(legacy_docstore_path)):
+            return False
+        
+        legacy_index = faiss.read_index(legacy_index_path)
+        with open(legacy_docstore_path, "rb") as f:
+            legacy_docstore, index_to_docstore_id = pickle.load(f)
+        
+        vectors = legacy_index.reconstruct_n(0, legacy_index.ntotal)
+        by_document: Dict[str, List[int]] = {}
+        for position in range(legacy_index.ntotal):
+            document = legacy_docstore.search(index_to_docstore_id[position])
+            by_document.setdefault(document.metadata.get("document_id", ""), []).append(position)
+        
+        documents = []
+        for document_id, positions in by_document.items():
+            chunks = [legacy_docstore.search(index_to_docstore_id[p]) for p in positions]
+            documents.append((
+                document_id,
+                [chunk.page_content for chunk in chunks],
+                vectors[positions],
+                [chunk.metadata for chunk in chunks]
+            ))
+        self.add_documents(documents)
+        
+        for document_id in by_document:
+            if document_id not in live_document_ids:
+                self.delete_document(document_id)
+        
+        os.replace(legacy_index_path, f"{legacy_index_path}.legacy")
+        os.replace(legacy_docstore_path, f"{legacy_docstore_path}.legacy")
+        return True
@@ -1,69 +1,93 @@
 import os
-import json
+import asyncio
 import hashlib
+import threading
+import time
 from pathlib import Path
 from typing import Optional, List, Dict, Any
 from dotenv import load_dotenv
 
-from langchain_community.document_loaders import TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai.embeddings import OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from .embeddings import (
+    ProgressCallback,
+    aembed_documents_parallel,
+    create_embeddings,
+    embed_documents_in_batches,
+)
+from .chunking import Chunk, achunk_many, chunking_settings, split_file
+from .diversity import MMR_CANDIDATES
+from .document_catalog import DocumentCatalog
+from .faiss_index import ChunkIndex
+from .streaming import ChunkSpool, estimated_total, iter_chunk_batches, should_stream
 
 # Load environment variables
 load_dotenv()
 
+# Compact in the background once this fraction of the indexed vectors belongs to deleted documents
+FAISS_COMPACT_DEAD_RATIO = float(os.getenv("FAISS_COMPACT_DEAD_RATIO", "0.3"))
+
+# Each commit writes a delta segment; merge in the background once this many have piled up
+FAISS_MAX_DELTA_SEGMENTS = int(os.getenv("FAISS_MAX_DELTA_SEGMENTS", "8"))
+
+# Fold the deltas into the base segment once they hold this fraction of its vectors
+FAISS_BASE_MERGE_RATIO = float(os.getenv("FAISS_BASE_MERGE_RATIO", "0.25"))
+
+# Vectors per delta segment when a streamed (large) document is written from its spool
+FAISS_STREAM_SEGMENT_VECTORS = int(os.getenv("FAISS_STREAM_SEGMENT_VECTORS", "16384"))
+
 
 class VectorStoreManager:
     """Manages persistent vector store and document tracking"""
     
-    def __init__(self, vector_store_path: str = "vector_store", metadata_path: str = "vector_store_metadata.json"):
+    def __init__(
+        self,
+        vector_store_path: str = "vector_store",
+        metadata_path: str = "vector_store_metadata.json",
+        catalog_path: Optional[str] = None
+    ):
         self.vector_store_path = vector_store_path
+        # JSON metadata written by older versions, imported into the catalog on first start
         self.metadata_path = metadata_path
-        self.embeddings = OpenAIEmbeddings()
-        self.vector_store: Optional[FAISS] = None
-        self.metadata: Dict[str, Dict] = {}
+        self.catalog_path = catalog_path or os.path.join(vector_store_path, "documents.db")
+        self.embeddings = create_embeddings()
+        self.index = ChunkIndex(vector_store_path)
         
         # Create vector store directory if it doesn't exist
         Path(vector_store_path).mkdir(parents=True, exist_ok=True)
         
-        # Load existing metadata
-        self._load_metadata()
-        
-        # Load existing vector store if available
-        self._load_vector_store()
+        # Every gunicorn worker runs this at startup; one at a time imports or migrates older layouts
+        with self.index.writer():
+            # Load existing metadata
+            self._load_metadata()
+            
+            # Load existing vector store if available
+            self._load_vector_store()
     
     def _load_metadata(self):
-        """Load document metadata from JSON file"""
-        if os.path.exists(self.metadata_path):
-            with open(self.metadata_path, 'r') as f:
-                self.metadata = json.load(f)
-        else:
-            self.metadata = {}
-    
-    def _save_metadata(self):
-        """Save document metadata to JSON file"""
-        with open(self.metadata_path, 'w') as f:
-            json.dump(self.metadata, f, indent=2)
+        """Open the document catalog, importing the JSON metadata of older versions"""
+        self.catalog = DocumentCatalog(self.catalog_path)
+        imported = self.catalog.import_json(self.metadata_path)
+        if imported:
+            print(f"Imported {imported} documents from {self.metadata_path}")
     
     def _load_vector_store(self):
-        """Load existing FAISS vector store"""
-        if os.path.exists(os.path.join(self.vector_store_path, "index.faiss")):
-            try:
-                self.vector_store = FAISS.load_local(
-                    self.vector_store_path, 
-                    self.embeddings,
-                    allow_dangerous_deserialization=True
-                )
-                print(f"Loaded existing vector store with {len(self.metadata)} documents")
-            except Exception as e:
-                print(f"Error loading vector store: {e}")
-                self.vector_store = None
+        """Load existing FAISS vector store, converting a LangChain-format store on first start"""
+        try:
+            if self.index.load():
+                print(f"Loaded existing vector store with {len(self.catalog)} documents")
+            elif self.index.migrate_legacy(set(self.catalog.ids())):
+                print(f"Migrated legacy vector store with {len(self.catalog)} documents")
+        except Exception as e:
+            print(f"Error loading vector store: {e}")
+            self.index = ChunkIndex(self.vector_store_path)
     
-    def _save_vector_store(self):
-        """Save FAISS vector store to disk"""
-        if self.vector_store:
-            self.vector_store.save_local(self.vector_store_path)
+    def _notify_corpus_changed(self):
+        """Invalidate answers cached against the previous corpus"""
+        from src.core.answer_cache import invalidate_answer_cache
+        invalidate_answer_cache()
     
     def _calculate_file_hash(self, file_path: str) -> str:
         """Calculate SHA256 hash of a file"""
@@ -79,68 +103,82 @@ class VectorStoreManager:
         Returns: (exists: bool, document_id: Optional[str])
         """
         file_hash = self._calculate_file_hash(file_path)
-        
-        for doc_id, doc_info in self.metadata.items():
-            if doc_info.get('file_hash') == file_hash:
-                return True, doc_id
-        
-        return False, None
+        return self._find_by_hash(file_hash)
+    
+    def _find_by_hash(self, file_hash: str) -> tuple[bool, Optional[str]]:
+        """Look up a document by content hash (one indexed catalog lookup)"""
+        doc_id = self.catalog.find_by_hash(file_hash)
+        return doc_id is not None, doc_id
     
-    def add_document(self, file_path: str, original_filename: str) -> Dict[str, Any]:
+    def add_document(
+        self,
+        file_path: str,
+        original_filename: str,
+        progress_callback: Optional[ProgressCallback] = None,
+        file_hash: Optional[str] = None,
+        chunking: Optional[Dict[str, Any]] = None,
+        stored_path: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         Add a new document to the vector store
+        progress_callback is called with (chunks_embedded, chunks_total) after each embedding batch
+        file_hash is the SHA256 computed while the upload was written, if known (saves a second read)
+        chunking is the upload's chunking settings (chunking.chunking_settings, the CHUNK_* defaults if None)
+        stored_path is where a staged upload is moved once its chunks are committed (the catalog
+        records it); by default the file stays at file_path
         Returns: Dictionary with status and document info
         """
-        # Check if document already exists
-        exists, existing_id = self.document_exists(file_path)
-        if exists:
-            return {
-                "status": "duplicate",
-                "message": f"Document already exists with ID: {existing_id}",
-                "document_id": existing_id
-            }
-        
+        chunking = chunking or chunking_settings()
         try:
-            # Load the document
-            loader = TextLoader(file_path, encoding='utf-8')
-            documents = loader.load()
-            
-            # Split the document into chunks
-            splitter = RecursiveCharacterTextSplitter(chunk_size=200, chunk_overlap=20)
-            document_chunks = splitter.split_documents(documents)
-            
             # Calculate file hash for duplicate detection
-            file_hash = self._calculate_file_hash(file_path)
+            if file_hash is None:
+                file_hash = self._calculate_file_hash(file_path)
+            
+            # Check if document already exists
+            exists, existing_id = self._find_by_hash(file_hash)
+            if exists:
+                return {
+                    "status": "duplicate",
+                    "message": f"Document already exists with ID: {existing_id}",
+                    "document_id": existing_id
+                }
             
             # Generate unique document ID
             doc_id = f"doc_{file_hash[:16]}"
             
-            # Add metadata to each chunk
-            for chunk in document_chunks:
-                chunk.metadata['document_id'] = doc_id
-                chunk.metadata['source_file'] = original_filename
+            # Large files are chunked, embedded and written without loading them whole
+            stored_path = stored_path or file_path
+            if should_stream(file_path):
+                return self._add_streamed(
+                    file_path, doc_id, original_filename, file_hash, progress_callback, chunking, stored_path
+                )
             
-            # Add to vector store or create new one
-            if self.vector_store is None:
-                self.vector_store = FAISS.from_documents(document_chunks, self.embeddings)
-            else:
-                # Add new documents to existing vector store
-                new_vector_store = FAISS.from_documents(document_chunks, self.embeddings)
-                self.vector_store.merge_from(new_vector_store)
+            # Load and split the document into chunks
+            document_chunks = self._load_chunks(file_path, doc_id, original_filename, chunking, stored_path)
             
-            # Save vector store
-            self._save_vector_store()
+            # Embed outside the lock so searches keep running meanwhile
+            texts = [chunk.page_content for chunk in document_chunks]
+            metadatas = [chunk.metadata for chunk in document_chunks]
+            vectors = embed_documents_in_batches(self.embeddings, texts, progress_callback)
             
-            # Update metadata
-            self.metadata[doc_id] = {
-                'document_id': doc_id,
-                'original_filename': original_filename,
-                'file_hash': file_hash,
-                'file_path': file_path,
-                'chunk_count': len(document_chunks),
-                'added_at': str(Path(file_path).stat().st_mtime)
-            }
-            self._save_metadata()
+            # Commits and deletes from every worker process are serialized by the index writer lock
+            with self.index.writer():
+                # Another upload of the same file may have finished while we were embedding
+                exists, existing_id = self._find_by_hash(file_hash)
+                if exists:
+                    return {
+                        "status": "duplicate",
+                        "message": f"Document already exists with ID: {existing_id}",
+                        "document_id": existing_id
+                    }
+                
+                self._commit(
+                    texts,
+                    vectors,
+                    metadatas,
+                    [self._metadata_entry(doc_id, original_filename, file_hash, file_path, len(document_chunks), stored_path)]
+                )
+                self._keep_file(file_path, stored_path)
             
             return {
                 "status": "success",
@@ -148,7 +186,7 @@ class VectorStoreManager:
                 "document_id": doc_id,
                 "chunk_count": len(document_chunks)
             }
-            
+        
         except Exception as e:
             return {
                 "status": "error",
@@ -156,34 +194,446 @@ class VectorStoreManager:
                 "document_id": None
             }
     
-    def get_retriever(self, k: int = 2):
-        """Get a retriever from the vector store"""
-        if self.vector_store is None:
+    def _add_streamed(
+        self,
+        file_path: str,
+        doc_id: str,
+        original_filename: str,
+        file_hash: str,
+        progress_callback: Optional[ProgressCallback] = None,
+        chunking: Optional[Dict[str, Any]] = None,
+        stored_path: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        add_document for a large file (see src/backends/streaming.py)
+        Chunks are cut block by block and embedded batch by batch into a spool next to the
+        index; the document's segments are then written from the spool under the writer.
+        Progress totals are estimated from the share of the file read so far.
+        """
+        with ChunkSpool(self.vector_store_path) as spool:
+            for texts, chunk_metadatas, fraction_read in iter_chunk_batches(file_path, chunking or chunking_settings()):
+                vectors = embed_documents_in_batches(self.embeddings, texts)
+                metadatas = [
+                    self._chunk_metadata(metadata, stored_path or file_path, doc_id, original_filename)
+                    for metadata in chunk_metadatas
+                ]
+                spool.append(texts, vectors, metadatas)
+                if progress_callback:
+                    progress_callback(spool.count, estimated_total(spool.count, fraction_read))
+            
+            with self.index.writer():
+                # Another upload of the same file may have finished while we were embedding
+                exists, existing_id = self._find_by_hash(file_hash)
+                if exists:
+                    return {
+                        "status": "duplicate",
+                        "message": f"Document already exists with ID: {existing_id}",
+                        "document_id": existing_id
+                    }
+                
+                chunk_count = self.index.add_spooled_document(doc_id, spool, FAISS_STREAM_SEGMENT_VECTORS)
+                self.catalog.add_many([
+                    self._metadata_entry(doc_id, original_filename, file_hash, file_path, chunk_count, stored_path)
+                ])
+                self._keep_file(file_path, stored_path)
+                self._notify_corpus_changed()
+                self._maybe_merge()
+        
+        return {
+            "status": "success",
+            "message": f"Document added successfully with {chunk_count} chunks (streamed)",
+            "document_id": doc_id,
+            "chunk_count": chunk_count
+        }
+    
+    async def aadd_documents(
+        self,
+        files: List[tuple[str, str]],
+        progress_callback: Optional[ProgressCallback] = None,
+        file_hashes: Optional[List[Optional[str]]] = None,
+        chunking: Optional[Dict[str, Any]] = None,
+        stored_paths: Optional[List[Optional[str]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Add many documents at once
+        files is a list of (file_path, original_filename); file_hashes optionally gives their
+        SHA256 when it was computed during the upload, stored_paths where each staged file
+        is moved once committed (as for add_document). Duplicates are dropped up front, the
+        files are chunked (in the chunking process pool if CHUNKING_PROCESSES is set),
+        chunks from all files are embedded in large parallel batches and the vector store
+        is written once at the end. Files large enough for streaming ingestion are committed
+        on their own as they come up.
+        Returns: Dictionary with overall status, per-file results and throughput
+        """
+        started = time.perf_counter()
+        results: List[Dict[str, Any]] = []
+        pending = []
+        seen_hashes: Dict[str, str] = {}
+        streamed_chunks: List[int] = []
+        chunking = chunking or chunking_settings()
+        
+        try:
+            # Dedupe by hash against the store and within the batch
+            for (file_path, original_filename), file_hash, stored_path in zip(
+                files, file_hashes or [None] * len(files), stored_paths or [None] * len(files)
+            ):
+                if file_hash is None:
+                    file_hash = await asyncio.to_thread(self._calculate_file_hash, file_path)
+                exists, existing_id = self._find_by_hash(file_hash)
+                if not exists and file_hash in seen_hashes:
+                    exists, existing_id = True, seen_hashes[file_hash]
+                if exists:
+                    results.append({
+                        "filename": original_filename,
+                        "status": "duplicate",
+                        "message": f"Document already exists with ID: {existing_id}",
+                        "document_id": existing_id
+                    })
+                    continue
+                
+                doc_id = f"doc_{file_hash[:16]}"
+                seen_hashes[file_hash] = doc_id
+                stored_path = stored_path or file_path
+                if should_stream(file_path):
+                    # Committed on its own rather than held in memory with the batch
+                    result = await asyncio.to_thread(
+                        self._add_streamed, file_path, doc_id, original_filename, file_hash, None, chunking, stored_path
+                    )
+                    results.append({"filename": original_filename, **result})
+                    if result["status"] == "success":
+                        streamed_chunks.append(result["chunk_count"])
+                    continue
+                pending.append((file_path, stored_path, original_filename, file_hash, doc_id))
+            
+            split = await achunk_many(split_file, [file_path for file_path, *_ in pending], chunking)
+            pending = [
+                (file_path, stored_path, original_filename, file_hash, doc_id, self._tag_chunks(chunks, stored_path, doc_id, original_filename))
+                for (file_path, stored_path, original_filename, file_hash, doc_id), chunks in zip(pending, split)
+            ]
+            
+            # Pack chunks from every file into shared embedding batches
+            all_chunks = [chunk for *_, chunks in pending for chunk in chunks]
+            texts = [chunk.page_content for chunk in all_chunks]
+            metadatas = [chunk.metadata for chunk in all_chunks]
+            vectors = await aembed_documents_parallel(
+                self.embeddings, texts, progress_callback=progress_callback
+            )
+            
+            entries = [
+                self._metadata_entry(doc_id, original_filename, file_hash, file_path, len(chunks), stored_path)
+                for file_path, stored_path, original_filename, file_hash, doc_id, chunks in pending
+            ]
+            committed = []
+            if entries:
+                committed = await asyncio.to_thread(self._locked_commit, texts, vectors, metadatas, entries)
+            committed_ids = {entry["document_id"] for entry in committed}
+            for file_path, stored_path, _, _, doc_id, _ in pending:
+                if doc_id in committed_ids:
+                    self._keep_file(file_path, stored_path)
+        
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": f"Error processing documents: {str(e)}",
+                "documents": results
+            }
+        
+        for entry in entries:
+            if entry["document_id"] not in committed_ids:
+                results.append({
+                    "filename": entry["original_filename"],
+                    "status": "duplicate",
+                    "message": f"Document already exists with ID: {entry['document_id']}",
+                    "document_id": entry["document_id"]
+                })
+                continue
+            results.append({
+                "filename": entry["original_filename"],
+                "status": "success",
+                "message": f"Document added successfully with {entry['chunk_count']} chunks",
+                "document_id": entry["document_id"],
+                "chunk_count": entry["chunk_count"]
+            })
+        
+        document_count = len(committed) + len(streamed_chunks)
+        chunk_count = sum(entry["chunk_count"] for entry in committed) + sum(streamed_chunks)
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        return {
+            "status": "success",
+            "message": f"Added {document_count} documents ({chunk_count} chunks), skipped {len(files) - document_count} duplicates",
+            "documents": results,
+            "document_count": document_count,
+            "chunk_count": chunk_count,
+            "elapsed_seconds": round(elapsed, 3),
+            "documents_per_second": round(document_count / elapsed, 2),
+            "chunks_per_second": round(chunk_count / elapsed, 2)
+        }
+    
+    def _load_chunks(
+        self,
+        file_path: str,
+        doc_id: str,
+        original_filename: str,
+        chunking: Dict[str, Any],
+        stored_path: Optional[str] = None
+    ) -> List[Document]:
+        """Load a text file and split it into tagged chunks (their source is stored_path, if given)"""
+        return self._tag_chunks(split_file(file_path, chunking), stored_path or file_path, doc_id, original_filename)
+    
+    def _tag_chunks(self, chunks: List[Chunk], file_path: str, doc_id: str, original_filename: str) -> List[Document]:
+        """Chunks as Documents carrying their document's metadata"""
+        return [
+            Document(page_content=text, metadata=self._chunk_metadata(metadata, file_path, doc_id, original_filename))
+            for text, metadata in chunks
+        ]
+    
+    def _chunk_metadata(self, metadata: Dict[str, Any], file_path: str, doc_id: str, original_filename: str) -> Dict[str, Any]:
+        return {'source': file_path, **metadata, 'document_id': doc_id, 'source_file': original_filename}
+    
+    def _metadata_entry(
+        self,
+        doc_id: str,
+        original_filename: str,
+        file_hash: str,
+        file_path: str,
+        chunk_count: int,
+        stored_path: Optional[str] = None
+    ) -> Dict[str, Any]:
+        return {
+            'document_id': doc_id,
+            'original_filename': original_filename,
+            'file_hash': file_hash,
+            'file_path': stored_path or file_path,
+            'chunk_count': chunk_count,
+            'added_at': str(Path(file_path).stat().st_mtime)
+        }
+    
+    def _keep_file(self, file_path: str, stored_path: Optional[str]):
+        """Move a committed upload from its staging path to where the catalog records it"""
+        if not stored_path or stored_path == file_path:
+            return
+        try:
+            os.replace(file_path, stored_path)
+        except OSError as e:
+            # The chunks are committed either way; only the copy kept in the data directory is missing
+            print(f"Error moving {file_path} to {stored_path}: {e}")
+    
+    def _locked_commit(
+        self,
+        texts: List[str],
+        vectors: List[List[float]],
+        metadatas: List[Dict],
+        entries: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Commit under the index writer lock, skipping documents added by someone else meanwhile; returns what was committed"""
+        with self.index.writer():
+            late_duplicates = {entry['document_id'] for entry in entries if self._find_by_hash(entry['file_hash'])[0]}
+            if late_duplicates:
+                keep = [i for i, metadata in enumerate(metadatas) if metadata['document_id'] not in late_duplicates]
+                texts = [texts[i] for i in keep]
+                vectors = [vectors[i] for i in keep]
+                metadatas = [metadatas[i] for i in keep]
+                entries = [entry for entry in entries if entry['document_id'] not in late_duplicates]
+            if entries:
+                self._commit(texts, vectors, metadatas, entries)
+            return entries
+    
+    def _commit(self, texts: List[str], vectors: List[List[float]], metadatas: List[Dict], entries: List[Dict[str, Any]]):
+        """Add embedded chunks to the index and persist it with the new metadata (caller holds the index writer)"""
+        # Written as one small delta segment; each document gets its own contiguous id range
+        documents = []
+        start = 0
+        for entry in entries:
+            end = start + entry['chunk_count']
+            documents.append((entry['document_id'], texts[start:end], vectors[start:end], metadatas[start:end]))
+            start = end
+        self.index.add_documents(documents)
+        
+        # Update metadata
+        self.catalog.add_many(entries)
+        self._notify_corpus_changed()
+        self._maybe_merge()
+    
+    def _maybe_merge(self):
+        """
+        Start a background merge once there are FAISS_MAX_DELTA_SEGMENTS deltas
+        Deltas are merged with each other, and folded into the base segment only when they
+        add up to FAISS_BASE_MERGE_RATIO of it, so merge work stays proportional to new data
+        """
+        if self.index.delta_count < FAISS_MAX_DELTA_SEGMENTS:
+            return
+        base_vectors = self.index.segments[0].ntotal
+        delta_vectors = sum(segment.ntotal for segment in self.index.segments[1:])
+        include_base = delta_vectors >= FAISS_BASE_MERGE_RATIO * base_vectors
+        threading.Thread(target=self.index.merge, args=(include_base,), name="faiss-merge", daemon=True).start()
+    
+    def get_retriever(self, k: int = 2, filters: Optional[Dict[str, Any]] = None) -> "IndexRetriever":
+        """Get a retriever from the vector store, optionally limited to documents matching filters"""
+        if self.index.live_count <= 0:
+            raise ValueError("No vector store available. Please add documents first.")
+        
+        return IndexRetriever(manager=self, k=k, filters=filters)
+    
+    def similarity_search(self, query: str, k: int = 2, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
+        """Embed the query and return the k most similar live chunks"""
+        return self._search_by_vector(self.embeddings.embed_query(query), k, filters)
+    
+    async def asimilarity_search(self, query: str, k: int = 2, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
+        """
+        Async similarity search that never blocks the event loop.
+        The query is embedded with the async client and the FAISS search runs in a worker thread.
+        """
+        if self.index.live_count <= 0:
             raise ValueError("No vector store available. Please add documents first.")
         
-        return self.vector_store.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": k}
+        query_embedding = await self.embeddings.aembed_query(query)
+        return await self.asimilarity_search_by_vector(query_embedding, k, filters)
+    
+    async def asimilarity_search_by_vector(
+        self,
+        query_embedding: List[float],
+        k: int = 2,
+        filters: Optional[Dict[str, Any]] = None,
+        mmr: bool = False
+    ) -> List[Document]:
+        """
+        Search with an already computed query embedding, off the event loop
+        mmr picks the k results out of MMR_CANDIDATES for diversity (see src/backends/diversity.py)
+        """
+        return await asyncio.to_thread(self._search_by_vector, query_embedding, k, filters, mmr)
+    
+    def _search_by_vector(
+        self,
+        query_embedding: List[float],
+        k: int,
+        filters: Optional[Dict[str, Any]] = None,
+        mmr: bool = False
+    ) -> List[Document]:
+        # The index snapshots its segments, so searches never wait for a commit or merge;
+        # a newer generation written by another worker is loaded first
+        self.index.refresh()
+        if self.index.live_count <= 0:
+            raise ValueError("No vector store available. Please add documents first.")
+        document_ids = self._filtered_document_ids(filters)
+        mmr_candidates = MMR_CANDIDATES if mmr else 0
+        return [document for document, _ in self.index.search(query_embedding, k, document_ids, mmr_candidates)]
+    
+    async def ahybrid_search_by_vector(
+        self,
+        query: str,
+        query_embedding: List[float],
+        k: int = 2,
+        filters: Optional[Dict[str, Any]] = None,
+        mmr: bool = False
+    ) -> List[Document]:
+        """Keyword + vector search fused by reciprocal rank (see src/backends/hybrid.py), off the event loop"""
+        return await asyncio.to_thread(self._hybrid_search, query, query_embedding, k, filters, mmr)
+    
+    def _hybrid_search(
+        self,
+        query: str,
+        query_embedding: List[float],
+        k: int,
+        filters: Optional[Dict[str, Any]] = None,
+        mmr: bool = False
+    ) -> List[Document]:
+        self.index.refresh()
+        if self.index.live_count <= 0:
+            raise ValueError("No vector store available. Please add documents first.")
+        document_ids = self._filtered_document_ids(filters)
+        mmr_candidates = MMR_CANDIDATES if mmr else 0
+        return [
+            document
+            for document, _ in self.index.hybrid_search(query, query_embedding, k, document_ids=document_ids, mmr_candidates=mmr_candidates)
+        ]
+    
+    def _filtered_document_ids(self, filters: Optional[Dict[str, Any]]) -> Optional[List[str]]:
+        """
+        Documents passing the query filters, or None to search everything
+        filters may hold "document_ids" and "filenames" (lists) and "uploaded_after" /
+        "uploaded_before" (datetimes); the search is then restricted to those documents'
+        id ranges inside FAISS.
+        """
+        if not filters:
+            return None
+        return self.catalog.find_ids(
+            document_ids=filters.get("document_ids"),
+            filenames=filters.get("filenames"),
+            added_after=filters["uploaded_after"].timestamp() if filters.get("uploaded_after") else None,
+            added_before=filters["uploaded_before"].timestamp() if filters.get("uploaded_before") else None
         )
     
     def get_all_documents(self) -> List[Dict]:
         """Get list of all documents in the vector store"""
-        return list(self.metadata.values())
+        return self.catalog.all()
     
     def remove_document(self, doc_id: str) -> Dict[str, Any]:
-        """Remove a document from metadata (Note: FAISS doesn't support deletion easily)"""
-        if doc_id in self.metadata:
-            del self.metadata[doc_id]
-            self._save_metadata()
-            return {
-                "status": "success",
-                "message": f"Document {doc_id} removed from metadata. Rebuild vector store to fully remove."
-            }
+        """
+        Remove a document from the vector store
+        Its chunks are tombstoned and excluded from searches immediately; the vectors are
+        dropped from disk by the next compaction (started automatically past FAISS_COMPACT_DEAD_RATIO)
+        """
+        with self.index.writer():
+            if doc_id not in self.catalog:
+                return {
+                    "status": "error",
+                    "message": f"Document {doc_id} not found"
+                }
+            chunk_count = self.index.delete_document(doc_id)
+            self.catalog.remove(doc_id)
+            self._notify_corpus_changed()
+            dead_ratio = self.index.stats()["dead_ratio"]
+        
+        if dead_ratio >= FAISS_COMPACT_DEAD_RATIO:
+            threading.Thread(target=self.compact, name="faiss-compaction", daemon=True).start()
+        
+        return {
+            "status": "success",
+            "message": f"Document {doc_id} removed ({chunk_count} chunks)",
+            "chunks_removed": chunk_count
+        }
+    
+    def compact(self) -> Dict[str, Any]:
+        """Rewrite the index without the vectors of deleted documents"""
+        started = time.perf_counter()
+        # Runs without the manager lock: the index swaps in the merged segment atomically
+        result = self.index.compact()
+        print(f"Compacted vector store: {result['vectors_removed']} vectors, {result['bytes_reclaimed']} bytes reclaimed")
         return {
-            "status": "error",
-            "message": f"Document {doc_id} not found"
+            "status": "success",
+            "message": f"Removed {result['vectors_removed']} deleted vectors, reclaimed {result['bytes_reclaimed']} bytes",
+            **result,
+            "elapsed_seconds": round(time.perf_counter() - started, 3)
         }
+    
+    def stats(self) -> Dict[str, Any]:
+        """Index size, segment and tombstone counters for monitoring"""
+        return self.index.stats()
+
+
+class IndexRetriever(BaseRetriever):
+    """LangChain retriever over a VectorStoreManager"""
+    
+    manager: Any
+    k: int = 2
+    filters: Optional[Dict[str, Any]] = None
+    
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.manager.similarity_search(query, self.k, self.filters)
+    
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        return await self.manager.asimilarity_search(query, self.k, self.filters)
+
 
+# Global instance (created on first use)
+vector_store_manager: Optional[VectorStoreManager] = None
+_vector_store_manager_lock = threading.Lock()
 
-# Global instance
-vector_store_manager = VectorStoreManager()
+def get_vector_store_manager() -> VectorStoreManager:
+    """Get or create the vector store manager (the warm-up thread and requests may race here)"""
+    global vector_store_manager
+    if vector_store_manager is None:
+        with _vector_store_manager_lock:
+            if vector_store_manager is None:
+                vector_store_manager = VectorStoreManager()
+    return vector_store_manager
@@ -0,0 +1,33 @@
+"""
+Hybrid retrieval: lexical (BM25) and vector rankings merged by reciprocal rank fusion.
+Embeddings miss exact tokens such as error codes, SKUs and names; a keyword index finds
+them. Each ranking contributes 1 / (RRF_K + rank) per chunk, so a chunk near the top of
+either list makes the cut without tuning weights between BM25 and distance scores.
+The local backend fuses in Python (see ChunkIndex.hybrid_search); Supabase fuses in SQL
+(hybrid_match_documents in config/setup_supabase.sql).
+"""
+import os
+from typing import Dict, Iterable, List, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Retrieve with keyword + vector fusion instead of vector similarity alone
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "false").lower() == "true"
+
+# Candidates taken from each ranking before fusing
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+
+# Damps the weight of the very top ranks; 60 is the value from the original RRF paper
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[int]], limit: int, rrf_k: int = RRF_K) -> List[Tuple[int, float]]:
+    """Top (chunk id, fused score) pairs of several best-first rankings"""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank)
+    # Ties keep first-seen order, i.e. the vector ranking's when it is passed first
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
@@ -0,0 +1,213 @@
+"""
+Direct Postgres bulk loading for the Supabase backend
+PostgREST inserts carry every embedding as a JSON list of 1536 numbers (about 30 KB per
+chunk), which is slow to serialize and parse and runs into request size limits on large
+documents. With SUPABASE_DIRECT_INGEST=true chunks go straight to Postgres instead, over
+a small pool of psycopg2 connections: document rows and chunk rows are written with
+COPY ... (FORMAT binary) in batches of SUPABASE_COPY_BATCH_ROWS, so each vector travels as
+6 KB of float4s (pgvector's binary format), and all of a load commits in one transaction.
+Uploads insert their document rows with INSERT ... ON CONFLICT (file_hash) DO NOTHING
+first, so a concurrent upload of the same file is reported as a duplicate, not an error.
+"""
+import json
+import os
+import struct
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Write chunks over a direct Postgres connection instead of PostgREST inserts
+SUPABASE_DIRECT_INGEST = os.getenv("SUPABASE_DIRECT_INGEST", "false").lower() == "true"
+
+# Postgres connection string (Project Settings -> Database), shared with scripts/supabase_db.py
+SUPABASE_DB_URL = os.getenv("SUPABASE_DB_URL", "")
+
+# Connections kept open for ingestion
+SUPABASE_DB_POOL_SIZE = int(os.getenv("SUPABASE_DB_POOL_SIZE", "4"))
+
+# Chunk rows per COPY batch; bounds the memory one batch's encoded rows take
+SUPABASE_COPY_BATCH_ROWS = int(os.getenv("SUPABASE_COPY_BATCH_ROWS", "1000"))
+
+COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+COPY_HEADER = COPY_SIGNATURE + struct.pack("!ii", 0, 0)
+COPY_TRAILER = struct.pack("!h", -1)
+NULL_FIELD = struct.pack("!i", -1)
+
+DOCUMENT_COLUMNS = ("document_id", "filename", "file_hash", "file_path", "chunk_count")
+CHUNK_COLUMNS = ("document_id", "chunk_index", "content", "embedding", "metadata")
+
+
+def _text(value: str) -> bytes:
+    data = value.encode("utf-8")
+    return struct.pack("!i", len(data)) + data
+
+
+def _int4(value: int) -> bytes:
+    return struct.pack("!ii", 4, value)
+
+
+def _jsonb(value: Optional[Dict[str, Any]]) -> bytes:
+    if value is None:
+        return NULL_FIELD
+    # jsonb's binary form is a version byte followed by the JSON text
+    data = b"\x01" + json.dumps(value).encode("utf-8")
+    return struct.pack("!i", len(data)) + data
+
+
+def _vector(values) -> bytes:
+    from pgvector import Vector
+    data = Vector(values).to_binary()
+    return struct.pack("!i", len(data)) + data
+
+
+def encode_document_rows(rows: List[Dict[str, Any]]) -> bytes:
+    """COPY binary stream for documents rows (DOCUMENT_COLUMNS)"""
+    parts = [COPY_HEADER]
+    for row in rows:
+        parts.append(struct.pack("!h", len(DOCUMENT_COLUMNS)))
+        parts.append(_text(row["document_id"]))
+        parts.append(_text(row["filename"]))
+        parts.append(_text(row["file_hash"]))
+        parts.append(_text(row["file_path"]))
+        parts.append(_int4(row["chunk_count"]))
+    parts.append(COPY_TRAILER)
+    return b"".join(parts)
+
+
+def encode_chunk_rows(rows: List[Dict[str, Any]]) -> bytes:
+    """COPY binary stream for document_chunks rows (CHUNK_COLUMNS), as built by _chunk_records"""
+    parts = [COPY_HEADER]
+    for row in rows:
+        parts.append(struct.pack("!h", len(CHUNK_COLUMNS)))
+        parts.append(_text(row["document_id"]))
+        parts.append(_int4(row["chunk_index"]))
+        parts.append(_text(row["content"]))
+        parts.append(_vector(row["embedding"]))
+        parts.append(_jsonb(row.get("metadata")))
+    parts.append(COPY_TRAILER)
+    return b"".join(parts)
+
+
+class _Stream:
+    """File-like reader over bytes for copy_expert, without copying them into a BytesIO"""
+    
+    def __init__(self, data: bytes):
+        self._view = memoryview(data)
+        self._position = 0
+    
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else self._position + size
+        chunk = self._view[self._position:end]
+        self._position += len(chunk)
+        return bytes(chunk)
+    
+    readline = read
+
+
+class PostgresLoader:
+    """Pooled direct connections that bulk load documents and their chunks with binary COPY"""
+    
+    def __init__(self, database_url: str, pool_size: int = SUPABASE_DB_POOL_SIZE, batch_rows: int = SUPABASE_COPY_BATCH_ROWS):
+        from psycopg2.pool import ThreadedConnectionPool
+        self.pool = ThreadedConnectionPool(1, max(pool_size, 1), database_url)
+        self.batch_rows = max(batch_rows, 1)
+    
+    @contextmanager
+    def transaction(self) -> Iterator[Any]:
+        """A pooled connection's cursor inside one transaction (committed, or rolled back on error)"""
+        connection = self.pool.getconn()
+        try:
+            with connection:
+                with connection.cursor() as cursor:
+                    yield cursor
+        finally:
+            self.pool.putconn(connection)
+    
+    def load(self, document_rows: List[Dict[str, Any]], chunk_rows: List[Dict[str, Any]]) -> int:
+        """
+        Insert documents and their chunks in one transaction; returns the chunk rows written
+        Chunks are encoded and copied SUPABASE_COPY_BATCH_ROWS at a time, so only one batch
+        is held in encoded form at once.
+        """
+        with self.transaction() as cursor:
+            if document_rows:
+                cursor.copy_expert(
+                    f"COPY documents ({', '.join(DOCUMENT_COLUMNS)}) FROM STDIN WITH (FORMAT binary)",
+                    _Stream(encode_document_rows(document_rows))
+                )
+            self._copy_chunks(cursor, chunk_rows)
+        return len(chunk_rows)
+    
+    def ingest(self, document_row: Dict[str, Any], chunk_rows: List[Dict[str, Any]]) -> Tuple[bool, str, str]:
+        """
+        Insert one document and its chunks in one transaction, unless its file_hash is stored
+        Returns (inserted, document_id, file_path) like the ingest_document function: on a
+        conflict no chunk is copied and the stored document's id and path come back.
+        """
+        with self.transaction() as cursor:
+            cursor.execute(
+                f"INSERT INTO documents ({', '.join(DOCUMENT_COLUMNS)}) "
+                f"VALUES ({', '.join(['%s'] * len(DOCUMENT_COLUMNS))}) "
+                "ON CONFLICT (file_hash) DO NOTHING RETURNING document_id, file_path",
+                [document_row[column] for column in DOCUMENT_COLUMNS]
+            )
+            row = cursor.fetchone()
+            if row is None:
+                cursor.execute(
+                    "SELECT document_id, file_path FROM documents WHERE file_hash = %s",
+                    (document_row["file_hash"],)
+                )
+                document_id, file_path = cursor.fetchone()
+                return False, document_id, file_path
+            self._copy_chunks(cursor, chunk_rows)
+        return True, row[0], row[1]
+    
+    def ingest_many(self, document_rows: List[Dict[str, Any]], chunk_rows: List[Dict[str, Any]]) -> Set[str]:
+        """
+        Insert the documents whose file_hash isn't stored yet and their chunks, in one transaction
+        Returns the ids of the documents inserted; chunks of the others are not copied.
+        """
+        from psycopg2.extras import execute_values
+        with self.transaction() as cursor:
+            returned = execute_values(
+                cursor,
+                f"INSERT INTO documents ({', '.join(DOCUMENT_COLUMNS)}) VALUES %s "
+                "ON CONFLICT (file_hash) DO NOTHING RETURNING document_id",
+                [tuple(row[column] for column in DOCUMENT_COLUMNS) for row in document_rows],
+                fetch=True
+            ) if document_rows else []
+            inserted = {row[0] for row in returned}
+            self._copy_chunks(cursor, [row for row in chunk_rows if row["document_id"] in inserted])
+        return inserted
+    
+    def _copy_chunks(self, cursor, chunk_rows: List[Dict[str, Any]]):
+        for start in range(0, len(chunk_rows), self.batch_rows):
+            cursor.copy_expert(
+                f"COPY document_chunks ({', '.join(CHUNK_COLUMNS)}) FROM STDIN WITH (FORMAT binary)",
+                _Stream(encode_chunk_rows(chunk_rows[start:start + self.batch_rows]))
+            )
+    
+    def close(self):
+        self.pool.closeall()
+
+
+# Global instance (created on first use)
+postgres_loader: Optional[PostgresLoader] = None
+_postgres_loader_lock = threading.Lock()
+
+def get_postgres_loader() -> Optional[PostgresLoader]:
+    """The direct loader when SUPABASE_DIRECT_INGEST is on, else None (PostgREST inserts)"""
+    global postgres_loader
+    if not SUPABASE_DIRECT_INGEST:
+        return None
+    if postgres_loader is None:
+        with _postgres_loader_lock:
+            if postgres_loader is None:
+                if not SUPABASE_DB_URL:
+                    raise ValueError("SUPABASE_DIRECT_INGEST=true needs SUPABASE_DB_URL (Project Settings -> Database)")
+                postgres_loader = PostgresLoader(SUPABASE_DB_URL)
+    return postgres_loader
@@ -0,0 +1,148 @@
+"""
+Query embedding cache shared by the FAISS and Supabase backends.
+Keeps recently used query embeddings in memory (LRU + TTL) with an optional
+SQLite tier on disk, so repeat questions skip the embeddings round trip.
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "10000"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "86400"))
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", "")
+
+
+class QueryEmbeddingCache:
+    """Bounded LRU cache of query embeddings with TTL expiry and an optional on-disk tier"""
+    
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 86400, disk_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_path = disk_path
+        self._entries: "OrderedDict[str, Tuple[float, List[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+        if disk_path:
+            self._open_disk_tier(disk_path)
+    
+    def _open_disk_tier(self, disk_path: str):
+        """Open (or create) the SQLite tier and drop expired rows"""
+        self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+        self._disk.execute("PRAGMA journal_mode=WAL")
+        self._disk.execute(
+            "CREATE TABLE IF NOT EXISTS query_embeddings ("
+            "key TEXT PRIMARY KEY, embedding BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._disk.execute(
+            "DELETE FROM query_embeddings WHERE created_at < ?",
+            (time.time() - self.ttl_seconds,)
+        )
+        self._disk.commit()
+    
+    @staticmethod
+    def make_key(text: str, model: str) -> str:
+        """Cache key from the normalized query text and the embedding model name"""
+        normalized = " ".join(text.split()).casefold()
+        return hashlib.sha256(f"{model}\0{normalized}".encode("utf-8")).hexdigest()
+    
+    def get(self, key: str) -> Optional[List[float]]:
+        """Return the cached embedding or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, embedding = entry
+                if now - created_at < self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return list(embedding)
+                del self._entries[key]
+            
+            if self._disk is not None:
+                row = self._disk.execute(
+                    "SELECT embedding, created_at FROM query_embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and now - row[1] < self.ttl_seconds:
+                    embedding = array("f", row[0]).tolist()
+                    self._remember(key, row[1], embedding)
+                    self.disk_hits += 1
+                    return list(embedding)
+            
+            self.misses += 1
+            return None
+    
+    def put(self, key: str, embedding: List[float]):
+        """Store an embedding in memory and, if enabled, on disk"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, list(embedding))
+            if self._disk is not None:
+                try:
+                    self._disk.execute(
+                        "INSERT OR REPLACE INTO query_embeddings (key, embedding, created_at) VALUES (?, ?, ?)",
+                        (key, array("f", embedding).tobytes(), now)
+                    )
+                    self._disk.commit()
+                except sqlite3.Error as e:
+                    # The disk tier is best effort; a busy database must not fail the query
+                    print(f"Query cache disk write failed: {e}")
+    
+    def _remember(self, key: str, created_at: float, embedding: List[float]):
+        """Insert into the in-memory LRU, evicting the least recently used entries"""
+        self._entries[key] = (created_at, embedding)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def clear(self):
+        """Drop every cached embedding"""
+        with self._lock:
+            self._entries.clear()
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM query_embeddings")
+                self._disk.commit()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for monitoring"""
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "disk_tier": self.disk_path or None,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0
+        }
+
+
+# Global instance shared by both backends (created on first use)
+query_embedding_cache: Optional[QueryEmbeddingCache] = None
+
+def get_query_cache() -> Optional[QueryEmbeddingCache]:
+    """Get or create the process-wide query embedding cache (None when disabled)"""
+    global query_embedding_cache
+    if query_embedding_cache is None and QUERY_CACHE_SIZE > 0:
+        query_embedding_cache = QueryEmbeddingCache(
+            max_entries=QUERY_CACHE_SIZE,
+            ttl_seconds=QUERY_CACHE_TTL_SECONDS,
+            disk_path=QUERY_CACHE_PATH or None
+        )
+    return query_embedding_cache
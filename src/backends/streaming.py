@@ -0,0 +1,230 @@
+"""
+Streaming ingestion for large text files
+Files of INGEST_STREAM_MIN_MB or more are never read or split as a whole: the staged file
+is decoded INGEST_STREAM_BLOCK_KB at a time, chunks are cut incrementally with the upload's
+chunking settings (exactly the chunks a whole-file split cuts), and they are handed to the
+backend INGEST_STREAM_BATCH_CHUNKS at a time to be embedded and written. Memory use is bounded by a block and a batch instead of growing with the file.
+The FAISS backend spools embedded batches to disk (ChunkSpool) and writes the document's
+segments from the spool once it is complete; Supabase inserts each batch as it is embedded.
+"""
+import codecs
+import json
+import os
+import shutil
+import tempfile
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from dotenv import load_dotenv
+
+import numpy as np
+
+from .chunking import SEPARATORS, MarkdownScanner, RecursiveSplitter, make_splitter, section_metadata
+
+# Load environment variables
+load_dotenv()
+
+# Uploads at least this large are ingested in streaming mode (0 streams every upload)
+INGEST_STREAM_MIN_BYTES = int(float(os.getenv("INGEST_STREAM_MIN_MB", "16")) * 1024 * 1024)
+
+# Bytes read and decoded per block
+INGEST_STREAM_BLOCK_BYTES = int(float(os.getenv("INGEST_STREAM_BLOCK_KB", "1024")) * 1024)
+
+# Chunks embedded and written per batch
+INGEST_STREAM_BATCH_CHUNKS = int(os.getenv("INGEST_STREAM_BATCH_CHUNKS", "512"))
+
+# Chunks at the end of the text seen so far that are not emitted yet: the next block can
+# still change them (a paragraph cut in half by the block boundary)
+HELD_BACK_CHUNKS = 2
+
+# Pending text is cut at a held-back chunk even inside a paragraph once it grows past this
+# (a multi-megabyte paragraph): the chunks stay overlapped, their boundaries may shift
+MAX_PENDING_CHARS = 8 * INGEST_STREAM_BLOCK_BYTES
+
+
+def should_stream(file_path: str) -> bool:
+    """Whether a staged upload is large enough for streaming ingestion"""
+    return os.path.getsize(file_path) >= INGEST_STREAM_MIN_BYTES
+
+
+def read_text_blocks(file_path: str, block_bytes: int = INGEST_STREAM_BLOCK_BYTES) -> Iterator[Tuple[str, int]]:
+    """(text, bytes read so far) per block of a UTF-8 file; characters split across blocks are kept whole"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    read = 0
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_bytes), b""):
+            read += len(block)
+            text = decoder.decode(block)
+            if text:
+                yield text, read
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail, read
+
+
+def _resume_point(text: str, offset: int, separator: str) -> Optional[int]:
+    """
+    Where splitting can restart so that a chunk starting at offset comes out unchanged: the
+    separator in front of it, when only whitespace (pieces the splitter strips away) lies
+    in between and the chunk starts a top-level piece of the text. None inside a piece,
+    where the split depends on the whole piece.
+    """
+    position = text.rfind(separator, 0, offset + len(separator))
+    if position <= 0 or text[position + len(separator):offset].strip():
+        return None
+    # A separator overlapping the one before it ("\n\n\n") may be inside a piece
+    if text.startswith(separator, position - 1):
+        return None
+    return position
+
+
+def _settle(splitter: RecursiveSplitter, pending: str, separator: Optional[str]) -> Tuple[List[Tuple[str, int]], int]:
+    """
+    Chunks of pending text that no further text can change, and where splitting resumes
+    The pending text is split and the last HELD_BACK_CHUNKS chunks are held back. The chunks
+    before the latest complete chunk that starts a top-level piece (a paragraph) are final: the
+    overlap the splitter carries from one chunk to the next never reaches past it, so
+    splitting resumes at that piece. (0 when nothing is final yet.)
+    """
+    pieces = splitter.split_with_offsets(pending)
+    if separator is not None:
+        # The last piece can still grow, and with a large overlap every chunk reaching into
+        # it can change: the chunk splitting resumes at must end before it
+        last_piece = pending.rfind(separator)
+        while last_piece > 0 and pending.startswith(separator, last_piece - 1):
+            last_piece -= 1
+        for candidate in range(len(pieces) - HELD_BACK_CHUNKS, 0, -1):
+            chunk, offset = pieces[candidate]
+            if pending.find(chunk, offset) + len(chunk) > last_piece:
+                continue
+            resume = _resume_point(pending, offset, separator)
+            # ... and be the first chunk of its piece
+            if resume and pieces[candidate - 1][1] < resume:
+                return pieces[:candidate], resume
+    if len(pending) > MAX_PENDING_CHARS and len(pieces) > HELD_BACK_CHUNKS:
+        held = len(pieces) - HELD_BACK_CHUNKS
+        if pieces[held][1]:
+            return pieces[:held], pieces[held][1]
+    return [], 0
+
+
+def iter_chunks(blocks: Iterable[Tuple[str, Any]], settings: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any], Any]]:
+    """
+    Split text arriving in blocks into the chunks chunking.split_text cuts from the whole
+    text, yielding (chunk, metadata, position of the block it was cut from)
+    Only the text after the last final chunk is carried from one block to the next. With
+    the markdown strategy every heading ends the pending text's section, which is split
+    completely.
+    """
+    splitter = make_splitter(settings)
+    scanner = MarkdownScanner() if settings["strategy"] == "markdown" else None
+    
+    pending = ""
+    position = None
+    separator = None
+    metadata: Dict[str, Any] = {}
+    
+    def flush() -> Iterator[Tuple[str, Dict[str, Any], Any]]:
+        for chunk, _ in splitter.split_with_offsets(pending):
+            yield chunk, metadata, position
+    
+    for text, position in blocks:
+        for kind, value in scanner.feed(text) if scanner else [("text", text)]:
+            if kind == "section":
+                yield from flush()
+                pending, separator, metadata = "", None, section_metadata(value)
+            else:
+                pending += value
+        # The whole-text split uses the coarsest separator the text contains; until one
+        # has been seen no chunk is known to start a piece
+        coarsest = next((s for s in SEPARATORS[:-1] if s in pending), None)
+        if coarsest is not None and (separator is None or SEPARATORS.index(coarsest) < SEPARATORS.index(separator)):
+            separator = coarsest
+        if separator is None and len(pending) <= MAX_PENDING_CHARS:
+            continue
+        final, resume = _settle(splitter, pending, separator)
+        for chunk, _ in final:
+            yield chunk, metadata, position
+        pending = pending[resume:]
+    
+    for kind, value in scanner.close() if scanner else []:
+        if kind == "section":
+            yield from flush()
+            pending, metadata = "", section_metadata(value)
+        else:
+            pending += value
+    yield from flush()
+
+
+def iter_chunk_batches(
+    file_path: str,
+    settings: Dict[str, Any],
+    batch_chunks: int = INGEST_STREAM_BATCH_CHUNKS
+) -> Iterator[Tuple[List[str], List[Dict[str, Any]], float]]:
+    """Chunks of a file and their metadata in batches of batch_chunks, each with the fraction of the file read so far"""
+    size = max(os.path.getsize(file_path), 1)
+    texts: List[str] = []
+    metadatas: List[Dict[str, Any]] = []
+    read = 0
+    for chunk, metadata, read in iter_chunks(read_text_blocks(file_path), settings):
+        texts.append(chunk)
+        metadatas.append(metadata)
+        if len(texts) >= batch_chunks:
+            yield texts, metadatas, read / size
+            texts, metadatas = [], []
+    if texts:
+        yield texts, metadatas, 1.0
+
+
+def estimated_total(chunks_done: int, fraction_read: float) -> int:
+    """Chunk count of the whole file extrapolated from the part read so far (for progress)"""
+    if fraction_read >= 1.0:
+        return chunks_done
+    return max(chunks_done, int(chunks_done / max(fraction_read, 1e-9)))
+
+
+class ChunkSpool:
+    """
+    Embedded chunks of one document written to disk batch by batch
+    Vectors are appended to a raw float32 file and texts with their metadata to a JSON
+    lines file, in a temporary directory that close() removes.
+    """
+    
+    def __init__(self, directory: Optional[str] = None):
+        self.path = tempfile.mkdtemp(prefix=".ingest-", dir=directory)
+        self._vectors = open(os.path.join(self.path, "vectors.f32"), "wb")
+        self._texts = open(os.path.join(self.path, "chunks.jsonl"), "w", encoding="utf-8")
+        self.count = 0
+        self.dimension: Optional[int] = None
+    
+    def append(self, texts: List[str], vectors, metadatas: List[Dict[str, Any]]):
+        matrix = np.asarray(vectors, dtype="float32")
+        if self.dimension is None:
+            self.dimension = matrix.shape[1]
+        self._vectors.write(matrix.tobytes())
+        for text, metadata in zip(texts, metadatas):
+            self._texts.write(json.dumps([text, metadata], default=str) + "\n")
+        self.count += len(texts)
+    
+    def blocks(self, block_chunks: int) -> Iterator[Tuple[List[str], List[Dict[str, Any]], np.ndarray]]:
+        """(texts, metadatas, vectors) of up to block_chunks chunks at a time, in order"""
+        self._vectors.flush()
+        self._texts.flush()
+        if not self.count:
+            return
+        # Read block by block rather than mapped: mapped pages stay resident once touched
+        with open(self._vectors.name, "rb") as vectors, open(self._texts.name, "r", encoding="utf-8") as lines:
+            for start in range(0, self.count, block_chunks):
+                count = min(block_chunks, self.count - start)
+                rows = [json.loads(next(lines)) for _ in range(count)]
+                matrix = np.fromfile(vectors, dtype="float32", count=count * self.dimension).reshape(count, self.dimension)
+                yield [text for text, _ in rows], [metadata for _, metadata in rows], matrix
+    
+    def close(self):
+        self._vectors.close()
+        self._texts.close()
+        shutil.rmtree(self.path, ignore_errors=True)
+    
+    def __enter__(self) -> "ChunkSpool":
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
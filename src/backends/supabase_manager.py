@@ -1,20 +1,74 @@
 """
 Supabase Vector Store Manager with pgvector
 Optimized for scalable document storage and retrieval
+All PostgREST and Storage calls go through supabase's AsyncClient, sharing one pooled
+keep-alive httpx connection pool, so a slow round trip only suspends the request that made
+it instead of blocking the worker's event loop. Every call has a deadline.
 """
 import os
+import time
+import asyncio
+import threading
 import hashlib
-from typing import Optional, List, Dict, Any
+import json
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Set
 from datetime import datetime
 from dotenv import load_dotenv
 
-from supabase import create_client, Client
-from langchain_openai.embeddings import OpenAIEmbeddings
+import httpx
+import numpy as np
+from postgrest.types import ReturnMethod
+from supabase import AsyncClient
+from supabase.lib.client_options import AsyncClientOptions
 from langchain_core.documents import Document
 
+from .embeddings import (
+    EMBEDDING_DOCUMENT_BATCH_SIZE,
+    ProgressCallback,
+    aembed_documents_parallel,
+    create_embeddings,
+)
+from .chunking import achunk_many, chunking_settings, split_content, split_text
+from .diversity import MMR_CANDIDATES, MMR_LAMBDA, maximal_marginal_relevance
+from .hybrid import HYBRID_CANDIDATES, RRF_K
+from .postgres_loader import get_postgres_loader
+from .streaming import estimated_total, iter_chunk_batches, should_stream
+
 # Load environment variables
 load_dotenv()
 
+# Rows per PostgREST insert request when loading chunks (see postgres_loader for the direct path)
+SUPABASE_INSERT_BATCH_SIZE = int(os.getenv("SUPABASE_INSERT_BATCH_SIZE", "500"))
+
+# Per-query index search parameters sent to the search RPCs; 0 uses the values that
+# scripts/supabase_db.py reindex stored in vector_index_settings for the current index
+SUPABASE_IVF_PROBES = int(os.getenv("SUPABASE_IVF_PROBES", "0"))
+SUPABASE_HNSW_EF_SEARCH = int(os.getenv("SUPABASE_HNSW_EF_SEARCH", "0"))
+
+# Deadline of one lookup or search call, and of one insert / upload / download
+SUPABASE_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_TIMEOUT_SECONDS", "10"))
+SUPABASE_WRITE_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_WRITE_TIMEOUT_SECONDS", "60"))
+
+# HTTP connections to Supabase shared by all concurrent requests of a worker, and how long
+# an idle one is kept open for reuse (saves a TCP + TLS handshake per call)
+SUPABASE_MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "20"))
+SUPABASE_KEEPALIVE_SECONDS = float(os.getenv("SUPABASE_KEEPALIVE_SECONDS", "30"))
+
+
+async def _timed(timings: Dict[str, float], stage: str, awaitable):
+    """Await awaitable and record how long it took in timings[stage] (seconds)"""
+    started = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        timings[stage] = round(time.perf_counter() - started, 3)
+
+
+def _with_total(timings: Dict[str, float], started: float) -> Dict[str, float]:
+    """Stage timings plus the total; overlapping stages can add up to more than the total"""
+    return {**timings, "total": round(time.perf_counter() - started, 3)}
+
 
 class SupabaseVectorStore:
     """Manages document storage and vector search using Supabase + pgvector"""
@@ -30,21 +84,54 @@ class SupabaseVectorStore:
                 "Get these from your Supabase project settings."
             )
         
-        self.client: Client = create_client(supabase_url, supabase_key)
-        self.embeddings = OpenAIEmbeddings()
+        # One connection pool for PostgREST and Storage; asyncio.wait_for in _call bounds each
+        # call as a whole, the httpx timeout bounds connecting and every read / write
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=SUPABASE_MAX_CONNECTIONS,
+                max_keepalive_connections=SUPABASE_MAX_CONNECTIONS,
+                keepalive_expiry=SUPABASE_KEEPALIVE_SECONDS
+            ),
+            timeout=httpx.Timeout(SUPABASE_WRITE_TIMEOUT_SECONDS, connect=min(SUPABASE_TIMEOUT_SECONDS, 5.0))
+        )
+        self.client = AsyncClient(
+            supabase_url,
+            supabase_key,
+            AsyncClientOptions(
+                httpx_client=self.http_client,
+                postgrest_client_timeout=SUPABASE_WRITE_TIMEOUT_SECONDS,
+                storage_client_timeout=int(SUPABASE_WRITE_TIMEOUT_SECONDS)
+            )
+        )
+        self.embeddings = create_embeddings()
         self.bucket_name = "documents"
-        
-        # Ensure storage bucket exists
-        self._ensure_bucket_exists()
+        # The storage bucket is checked before the first upload
+        self._bucket_checked = False
     
-    def _ensure_bucket_exists(self):
+    async def _call(self, awaitable, timeout: float = SUPABASE_TIMEOUT_SECONDS):
+        """Await a Supabase call, raising TimeoutError when it takes longer than timeout seconds"""
+        return await asyncio.wait_for(awaitable, timeout)
+    
+    async def _ensure_bucket_exists(self):
         """Create storage bucket if it doesn't exist"""
+        if self._bucket_checked:
+            return
         try:
-            buckets = self.client.storage.list_buckets()
+            buckets = await self._call(self.client.storage.list_buckets())
             if not any(b.name == self.bucket_name for b in buckets):
-                self.client.storage.create_bucket(self.bucket_name, {"public": False})
+                await self._call(self.client.storage.create_bucket(self.bucket_name, options={"public": False}))
         except Exception as e:
             print(f"Note: Storage bucket check: {e}")
+        self._bucket_checked = True
+    
+    async def aclose(self):
+        """Close the pooled HTTP connections"""
+        await self.http_client.aclose()
+    
+    def _notify_corpus_changed(self):
+        """Invalidate answers cached against the previous corpus"""
+        from src.core.answer_cache import invalidate_answer_cache
+        invalidate_answer_cache()
     
     def _calculate_file_hash(self, content: bytes) -> str:
         """Calculate SHA256 hash of file content"""
@@ -56,7 +143,9 @@ class SupabaseVectorStore:
         Returns: (exists: bool, document_id: Optional[str])
         """
         try:
-            result = self.client.table("documents").select("id, document_id").eq("file_hash", file_hash).execute()
+            result = await self._call(
+                self.client.table("documents").select("id, document_id").eq("file_hash", file_hash).execute()
+            )
             
             if result.data and len(result.data) > 0:
                 return True, result.data[0]["document_id"]
@@ -69,51 +158,61 @@ class SupabaseVectorStore:
         self, 
         file_content: bytes, 
         filename: str,
-        chunk_size: int = 200,
-        chunk_overlap: int = 20
+        chunking: Optional[Dict[str, Any]] = None,
+        progress_callback: Optional[ProgressCallback] = None,
+        file_hash: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Add a document to Supabase storage and vector database
+        The stages overlap: the duplicate lookup runs while the text is split, and the file is
+        uploaded to Storage while the chunks are embedded (EMBEDDING_MAX_PARALLEL sub-batches
+        in flight). The document and its chunks then go in with one ingest_document call.
+        progress_callback is called with (chunks_embedded, chunks_total) after each embedding batch
+        file_hash is the SHA256 computed while the upload was staged, if known
+        chunking is the upload's chunking settings (chunking.chunking_settings, the CHUNK_* defaults if None)
+        The result's "timings" holds the seconds each stage took and the total.
         """
+        chunking = chunking or chunking_settings()
+        started = time.perf_counter()
+        timings: Dict[str, float] = {}
         try:
             # Calculate file hash for duplicate detection
-            file_hash = self._calculate_file_hash(file_content)
+            if file_hash is None:
+                file_hash = self._calculate_file_hash(file_content)
+            text_content = file_content.decode('utf-8')
             
-            # Check for duplicates
-            exists, existing_id = await self.document_exists(file_hash)
+            # A stored file is caught before its chunks are embedded; a copy stored meanwhile
+            # by a concurrent upload is caught by ingest_document's ON CONFLICT
+            lookup = asyncio.create_task(_timed(timings, "duplicate_check", self.document_exists(file_hash)))
+            split = await _timed(timings, "split", asyncio.to_thread(split_text, text_content, chunking))
+            chunks = [text for text, _ in split]
+            exists, existing_id = await lookup
             if exists:
                 return {
                     "status": "duplicate",
                     "message": f"Document already exists with ID: {existing_id}",
-                    "document_id": existing_id
+                    "document_id": existing_id,
+                    "timings": _with_total(timings, started)
                 }
             
             # Generate unique document ID
             doc_id = f"doc_{file_hash[:16]}"
-            
-            # Upload file to Supabase Storage
             file_path = f"{doc_id}/{filename}"
-            storage_result = self.client.storage.from_(self.bucket_name).upload(
-                file_path, 
-                file_content,
-                {"content-type": "text/plain"}
-            )
             
-            # Decode content for processing
-            text_content = file_content.decode('utf-8')
-            
-            # Split text into chunks
-            from langchain_text_splitters import RecursiveCharacterTextSplitter
-            splitter = RecursiveCharacterTextSplitter(
-                chunk_size=chunk_size, 
-                chunk_overlap=chunk_overlap
-            )
-            chunks = splitter.split_text(text_content)
+            # Upload the original file to Supabase Storage while the chunks are embedded
+            upload = asyncio.create_task(_timed(timings, "upload", self._upload(file_path, file_content)))
+            try:
+                embeddings_list = await _timed(timings, "embed", aembed_documents_parallel(
+                    self.embeddings,
+                    chunks,
+                    batch_size=EMBEDDING_DOCUMENT_BATCH_SIZE,
+                    progress_callback=progress_callback
+                ))
+            except BaseException:
+                upload.cancel()
+                raise
+            await upload
             
-            # Generate embeddings for all chunks
-            embeddings_list = self.embeddings.embed_documents(chunks)
-            
-            # Insert document metadata
             doc_metadata = {
                 "document_id": doc_id,
                 "filename": filename,
@@ -122,80 +221,657 @@ class SupabaseVectorStore:
                 "chunk_count": len(chunks),
                 "created_at": datetime.utcnow().isoformat()
             }
+            chunk_records = self._chunk_records(
+                doc_id, filename, chunks, embeddings_list, metadatas=[metadata for _, metadata in split]
+            )
+            inserted, stored_id, stored_path = await _timed(
+                timings, "insert", self._ingest_document(doc_metadata, chunk_records)
+            )
+            if not inserted:
+                # Another upload of the same file won; keep only the copy its row points to
+                if stored_path != file_path:
+                    await self._remove_stored_file(file_path)
+                return {
+                    "status": "duplicate",
+                    "message": f"Document already exists with ID: {stored_id}",
+                    "document_id": stored_id,
+                    "timings": _with_total(timings, started)
+                }
+            self._notify_corpus_changed()
             
-            self.client.table("documents").insert(doc_metadata).execute()
+            return {
+                "status": "success",
+                "message": f"Document added successfully with {len(chunks)} chunks",
+                "document_id": doc_id,
+                "chunk_count": len(chunks),
+                "file_path": file_path,
+                "timings": _with_total(timings, started)
+            }
+        
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": f"Error adding document: {str(e)}",
+                "document_id": None,
+                "timings": _with_total(timings, started)
+            }
+    
+    async def add_documents(
+        self,
+        files: List[tuple[bytes, str]],
+        chunking: Optional[Dict[str, Any]] = None,
+        progress_callback: Optional[ProgressCallback] = None
+    ) -> Dict[str, Any]:
+        """
+        Add many documents at once
+        files is a list of (file_content, filename). Duplicates are found with a single query,
+        the files are chunked (in the chunking process pool if CHUNKING_PROCESSES is set),
+        chunks from all files are embedded in large parallel batches while the files are
+        uploaded to Storage, and rows are inserted with a handful of bulk inserts at the end.
+        Returns: Dictionary with overall status, per-file results, throughput and stage timings
+        """
+        started = time.perf_counter()
+        timings: Dict[str, float] = {}
+        results: List[Dict[str, Any]] = []
+        chunking = chunking or chunking_settings()
+        
+        try:
+            hashes = [self._calculate_file_hash(content) for content, _ in files]
+            
+            # One round trip for the duplicate check of the whole batch
+            existing = await _timed(timings, "duplicate_check", self._call(
+                self.client.table("documents").select("document_id, file_hash").in_("file_hash", list(set(hashes))).execute()
+            ))
+            known = {row["file_hash"]: row["document_id"] for row in existing.data}
+            
+            new_files = []
+            for (content, filename), file_hash in zip(files, hashes):
+                if file_hash in known:
+                    results.append({
+                        "filename": filename,
+                        "status": "duplicate",
+                        "message": f"Document already exists with ID: {known[file_hash]}",
+                        "document_id": known[file_hash]
+                    })
+                    continue
+                
+                doc_id = f"doc_{file_hash[:16]}"
+                known[file_hash] = doc_id
+                new_files.append((doc_id, filename, file_hash, f"{doc_id}/{filename}", content))
+            
+            split_lists = await _timed(
+                timings, "split", achunk_many(split_content, [content for *_, content in new_files], chunking)
+            )
+            chunk_lists = [[text for text, _ in split] for split in split_lists]
+            
+            # Files go to Storage (a few at a time, leaving connections for searches) while
+            # chunks from every file are packed into shared embedding batches
+            upload_slots = asyncio.Semaphore(max(1, SUPABASE_MAX_CONNECTIONS // 2))
+            
+            async def upload_file(file_path: str, content: bytes):
+                async with upload_slots:
+                    await self._upload(file_path, content)
+            
+            uploads = asyncio.create_task(_timed(timings, "upload", asyncio.gather(
+                *(upload_file(file_path, content) for *_, file_path, content in new_files)
+            )))
+            try:
+                all_chunks = [chunk for chunks in chunk_lists for chunk in chunks]
+                vectors = await _timed(timings, "embed", aembed_documents_parallel(
+                    self.embeddings, all_chunks, progress_callback=progress_callback
+                ))
+            except BaseException:
+                uploads.cancel()
+                raise
+            await uploads
             
-            # Insert chunks with embeddings into vector table
+            doc_rows = []
             chunk_records = []
-            for idx, (chunk, embedding) in enumerate(zip(chunks, embeddings_list)):
-                chunk_records.append({
+            offset = 0
+            for (doc_id, filename, file_hash, file_path, _), chunks, split in zip(new_files, chunk_lists, split_lists):
+                doc_rows.append({
                     "document_id": doc_id,
-                    "chunk_index": idx,
-                    "content": chunk,
-                    "embedding": embedding,
-                    "metadata": {"filename": filename, "chunk": idx}
+                    "filename": filename,
+                    "file_hash": file_hash,
+                    "file_path": file_path,
+                    "chunk_count": len(chunks),
+                    "created_at": datetime.utcnow().isoformat()
                 })
+                chunk_records.extend(
+                    self._chunk_records(
+                        doc_id, filename, chunks, vectors[offset:offset + len(chunks)], metadatas=[metadata for _, metadata in split]
+                    )
+                )
+                offset += len(chunks)
             
-            # Batch insert chunks
-            self.client.table("document_chunks").insert(chunk_records).execute()
+            inserted: Set[str] = set()
+            if doc_rows:
+                inserted = await _timed(timings, "insert", self._insert_rows(doc_rows, chunk_records))
+                if inserted:
+                    self._notify_corpus_changed()
             
+            # Files another upload stored while this batch was embedded
+            late_duplicates = [row for row in doc_rows if row["document_id"] not in inserted]
+            if late_duplicates:
+                stored = await self._call(
+                    self.client.table("documents").select("document_id, file_hash, file_path").in_(
+                        "file_hash", [row["file_hash"] for row in late_duplicates]
+                    ).execute()
+                )
+                stored_rows = {row["file_hash"]: row for row in stored.data}
+                for row in late_duplicates:
+                    stored_row = stored_rows.get(row["file_hash"], row)
+                    # Keep only the copy the stored row points to
+                    if stored_row["file_path"] != row["file_path"]:
+                        await self._remove_stored_file(row["file_path"])
+                    results.append({
+                        "filename": row["filename"],
+                        "status": "duplicate",
+                        "message": f"Document already exists with ID: {stored_row['document_id']}",
+                        "document_id": stored_row["document_id"]
+                    })
+                doc_rows = [row for row in doc_rows if row["document_id"] in inserted]
+                chunk_records = [record for record in chunk_records if record["document_id"] in inserted]
+        
+        except Exception as e:
             return {
+                "status": "error",
+                "message": f"Error adding documents: {str(e)}",
+                "documents": results,
+                "timings": _with_total(timings, started)
+            }
+        
+        for row in doc_rows:
+            results.append({
+                "filename": row["filename"],
                 "status": "success",
-                "message": f"Document added successfully with {len(chunks)} chunks",
+                "message": f"Document added successfully with {row['chunk_count']} chunks",
+                "document_id": row["document_id"],
+                "chunk_count": row["chunk_count"]
+            })
+        
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        return {
+            "status": "success",
+            "message": f"Added {len(doc_rows)} documents ({len(chunk_records)} chunks), skipped {len(files) - len(doc_rows)} duplicates",
+            "documents": results,
+            "document_count": len(doc_rows),
+            "chunk_count": len(chunk_records),
+            "elapsed_seconds": round(elapsed, 3),
+            "documents_per_second": round(len(doc_rows) / elapsed, 2),
+            "chunks_per_second": round(len(chunk_records) / elapsed, 2),
+            "timings": _with_total(timings, started)
+        }
+    
+    async def add_file(
+        self,
+        local_path: str,
+        filename: str,
+        chunking: Optional[Dict[str, Any]] = None,
+        progress_callback: Optional[ProgressCallback] = None,
+        file_hash: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        add_document for a staged upload on disk
+        Files large enough for streaming ingestion (see src/backends/streaming.py) are never
+        read whole; smaller ones are read and go through add_document.
+        """
+        if not should_stream(local_path):
+            file_content = await asyncio.to_thread(Path(local_path).read_bytes)
+            return await self.add_document(
+                file_content, filename, chunking, progress_callback=progress_callback, file_hash=file_hash
+            )
+        return await self._add_streamed(local_path, filename, chunking, progress_callback, file_hash)
+    
+    async def add_files(
+        self,
+        files: List[tuple[str, str]],
+        chunking: Optional[Dict[str, Any]] = None,
+        progress_callback: Optional[ProgressCallback] = None
+    ) -> Dict[str, Any]:
+        """
+        add_documents for staged uploads on disk, given as (local_path, filename)
+        Large files are streamed one at a time after the others went in as one batch.
+        """
+        small = [(local_path, filename) for local_path, filename in files if not should_stream(local_path)]
+        contents = [(await asyncio.to_thread(Path(local_path).read_bytes), filename) for local_path, filename in small]
+        result = await self.add_documents(contents, chunking, progress_callback=progress_callback)
+        if result["status"] != "success" or len(small) == len(files):
+            return result
+        
+        for local_path, filename in files:
+            if (local_path, filename) in small:
+                continue
+            streamed = await self._add_streamed(local_path, filename, chunking, progress_callback)
+            result["documents"].append({"filename": filename, **streamed})
+            if streamed["status"] == "success":
+                result["document_count"] += 1
+                result["chunk_count"] += streamed["chunk_count"]
+        result["message"] = (
+            f"Added {result['document_count']} documents ({result['chunk_count']} chunks), "
+            f"skipped {len(files) - result['document_count']} duplicates"
+        )
+        return result
+    
+    async def _add_streamed(
+        self,
+        local_path: str,
+        filename: str,
+        chunking: Optional[Dict[str, Any]] = None,
+        progress_callback: Optional[ProgressCallback] = None,
+        file_hash: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Ingest a large file batch by batch
+        The file is uploaded to Storage from disk while INGEST_STREAM_BATCH_CHUNKS chunks at a
+        time are cut from it and embedded; the first batch goes in with ingest_document and
+        each later one is inserted while the next is embedded. The documents row carries
+        chunk_count 0 until the last batch is in; a failure removes the partial document.
+        """
+        started = time.perf_counter()
+        timings: Dict[str, float] = {"split": 0.0, "embed": 0.0, "insert": 0.0}
+        doc_id = None
+        inserted = False
+        
+        async def insert(awaitable):
+            insert_started = time.perf_counter()
+            try:
+                return await awaitable
+            finally:
+                timings["insert"] = round(timings["insert"] + time.perf_counter() - insert_started, 3)
+        
+        try:
+            if file_hash is None:
+                file_hash = await asyncio.to_thread(self._calculate_file_hash_from_path, local_path)
+            exists, existing_id = await _timed(timings, "duplicate_check", self.document_exists(file_hash))
+            if exists:
+                return {
+                    "status": "duplicate",
+                    "message": f"Document already exists with ID: {existing_id}",
+                    "document_id": existing_id,
+                    "timings": _with_total(timings, started)
+                }
+            
+            doc_id = f"doc_{file_hash[:16]}"
+            file_path = f"{doc_id}/{filename}"
+            doc_row = {
                 "document_id": doc_id,
-                "chunk_count": len(chunks),
-                "file_path": file_path
+                "filename": filename,
+                "file_hash": file_hash,
+                "file_path": file_path,
+                "chunk_count": 0,
+                "created_at": datetime.utcnow().isoformat()
             }
             
+            upload = asyncio.create_task(_timed(timings, "upload", self._upload_from_path(file_path, local_path)))
+            pending_insert: Optional[asyncio.Task] = None
+            chunk_count = 0
+            batches = iter_chunk_batches(local_path, chunking or chunking_settings())
+            try:
+                while True:
+                    split_started = time.perf_counter()
+                    batch = await asyncio.to_thread(next, batches, None)
+                    timings["split"] = round(timings["split"] + time.perf_counter() - split_started, 3)
+                    if batch is None:
+                        break
+                    chunks, metadatas, fraction_read = batch
+                    
+                    embed_started = time.perf_counter()
+                    vectors = await aembed_documents_parallel(
+                        self.embeddings, chunks, batch_size=EMBEDDING_DOCUMENT_BATCH_SIZE
+                    )
+                    timings["embed"] = round(timings["embed"] + time.perf_counter() - embed_started, 3)
+                    records = self._chunk_records(doc_id, filename, chunks, vectors, start=chunk_count, metadatas=metadatas)
+                    chunk_count += len(chunks)
+                    if progress_callback:
+                        progress_callback(chunk_count, estimated_total(chunk_count, fraction_read))
+                    
+                    if pending_insert is not None:
+                        await pending_insert
+                    if not inserted:
+                        inserted, stored_id, stored_path = await insert(self._ingest_document(doc_row, records))
+                        if not inserted:
+                            # Another upload of the same file won; keep only the copy its row points to
+                            await upload
+                            if stored_path != file_path:
+                                await self._remove_stored_file(file_path)
+                            return {
+                                "status": "duplicate",
+                                "message": f"Document already exists with ID: {stored_id}",
+                                "document_id": stored_id,
+                                "timings": _with_total(timings, started)
+                            }
+                    else:
+                        pending_insert = asyncio.create_task(insert(self._append_chunks(records)))
+                if pending_insert is not None:
+                    await pending_insert
+            except BaseException:
+                upload.cancel()
+                if pending_insert is not None:
+                    pending_insert.cancel()
+                raise
+            finally:
+                batches.close()
+            await upload
+            
+            if not inserted:
+                # An empty file: the documents row alone
+                inserted, *_ = await insert(self._ingest_document(doc_row, []))
+            await insert(self._call(
+                self.client.table("documents").update({"chunk_count": chunk_count}).eq("document_id", doc_id).execute()
+            ))
+            self._notify_corpus_changed()
+            
+            return {
+                "status": "success",
+                "message": f"Document added successfully with {chunk_count} chunks (streamed)",
+                "document_id": doc_id,
+                "chunk_count": chunk_count,
+                "file_path": file_path,
+                "timings": _with_total(timings, started)
+            }
+        
         except Exception as e:
+            if inserted:
+                # Searches may have seen some of its chunks; drop the partial document
+                await self.delete_document(doc_id)
             return {
                 "status": "error",
                 "message": f"Error adding document: {str(e)}",
-                "document_id": None
+                "document_id": None,
+                "timings": _with_total(timings, started)
             }
     
-    async def similarity_search(self, query: str, k: int = 2) -> List[Document]:
+    def _calculate_file_hash_from_path(self, local_path: str) -> str:
+        """SHA256 of a file on disk, read in blocks"""
+        sha256_hash = hashlib.sha256()
+        with open(local_path, "rb") as f:
+            for byte_block in iter(lambda: f.read(1024 * 1024), b""):
+                sha256_hash.update(byte_block)
+        return sha256_hash.hexdigest()
+    
+    async def _upload(self, file_path: str, file_content: bytes):
+        """
+        Store the original file; upsert, so a retry after a failed insert can send it again
+        """
+        await self._ensure_bucket_exists()
+        await self._call(
+            self.client.storage.from_(self.bucket_name).upload(
+                file_path,
+                file_content,
+                {"content-type": "text/plain", "upsert": "true"}
+            ),
+            SUPABASE_WRITE_TIMEOUT_SECONDS
+        )
+    
+    async def _upload_from_path(self, file_path: str, local_path: str):
+        """_upload for a file on disk, sent from an open file rather than read into memory"""
+        await self._ensure_bucket_exists()
+        with open(local_path, "rb") as f:
+            await self._call(
+                self.client.storage.from_(self.bucket_name).upload(
+                    file_path,
+                    f,
+                    {"content-type": "text/plain", "upsert": "true"}
+                ),
+                SUPABASE_WRITE_TIMEOUT_SECONDS
+            )
+    
+    async def _remove_stored_file(self, file_path: str):
+        """Delete a file from Storage; a failure is logged rather than raised, since the rows are what count"""
+        try:
+            await self._call(self.client.storage.from_(self.bucket_name).remove([file_path]))
+        except Exception as e:
+            print(f"Error removing {file_path} from storage: {e}")
+    
+    async def _ingest_document(self, doc_row: Dict[str, Any], chunk_records: List[Dict[str, Any]]) -> tuple[bool, str, str]:
+        """
+        Insert one document and its chunks; returns (inserted, document_id, file_path)
+        When the file_hash is already stored nothing is written, and the stored document's
+        id and path come back with inserted = False. Through PostgREST this is one
+        ingest_document call (config/migrations/003_ingest_document.sql), plus an insert per
+        SUPABASE_INSERT_BATCH_SIZE chunks beyond the first batch; with SUPABASE_DIRECT_INGEST,
+        the same conflict check and a binary COPY of the chunks in one transaction.
+        """
+        loader = get_postgres_loader()
+        if loader is not None:
+            return await asyncio.to_thread(loader.ingest, doc_row, chunk_records)
+        
+        result = await self._call(
+            self.client.rpc(
+                "ingest_document",
+                {"document": doc_row, "chunks": chunk_records[:SUPABASE_INSERT_BATCH_SIZE]}
+            ).execute(),
+            SUPABASE_WRITE_TIMEOUT_SECONDS
+        )
+        row = result.data[0]
+        if row["inserted"]:
+            await self._insert_chunks(chunk_records[SUPABASE_INSERT_BATCH_SIZE:])
+        return row["inserted"], row["document_id"], row["file_path"]
+    
+    async def _insert_rows(self, doc_rows: List[Dict[str, Any]], chunk_records: List[Dict[str, Any]]) -> Set[str]:
+        """
+        Write document rows, skipping any whose file_hash is already stored, and the chunks of
+        the documents inserted; returns their ids, so a concurrent upload of one file only
+        makes that document a duplicate. With SUPABASE_DIRECT_INGEST, INSERT ... ON CONFLICT
+        and a binary COPY over a pooled Postgres connection in one transaction; otherwise a
+        PostgREST upsert that ignores duplicates, then inserts of SUPABASE_INSERT_BATCH_SIZE chunks.
+        """
+        loader = get_postgres_loader()
+        if loader is not None:
+            return await asyncio.to_thread(loader.ingest_many, doc_rows, chunk_records)
+        result = await self._call(
+            self.client.table("documents").upsert(doc_rows, on_conflict="file_hash", ignore_duplicates=True).execute(),
+            SUPABASE_WRITE_TIMEOUT_SECONDS
+        )
+        inserted = {row["document_id"] for row in result.data}
+        await self._insert_chunks([record for record in chunk_records if record["document_id"] in inserted])
+        return inserted
+    
+    async def _append_chunks(self, chunk_records: List[Dict[str, Any]]):
+        """Insert more chunks of a document already stored (direct COPY or PostgREST inserts)"""
+        loader = get_postgres_loader()
+        if loader is not None:
+            await asyncio.to_thread(loader.load, [], chunk_records)
+            return
+        await self._insert_chunks(chunk_records)
+    
+    async def _insert_chunks(self, chunk_records: List[Dict[str, Any]]):
+        # Keep each request well below PostgREST payload limits; return=minimal, since the
+        # default response would send every embedding back
+        for start in range(0, len(chunk_records), SUPABASE_INSERT_BATCH_SIZE):
+            batch = chunk_records[start:start + SUPABASE_INSERT_BATCH_SIZE]
+            await self._call(
+                self.client.table("document_chunks").insert(batch, returning=ReturnMethod.minimal).execute(),
+                SUPABASE_WRITE_TIMEOUT_SECONDS
+            )
+    
+    def _chunk_records(
+        self,
+        doc_id: str,
+        filename: str,
+        chunks: List[str],
+        embeddings_list: List[List[float]],
+        start: int = 0,
+        metadatas: Optional[List[Dict[str, Any]]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Rows for the document_chunks table; start is the chunk_index of the first chunk
+        metadatas optionally adds the chunker's metadata (markdown heading paths) per chunk
+        """
+        metadatas = metadatas or [{}] * len(chunks)
+        return [
+            {
+                "document_id": doc_id,
+                "chunk_index": idx,
+                "content": chunk,
+                "embedding": embedding,
+                "metadata": {"filename": filename, "chunk": idx, **metadata}
+            }
+            for idx, (chunk, embedding, metadata) in enumerate(zip(chunks, embeddings_list, metadatas), start)
+        ]
+    
+    async def similarity_search(self, query: str, k: int = 2, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
         """
         Perform similarity search using pgvector
         """
         try:
-            # Generate query embedding
-            query_embedding = self.embeddings.embed_query(query)
-            
+            # Generate query embedding with the async client
+            query_embedding = await self.embeddings.aembed_query(query)
+        except Exception as e:
+            print(f"Error in similarity search: {e}")
+            return []
+        
+        return await self.similarity_search_by_vector(query_embedding, k, filters)
+    
+    async def similarity_search_by_vector(
+        self,
+        query_embedding: List[float],
+        k: int = 2,
+        filters: Optional[Dict[str, Any]] = None,
+        mmr: bool = False
+    ) -> List[Document]:
+        """
+        Perform similarity search with an already computed query embedding
+        filters ("document_ids", "filenames", "uploaded_after", "uploaded_before") are applied
+        by match_documents inside Postgres. mmr fetches MMR_CANDIDATES chunks with their
+        embeddings and picks k of them for diversity (see src/backends/diversity.py).
+        """
+        try:
             # Use Supabase RPC for vector similarity search
             # This requires a custom PostgreSQL function (see setup_supabase.sql)
-            result = self.client.rpc(
-                "match_documents",
-                {
-                    "query_embedding": query_embedding,
-                    "match_count": k
-                }
-            ).execute()
-            
-            # Convert results to LangChain Document objects
-            documents = []
-            for row in result.data:
-                doc = Document(
-                    page_content=row["content"],
-                    metadata={
-                        "document_id": row["document_id"],
-                        "chunk_index": row["chunk_index"],
-                        "similarity": row["similarity"],
-                        **row.get("metadata", {})
+            result = await self._call(
+                self.client.rpc(
+                    "match_documents",
+                    {
+                        "query_embedding": query_embedding,
+                        "match_count": max(k, MMR_CANDIDATES) if mmr else k,
+                        **self._filter_params(filters),
+                        **self._mmr_params(mmr),
+                        **self._index_params()
                     }
-                )
-                documents.append(doc)
-            
-            return documents
+                ).execute()
+            )
             
+            rows = result.data
+            if mmr:
+                rows = await asyncio.to_thread(self._diversify, query_embedding, rows, k)
+            return self._to_documents(rows)
+        
         except Exception as e:
             print(f"Error in similarity search: {e}")
             return []
     
+    async def hybrid_search_by_vector(
+        self,
+        query: str,
+        query_embedding: List[float],
+        k: int = 2,
+        filters: Optional[Dict[str, Any]] = None,
+        mmr: bool = False
+    ) -> List[Document]:
+        """
+        Keyword (Postgres full-text) + vector search fused by reciprocal rank in one round trip
+        Requires the hybrid_match_documents function from setup_supabase.sql. With mmr, k
+        of the best MMR_CANDIDATES fused chunks are picked for diversity.
+        """
+        try:
+            result = await self._call(
+                self.client.rpc(
+                    "hybrid_match_documents",
+                    {
+                        "query_text": query,
+                        "query_embedding": query_embedding,
+                        "match_count": max(k, MMR_CANDIDATES) if mmr else k,
+                        "candidate_count": max(HYBRID_CANDIDATES, k),
+                        "rrf_k": RRF_K,
+                        **self._filter_params(filters),
+                        **self._mmr_params(mmr),
+                        **self._index_params()
+                    }
+                ).execute()
+            )
+            rows = result.data
+            if mmr:
+                rows = await asyncio.to_thread(self._diversify, query_embedding, rows, k, "score")
+            return self._to_documents(rows)
+        
+        except Exception as e:
+            print(f"Error in hybrid search: {e}")
+            return []
+    
+    @staticmethod
+    def _filter_params(filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """RPC arguments for the filters that are set (unfiltered calls send none, like before)"""
+        if not filters:
+            return {}
+        params = {
+            "filter_document_ids": filters.get("document_ids"),
+            "filter_filenames": filters.get("filenames"),
+            "uploaded_after": filters["uploaded_after"].isoformat() if filters.get("uploaded_after") else None,
+            "uploaded_before": filters["uploaded_before"].isoformat() if filters.get("uploaded_before") else None
+        }
+        return {name: value for name, value in params.items() if value is not None}
+    
+    @staticmethod
+    def _index_params() -> Dict[str, Any]:
+        """ivfflat.probes / hnsw.ef_search overrides for the search RPCs, when configured"""
+        params = {"ivf_probes": SUPABASE_IVF_PROBES, "hnsw_ef_search": SUPABASE_HNSW_EF_SEARCH}
+        return {name: value for name, value in params.items() if value > 0}
+    
+    @staticmethod
+    def _mmr_params(mmr: bool) -> Dict[str, Any]:
+        """Ask the search RPC for the candidates' embeddings (unneeded otherwise, so not sent)"""
+        return {"include_embeddings": True} if mmr else {}
+    
+    @staticmethod
+    def _diversify(
+        query_embedding: List[float],
+        rows: List[Dict[str, Any]],
+        k: int,
+        score_field: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        The k match rows picked by maximal marginal relevance, in pick order
+        Relevance is cosine similarity to the query, or score_field scaled to a best of 1.
+        """
+        if len(rows) <= 1:
+            return rows[:k]
+        # PostgREST returns pgvector values in their text form, "[0.1,0.2,...]"
+        vectors = np.array(
+            [json.loads(row["embedding"]) if isinstance(row["embedding"], str) else row["embedding"] for row in rows],
+            dtype="float32"
+        )
+        relevance = None
+        if score_field is not None:
+            scores = np.array([row[score_field] for row in rows], dtype="float32")
+            relevance = scores / max(float(scores.max()), 1e-12)
+        picked = maximal_marginal_relevance(query_embedding, vectors, k, MMR_LAMBDA, relevance)
+        return [rows[position] for position in picked]
+    
+    @staticmethod
+    def _to_documents(rows: List[Dict[str, Any]]) -> List[Document]:
+        """Convert match rows to LangChain Document objects"""
+        documents = []
+        for row in rows:
+            metadata = {
+                "document_id": row["document_id"],
+                "chunk_index": row["chunk_index"],
+                "similarity": row["similarity"],
+                **(row.get("metadata") or {})
+            }
+            # Fused rank score, only returned by hybrid_match_documents
+            if "score" in row:
+                metadata["score"] = row["score"]
+            documents.append(Document(page_content=row["content"], metadata=metadata))
+        return documents
+    
     async def get_all_documents(self) -> List[Dict[str, Any]]:
         """Get list of all documents"""
         try:
-            result = self.client.table("documents").select("*").order("created_at", desc=True).execute()
+            result = await self._call(
+                self.client.table("documents").select("*").order("created_at", desc=True).execute()
+            )
             return result.data
         except Exception as e:
             print(f"Error fetching documents: {e}")
@@ -205,20 +881,22 @@ class SupabaseVectorStore:
         """Delete a document and its chunks"""
         try:
             # Delete from storage
-            doc_result = self.client.table("documents").select("file_path").eq("document_id", doc_id).execute()
+            doc_result = await self._call(
+                self.client.table("documents").select("file_path").eq("document_id", doc_id).execute()
+            )
             
             if doc_result.data and len(doc_result.data) > 0:
-                file_path = doc_result.data[0]["file_path"]
-                try:
-                    self.client.storage.from_(self.bucket_name).remove([file_path])
-                except:
-                    pass  # File might not exist
+                await self._remove_stored_file(doc_result.data[0]["file_path"])
             
             # Delete chunks (cascades if foreign key is set up)
-            self.client.table("document_chunks").delete().eq("document_id", doc_id).execute()
+            await self._call(
+                self.client.table("document_chunks").delete().eq("document_id", doc_id).execute(),
+                SUPABASE_WRITE_TIMEOUT_SECONDS
+            )
             
             # Delete document metadata
-            self.client.table("documents").delete().eq("document_id", doc_id).execute()
+            await self._call(self.client.table("documents").delete().eq("document_id", doc_id).execute())
+            self._notify_corpus_changed()
             
             return {
                 "status": "success",
@@ -233,11 +911,16 @@ class SupabaseVectorStore:
     async def get_document_content(self, doc_id: str) -> Optional[str]:
         """Retrieve original document content from storage"""
         try:
-            doc_result = self.client.table("documents").select("file_path").eq("document_id", doc_id).execute()
+            doc_result = await self._call(
+                self.client.table("documents").select("file_path").eq("document_id", doc_id).execute()
+            )
             
             if doc_result.data and len(doc_result.data) > 0:
                 file_path = doc_result.data[0]["file_path"]
-                content = self.client.storage.from_(self.bucket_name).download(file_path)
+                content = await self._call(
+                    self.client.storage.from_(self.bucket_name).download(file_path),
+                    SUPABASE_WRITE_TIMEOUT_SECONDS
+                )
                 return content.decode('utf-8')
             return None
         except Exception as e:
@@ -247,10 +930,22 @@ class SupabaseVectorStore:
 
 # Global instance (will be created when imported)
 supabase_vector_store = None
+_supabase_store_lock = threading.Lock()
 
 def get_supabase_store() -> SupabaseVectorStore:
     """Get or create Supabase vector store instance"""
     global supabase_vector_store
     if supabase_vector_store is None:
-        supabase_vector_store = SupabaseVectorStore()
+        # The warm-up thread and a first request may both get here
+        with _supabase_store_lock:
+            if supabase_vector_store is None:
+                supabase_vector_store = SupabaseVectorStore()
     return supabase_vector_store
+
+
+async def close_supabase_store():
+    """Close the store's HTTP connections, if it was created (on worker shutdown)"""
+    global supabase_vector_store
+    if supabase_vector_store is not None:
+        await supabase_vector_store.aclose()
+        supabase_vector_store = None
@@ -1,6 +1,6 @@
 """
 Core RAG system components
 """
-from .rag import get_rag_response
+from .rag import answer_query, get_rag_response, search_filters, stream_rag_response
 
-__all__ = ["get_rag_response"]
+__all__ = ["answer_query", "get_rag_response", "search_filters", "stream_rag_response"]
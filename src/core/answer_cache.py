@@ -0,0 +1,387 @@
+"""
+Semantic answer cache.
+Serves a stored answer when a new question's embedding is close enough to one that
+was already answered. Entries are tagged with a corpus generation counter that is
+bumped whenever documents are added or removed, which invalidates every older answer.
+
+Storage backends: in-process memory, SQLite on local disk, or a Redis-compatible
+server (so all gunicorn workers share hits).
+"""
+import os
+import json
+import time
+import base64
+import sqlite3
+import asyncio
+import threading
+from typing import Optional, List, Dict, Any, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+ANSWER_CACHE_BACKEND = os.getenv("ANSWER_CACHE_BACKEND", "none").lower()
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "5000"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", "answer_cache.db")
+ANSWER_CACHE_REDIS_URL = os.getenv("ANSWER_CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+
+class MemoryAnswerStore:
+    """
+    Answer entries kept in this process only
+    Cursors count every entry added in the generation, including the oldest ones trimmed away.
+    """
+    
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._generation = 0
+        self._entries: List[Dict[str, Any]] = []
+        self._trimmed = 0
+        self._lock = threading.Lock()
+    
+    def generation(self) -> int:
+        return self._generation
+    
+    def bump_generation(self) -> int:
+        with self._lock:
+            self._generation += 1
+            self._entries = []
+            self._trimmed = 0
+            return self._generation
+    
+    def entries_since(self, generation: int, cursor: int) -> Tuple[int, List[Dict[str, Any]]]:
+        with self._lock:
+            if generation != self._generation:
+                return cursor, []
+            return self._trimmed + len(self._entries), self._entries[max(cursor - self._trimmed, 0):]
+    
+    def add(self, generation: int, entry: Dict[str, Any]):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries.append(entry)
+            # Keep the newest entries, like the SQLite store
+            if len(self._entries) > self.max_entries:
+                self._trimmed += len(self._entries) - self.max_entries
+                del self._entries[:-self.max_entries]
+
+
+class SQLiteAnswerStore:
+    """Answer entries in a local SQLite file, shared by every worker on the machine"""
+    
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS answer_cache_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS answer_cache ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, generation INTEGER NOT NULL, query TEXT NOT NULL, "
+            "answer TEXT NOT NULL, sources TEXT NOT NULL, embedding BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        conn.execute("INSERT OR IGNORE INTO answer_cache_meta (key, value) VALUES ('generation', 0)")
+        conn.commit()
+    
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread (queries run in the default thread pool)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+    
+    def generation(self) -> int:
+        row = self._connection().execute(
+            "SELECT value FROM answer_cache_meta WHERE key = 'generation'"
+        ).fetchone()
+        return row[0]
+    
+    def bump_generation(self) -> int:
+        conn = self._connection()
+        with conn:
+            conn.execute("UPDATE answer_cache_meta SET value = value + 1 WHERE key = 'generation'")
+            generation = conn.execute(
+                "SELECT value FROM answer_cache_meta WHERE key = 'generation'"
+            ).fetchone()[0]
+            conn.execute("DELETE FROM answer_cache WHERE generation < ?", (generation,))
+        return generation
+    
+    def entries_since(self, generation: int, cursor: int) -> Tuple[int, List[Dict[str, Any]]]:
+        rows = self._connection().execute(
+            "SELECT id, query, answer, sources, embedding, created_at FROM answer_cache "
+            "WHERE generation = ? AND id > ? ORDER BY id",
+            (generation, cursor)
+        ).fetchall()
+        entries = [
+            {
+                "query": row[1],
+                "answer": row[2],
+                "sources": json.loads(row[3]),
+                "embedding": np.frombuffer(row[4], dtype=np.float32),
+                "created_at": row[5]
+            }
+            for row in rows
+        ]
+        return (rows[-1][0] if rows else cursor), entries
+    
+    def add(self, generation: int, entry: Dict[str, Any]):
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT INTO answer_cache (generation, query, answer, sources, embedding, created_at) "
+                "SELECT ?, ?, ?, ?, ?, ? WHERE ? = (SELECT value FROM answer_cache_meta WHERE key = 'generation')",
+                (
+                    generation, entry["query"], entry["answer"], json.dumps(entry["sources"]),
+                    np.asarray(entry["embedding"], dtype=np.float32).tobytes(), entry["created_at"],
+                    generation
+                )
+            )
+            conn.execute(
+                "DELETE FROM answer_cache WHERE id <= (SELECT MAX(id) FROM answer_cache) - ?",
+                (self.max_entries,)
+            )
+
+
+class RedisAnswerStore:
+    """
+    Answer entries in a Redis-compatible server, shared by every worker and machine
+    Each generation's list keeps its newest max_entries entries; a counter of every entry
+    added to it turns cursors into positions counted from the end of the list.
+    """
+    
+    def __init__(self, url: str, ttl_seconds: float, max_entries: int, prefix: str = "langbot:answer_cache"):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("ANSWER_CACHE_BACKEND=redis requires the redis package: pip install redis")
+        
+        self.client = redis.Redis.from_url(url)
+        self.ttl_seconds = int(ttl_seconds)
+        self.max_entries = max_entries
+        self.prefix = prefix
+    
+    def _entries_key(self, generation: int) -> str:
+        return f"{self.prefix}:entries:{generation}"
+    
+    def _added_key(self, generation: int) -> str:
+        return f"{self.prefix}:added:{generation}"
+    
+    def generation(self) -> int:
+        return int(self.client.get(f"{self.prefix}:generation") or 0)
+    
+    def bump_generation(self) -> int:
+        return int(self.client.incr(f"{self.prefix}:generation"))
+    
+    def entries_since(self, generation: int, cursor: int) -> Tuple[int, List[Dict[str, Any]]]:
+        key, added_key = self._entries_key(generation), self._added_key(generation)
+        
+        def read(pipeline) -> Tuple[int, List[bytes]]:
+            # Both keys are watched: another worker's add in between retries the read
+            added = int(pipeline.get(added_key) or 0)
+            new = min(added - cursor, self.max_entries)
+            return added, (pipeline.lrange(key, -new, -1) if new > 0 else [])
+        
+        added, raw_entries = self.client.transaction(read, key, added_key, value_from_callable=True)
+        entries = []
+        for raw in raw_entries:
+            entry = json.loads(raw)
+            entry["embedding"] = np.frombuffer(base64.b64decode(entry["embedding"]), dtype=np.float32)
+            entries.append(entry)
+        return added, entries
+    
+    def add(self, generation: int, entry: Dict[str, Any]):
+        key, added_key = self._entries_key(generation), self._added_key(generation)
+        payload = dict(entry)
+        payload["embedding"] = base64.b64encode(
+            np.asarray(entry["embedding"], dtype=np.float32).tobytes()
+        ).decode("ascii")
+        # One MULTI/EXEC: concurrent workers can't push past the cap between push and trim
+        pipeline = self.client.pipeline()
+        pipeline.rpush(key, json.dumps(payload))
+        pipeline.ltrim(key, -self.max_entries, -1)
+        pipeline.incr(added_key)
+        pipeline.expire(key, self.ttl_seconds)
+        pipeline.expire(added_key, self.ttl_seconds)
+        pipeline.execute()
+
+
+class SemanticAnswerCache:
+    """Looks up earlier answers by query-embedding similarity within the current corpus generation"""
+    
+    def __init__(self, store, threshold: float = 0.95, max_entries: int = 5000, ttl_seconds: float = 86400):
+        self.store = store
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        
+        # Local mirror of the current generation's entries, synced incrementally from the store
+        self._generation: Optional[int] = None
+        self._cursor = 0
+        self._entries: List[Dict[str, Any]] = []
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def _sync(self) -> int:
+        """Pull entries added since the last lookup; reset the mirror on a new generation"""
+        generation = self.store.generation()
+        if generation != self._generation:
+            self._generation = generation
+            self._cursor = 0
+            self._entries = []
+            self._matrix = np.empty((0, 0), dtype=np.float32)
+        
+        self._cursor, new_entries = self.store.entries_since(generation, self._cursor)
+        if new_entries:
+            self._entries.extend(new_entries)
+            vectors = np.stack([self._normalize(entry["embedding"]) for entry in new_entries])
+            self._matrix = vectors if self._matrix.size == 0 else np.vstack([self._matrix, vectors])
+            if len(self._entries) > self.max_entries:
+                self._entries = self._entries[-self.max_entries:]
+                self._matrix = self._matrix[-self.max_entries:]
+        return generation
+    
+    def _lookup(self, query_embedding: List[float]) -> Tuple[int, Optional[Dict[str, Any]]]:
+        with self._lock:
+            generation = self._sync()
+            if not self._entries:
+                return generation, None
+            
+            similarities = self._matrix @ self._normalize(query_embedding)
+            expired = np.array([time.time() - entry["created_at"] >= self.ttl_seconds for entry in self._entries])
+            similarities[expired] = -1.0
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return generation, None
+            
+            entry = self._entries[best]
+            return generation, {
+                "answer": entry["answer"],
+                "sources": entry["sources"],
+                "matched_query": entry["query"],
+                "similarity": round(float(similarities[best]), 4)
+            }
+    
+    async def lookup(self, query_embedding: List[float]) -> Tuple[int, Optional[Dict[str, Any]]]:
+        """
+        Find a cached answer for this query embedding.
+        Returns: (corpus generation the lookup ran against, hit or None)
+        """
+        try:
+            generation, hit = await asyncio.to_thread(self._lookup, query_embedding)
+        except Exception as e:
+            # A cache outage must not fail the query; answer it normally instead
+            print(f"Error reading answer cache: {e}")
+            return -1, None
+        
+        if hit is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return generation, hit
+    
+    async def store_answer(
+        self,
+        generation: int,
+        query: str,
+        query_embedding: List[float],
+        answer: str,
+        sources: List[Dict[str, Any]]
+    ):
+        """Remember an answer; it is dropped if the corpus changed since the lookup"""
+        if generation < 0:
+            return
+        entry = {
+            "query": query,
+            "answer": answer,
+            "sources": sources,
+            "embedding": np.asarray(query_embedding, dtype=np.float32),
+            "created_at": time.time()
+        }
+        try:
+            await asyncio.to_thread(self.store.add, generation, entry)
+        except Exception as e:
+            print(f"Error writing answer cache: {e}")
+    
+    def invalidate(self) -> int:
+        """Start a new corpus generation, invalidating every cached answer"""
+        return self.store.bump_generation()
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.store).__name__,
+            "threshold": self.threshold,
+            "generation": self._generation,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+# Global instance (created on first use, None when disabled)
+answer_cache: Optional[SemanticAnswerCache] = None
+
+def get_answer_cache() -> Optional[SemanticAnswerCache]:
+    """Get or create the answer cache configured by ANSWER_CACHE_BACKEND"""
+    global answer_cache
+    if answer_cache is None and ANSWER_CACHE_BACKEND != "none":
+        if ANSWER_CACHE_BACKEND == "memory":
+            if os.getenv("USE_SUPABASE", "false").lower() == "true":
+                # Only the local FAISS index tells a worker about another worker's uploads
+                print("Warning: the memory answer cache is per worker; with Supabase and more than one worker use sqlite or redis")
+            store = MemoryAnswerStore(ANSWER_CACHE_MAX_ENTRIES)
+        elif ANSWER_CACHE_BACKEND == "sqlite":
+            store = SQLiteAnswerStore(ANSWER_CACHE_PATH, ANSWER_CACHE_MAX_ENTRIES)
+        elif ANSWER_CACHE_BACKEND == "redis":
+            store = RedisAnswerStore(ANSWER_CACHE_REDIS_URL, ANSWER_CACHE_TTL_SECONDS, ANSWER_CACHE_MAX_ENTRIES)
+        else:
+            raise ValueError(
+                f"Unknown ANSWER_CACHE_BACKEND '{ANSWER_CACHE_BACKEND}'. Use none, memory, sqlite or redis."
+            )
+        answer_cache = SemanticAnswerCache(
+            store,
+            threshold=ANSWER_CACHE_THRESHOLD,
+            max_entries=ANSWER_CACHE_MAX_ENTRIES,
+            ttl_seconds=ANSWER_CACHE_TTL_SECONDS
+        )
+    return answer_cache
+
+
+def invalidate_answer_cache():
+    """Called by the backends whenever the corpus changes"""
+    cache = get_answer_cache()
+    if cache is not None:
+        try:
+            cache.invalidate()
+        except Exception as e:
+            print(f"Error invalidating answer cache: {e}")
+
+
+def corpus_reloaded():
+    """
+    Called when this process loads a corpus generation another worker wrote (rag.get_store
+    subscribes it to the FAISS index's reloads)
+    That worker already invalidated the shared stores; a memory store is private to
+    each process, so it is invalidated here.
+    """
+    cache = answer_cache
+    if cache is not None and isinstance(cache.store, MemoryAnswerStore):
+        invalidate_answer_cache()
@@ -0,0 +1,304 @@
+"""
+Background document ingestion.
+/upload/ stages the file and returns a job id right away; a small pool of workers in
+each process embeds and indexes documents taken from a bounded queue. Job status is
+kept in small JSON files so /jobs/{id} can be answered by any gunicorn worker.
+"""
+import os
+import re
+import json
+import time
+import uuid
+import asyncio
+from pathlib import Path
+from typing import Callable, Optional, List, Dict, Any, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))
+INGESTION_QUEUE_SIZE = int(os.getenv("INGESTION_QUEUE_SIZE", "16"))
+INGESTION_JOBS_DIR = os.getenv("INGESTION_JOBS_DIR", "ingestion_jobs")
+INGESTION_JOB_TTL_SECONDS = float(os.getenv("INGESTION_JOB_TTL_SECONDS", "86400"))
+
+USE_SUPABASE = os.getenv("USE_SUPABASE", "false").lower() == "true"
+
+JOB_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+# Called with (chunks_embedded, chunks_total) after every embedding batch
+ProgressCallback = Callable[[int, int], None]
+
+
+class QueueFullError(Exception):
+    """Raised when the ingestion queue has no room left (the client should retry later)"""
+
+
+class JobStore:
+    """Job status files shared by every worker process"""
+    
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+    
+    def _path(self, job_id: str) -> Path:
+        return self.directory / f"{job_id}.json"
+    
+    def save(self, job: Dict[str, Any]):
+        """Write atomically so readers never see a half-written file"""
+        path = self._path(job["job_id"])
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(job, f)
+        os.replace(tmp_path, path)
+    
+    def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if not JOB_ID_PATTERN.fullmatch(job_id):
+            return None
+        try:
+            with open(self._path(job_id), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+    
+    def prune(self, max_age_seconds: float):
+        """Delete status files of jobs that finished long ago"""
+        cutoff = time.time() - max_age_seconds
+        for path in self.directory.glob("*.json"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class IngestionQueue:
+    """Bounded queue of ingestion jobs processed by a pool of asyncio workers"""
+    
+    def __init__(self, store: JobStore, workers: int = 2, max_queued: int = 16):
+        self.store = store
+        self.workers = workers
+        self.max_queued = max_queued
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        
+        # Throughput per backend, for this process
+        self._throughput: Dict[str, Dict[str, float]] = {}
+    
+    def _ensure_workers(self):
+        """Start the worker pool on the running event loop the first time it is needed"""
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queued)
+            self.store.prune(INGESTION_JOB_TTL_SECONDS)
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+    
+    def is_full(self) -> bool:
+        return self._queue is not None and self._queue.full()
+    
+    def submit(
+        self,
+        staged_path: str,
+        filename: str,
+        remove_staged: bool = False,
+        file_hash: Optional[str] = None,
+        chunking: Optional[Dict[str, Any]] = None,
+        stored_path: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Queue a staged upload for ingestion
+        file_hash is the SHA256 computed while the upload was staged, so workers don't reread the file
+        chunking is the upload's chunking settings (the CHUNK_* defaults if None)
+        stored_path is where the local backend moves the file once the document is committed
+        Raises QueueFullError when the queue is at capacity
+        """
+        return self._enqueue("document", [(staged_path, filename)], remove_staged, [file_hash], chunking, [stored_path])
+    
+    def submit_batch(
+        self,
+        files: List[Tuple[str, str]],
+        remove_staged: bool = False,
+        file_hashes: Optional[List[Optional[str]]] = None,
+        chunking: Optional[Dict[str, Any]] = None,
+        stored_paths: Optional[List[Optional[str]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Queue many staged uploads as one bulk ingestion job
+        files is a list of (staged_path, filename), file_hashes their SHA256 if already known
+        chunking is the chunking settings for every file (the CHUNK_* defaults if None)
+        stored_paths is where the local backend moves each committed file, as for submit
+        Raises QueueFullError when the queue is at capacity
+        """
+        return self._enqueue(
+            "batch", files, remove_staged, file_hashes or [None] * len(files), chunking, stored_paths or [None] * len(files)
+        )
+    
+    def _enqueue(
+        self,
+        kind: str,
+        files: List[Tuple[str, str]],
+        remove_staged: bool,
+        file_hashes: List[Optional[str]],
+        chunking: Optional[Dict[str, Any]],
+        stored_paths: List[Optional[str]]
+    ) -> Dict[str, Any]:
+        self._ensure_workers()
+        
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "kind": kind,
+            "filename": files[0][1] if kind == "document" else None,
+            "filenames": [filename for _, filename in files],
+            "backend": "Supabase" if USE_SUPABASE else "Local FAISS",
+            "status": "queued",
+            "message": "Waiting for an ingestion worker",
+            "document_id": None,
+            "chunking": chunking,
+            "chunks_embedded": 0,
+            "chunks_total": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None
+        }
+        
+        try:
+            self._queue.put_nowait((job, files, file_hashes, stored_paths, remove_staged))
+        except asyncio.QueueFull:
+            raise QueueFullError("Ingestion queue is full, please retry shortly")
+        
+        self.store.save(job)
+        return job
+    
+    async def _worker(self):
+        while True:
+            job, files, file_hashes, stored_paths, remove_staged = await self._queue.get()
+            try:
+                await self._run(job, files, file_hashes, stored_paths)
+            except Exception as e:
+                job.update({"status": "error", "message": f"Error processing document: {str(e)}"})
+            finally:
+                job["finished_at"] = time.time()
+                self.store.save(job)
+                if remove_staged:
+                    # Committed files were already moved to their stored path
+                    for staged_path, _ in files:
+                        Path(staged_path).unlink(missing_ok=True)
+                self._queue.task_done()
+    
+    async def _run(
+        self,
+        job: Dict[str, Any],
+        files: List[Tuple[str, str]],
+        file_hashes: List[Optional[str]],
+        stored_paths: List[Optional[str]]
+    ):
+        job.update({"status": "running", "message": "Embedding chunks", "started_at": time.time()})
+        self.store.save(job)
+        
+        def progress(chunks_embedded: int, chunks_total: int):
+            job["chunks_embedded"] = chunks_embedded
+            job["chunks_total"] = chunks_total
+            self.store.save(job)
+        
+        if job["kind"] == "batch":
+            result = await self._run_batch(files, file_hashes, job["chunking"], stored_paths, progress)
+            job["documents"] = result.get("documents", [])
+            documents_added = result.get("document_count", 0)
+        else:
+            result = await self._run_document(files[0], file_hashes[0], job["chunking"], stored_paths[0], progress)
+            job["document_id"] = result.get("document_id")
+            documents_added = 1
+        
+        job.update({
+            "status": result["status"],
+            "message": result["message"],
+            "chunk_count": result.get("chunk_count")
+        })
+        # Seconds per ingestion stage, from backends that report them (Supabase)
+        if result.get("timings"):
+            job["timings"] = result["timings"]
+        
+        if result["status"] == "success":
+            elapsed = max(time.time() - job["started_at"], 1e-9)
+            job["chunks_per_second"] = round(result["chunk_count"] / elapsed, 2)
+            job["documents_per_second"] = round(documents_added / elapsed, 3)
+            totals = self._throughput.setdefault(job["backend"], {"documents": 0, "chunks": 0, "seconds": 0.0})
+            totals["documents"] += documents_added
+            totals["chunks"] += result["chunk_count"]
+            totals["seconds"] += elapsed
+    
+    async def _run_document(
+        self,
+        file: Tuple[str, str],
+        file_hash: Optional[str],
+        chunking: Optional[Dict[str, Any]],
+        stored_path: Optional[str],
+        progress: ProgressCallback
+    ) -> Dict[str, Any]:
+        staged_path, filename = file
+        if USE_SUPABASE:
+            from src.backends import get_supabase_store
+            
+            # Large files are streamed from disk instead of read whole
+            return await get_supabase_store().add_file(
+                staged_path, filename, chunking, progress_callback=progress, file_hash=file_hash
+            )
+        
+        from src.backends import get_vector_store_manager
+        
+        return await asyncio.to_thread(
+            get_vector_store_manager().add_document, staged_path, filename, progress, file_hash, chunking, stored_path
+        )
+    
+    async def _run_batch(
+        self,
+        files: List[Tuple[str, str]],
+        file_hashes: List[Optional[str]],
+        chunking: Optional[Dict[str, Any]],
+        stored_paths: List[Optional[str]],
+        progress: ProgressCallback
+    ) -> Dict[str, Any]:
+        if USE_SUPABASE:
+            from src.backends import get_supabase_store
+            
+            return await get_supabase_store().add_files(files, chunking, progress_callback=progress)
+        
+        from src.backends import get_vector_store_manager
+        
+        return await get_vector_store_manager().aadd_documents(
+            files, progress_callback=progress, file_hashes=file_hashes, chunking=chunking, stored_paths=stored_paths
+        )
+    
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.load(job_id)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and ingestion throughput per backend"""
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_queued": self.max_queued,
+            "throughput": {
+                backend: {
+                    **totals,
+                    "seconds": round(totals["seconds"], 3),
+                    "documents_per_second": round(totals["documents"] / totals["seconds"], 3) if totals["seconds"] else 0.0,
+                    "chunks_per_second": round(totals["chunks"] / totals["seconds"], 2) if totals["seconds"] else 0.0
+                }
+                for backend, totals in self._throughput.items()
+            }
+        }
+
+
+# Global instance (created on first use)
+ingestion_queue: Optional[IngestionQueue] = None
+
+def get_ingestion_queue() -> IngestionQueue:
+    """Get or create the ingestion queue for this process"""
+    global ingestion_queue
+    if ingestion_queue is None:
+        ingestion_queue = IngestionQueue(
+            JobStore(INGESTION_JOBS_DIR),
+            workers=INGESTION_WORKERS,
+            max_queued=INGESTION_QUEUE_SIZE
+        )
+    return ingestion_queue
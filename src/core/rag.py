@@ -2,55 +2,226 @@
 RAG System with Supabase backend
 Supports both FAISS (local) and Supabase (cloud) vector stores
 """
+import asyncio
+from contextlib import aclosing
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional
 from dotenv import load_dotenv
 import os
 
-from langchain_openai import OpenAI
+from .answer_cache import corpus_reloaded, get_answer_cache
+from src.backends.diversity import MMR_SEARCH
+from src.backends.hybrid import HYBRID_SEARCH
+
+# LangChain and the OpenAI SDK take seconds to import; load them on first use, not at startup
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+    from langchain_openai import OpenAI
 
 # Load environment variables
 load_dotenv()
 
-# Initialize the LLM (using OpenAI)
-llm = OpenAI()
+# The LLM (using OpenAI), created on first use
+llm: Optional["OpenAI"] = None
 
 # Determine which vector store to use
 USE_SUPABASE = os.getenv("USE_SUPABASE", "false").lower() == "true"
 
+# Maximum number of queries processed at once by this worker; extra requests wait for a slot
+MAX_CONCURRENT_QUERIES = int(os.getenv("RAG_MAX_CONCURRENT_QUERIES", "32"))
+_query_slots = asyncio.Semaphore(MAX_CONCURRENT_QUERIES)
+
+
+NO_DOCUMENTS_MESSAGE = "I don't have enough information to answer that question. Please upload relevant documents first."
+NO_MATCHING_DOCUMENTS_MESSAGE = "No indexed documents match the given filters."
+
+
+def get_llm() -> "OpenAI":
+    """Get or create the LLM client"""
+    global llm
+    if llm is None:
+        from langchain_openai import OpenAI
+        llm = OpenAI()
+    return llm
+
+
+def get_store():
+    """Vector store for the configured backend"""
+    if USE_SUPABASE:
+        # Use Supabase pgvector for production
+        from src.backends import get_supabase_store
+        return get_supabase_store()
+    
+    # Use FAISS for local development
+    from src.backends import get_vector_store_manager
+    store = get_vector_store_manager()
+    # The worker that wrote a generation could only invalidate answer caches it shares
+    store.index.on_reload(corpus_reloaded)
+    return store
+
+
+async def _refresh_corpus():
+    """Load index changes other workers wrote, so the answer cache isn't consulted against an older corpus"""
+    if not USE_SUPABASE:
+        await asyncio.to_thread(get_store().index.refresh)
+
+
+async def _embed_query(query: str) -> List[float]:
+    """Embed the question once; the vector is reused for the answer cache and retrieval"""
+    return await get_store().embeddings.aembed_query(query)
+
+
+def search_filters(
+    document_ids: Optional[List[str]] = None,
+    filenames: Optional[List[str]] = None,
+    uploaded_after: Optional[datetime] = None,
+    uploaded_before: Optional[datetime] = None
+) -> Optional[Dict[str, Any]]:
+    """Retrieval filters in the form both backends take, or None when none is set"""
+    filters = {
+        "document_ids": document_ids or None,
+        "filenames": filenames or None,
+        "uploaded_after": uploaded_after,
+        "uploaded_before": uploaded_before
+    }
+    filters = {name: value for name, value in filters.items() if value is not None}
+    return filters or None
+
+
+async def _retrieve_documents(
+    query: str,
+    query_embedding: List[float],
+    k: int = 2,
+    filters: Optional[Dict[str, Any]] = None
+) -> List["Document"]:
+    """Retrieve the most relevant chunks from the configured backend (diversified with MMR_SEARCH)"""
+    store = get_store()
+    if HYBRID_SEARCH:
+        if USE_SUPABASE:
+            return await store.hybrid_search_by_vector(query, query_embedding, k=k, filters=filters, mmr=MMR_SEARCH)
+        return await store.ahybrid_search_by_vector(query, query_embedding, k=k, filters=filters, mmr=MMR_SEARCH)
+    if USE_SUPABASE:
+        return await store.similarity_search_by_vector(query_embedding, k=k, filters=filters, mmr=MMR_SEARCH)
+    return await store.asimilarity_search_by_vector(query_embedding, k=k, filters=filters, mmr=MMR_SEARCH)
+
+
+def _build_prompt(query: str, retrieved_docs: List["Document"]) -> str:
+    """Combine the retrieved context and the question into a single prompt"""
+    context = "\n".join([doc.page_content for doc in retrieved_docs])
+    return f"Use the following information to answer the question:\n\n{context}\n\nQuestion: {query}"
+
+
+def _describe_sources(retrieved_docs: List["Document"]) -> List[Dict[str, Any]]:
+    """JSON-friendly description of the retrieved chunks"""
+    return [{"content": doc.page_content, "metadata": doc.metadata} for doc in retrieved_docs]
+
+
+async def answer_query(query: str, filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Answer a question using either Supabase or FAISS backend
+    filters (see search_filters) restricts retrieval to matching documents; such answers
+    bypass the answer cache, whose entries were retrieved from the whole corpus.
+    Returns: {"response": str, "cached": bool} plus the cache match details on a hit
+    """
+    try:
+        async with _query_slots:
+            query_embedding = await _embed_query(query)
+            
+            # Serve paraphrases of earlier questions from the answer cache
+            cache = get_answer_cache() if filters is None else None
+            if cache is not None:
+                await _refresh_corpus()
+                generation, hit = await cache.lookup(query_embedding)
+                if hit is not None:
+                    return {
+                        "response": hit["answer"],
+                        "cached": True,
+                        "cache_similarity": hit["similarity"],
+                        "cache_matched_query": hit["matched_query"]
+                    }
+            
+            retrieved_docs = await _retrieve_documents(query, query_embedding, k=2, filters=filters)
+            
+            if filters is not None and not retrieved_docs:
+                return {"response": NO_MATCHING_DOCUMENTS_MESSAGE, "cached": False}
+            if USE_SUPABASE and not retrieved_docs:
+                return {"response": NO_DOCUMENTS_MESSAGE, "cached": False}
+            
+            # Generate the final response without blocking the event loop
+            generated_response = await get_llm().agenerate([_build_prompt(query, retrieved_docs)])
+            
+            # Extract the text from the response
+            answer = generated_response.generations[0][0].text
+            
+            if cache is not None:
+                await cache.store_answer(generation, query, query_embedding, answer, _describe_sources(retrieved_docs))
+            
+            return {"response": answer, "cached": False}
+    
+    except ValueError as e:
+        return {"response": f"Error: {str(e)}. Please upload at least one document first.", "cached": False}
+    except Exception as e:
+        return {"response": f"An error occurred: {str(e)}", "cached": False}
+
 
 async def get_rag_response(query: str):
     """
     Get RAG response using either Supabase or FAISS backend
     """
+    result = await answer_query(query)
+    return result["response"]
+
+
+async def stream_rag_response(query: str, filters: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Stream a RAG response as events.
+    Yields one "sources" event with the retrieved chunk metadata, then a "token" event
+    per generated text fragment, and finally "done" (or "error"). Answers served from
+    the answer cache are preceded by a "cached" event. filters works as in answer_query.
+    Closing the generator early cancels the LLM request.
+    """
     try:
-        if USE_SUPABASE:
-            # Use Supabase pgvector for production
-            from src.backends import get_supabase_store
+        async with _query_slots:
+            query_embedding = await _embed_query(query)
             
-            store = get_supabase_store()
-            retrieved_docs = await store.similarity_search(query, k=2)
+            cache = get_answer_cache() if filters is None else None
+            if cache is not None:
+                await _refresh_corpus()
+                generation, hit = await cache.lookup(query_embedding)
+                if hit is not None:
+                    yield {"event": "sources", "data": hit["sources"]}
+                    yield {
+                        "event": "cached",
+                        "data": {"similarity": hit["similarity"], "matched_query": hit["matched_query"]}
+                    }
+                    yield {"event": "token", "data": hit["answer"]}
+                    yield {"event": "done", "data": None}
+                    return
             
-            if not retrieved_docs:
-                return "I don't have enough information to answer that question. Please upload relevant documents first."
-        else:
-            # Use FAISS for local development
-            from src.backends import vector_store_manager
+            retrieved_docs = await _retrieve_documents(query, query_embedding, k=2, filters=filters)
+            sources = _describe_sources(retrieved_docs)
             
-            retriever = vector_store_manager.get_retriever(k=2)
-            retrieved_docs = retriever.invoke(query)
-        
-        # Prepare the input for the LLM
-        context = "\n".join([doc.page_content for doc in retrieved_docs])
-        
-        # Create prompt with context
-        prompt = [f"Use the following information to answer the question:\n\n{context}\n\nQuestion: {query}"]
-        
-        # Generate the final response using the language model
-        generated_response = llm.generate(prompt)
-        
-        # Extract the text from the response
-        return generated_response.generations[0][0].text
+            yield {"event": "sources", "data": sources}
+            
+            if filters is not None and not retrieved_docs:
+                yield {"event": "token", "data": NO_MATCHING_DOCUMENTS_MESSAGE}
+            elif USE_SUPABASE and not retrieved_docs:
+                yield {"event": "token", "data": NO_DOCUMENTS_MESSAGE}
+            else:
+                answer_parts = []
+                # aclosing() makes sure the HTTP stream to the LLM is closed as soon as we stop iterating
+                async with aclosing(get_llm().astream(_build_prompt(query, retrieved_docs))) as tokens:
+                    async for token in tokens:
+                        answer_parts.append(token)
+                        yield {"event": "token", "data": token}
+                
+                # Only complete answers are cached; a disconnect never reaches this point
+                if cache is not None:
+                    await cache.store_answer(generation, query, query_embedding, "".join(answer_parts), sources)
         
+        yield {"event": "done", "data": None}
+    
     except ValueError as e:
-        return f"Error: {str(e)}. Please upload at least one document first."
+        yield {"event": "error", "data": f"Error: {str(e)}. Please upload at least one document first."}
     except Exception as e:
-        return f"An error occurred: {str(e)}"
+        yield {"event": "error", "data": f"An error occurred: {str(e)}"}
@@ -0,0 +1,81 @@
+"""
+Startup warm-up.
+Importing the app loads only FastAPI and the route modules, so a worker binds its port and
+answers /health quickly. The LLM client, the embeddings and the vector store are then built
+in a background thread, and /ready reports when this worker can answer queries without a
+user's first request paying for imports and the index load.
+"""
+import os
+import sys
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Any
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# When false, everything is built by the first request that needs it and /ready answers at once
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+
+# pending -> running -> ready | failed ("lazy" when warm-up is disabled)
+warmup_status: Dict[str, Any] = {
+    "state": "pending" if WARMUP_ON_STARTUP else "lazy",
+    "steps": {},
+    "seconds": None,
+    "error": None
+}
+
+
+def _run_step(name: str, build: Callable[[], Any]):
+    started = time.perf_counter()
+    build()
+    warmup_status["steps"][name] = round(time.perf_counter() - started, 3)
+
+
+def _warm_up():
+    """Build every lazily created component a query needs (runs in a worker thread)"""
+    from src.core.answer_cache import get_answer_cache
+    from src.core.rag import get_llm, get_store
+    
+    _run_step("llm", get_llm)
+    # Creates the embeddings client and, for FAISS, loads the index
+    _run_step("vector_store", get_store)
+    _run_step("answer_cache", get_answer_cache)
+
+
+async def warm_up():
+    """Run the warm-up off the event loop, so /health and /ready keep answering meanwhile"""
+    warmup_status["state"] = "running"
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(_warm_up)
+        warmup_status["state"] = "ready"
+    except Exception as e:
+        # Requests still build what they need lazily; /ready stays unavailable
+        print(f"Warm-up failed: {e}")
+        warmup_status["state"] = "failed"
+        warmup_status["error"] = str(e)
+    warmup_status["seconds"] = round(time.perf_counter() - started, 3)
+
+
+def is_ready() -> bool:
+    return warmup_status["state"] in ("ready", "lazy")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Start the warm-up without waiting for it, so the server begins accepting connections"""
+    task = asyncio.create_task(warm_up()) if WARMUP_ON_STARTUP else None
+    yield
+    if task is not None and not task.done():
+        task.cancel()
+    # Close the Supabase store's pooled connections, if this worker created it
+    supabase_manager = sys.modules.get("src.backends.supabase_manager")
+    if supabase_manager is not None:
+        await supabase_manager.close_supabase_store()
+    # Stop the chunking processes, if this worker started them
+    chunking = sys.modules.get("src.backends.chunking")
+    if chunking is not None:
+        chunking.shutdown_chunking_pool()
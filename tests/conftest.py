@@ -0,0 +1,38 @@
+"""
+Shared test setup: the project root on sys.path, no on-disk chunk embedding cache, and a
+local FAISS store in a temporary directory whose embeddings never leave the process
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+os.environ.setdefault("CHUNK_CACHE_MAX_MB", "0")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+
+@pytest.fixture
+def faiss_store(tmp_path, monkeypatch):
+    """A VectorStoreManager under tmp_path (also the working directory), served by get_vector_store_manager"""
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from src.backends import faiss_manager
+    
+    monkeypatch.chdir(tmp_path)
+    manager = faiss_manager.VectorStoreManager(
+        str(tmp_path / "vector_store"), metadata_path=str(tmp_path / "vector_store_metadata.json")
+    )
+    manager.embeddings = DeterministicFakeEmbedding(size=8)
+    monkeypatch.setattr(faiss_manager, "vector_store_manager", manager)
+    return manager
+
+
+@pytest.fixture
+def ingestion_queue(tmp_path, monkeypatch):
+    """A fresh ingestion queue for this test, served by get_ingestion_queue"""
+    from src.core import ingestion
+    
+    queue = ingestion.IngestionQueue(ingestion.JobStore(str(tmp_path / "ingestion_jobs")))
+    monkeypatch.setattr(ingestion, "ingestion_queue", queue)
+    return queue
@@ -0,0 +1,83 @@
+"""
+Answer cache invalidation when another worker changes the corpus
+"""
+import asyncio
+
+import numpy as np
+
+from src.backends.faiss_index import ChunkIndex
+from src.core import answer_cache
+from src.core.answer_cache import MemoryAnswerStore, SemanticAnswerCache, SQLiteAnswerStore
+
+EMBEDDING = [1.0, 0.0, 0.0, 0.0]
+
+
+def document(document_id: str, chunks: int = 3):
+    vectors = np.random.default_rng(len(document_id)).random((chunks, 4), dtype="float32")
+    texts = [f"{document_id} chunk {number}" for number in range(chunks)]
+    return document_id, texts, vectors, [{"document_id": document_id} for _ in texts]
+
+
+def cache_answer(cache: SemanticAnswerCache):
+    generation, _ = asyncio.run(cache.lookup(EMBEDDING))
+    asyncio.run(cache.store_answer(generation, "question", EMBEDDING, "answer", []))
+
+
+def test_memory_cache_invalidated_by_another_workers_generation(tmp_path, monkeypatch):
+    cache = SemanticAnswerCache(MemoryAnswerStore(100))
+    monkeypatch.setattr(answer_cache, "answer_cache", cache)
+    # Two workers sharing one vector store directory
+    writer, reader = ChunkIndex(str(tmp_path)), ChunkIndex(str(tmp_path))
+    reader.on_reload(answer_cache.corpus_reloaded)
+    writer.add_documents([document("doc_a")])
+    reader.refresh()
+    
+    cache_answer(cache)
+    assert asyncio.run(cache.lookup(EMBEDDING))[1]["answer"] == "answer"
+    
+    writer.add_documents([document("doc_b")])
+    assert reader.refresh()
+    assert asyncio.run(cache.lookup(EMBEDDING))[1] is None
+
+
+def test_shared_cache_left_to_the_writer(tmp_path, monkeypatch):
+    cache = SemanticAnswerCache(SQLiteAnswerStore(str(tmp_path / "answers.db"), 100))
+    monkeypatch.setattr(answer_cache, "answer_cache", cache)
+    cache_answer(cache)
+    generation = cache.store.generation()
+    
+    answer_cache.corpus_reloaded()
+    assert cache.store.generation() == generation
+
+
+
+def test_memory_store_keeps_the_newest_entries():
+    store = MemoryAnswerStore(3)
+    
+    def add(number: int):
+        store.add(0, {"query": f"q{number}", "answer": "", "sources": [], "embedding": EMBEDDING, "created_at": 0})
+    
+    def queries(entries):
+        return [entry["query"] for entry in entries]
+    
+    for number in range(2):
+        add(number)
+    cursor, entries = store.entries_since(0, 0)
+    assert cursor == 2 and queries(entries) == ["q0", "q1"]
+    
+    for number in range(2, 7):
+        add(number)
+    assert queries(store.entries_since(0, 0)[1]) == ["q4", "q5", "q6"]
+    # A reader picks up where it stopped, whatever was trimmed meanwhile
+    cursor, entries = store.entries_since(0, cursor)
+    assert cursor == 7 and queries(entries) == ["q4", "q5", "q6"]
+    assert queries(store.entries_since(0, 5)[1]) == ["q5", "q6"]
+    assert store.entries_since(0, 7) == (7, [])
+
+
+def test_get_store_subscribes_to_index_reloads(faiss_store):
+    from src.core import rag
+    
+    store = rag.get_store()
+    rag.get_store()
+    assert store.index._reload_callbacks == [answer_cache.corpus_reloaded]
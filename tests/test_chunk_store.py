@@ -0,0 +1,26 @@
+"""
+BM25 keyword search in the chunk store
+"""
+from src.backends import chunk_store
+from src.backends.chunk_store import ChunkStore
+
+
+def store_with(tmp_path, texts) -> ChunkStore:
+    store = ChunkStore(str(tmp_path / "chunks.db"))
+    store.add_many((chunk_id, text, {}) for chunk_id, text in enumerate(texts))
+    return store
+
+
+def test_small_corpus_matches_words_in_most_chunks(tmp_path):
+    store = store_with(tmp_path, ["apple pie recipe", "apple tart recipe", "pear cake"])
+    
+    assert sorted(store.search_keywords("apple", 10, total=3)) == [0, 1]
+    assert sorted(store.search_keywords("recipe", 10, total=3)) == [0, 1]
+
+
+def test_large_corpus_drops_words_in_most_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(chunk_store, "MIN_CHUNKS_FOR_TERM_CUTOFF", 10)
+    store = store_with(tmp_path, [f"the chunk number {number}" for number in range(19)] + ["the zebra"])
+    
+    assert store.search_keywords("the", 10, total=20) == []
+    assert store.search_keywords("the zebra", 10, total=20) == [19]
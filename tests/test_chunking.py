@@ -0,0 +1,75 @@
+"""
+Chunking: the splitter against langchain's, and streamed chunks against splitting the whole text
+"""
+import random
+from functools import partial
+
+import pytest
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from src.backends import streaming
+from src.backends.chunking import RecursiveSplitter, chunking_settings, split_file, split_text
+from src.backends.streaming import iter_chunk_batches, iter_chunks
+
+# (chunk_size, chunk_overlap), including no overlap and an overlap of all but one character
+SIZES = [(200, 20), (1000, 100), (50, 0), (300, 299)]
+
+
+def prose_text(seed: int, paragraphs: int = 200) -> str:
+    """Paragraphs of 30 to 80 words separated by blank lines"""
+    rng = random.Random(seed)
+    words = "vector index query answer document chunk embedding latency worker cache search stream".split()
+    return "\n\n".join(" ".join(rng.choice(words) for _ in range(rng.randint(30, 80))) for _ in range(paragraphs))
+
+
+def noisy_text(seed: int, length: int = 20000) -> str:
+    """Runs of letters, spaces and blank lines in every combination the separators care about"""
+    rng = random.Random(seed)
+    return "".join(rng.choice(["a", "b", " ", "\n", "\n\n", "\n\n\n", "  ", "xyz" * 30]) for _ in range(length))
+
+
+def markdown_text(seed: int) -> str:
+    """Headings of every level, fenced code with heading-like lines, and non-ASCII text"""
+    rng = random.Random(seed)
+    return "".join(
+        rng.choice([
+            f"# T{number}\n", f"## S{number} ##\n", "### x\n", "```\n", "# in fence?\n", "line\n", "é ünï\n",
+            "para " * rng.randint(1, 80) + "\n\n"
+        ])
+        for number in range(300)
+    )
+
+
+TEXTS = [prose_text(1), noisy_text(2), markdown_text(3), "a" * 5000, "\n" * 50 + "abc" + "\n" * 3]
+
+
+@pytest.mark.parametrize("chunk_size,chunk_overlap", SIZES + [(5, 2)])
+def test_recursive_splitter_matches_langchain(chunk_size, chunk_overlap):
+    expected = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    splitter = RecursiveSplitter(chunk_size, chunk_overlap)
+    for text in TEXTS:
+        assert splitter.split(text) == expected.split_text(text)
+
+
+@pytest.mark.parametrize("strategy", ["character", "markdown"])
+@pytest.mark.parametrize("chunk_size,chunk_overlap", SIZES)
+def test_streamed_chunks_match_whole_text_split(strategy, chunk_size, chunk_overlap):
+    settings = chunking_settings(strategy, chunk_size, chunk_overlap)
+    for text in TEXTS:
+        whole = split_text(text, settings)
+        for block_size in (7, 997, 4096):
+            blocks = [(text[start:start + block_size], start) for start in range(0, len(text), block_size)]
+            assert [(chunk, metadata) for chunk, metadata, _ in iter_chunks(blocks, settings)] == whole
+
+
+def test_streamed_file_matches_split_file(tmp_path, monkeypatch):
+    # Blocks that end inside multi-byte characters
+    monkeypatch.setattr(streaming, "read_text_blocks", partial(streaming.read_text_blocks, block_bytes=101))
+    path = tmp_path / "notes.md"
+    path.write_text(markdown_text(4) * 3, encoding="utf-8")
+    settings = chunking_settings("markdown", 200, 20)
+    
+    streamed = []
+    for texts, metadatas, _ in iter_chunk_batches(str(path), settings, batch_chunks=16):
+        streamed.extend(zip(texts, metadatas))
+    assert streamed == split_file(str(path), settings)
@@ -0,0 +1,57 @@
+"""
+Query embedding micro-batching
+"""
+import asyncio
+
+import pytest
+
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+
+from src.backends.embedding_batcher import QueryEmbeddingBatcher
+
+
+class SlowEmbeddings(Embeddings):
+    """Embeddings whose batch calls wait until released"""
+    
+    def __init__(self):
+        self.release = asyncio.Event()
+    
+    def embed_documents(self, texts):
+        return [[1.0, 0.0] for _ in texts]
+    
+    def embed_query(self, text):
+        return [1.0, 0.0]
+    
+    async def aembed_documents(self, texts):
+        await self.release.wait()
+        return self.embed_documents(texts)
+
+
+def test_batch_shares_one_call():
+    batcher = QueryEmbeddingBatcher(DeterministicFakeEmbedding(size=4), max_wait_ms=1)
+    
+    async def ask():
+        return await asyncio.gather(batcher.embed("a"), batcher.embed("b"), batcher.embed("a"))
+    
+    first, second, third = asyncio.run(ask())
+    assert first == third != second
+    assert batcher.batches == 1 and batcher.queries == 3
+
+
+@pytest.mark.parametrize("started", [False, True])
+def test_cancelled_batch_releases_its_waiters(started):
+    async def ask():
+        embeddings = SlowEmbeddings()
+        batcher = QueryEmbeddingBatcher(embeddings, max_wait_ms=1)
+        waiters = [asyncio.ensure_future(batcher.embed(text)) for text in ("a", "b")]
+        while not batcher._batches:
+            await asyncio.sleep(0.001)
+        if started:
+            # Let the batch reach the embeddings call
+            await asyncio.sleep(0.01)
+        for task in list(batcher._batches):
+            task.cancel()
+        return await asyncio.wait(waiters, timeout=1)
+    
+    done, pending = asyncio.run(ask())
+    assert not pending and all(waiter.cancelled() for waiter in done)
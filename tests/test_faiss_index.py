@@ -0,0 +1,77 @@
+"""
+FAISS segment index: documents streamed across several segments, and merging them
+"""
+import tracemalloc
+
+import numpy as np
+
+from src.backends.faiss_index import ChunkIndex
+from src.backends.streaming import ChunkSpool
+
+DIMENSION = 8
+
+
+def vectors(count: int, seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).random((count, DIMENSION), dtype="float32")
+
+
+def nearest_texts(index: ChunkIndex, queries: np.ndarray, document_ids=None):
+    return [index.search(list(query), 1, document_ids=document_ids)[0][0].page_content for query in queries]
+
+
+def test_streamed_document_across_segments_survives_merge(tmp_path):
+    index = ChunkIndex(str(tmp_path))
+    small = vectors(3, seed=1)
+    index.add_documents([("doc_small", [f"small {number}" for number in range(3)], small, [{}] * 3)])
+    
+    streamed = vectors(10, seed=2)
+    texts = [f"streamed {number}" for number in range(10)]
+    with ChunkSpool(str(tmp_path)) as spool:
+        spool.append(texts, streamed, [{} for _ in texts])
+        assert index.add_spooled_document("doc_streamed", spool, segment_chunks=4) == 10
+    
+    # Three segments of 4, 4 and 2 chunks, each recording only its own slice
+    start = index.ranges["doc_streamed"][0]
+    assert index.ranges["doc_streamed"] == (start, 10)
+    assert [segment.ranges for segment in index.segments[1:]] == [
+        {"doc_streamed": (start, 4)}, {"doc_streamed": (start + 4, 4)}, {"doc_streamed": (start + 8, 2)}
+    ]
+    assert nearest_texts(index, streamed, ["doc_streamed"]) == texts
+    
+    # Another worker sees the same document ranges
+    reader = ChunkIndex(str(tmp_path))
+    reader.load()
+    assert reader.ranges == index.ranges
+    
+    index.delete_document("doc_small")
+    assert index.merge()["segments_merged"] == 4
+    assert len(index.segments) == 1
+    assert index.segments[0].ranges == {"doc_streamed": (start, 10)}
+    assert index.ranges == {"doc_streamed": (start, 10)}
+    assert nearest_texts(index, streamed) == texts
+    assert nearest_texts(index, streamed, ["doc_streamed"]) == texts
+
+
+def test_merging_a_streamed_document_reads_one_block_at_a_time(tmp_path):
+    dimension, segments, per_segment = 64, 20, 1000
+    index = ChunkIndex(str(tmp_path))
+    streamed = np.random.default_rng(3).random((segments * per_segment, dimension), dtype="float32")
+    texts = [f"chunk {number}" for number in range(len(streamed))]
+    with ChunkSpool(str(tmp_path)) as spool:
+        for start in range(0, len(streamed), per_segment):
+            spool.append(texts[start:start + per_segment], streamed[start:start + per_segment], [{}] * per_segment)
+        index.add_spooled_document("doc_streamed", spool, segment_chunks=per_segment)
+    assert len(index.segments) == segments
+    
+    # numpy allocations are traced, the FAISS index being filled is not: the heap only
+    # holds a block of vectors, not a copy of the whole document
+    tracemalloc.start()
+    try:
+        assert index.merge()["segments_merged"] == segments
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak < streamed.nbytes / 4
+    
+    assert index.ranges == {"doc_streamed": (0, len(streamed))}
+    assert nearest_texts(index, streamed[::997]) == texts[::997]
@@ -0,0 +1,82 @@
+"""
+Direct Postgres ingestion (postgres_loader) against a recording connection: no database needed
+"""
+from src.backends.postgres_loader import PostgresLoader
+
+DOCUMENT = {
+    "document_id": "doc_0123456789abcdef",
+    "filename": "notes.txt",
+    "file_hash": "0123456789abcdef" * 4,
+    "file_path": "documents/doc_0123456789abcdef_notes.txt",
+    "chunk_count": 1
+}
+CHUNK = {"document_id": DOCUMENT["document_id"], "chunk_index": 0, "content": "text", "embedding": [0.5, 0.25], "metadata": {}}
+
+
+class Cursor:
+    def __init__(self, results):
+        self.results = list(results)
+        self.statements = []
+    
+    def execute(self, statement, parameters=None):
+        self.statements.append(statement)
+    
+    def fetchone(self):
+        return self.results.pop(0)
+    
+    def copy_expert(self, statement, stream):
+        self.statements.append(statement)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        return False
+
+
+class Connection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+    
+    def cursor(self):
+        return self._cursor
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        return False
+
+
+class Pool:
+    def __init__(self, cursor):
+        self.connection = Connection(cursor)
+    
+    def getconn(self):
+        return self.connection
+    
+    def putconn(self, connection):
+        pass
+
+
+def loader_with(cursor) -> PostgresLoader:
+    loader = PostgresLoader.__new__(PostgresLoader)
+    loader.pool = Pool(cursor)
+    loader.batch_rows = 1000
+    return loader
+
+
+def test_new_document_copies_its_chunks():
+    cursor = Cursor([(DOCUMENT["document_id"], DOCUMENT["file_path"])])
+    
+    assert loader_with(cursor).ingest(DOCUMENT, [CHUNK]) == (True, DOCUMENT["document_id"], DOCUMENT["file_path"])
+    assert "ON CONFLICT (file_hash) DO NOTHING" in cursor.statements[0]
+    assert cursor.statements[1].startswith("COPY document_chunks")
+
+
+def test_concurrent_duplicate_copies_nothing():
+    # The other upload's row won the conflict; the stored document is returned instead
+    cursor = Cursor([None, ("doc_stored", "documents/stored.txt")])
+    
+    assert loader_with(cursor).ingest(DOCUMENT, [CHUNK]) == (False, "doc_stored", "documents/stored.txt")
+    assert not any(statement.startswith("COPY") for statement in cursor.statements)
@@ -0,0 +1,43 @@
+"""
+Query embedding cache in front of the embeddings client
+"""
+import asyncio
+import threading
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from src.backends.embeddings import CachedQueryEmbeddings
+from src.backends.query_cache import QueryEmbeddingCache
+
+
+class RecordingCache(QueryEmbeddingCache):
+    """Records the thread every lookup and store runs on"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threads = []
+    
+    def get(self, key):
+        self.threads.append(threading.get_ident())
+        return super().get(key)
+    
+    def put(self, key, embedding):
+        self.threads.append(threading.get_ident())
+        super().put(key, embedding)
+
+
+def test_disk_tier_runs_off_the_event_loop(tmp_path):
+    cache = RecordingCache(disk_path=str(tmp_path / "query_cache.db"))
+    embeddings = CachedQueryEmbeddings(DeterministicFakeEmbedding(size=8), cache)
+    
+    async def ask():
+        loop_thread = threading.get_ident()
+        first = await embeddings.aembed_query("what is a segment?")
+        second = await embeddings.aembed_query("What is a  segment?")
+        return loop_thread, first, second
+    
+    loop_thread, first, second = asyncio.run(ask())
+    
+    assert first == second
+    assert cache.hits == 1 and cache.misses == 1
+    assert len(cache.threads) == 3 and loop_thread not in cache.threads
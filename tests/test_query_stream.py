@@ -0,0 +1,57 @@
+"""
+/query/stream when the client goes away
+"""
+import asyncio
+
+from src.api import endpoints
+from src.core import rag
+
+
+class FakeRequest:
+    """Stands in for the Starlette request: only reports whether the client is gone"""
+    
+    def __init__(self):
+        self.disconnected = False
+    
+    async def is_disconnected(self) -> bool:
+        return self.disconnected
+
+
+def test_disconnect_while_retrieving_releases_the_query_slot(monkeypatch):
+    retrieval_cancelled = []
+    
+    async def embed(query):
+        return [1.0, 0.0]
+    
+    async def retrieve(*args, **kwargs):
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            retrieval_cancelled.append(True)
+            raise
+    
+    monkeypatch.setattr(rag, "_embed_query", embed)
+    monkeypatch.setattr(rag, "_retrieve_documents", retrieve)
+    monkeypatch.setattr(rag, "get_answer_cache", lambda: None)
+    monkeypatch.setattr(endpoints, "DISCONNECT_POLL_SECONDS", 0.01)
+    
+    async def run():
+        request = FakeRequest()
+        response = await endpoints.stream_query("question", request)
+        body = response.body_iterator
+        first = asyncio.ensure_future(body.__anext__())
+        await asyncio.sleep(0.05)
+        # Retrieval is still pending: no event has been produced yet, and the query holds a slot
+        assert not first.done()
+        assert rag._query_slots._value == rag.MAX_CONCURRENT_QUERIES - 1
+        
+        request.disconnected = True
+        try:
+            await asyncio.wait_for(first, 1)
+        except StopAsyncIteration:
+            pass
+        await asyncio.sleep(0.01)
+    
+    asyncio.run(run())
+    assert retrieval_cancelled == [True]
+    assert rag._query_slots._value == rag.MAX_CONCURRENT_QUERIES
@@ -0,0 +1,60 @@
+"""
+Supabase ingestion against the local Supabase stand-in (scripts/benchmarks/stub_supabase.py)
+"""
+import asyncio
+import hashlib
+import sys
+from pathlib import Path
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts" / "benchmarks"))
+import harness
+
+
+@pytest.fixture
+def supabase_store(monkeypatch):
+    """A SupabaseVectorStore talking to a fresh stand-in with no documents"""
+    process, url = harness.start_supabase_stub(latency_ms=0, documents=0)
+    monkeypatch.setenv("SUPABASE_URL", url)
+    monkeypatch.setenv("SUPABASE_KEY", "stub")
+    from src.backends.supabase_manager import SupabaseVectorStore
+    
+    store = SupabaseVectorStore()
+    store.embeddings = DeterministicFakeEmbedding(size=8)
+    try:
+        yield store
+    finally:
+        harness.stop(process)
+
+
+def test_racing_duplicate_only_fails_its_own_document(supabase_store, monkeypatch):
+    racing = b"Second document, also uploaded by someone else meanwhile."
+    upload = supabase_store._upload
+    
+    async def upload_while_another_request_stores_b(file_path: str, content: bytes):
+        await upload(file_path, content)
+        if content == racing:
+            # Lands after the batch's duplicate check, before its rows are written
+            await supabase_store.client.table("documents").insert({
+                "document_id": "doc_racing", "filename": "other.txt", "file_hash": hashlib.sha256(racing).hexdigest(),
+                "file_path": "doc_racing/other.txt", "chunk_count": 1
+            }).execute()
+    
+    monkeypatch.setattr(supabase_store, "_upload", upload_while_another_request_stores_b)
+    
+    async def add():
+        try:
+            return await supabase_store.add_documents([(b"First document.", "a.txt"), (racing, "b.txt")])
+        finally:
+            await supabase_store.aclose()
+    
+    result = asyncio.run(add())
+    
+    assert result["status"] == "success"
+    assert {document["filename"]: document["status"] for document in result["documents"]} == {
+        "a.txt": "success", "b.txt": "duplicate"
+    }
+    assert [document["document_id"] for document in result["documents"] if document["status"] == "duplicate"] == ["doc_racing"]
+    assert result["document_count"] == 1
@@ -0,0 +1,113 @@
+"""
+Uploads through the API endpoints into a local FAISS store
+"""
+import asyncio
+import io
+import os
+import zipfile
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from src.api import endpoints
+
+
+def upload(filename: str, content: bytes) -> UploadFile:
+    return UploadFile(file=io.BytesIO(content), filename=filename)
+
+
+async def ingest(queue, *requests):
+    """Run upload requests, then wait until the queue has ingested everything they submitted"""
+    responses = [await request for request in requests]
+    await queue._queue.join()
+    return [queue.get_job(response["job_id"]) for response in responses]
+
+
+def test_same_name_uploads_keep_their_own_file(faiss_store, ingestion_queue):
+    first, second = b"First notes about apples.", b"Second notes about pears."
+    jobs = asyncio.run(ingest(
+        ingestion_queue,
+        endpoints.upload_document(upload("notes.txt", first)),
+        endpoints.upload_document(upload("notes.txt", second))
+    ))
+    
+    assert [job["status"] for job in jobs] == ["success", "success"]
+    documents = faiss_store.get_all_documents()
+    assert len(documents) == 2
+    stored = {Path(document["file_path"]).read_bytes() for document in documents}
+    assert stored == {first, second}
+    assert all(os.path.dirname(document["file_path"]) == endpoints.DATA_DIR for document in documents)
+    # Nothing is left behind in staging once the jobs are done
+    assert not os.listdir(endpoints.UPLOAD_STAGING_DIR)
+
+
+
+@pytest.mark.parametrize("filename", ["../../escaped.txt", "/tmp/escaped.txt", "..\\escaped.txt"])
+def test_upload_paths_stay_in_the_data_directory(faiss_store, ingestion_queue, filename):
+    job, = asyncio.run(ingest(ingestion_queue, endpoints.upload_document(upload(filename, b"Notes about plums."))))
+    
+    assert job["status"] == "success" and job["filename"] == "escaped.txt"
+    document, = faiss_store.get_all_documents()
+    assert os.path.dirname(document["file_path"]) == endpoints.DATA_DIR
+    assert os.path.basename(document["file_path"]).endswith("_escaped.txt")
+
+
+@pytest.mark.parametrize("filename", ["", "notes/", ".."])
+def test_upload_without_a_filename_is_rejected(faiss_store, ingestion_queue, filename):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(endpoints.upload_document(upload(filename, b"text")))
+    assert error.value.status_code == 400
+
+def zip_upload(members) -> UploadFile:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, content in members:
+            archive.writestr(name, content)
+    buffer.seek(0)
+    return upload("documents.zip", buffer.getvalue())
+
+
+def test_archive_members_sharing_a_name_are_all_ingested(faiss_store, ingestion_queue):
+    archive = zip_upload([("a/notes.txt", b"Notes from folder a."), ("b/notes.txt", b"Notes from folder b.")])
+    job, = asyncio.run(ingest(ingestion_queue, endpoints.upload_documents([archive])))
+    
+    assert [document["status"] for document in job["documents"]] == ["success", "success"]
+    stored = {Path(document["file_path"]).read_bytes() for document in faiss_store.get_all_documents()}
+    assert stored == {b"Notes from folder a.", b"Notes from folder b."}
+
+
+def test_archive_over_the_member_limit_is_rejected(faiss_store, ingestion_queue, monkeypatch):
+    monkeypatch.setattr(endpoints, "UPLOAD_MAX_ARCHIVE_MEMBERS", 2)
+    archive = zip_upload([(f"doc{number}.txt", b"text") for number in range(3)])
+    
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(endpoints.upload_documents([archive]))
+    assert error.value.status_code == 413
+    assert not os.listdir(endpoints.UPLOAD_STAGING_DIR)
+
+
+def test_archive_over_the_size_limit_is_rejected(faiss_store, ingestion_queue, monkeypatch):
+    monkeypatch.setattr(endpoints, "UPLOAD_MAX_EXTRACTED_MB", 1)
+    # Compresses to almost nothing, unpacks past the limit
+    archive = zip_upload([("small.txt", b"text"), ("bomb.txt", b"0" * (2 * 1024 * 1024))])
+    
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(endpoints.upload_documents([archive]))
+    assert error.value.status_code == 413
+    assert not os.listdir(endpoints.UPLOAD_STAGING_DIR)
+
+
+def test_concurrent_identical_uploads_are_stored_once(faiss_store, ingestion_queue):
+    content = b"The same notes, uploaded twice at once."
+    jobs = asyncio.run(ingest(
+        ingestion_queue,
+        endpoints.upload_document(upload("notes.txt", content)),
+        endpoints.upload_document(upload("copy of notes.txt", content))
+    ))
+    
+    assert sorted(job["status"] for job in jobs) == ["duplicate", "success"]
+    assert jobs[0]["document_id"] == jobs[1]["document_id"]
+    assert len(faiss_store.get_all_documents()) == 1
+    assert faiss_store.index.live_count == 1
+    assert not os.listdir(endpoints.UPLOAD_STAGING_DIR)